@@ -3,10 +3,13 @@ import pytest
 import pandas as pd
 
 from munch import DefaultMunch
+from sklearn.compose import ColumnTransformer
 from sklearn.linear_model import LogisticRegression
 from sklearn.tree import DecisionTreeClassifier
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
 
 from virny.datasets.base import BaseDataLoader
+from virny.preprocessing.basic_preprocessing import preprocess_dataset
 
 
 def get_root_dir():
@@ -108,3 +111,22 @@ def compas_without_sensitive_attrs_dataset_class():
                           target=target,
                           numerical_columns=numerical_columns,
                           categorical_columns=categorical_columns)
+
+
+def create_column_transformer(data_loader: BaseDataLoader):
+    return ColumnTransformer(transformers=[
+        ('categorical_features', OneHotEncoder(handle_unknown='ignore', sparse=False), data_loader.categorical_columns),
+        ('numerical_features', StandardScaler(), data_loader.numerical_columns),
+    ])
+
+
+@pytest.fixture(scope='package')
+def compas_base_flow_dataset(compas_without_sensitive_attrs_dataset_class):
+    data_loader = compas_without_sensitive_attrs_dataset_class
+    return preprocess_dataset(data_loader, create_column_transformer(data_loader), test_set_fraction=0.2,
+                              dataset_split_seed=42)
+
+
+def get_numerical_metrics(metrics_df):
+    numerical_columns = [col for col in metrics_df.columns if col not in ('Metric', 'Model_Name', 'Model_Params')]
+    return metrics_df[numerical_columns].values.astype(float)
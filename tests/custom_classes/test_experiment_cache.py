@@ -0,0 +1,79 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+
+from sklearn.tree import DecisionTreeClassifier
+
+from virny.custom_classes.base_dataset import BaseFlowDataset
+from virny.custom_classes.experiment_cache import ExperimentCache
+
+
+def create_dataset() -> BaseFlowDataset:
+    init_features_df = pd.DataFrame({'sex': [0, 1, 0, 1, 0, 1], 'age': [20, 30, 40, 50, 60, 70]})
+    X = init_features_df[['age']].astype(float)
+    y = pd.Series([0, 1, 0, 1, 1, 0], name='target')
+    return BaseFlowDataset(init_features_df, X.iloc[:4], X.iloc[4:], y.iloc[:4], y.iloc[4:], 'target',
+                           numerical_columns=['age'], categorical_columns=[])
+
+
+# ========================== Test ExperimentCache.create_key ==========================
+def test_create_key_true1():
+    dataset = create_dataset()
+    sensitive_attributes_dct = {'sex': 1}
+
+    # A RandomState parameter is hashed by its state, not by its memory address
+    keys = [ExperimentCache.create_key(dataset, DecisionTreeClassifier(random_state=np.random.RandomState(0)), 5, 0.8,
+                                       sensitive_attributes_dct)
+            for _ in range(2)]
+    assert keys[0] == keys[1]
+
+    other_state_key = ExperimentCache.create_key(dataset, DecisionTreeClassifier(random_state=np.random.RandomState(1)),
+                                                 5, 0.8, sensitive_attributes_dct)
+    other_seed_key = ExperimentCache.create_key(dataset, DecisionTreeClassifier(random_state=np.random.RandomState(0)),
+                                                5, 0.8, sensitive_attributes_dct, bootstrap_seed=42)
+    assert len({keys[0], other_state_key, other_seed_key}) == 3
+
+
+# ========================== Test ExperimentCache.put and get ==========================
+def test_put_and_get_true1(tmp_path):
+    experiment_cache = ExperimentCache(str(tmp_path))
+    metrics_df = pd.DataFrame({
+        'Metric': ['Accuracy', 'Sample_Size'],
+        'overall': [0.75, 4.0],
+        'sex_priv': np.array([0.5, 2.0], dtype=np.float32),
+        'Model_Name': 'DecisionTreeClassifier',
+        'Model_Params': None,
+    })
+    assert experiment_cache.get('key') is None
+
+    # Dtypes and None values are kept by the cache
+    experiment_cache.put('key', metrics_df)
+    cached_metrics_df = experiment_cache.get('key')
+    assert cached_metrics_df.dtypes.equals(metrics_df.dtypes)
+    assert cached_metrics_df['Model_Params'].tolist() == [None, None]
+    assert cached_metrics_df.equals(metrics_df)
+
+
+# ========================== Test ExperimentCache.evict ==========================
+def test_evict_true1(tmp_path):
+    experiment_cache = ExperimentCache(str(tmp_path))
+    metrics_df = pd.DataFrame({'Metric': ['Accuracy'], 'overall': [0.75]})
+    for key in ('first', 'second', 'third'):
+        experiment_cache.put(key, metrics_df)
+    # Set explicit last use times, since modification times of cells written in one test can be equal
+    now = time.time()
+    for key, last_use_time in (('first', now - 300), ('second', now - 200), ('third', now - 100)):
+        os.utime(os.path.join(experiment_cache.cache_dir, key), (last_use_time, last_use_time))
+
+    # Cells older than max_age_seconds are evicted
+    experiment_cache.max_age_seconds = 250
+    experiment_cache.evict()
+    assert sorted(os.listdir(experiment_cache.cache_dir)) == ['second', 'third']
+
+    # A get() updates the last use time, so the other cell is the least recently used one
+    experiment_cache.get('second')
+    cell_size = sum(entry.stat().st_size for entry in os.scandir(os.path.join(experiment_cache.cache_dir, 'second')))
+    experiment_cache.max_size_bytes = cell_size
+    experiment_cache.evict()
+    assert os.listdir(experiment_cache.cache_dir) == ['second']
@@ -0,0 +1,85 @@
+import os
+import time
+import concurrent.futures
+
+from virny.custom_classes.file_work_queue import FileWorkQueue
+
+
+def square(payload):
+    return payload ** 2
+
+
+def run_square_worker(queue_dir, worker_id):
+    return FileWorkQueue(queue_dir).run_worker(square, worker_id=worker_id)
+
+
+# ========================== Test FileWorkQueue ==========================
+def test_file_work_queue_true1(tmp_path):
+    queue_dir = str(tmp_path / 'queue')
+    work_queue = FileWorkQueue(queue_dir)
+    for idx in range(20):
+        assert work_queue.put(f'task_{idx:02d}', idx)
+    # A pending task is not added twice
+    assert not work_queue.put('task_00', 0)
+
+    # Several local worker processes share the queue directory
+    with concurrent.futures.ProcessPoolExecutor(max_workers=3) as executor:
+        n_completed_tasks = list(executor.map(run_square_worker, [queue_dir] * 3, ['worker_1', 'worker_2', 'worker_3']))
+
+    assert sum(n_completed_tasks) == 20
+    assert work_queue.get_status() == {'pending': 0, 'claimed': 0, 'done': 20, 'failed': 0}
+    assert work_queue.get_results() == {f'task_{idx:02d}': idx ** 2 for idx in range(20)}
+    # A done task is not added again
+    assert not work_queue.put('task_00', 0)
+
+
+def test_file_work_queue_true2(tmp_path):
+    work_queue = FileWorkQueue(str(tmp_path / 'queue'), claim_timeout_seconds=10)
+    work_queue.put('task', 3)
+    crashed_task = work_queue.claim('crashed_worker')
+    assert work_queue.claim('worker') is None
+    assert work_queue.requeue_stale_claims() == []
+
+    # The crashed worker has not sent heartbeats for longer than the claim timeout
+    last_heartbeat_time = time.time() - 60
+    os.utime(crashed_task.claim_path, (last_heartbeat_time, last_heartbeat_time))
+    assert work_queue.requeue_stale_claims() == ['task']
+    assert work_queue.run_worker(square, worker_id='worker') == 1
+    assert work_queue.get_results() == {'task': 9}
+    # A late result of the requeued claim is not counted as a completion
+    assert not work_queue.complete(crashed_task, 9)
+
+
+def test_file_work_queue_true3(tmp_path):
+    work_queue = FileWorkQueue(str(tmp_path / 'queue'))
+    work_queue.put('ok', 2)
+    work_queue.put('failed', 'a')
+
+    assert work_queue.run_worker(square, worker_id='worker') == 1
+    assert work_queue.get_status() == {'pending': 0, 'claimed': 0, 'done': 1, 'failed': 1}
+    assert os.path.exists(os.path.join(work_queue.queue_dir, 'failed', 'failed.txt'))
+    # A failed task is not added again without an explicit retry
+    assert not work_queue.put('failed', 3)
+    assert work_queue.requeue_failed() == ['failed']
+    assert work_queue.get_status()['pending'] == 1
+
+
+def test_file_work_queue_true4(tmp_path):
+    work_queue = FileWorkQueue(str(tmp_path / 'queue'), claim_timeout_seconds=10)
+    work_queue.put('failed', 'a')
+    assert work_queue.run_worker(square, worker_id='worker') == 0
+
+    # A failed task is replaced by a new task with retry_failed=True
+    assert work_queue.put('failed', 3, retry_failed=True)
+    assert not os.path.exists(os.path.join(work_queue.queue_dir, 'failed', 'failed.txt'))
+    assert work_queue.get_status() == {'pending': 1, 'claimed': 0, 'done': 0, 'failed': 0}
+
+    # A task that was pending for longer than the claim timeout is not stale right after the claim
+    pending_path = os.path.join(work_queue.queue_dir, 'pending', 'failed.pkl')
+    put_time = time.time() - 60
+    os.utime(pending_path, (put_time, put_time))
+    task = work_queue.claim('worker')
+    assert task.payload == 3
+    assert work_queue.requeue_stale_claims() == []
+    assert work_queue.complete(task, square(task.payload))
+    assert work_queue.get_results() == {'failed': 9}
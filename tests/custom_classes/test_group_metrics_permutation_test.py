@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+from virny.configs.constants import VARIANCE_METRICS
+from virny.custom_classes.group_metrics_permutation_test import GroupMetricsPermutationTest
+from virny.utils.protected_groups_partitioning import create_test_protected_groups
+
+
+def create_test_set(n_samples: int, seed: int):
+    rng = np.random.default_rng(seed)
+    init_features_df = pd.DataFrame({'sex': np.tile([0, 1], n_samples // 2)},
+                                    index=pd.RangeIndex(100, 100 + n_samples))
+    y_test = pd.Series(rng.integers(0, 2, n_samples), index=init_features_df.index)
+    per_sample_stats_df = pd.DataFrame(rng.uniform(size=(n_samples, len(VARIANCE_METRICS))),
+                                       columns=VARIANCE_METRICS, index=init_features_df.index)
+    test_protected_groups = create_test_protected_groups(init_features_df, init_features_df, {'sex': 1})
+    return init_features_df, y_test, per_sample_stats_df, test_protected_groups
+
+
+def compute_brute_force_p_value(y_test: np.ndarray, y_preds: np.ndarray, dis_mask: np.ndarray, metric_func,
+                                n_permutations: int, seed: int):
+    rng = np.random.default_rng(seed)
+    observed_statistic = metric_func(y_test[dis_mask], y_preds[dis_mask], y_test[~dis_mask], y_preds[~dis_mask])
+    permuted_statistics = []
+    for _ in range(n_permutations):
+        permuted_dis_mask = rng.permutation(dis_mask)
+        permuted_statistics.append(metric_func(y_test[permuted_dis_mask], y_preds[permuted_dis_mask],
+                                               y_test[~permuted_dis_mask], y_preds[~permuted_dis_mask]))
+    permuted_statistics = np.array(permuted_statistics)
+    permuted_statistics = permuted_statistics[np.isfinite(permuted_statistics)]
+    n_extreme = np.sum(np.abs(permuted_statistics) >= np.abs(observed_statistic) - 1e-12)
+    return (n_extreme + 1) / (permuted_statistics.shape[0] + 1)
+
+
+def accuracy_difference(dis_y_test, dis_y_preds, priv_y_test, priv_y_preds):
+    return np.mean(dis_y_test == dis_y_preds) - np.mean(priv_y_test == priv_y_preds)
+
+
+def log_positive_rate_ratio(dis_y_test, dis_y_preds, priv_y_test, priv_y_preds):
+    # Positive-Rate is a ratio of predicted and true positives, (TP + FP) / (TP + FN)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.log((np.sum(dis_y_preds) / np.sum(dis_y_test)) / (np.sum(priv_y_preds) / np.sum(priv_y_test)))
+
+
+# ========================== Test GroupMetricsPermutationTest ==========================
+def test_compute_p_values_true1():
+    n_samples, n_permutations = 40, 5000
+    init_features_df, y_test, per_sample_stats_df, test_protected_groups = create_test_set(n_samples, seed=42)
+    # Errors are more likely for the dis subgroup, and p-values are neither close to 0 nor to 1
+    dis_mask = init_features_df['sex'].values == 1
+    is_error = np.random.default_rng(1).uniform(size=n_samples) < np.where(dis_mask, 0.35, 0.15)
+    y_preds = np.where(is_error, 1 - y_test.values, y_test.values)
+
+    p_values_df = GroupMetricsPermutationTest(n_permutations=n_permutations, seed=42) \
+        .compute_p_values(y_test, y_preds, per_sample_stats_df, test_protected_groups, {'sex': 1}) \
+        .set_index('Metric')
+
+    # P-values are the same as for brute-force relabelings of dis and priv subgroups
+    for metric, metric_func in (('Accuracy_Parity', accuracy_difference),
+                                ('Disparate_Impact', log_positive_rate_ratio)):
+        expected_p_value = compute_brute_force_p_value(y_test.values, y_preds, dis_mask, metric_func,
+                                                       n_permutations, seed=0)
+        assert 0.05 < expected_p_value < 0.95
+        assert abs(p_values_df.loc[metric, 'P_Value'] - expected_p_value) < 0.04
+    assert np.isclose(p_values_df.loc['Accuracy_Parity', 'Value'],
+                      accuracy_difference(y_test.values[dis_mask], y_preds[dis_mask],
+                                          y_test.values[~dis_mask], y_preds[~dis_mask]))
+
+
+def test_compute_p_values_true2():
+    n_samples, n_permutations = 60, 2000
+    init_features_df, y_test, per_sample_stats_df, test_protected_groups = create_test_set(n_samples, seed=42)
+    # All predictions are wrong for the dis subgroup and correct for the priv subgroup
+    dis_mask = init_features_df['sex'].values == 1
+    y_preds = np.where(dis_mask, 1 - y_test.values, y_test.values)
+
+    p_values_df = GroupMetricsPermutationTest(n_permutations=n_permutations, seed=42) \
+        .compute_p_values(y_test, y_preds, per_sample_stats_df, test_protected_groups, {'sex': 1}) \
+        .set_index('Metric')
+    assert p_values_df.loc['Accuracy_Parity', 'Value'] == -1.0
+    assert p_values_df.loc['Accuracy_Parity', 'P_Value'] == 1 / (n_permutations + 1)
@@ -0,0 +1,88 @@
+import pytest
+import numpy as np
+import pandas as pd
+
+from virny.configs.constants import VARIANCE_METRICS
+from virny.custom_classes.metrics_accumulators import VarianceMetricsAccumulator, ErrorMetricsAccumulator, \
+    encode_confusion_codes
+from virny.utils.protected_groups_partitioning import create_test_protected_groups
+
+
+GROUP_NAMES = ['sex_priv', 'sex_dis']
+
+
+def create_test_set():
+    # Rows of the dis subgroup (sex == 1) are FN, FP, TN, and rows of the priv subgroup are TP, TN, TP
+    init_features_df = pd.DataFrame({'sex': [0, 1, 0, 1, 0, 1]}, index=range(10, 16))
+    y_test = pd.Series([1, 1, 0, 0, 1, 0], index=init_features_df.index)
+    y_preds = np.array([1, 0, 0, 1, 1, 0])
+    return init_features_df, y_test, y_preds
+
+
+def create_shards_protected_groups(init_features_df: pd.DataFrame, shard_indexes: list):
+    return [create_test_protected_groups(init_features_df.loc[shard_index], init_features_df, {'sex': 1},
+                                         allow_empty_groups=True)
+            for shard_index in shard_indexes]
+
+
+# ========================== Test encode_confusion_codes ==========================
+def test_encode_confusion_codes_true1():
+    assert encode_confusion_codes([0, 0, 1, 1], [0, 1, 0, 1]).tolist() == [0, 1, 2, 3]
+
+
+# ========================== Test ErrorMetricsAccumulator ==========================
+def test_error_metrics_accumulator_true1():
+    init_features_df, y_test, y_preds = create_test_set()
+    test_protected_groups = create_test_protected_groups(init_features_df, init_features_df, {'sex': 1})
+    accumulator = ErrorMetricsAccumulator(GROUP_NAMES).update(y_test, y_preds, test_protected_groups)
+
+    assert accumulator.confusion_counts['overall'].tolist() == [2, 1, 1, 2]
+    assert accumulator.confusion_counts['sex_dis'].tolist() == [1, 1, 1, 0]
+    metrics = accumulator.finalize()
+    assert metrics['overall']['Sample_Size'] == 6
+    assert np.isclose(metrics['overall']['Accuracy'], 4 / 6)
+    assert np.isclose(metrics['overall']['TPR'], 2 / 3)
+    assert np.isclose(metrics['sex_dis']['Accuracy'], 1 / 3)
+    assert np.isclose(metrics['sex_priv']['Accuracy'], 1.0)
+
+
+def test_error_metrics_accumulator_true2():
+    init_features_df, y_test, y_preds = create_test_set()
+    shard_indexes = [y_test.index[:4], y_test.index[4:]]
+    shards_protected_groups = create_shards_protected_groups(init_features_df, shard_indexes)
+
+    # Merged accumulators of disjoint shards have the same counts as an accumulator of the whole test set
+    accumulators = [ErrorMetricsAccumulator(GROUP_NAMES).update(y_test.loc[shard_index],
+                                                                y_preds[y_test.index.get_indexer(shard_index)],
+                                                                protected_groups)
+                    for shard_index, protected_groups in zip(shard_indexes, shards_protected_groups)]
+    merged_accumulator = accumulators[0].merge(accumulators[1])
+    assert merged_accumulator.confusion_counts['overall'].tolist() == [2, 1, 1, 2]
+    assert merged_accumulator.confusion_counts['sex_priv'].tolist() == [1, 0, 0, 2]
+
+
+def test_error_metrics_accumulator_false1():
+    with pytest.raises(ValueError):
+        ErrorMetricsAccumulator(GROUP_NAMES).merge(ErrorMetricsAccumulator(['race_priv', 'race_dis']))
+
+
+# ========================== Test VarianceMetricsAccumulator ==========================
+def test_variance_metrics_accumulator_true1():
+    init_features_df, y_test, _ = create_test_set()
+    # Each variance metric of a sample is equal to its position
+    per_sample_stats_df = pd.DataFrame(np.tile(np.arange(6, dtype=float)[:, np.newaxis], len(VARIANCE_METRICS)),
+                                       columns=VARIANCE_METRICS, index=y_test.index)
+    shard_indexes = [y_test.index[:4], y_test.index[4:]]
+    shards_protected_groups = create_shards_protected_groups(init_features_df, shard_indexes)
+
+    accumulators = [VarianceMetricsAccumulator(GROUP_NAMES).update(y_test.loc[shard_index], None, protected_groups,
+                                                                   per_sample_stats_df.loc[shard_index])
+                    for shard_index, protected_groups in zip(shard_indexes, shards_protected_groups)]
+    merged_accumulator = accumulators[0].merge(accumulators[1])
+    assert merged_accumulator.sample_sizes == {'overall': 6, 'sex_priv': 3, 'sex_dis': 3}
+
+    metrics = merged_accumulator.finalize()
+    for metric in VARIANCE_METRICS:
+        assert metrics['overall'][metric] == 2.5
+        assert metrics['sex_priv'][metric] == (0 + 2 + 4) / 3
+        assert metrics['sex_dis'][metric] == (1 + 3 + 5) / 3
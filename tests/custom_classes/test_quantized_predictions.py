@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from virny.custom_classes.quantized_predictions import QuantizedPredictions
+from virny.utils.stability_utils import compute_per_sample_stats
+
+
+# ========================== Test QuantizedPredictions ==========================
+@pytest.mark.parametrize("predictions_dtype, max_error", [('float16', 2 ** -12), ('uint8', 1 / 510), ('uint16', 1 / 131070)])
+def test_quantized_predictions_true1(predictions_dtype, max_error):
+    rng = np.random.default_rng(42)
+    uq_results = rng.uniform(0, 1, size=(20, 1000))
+    uq_results[0, :4] = [0.5, np.nextafter(0.5, 0), 0.4999, 0.5001]
+    y_test = rng.integers(0, 2, size=1000)
+
+    quantized_predictions = QuantizedPredictions.from_predictions(uq_results, predictions_dtype)
+    dequantized = quantized_predictions.to_numpy()
+
+    assert np.max(np.abs(dequantized - uq_results)) <= max_error
+    assert np.array_equal(dequantized < 0.5, uq_results < 0.5)
+
+    actual_stats_df = quantized_predictions.compute_per_sample_stats(y_test, chunk_size=300)
+    expected_stats_df = compute_per_sample_stats(y_test, dequantized)
+    assert np.allclose(actual_stats_df.values, expected_stats_df.values, atol=1e-12)
+
+
+def test_quantized_predictions_save_load_true1(tmp_path):
+    rng = np.random.default_rng(42)
+    quantized_predictions = QuantizedPredictions.from_predictions(rng.uniform(0, 1, size=(5, 100)), 'uint16')
+
+    for filename in ('predictions.npy', 'predictions.npz'):
+        quantized_predictions.save(tmp_path / filename)
+        loaded_predictions = QuantizedPredictions.load(str(tmp_path / filename))
+        assert loaded_predictions.predictions_dtype == 'uint16'
+        assert np.array_equal(loaded_predictions.values, quantized_predictions.values)
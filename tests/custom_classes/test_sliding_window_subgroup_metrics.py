@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from virny.custom_classes.sliding_window_subgroup_metrics import SlidingWindowSubgroupMetrics
+
+
+def create_window_metrics():
+    window_metrics = SlidingWindowSubgroupMetrics({'sex': 1}, window_size=10)
+    window_metrics.add_predictions(['a', 'b', 'c'], pd.DataFrame({'sex': [1, 0, 1]}),
+                                   np.array([[0.2, 0.3], [0.7, 0.6], [0.4, 0.8]]))
+    return window_metrics
+
+
+# ========================== Test SlidingWindowSubgroupMetrics ==========================
+def test_sliding_window_subgroup_metrics_true1():
+    window_metrics = create_window_metrics()
+    # Only the last label of a duplicated sample id is kept
+    window_metrics.add_labels(['b', 'b'], [0, 1])
+    window_metrics.add_labels(['b'], [0])
+    metrics = window_metrics.get_metrics()
+    assert metrics['overall']['Labelled_Sample_Size'] == 1
+    assert metrics['overall']['Accuracy'] == 1.0
+
+
+def test_sliding_window_subgroup_metrics_false1():
+    window_metrics = create_window_metrics()
+    window_metrics.add_labels(['a'], [1])
+    metrics_before = window_metrics.get_metrics()
+
+    with pytest.raises(ValueError):
+        window_metrics.add_labels(['a'], [2])
+    with pytest.raises(ValueError):
+        window_metrics.add_predictions(['d'], pd.DataFrame({'sex': [0]}), np.array([[0.1, 0.2]]), y_true=['x'])
+
+    # The window is not changed by invalid labels
+    assert len(window_metrics) == 3
+    assert pd.DataFrame(window_metrics.get_metrics()).equals(pd.DataFrame(metrics_before))
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+from virny.custom_classes.streaming_per_sample_stats import StreamingPerSampleStats, IQR_CHUNK_SIZE
+from virny.metrics.stability_metrics import compute_std_mean_iqr_metrics
+from virny.utils.stability_utils import compute_per_sample_stats
+
+
+# ========================== Test StreamingPerSampleStats ==========================
+def test_streaming_per_sample_stats_true1():
+    rng = np.random.default_rng(42)
+    n_estimators, n_samples, n_iqr_bins = 51, 500, 100
+    y_test = rng.integers(0, 2, size=n_samples)
+    uq_results = rng.beta(2, 2, size=(n_estimators, n_samples))
+
+    streaming_stats = StreamingPerSampleStats(n_samples, n_iqr_bins=n_iqr_bins)
+    for model_predictions in uq_results:
+        streaming_stats.update(model_predictions)
+    actual_stats_df = streaming_stats.get_per_sample_stats(y_test)
+    expected_stats_df = compute_per_sample_stats(y_test, uq_results)
+
+    exact_columns = [col for col in expected_stats_df.columns if col != 'IQR']
+    assert np.allclose(actual_stats_df[exact_columns].values, expected_stats_df[exact_columns].values, atol=1e-12)
+    assert np.max(np.abs(actual_stats_df['IQR'].values - expected_stats_df['IQR'].values)) <= 1 / n_iqr_bins
+
+
+def test_streaming_per_sample_stats_true2():
+    # Bin counters are widened beyond uint8, and IQR is computed over several chunks of samples
+    rng = np.random.default_rng(42)
+    n_estimators, n_samples, n_iqr_bins = 300, IQR_CHUNK_SIZE + 100, 100
+    uq_results = rng.beta(2, 2, size=(n_estimators, n_samples))
+
+    streaming_stats = StreamingPerSampleStats(n_samples, n_iqr_bins=n_iqr_bins)
+    for model_predictions in uq_results:
+        streaming_stats.update(model_predictions)
+    actual_stats_df = streaming_stats.get_per_sample_stats()
+    expected_stats_df = compute_per_sample_stats(None, uq_results)
+
+    assert streaming_stats.histograms.dtype == np.uint16
+    assert np.max(np.abs(actual_stats_df['IQR'].values - expected_stats_df['IQR'].values)) <= 1 / n_iqr_bins
+
+
+def test_streaming_per_sample_stats_label_stats_true1():
+    rng = np.random.default_rng(7)
+    n_estimators, n_samples = 10, 200
+    uq_results = rng.beta(2, 2, size=(n_estimators, n_samples))
+
+    streaming_stats = StreamingPerSampleStats(n_samples)
+    for model_predictions in uq_results:
+        streaming_stats.update(model_predictions)
+    actual_label_stats = streaming_stats.get_label_stats()
+    expected_label_stats = compute_std_mean_iqr_metrics(pd.DataFrame((uq_results < 0.5).astype(int)))
+
+    for actual, expected in zip(actual_label_stats, expected_label_stats):
+        assert np.allclose(actual, expected, atol=1e-12)
@@ -0,0 +1,62 @@
+import pytest
+import numpy as np
+import pandas as pd
+
+from virny.configs.constants import VARIANCE_METRICS
+from virny.custom_classes.subgroup_metrics_bootstrap import SubgroupMetricsBootstrap
+from virny.utils.protected_groups_partitioning import create_test_protected_groups
+
+
+def create_test_set(y_test: list, sex: list):
+    init_features_df = pd.DataFrame({'sex': sex}, index=range(10, 10 + len(sex)))
+    y_test = pd.Series(y_test, index=init_features_df.index)
+    per_sample_stats_df = pd.DataFrame(0.5, columns=VARIANCE_METRICS, index=init_features_df.index)
+    test_protected_groups = create_test_protected_groups(init_features_df, init_features_df, {'sex': 1})
+    return y_test, per_sample_stats_df, test_protected_groups
+
+
+# ========================== Test SubgroupMetricsBootstrap ==========================
+def test_compute_confidence_intervals_true1():
+    # Rows of the dis subgroup (sex == 1) are FN, FP, TN, and rows of the priv subgroup are TP, TN, TP
+    y_test, per_sample_stats_df, test_protected_groups = create_test_set([1, 1, 0, 0, 1, 0], [0, 1, 0, 1, 0, 1])
+    y_preds = np.array([1, 0, 0, 1, 1, 0])
+
+    intervals_df = SubgroupMetricsBootstrap(n_resamples=200, seed=42) \
+        .compute_confidence_intervals(y_test, y_preds, per_sample_stats_df, test_protected_groups, {'sex': 1}) \
+        .set_index(['Group', 'Metric'])
+    assert np.isclose(intervals_df.loc[('overall', 'Accuracy'), 'Estimate'], 4 / 6)
+    assert np.isclose(intervals_df.loc[('sex_dis', 'Accuracy'), 'Estimate'], 1 / 3)
+    assert np.isclose(intervals_df.loc[('sex_priv', 'Accuracy'), 'Estimate'], 1.0)
+    assert np.isclose(intervals_df.loc[('sex', 'Accuracy_Parity'), 'Estimate'], 1 / 3 - 1)
+    assert intervals_df.loc[('overall', 'Std'), 'Estimate'] == 0.5
+    assert (intervals_df['CI_Lower'] <= intervals_df['CI_Upper']).all()
+
+
+def test_compute_confidence_intervals_true2():
+    # All predictions are correct, so every resample has the accuracy of 1
+    y_test, per_sample_stats_df, test_protected_groups = create_test_set([1, 0] * 10, [0, 0, 1, 1] * 5)
+    intervals_df = SubgroupMetricsBootstrap(n_resamples=100, seed=42) \
+        .compute_confidence_intervals(y_test, y_test.values, per_sample_stats_df, test_protected_groups) \
+        .set_index(['Group', 'Metric'])
+    assert intervals_df.loc[('overall', 'Accuracy')][['Estimate', 'Std_Error', 'CI_Lower', 'CI_Upper']].tolist() == \
+           [1.0, 0.0, 1.0, 1.0]
+
+
+def test_compute_confidence_intervals_true3():
+    # A bootstrap standard error of the accuracy p is close to sqrt(p * (1 - p) / n)
+    n_samples, accuracy = 400, 0.75
+    y_test, per_sample_stats_df, test_protected_groups = create_test_set([1] * n_samples, [0, 1] * (n_samples // 2))
+    y_preds = np.array([1] * int(n_samples * accuracy) + [0] * int(n_samples * (1 - accuracy)))
+
+    intervals_df = SubgroupMetricsBootstrap(n_resamples=4000, seed=42) \
+        .compute_confidence_intervals(y_test, y_preds, per_sample_stats_df, test_protected_groups) \
+        .set_index(['Group', 'Metric'])
+    expected_std_error = np.sqrt(accuracy * (1 - accuracy) / n_samples)
+    assert np.isclose(intervals_df.loc[('overall', 'Accuracy'), 'Std_Error'], expected_std_error, rtol=0.1)
+    assert np.isclose(intervals_df.loc[('overall', 'Accuracy'), 'CI_Lower'], accuracy - 1.96 * expected_std_error,
+                      atol=0.01)
+
+
+def test_subgroup_metrics_bootstrap_false1():
+    with pytest.raises(ValueError):
+        SubgroupMetricsBootstrap(confidence_level=1.0)
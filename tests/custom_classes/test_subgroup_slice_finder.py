@@ -0,0 +1,45 @@
+import itertools
+import numpy as np
+import pandas as pd
+import pytest
+
+from virny.custom_classes.subgroup_slice_finder import SubgroupSliceFinder
+
+
+# ========================== Test SubgroupSliceFinder ==========================
+@pytest.mark.parametrize("metric", ['Jitter', 'Label_Stability'])
+def test_subgroup_slice_finder_true1(metric):
+    rng = np.random.default_rng(42)
+    n_samples = 2000
+    features_df = pd.DataFrame({
+        'sex': rng.integers(0, 2, size=n_samples),
+        'race': rng.choice(['A', 'B', 'C'], size=n_samples),
+        'age': rng.integers(18, 80, size=n_samples),
+        'priors': rng.integers(0, 3, size=n_samples),
+    })
+    per_sample_stats_df = pd.DataFrame({
+        'Jitter': rng.uniform(0, 0.2, size=n_samples),
+        'Label_Stability': rng.uniform(0.6, 1, size=n_samples),
+    })
+    # Make one 3-way slice the most unstable
+    worst_mask = (features_df['sex'] == 1) & (features_df['race'] == 'C') & (features_df['priors'] == 2)
+    per_sample_stats_df.loc[worst_mask, 'Jitter'] += 0.3
+    per_sample_stats_df.loc[worst_mask, 'Label_Stability'] -= 0.5
+
+    slice_finder = SubgroupSliceFinder(metric=metric, k=5, min_support=50, max_order=3)
+    slices_df = slice_finder.find_slices(features_df, per_sample_stats_df)
+    assert slices_df.shape[0] == 5
+    assert slices_df['Slice'].iloc[0] == 'sex=1 & race=C & priors=2'
+
+    # Top slices are equal to the exhaustive search over all conjunctions
+    columns_values = {'sex': features_df['sex'], 'race': features_df['race'],
+                      'age': pd.qcut(features_df['age'], q=4).astype(str), 'priors': features_df['priors']}
+    all_slices = []
+    for order in range(1, 4):
+        for cols in itertools.combinations(columns_values.keys(), order):
+            keys_df = pd.DataFrame({col: columns_values[col] for col in cols})
+            slices_stats_df = per_sample_stats_df[metric].groupby([keys_df[col] for col in cols]).agg(['mean', 'size'])
+            all_slices.extend(slices_stats_df.loc[slices_stats_df['size'] >= 50, 'mean'].tolist())
+    expected_values = sorted(all_slices, reverse=(metric == 'Jitter'))[:5]
+    assert np.allclose(slices_df['Value'].values, expected_values)
+    assert np.allclose(slices_df['Disparity'].values, slices_df['Value'].values - per_sample_stats_df[metric].mean())
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from virny.custom_classes.subgroup_threshold_sweep import SubgroupThresholdSweep
+from virny.utils.protected_groups_partitioning import create_test_protected_groups
+
+
+def create_test_set():
+    # Mean predictions are probabilities of the zero value label, so a sample gets the label 1 if it is below a threshold
+    init_features_df = pd.DataFrame({'sex': [0, 1, 0, 1]}, index=range(10, 14))
+    y_test = pd.Series([1, 1, 0, 0], index=init_features_df.index)
+    mean_predictions = np.array([0.1, 0.3, 0.6, 0.8])
+    test_protected_groups = create_test_protected_groups(init_features_df, init_features_df, {'sex': 1})
+    return y_test, mean_predictions, test_protected_groups
+
+
+# ========================== Test SubgroupThresholdSweep ==========================
+def test_compute_metrics_true1():
+    y_test, mean_predictions, test_protected_groups = create_test_set()
+    metrics_df, _ = SubgroupThresholdSweep(thresholds=[0.0, 0.3, 0.5, 1.0]) \
+        .compute_metrics(y_test, mean_predictions, test_protected_groups, {'sex': 1})
+    metrics_df = metrics_df.set_index(['Threshold', 'Group', 'Metric'])['Value']
+
+    # No samples, the first sample, the first two samples, and all samples are predicted as the label 1
+    assert [metrics_df[(threshold, 'overall', 'TPR')] for threshold in (0.0, 0.3, 0.5, 1.0)] == [0.0, 0.5, 1.0, 1.0]
+    assert [metrics_df[(threshold, 'overall', 'FPR')] for threshold in (0.0, 0.3, 0.5, 1.0)] == [0.0, 0.0, 0.0, 1.0]
+    assert [metrics_df[(threshold, 'overall', 'Accuracy')] for threshold in (0.0, 0.3, 0.5, 1.0)] == \
+           [0.5, 0.75, 1.0, 0.5]
+
+    # At the threshold of 0.3, the priv subgroup (sex == 0) has a TP and a TN, and the dis subgroup has a FN and a TN
+    assert metrics_df[(0.3, 'sex_priv', 'Accuracy')] == 1.0
+    assert metrics_df[(0.3, 'sex_dis', 'Accuracy')] == 0.5
+    assert metrics_df[(0.3, 'sex', 'Accuracy_Parity')] == -0.5
+    assert metrics_df[(0.3, 'sex', 'Equalized_Odds_TPR')] == -1.0
+
+
+def test_compute_metrics_true2():
+    y_test, mean_predictions, test_protected_groups = create_test_set()
+    metrics_df, calibration_df = SubgroupThresholdSweep(n_calibration_bins=2) \
+        .compute_metrics(y_test, mean_predictions, test_protected_groups)
+
+    # By default, every distinct mean prediction and 1.0 are thresholds
+    assert sorted(metrics_df['Threshold'].unique().tolist()) == [0.1, 0.3, 0.6, 0.8, 1.0]
+    assert 'sex' not in metrics_df['Group'].unique()
+
+    # Probabilities of the label 1 are 0.9, 0.7, 0.4, 0.2, so each bin has two samples of the same label
+    overall_calibration_df = calibration_df[calibration_df['Group'] == 'overall']
+    assert overall_calibration_df['Sample_Size'].tolist() == [2, 2]
+    assert np.allclose(overall_calibration_df['Mean_Predicted_Proba'], [0.3, 0.8])
+    assert overall_calibration_df['Observed_Positive_Rate'].tolist() == [0.0, 1.0]
@@ -0,0 +1,52 @@
+import pytest
+
+from virny.custom_classes.task_graph import TaskGraph
+
+
+def add(*values):
+    return sum(values)
+
+
+def fail():
+    raise ValueError('Task error')
+
+
+# ========================== Test TaskGraph ==========================
+@pytest.mark.parametrize("n_jobs", [1, 4])
+def test_task_graph_true1(n_jobs):
+    task_graph = TaskGraph()
+    for idx in range(10):
+        task_graph.add_task(('source', idx), add, args=(idx,))
+        task_graph.add_task(('square', idx), lambda value: value ** 2, dependencies=(('source', idx),))
+    task_graph.add_task('sum', add, dependencies=[('square', idx) for idx in range(10)], args=(1,))
+
+    # Only results of tasks without dependents are returned
+    assert task_graph.run(n_jobs=n_jobs) == {'sum': sum(idx ** 2 for idx in range(10)) + 1}
+
+    timings_df = task_graph.get_timings_df().set_index('Task')
+    assert timings_df.shape[0] == 21
+    assert (timings_df['Status'] == 'Done').all()
+    for idx in range(10):
+        assert timings_df.loc[[('square', idx)], 'Start_Time'].iloc[0] >= \
+               timings_df.loc[[('source', idx)], 'End_Time'].iloc[0]
+        assert timings_df.loc['sum', 'Start_Time'] >= timings_df.loc[[('square', idx)], 'End_Time'].iloc[0]
+
+
+def test_task_graph_true2():
+    task_graph = TaskGraph()
+    task_graph.add_task('ok', add, args=(1, 2))
+    task_graph.add_task('failed', fail)
+    task_graph.add_task('skipped', add, dependencies=('ok', 'failed'))
+    task_graph.add_task('tolerant', lambda ok, skipped: (ok, skipped), dependencies=('ok', 'skipped'),
+                        allow_failed_dependencies=True)
+
+    assert task_graph.run(n_jobs=2) == {'tolerant': (3, None)}
+    assert list(task_graph.errors.keys()) == ['failed']
+    statuses = task_graph.get_timings_df().set_index('Task')['Status'].to_dict()
+    assert statuses == {'ok': 'Done', 'failed': 'Failed', 'skipped': 'Skipped', 'tolerant': 'Done'}
+
+
+def test_task_graph_false1():
+    task_graph = TaskGraph()
+    with pytest.raises(ValueError):
+        task_graph.add_task('square', lambda value: value ** 2, dependencies=('source',))
@@ -0,0 +1,45 @@
+import pytest
+import numpy as np
+
+from sklearn.linear_model import LogisticRegression
+
+from tests import config_params, compas_without_sensitive_attrs_dataset_class, compas_base_flow_dataset, \
+    get_numerical_metrics
+from virny.custom_classes.base_dataset import BaseFlowDataset
+from virny.user_interfaces.metrics_computation_interfaces import compute_model_metrics
+from virny.user_interfaces.appended_rows_interfaces import append_test_rows_to_model_metrics
+
+
+# ========================== Test append_test_rows_to_model_metrics ==========================
+@pytest.mark.parametrize("computation_mode", [None, 'error_analysis'])
+def test_append_test_rows_to_model_metrics_true1(compas_base_flow_dataset, config_params, computation_mode):
+    dataset = compas_base_flow_dataset
+    n_estimators = 5
+    np.random.seed(42)
+    expected_metrics_df = compute_model_metrics(LogisticRegression(), n_estimators, dataset, config_params.bootstrap_fraction,
+                                                config_params.sensitive_attributes_dct, config_params.dataset_name,
+                                                'LogisticRegression', computation_mode=computation_mode,
+                                                save_results=False)
+
+    # Compute metrics for the first half of the test set and append the second half
+    n_first_rows = dataset.X_test.shape[0] // 2
+    first_half_dataset = BaseFlowDataset(dataset.init_features_df, dataset.X_train_val, dataset.X_test.iloc[:n_first_rows],
+                                         dataset.y_train_val, dataset.y_test.iloc[:n_first_rows], dataset.target,
+                                         dataset.numerical_columns, dataset.categorical_columns)
+    np.random.seed(42)
+    _, subgroup_variance_analyzer, error_analyzer = \
+        compute_model_metrics(LogisticRegression(), n_estimators, first_half_dataset, config_params.bootstrap_fraction,
+                              config_params.sensitive_attributes_dct, config_params.dataset_name,
+                              'LogisticRegression', computation_mode=computation_mode, save_results=False,
+                              return_analyzers=True)
+    actual_metrics_df = append_test_rows_to_model_metrics(LogisticRegression(), 'LogisticRegression',
+                                                          subgroup_variance_analyzer, error_analyzer,
+                                                          dataset.X_test.iloc[n_first_rows:],
+                                                          dataset.y_test.iloc[n_first_rows:],
+                                                          dataset.init_features_df,
+                                                          config_params.sensitive_attributes_dct)
+
+    assert actual_metrics_df['Metric'].tolist() == expected_metrics_df['Metric'].tolist()
+    assert sorted(actual_metrics_df.columns.tolist()) == sorted(expected_metrics_df.columns.tolist())
+    assert np.allclose(get_numerical_metrics(actual_metrics_df[expected_metrics_df.columns]),
+                       get_numerical_metrics(expected_metrics_df), atol=1e-9, equal_nan=True)
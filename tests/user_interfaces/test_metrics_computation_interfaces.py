@@ -0,0 +1,229 @@
+import os
+import copy
+import pytest
+import numpy as np
+import pandas as pd
+
+from sklearn.linear_model import LogisticRegression
+from sklearn.tree import DecisionTreeClassifier
+
+from tests import config_params, compas_without_sensitive_attrs_dataset_class, compas_base_flow_dataset, \
+    get_numerical_metrics, create_column_transformer
+from virny.configs.constants import ModelSetting
+from virny.user_interfaces.metrics_computation_interfaces import compute_model_metrics, run_metrics_computation, \
+    iter_metrics_computation, compute_metrics_multiple_runs, run_metrics_computation_with_multiple_test_sets, \
+    _spawn_models_seeds
+from virny.custom_classes.metrics_composer import MetricsComposer
+from virny.custom_classes.experiment_cache import ExperimentCache
+
+
+# ========================== Test compute_model_metrics in the streaming mode ==========================
+def test_compute_model_metrics_streaming_true1(compas_base_flow_dataset, config_params):
+    dataset = compas_base_flow_dataset
+    np.random.seed(42)
+    expected_metrics_df = compute_model_metrics(LogisticRegression(), 5, dataset, config_params.bootstrap_fraction,
+                                                config_params.sensitive_attributes_dct, config_params.dataset_name,
+                                                'LogisticRegression', save_results=False)
+    np.random.seed(42)
+    actual_metrics_df, subgroup_variance_analyzer, _ = \
+        compute_model_metrics(LogisticRegression(), 5, dataset, config_params.bootstrap_fraction,
+                              config_params.sensitive_attributes_dct, config_params.dataset_name,
+                              'LogisticRegression', computation_mode='streaming', save_results=False,
+                              return_analyzers=True)
+
+    assert subgroup_variance_analyzer.models_predictions is None
+    assert actual_metrics_df['Metric'].tolist() == expected_metrics_df['Metric'].tolist()
+    is_iqr = (expected_metrics_df['Metric'] == 'IQR').values
+    actual_metrics, expected_metrics = get_numerical_metrics(actual_metrics_df), get_numerical_metrics(expected_metrics_df)
+    assert np.allclose(actual_metrics[~is_iqr], expected_metrics[~is_iqr], atol=1e-9, equal_nan=True)
+    assert np.allclose(actual_metrics[is_iqr], expected_metrics[is_iqr], atol=0.01)
+
+
+# ========================== Test compute_model_metrics with approximation_relative_error ==========================
+def test_compute_model_metrics_with_approximation_true1(compas_base_flow_dataset, config_params):
+    dataset = compas_base_flow_dataset
+    relative_error = 0.2
+    np.random.seed(42)
+    exact_metrics_df = compute_model_metrics(LogisticRegression(), 5, dataset, config_params.bootstrap_fraction,
+                                             config_params.sensitive_attributes_dct, config_params.dataset_name,
+                                             'LogisticRegression', save_results=False)
+    np.random.seed(42)
+    approximate_metrics_df = compute_model_metrics(LogisticRegression(), 5, dataset, config_params.bootstrap_fraction,
+                                                   config_params.sensitive_attributes_dct, config_params.dataset_name,
+                                                   'LogisticRegression', save_results=False,
+                                                   approximation_relative_error=relative_error, approximation_seed=42)
+
+    approximate_metrics_df = approximate_metrics_df.set_index('Metric')
+    exact_metrics_df = exact_metrics_df.set_index('Metric').loc[approximate_metrics_df.index]
+    group_names = [col for col in exact_metrics_df.columns if col not in ('Model_Name', 'Model_Params')]
+    for group_name in group_names:
+        approximate_values = approximate_metrics_df[group_name].astype(float)
+        std_errors = approximate_metrics_df[f'{group_name}_Std_Error'].astype(float)
+        # Bootstrap estimators are the same as in the exact mode, so only the subsampling error remains
+        errors = (approximate_values - exact_metrics_df[group_name].astype(float)).abs()
+        assert (errors[std_errors > 0] <= 4 * std_errors[std_errors > 0]).all()
+        assert (errors[std_errors == 0] < 1e-9).all()
+        # Nonzero metrics of all groups meet the target relative error with 95% confidence
+        is_nonzero = approximate_values != 0
+        assert (1.96 * std_errors[is_nonzero] / approximate_values[is_nonzero].abs() <= relative_error * 1.001).all()
+
+
+# ========================== Test compute_model_metrics with per_sample_stats_file_path ==========================
+@pytest.mark.parametrize("file_name", ['per_sample_stats.parquet', 'per_sample_stats.feather'])
+def test_compute_model_metrics_with_per_sample_stats_file_true1(compas_base_flow_dataset, config_params,
+                                                                 tmp_path, file_name):
+    dataset = compas_base_flow_dataset
+    np.random.seed(42)
+    file_path = str(tmp_path / file_name)
+    metrics_df, subgroup_variance_analyzer, _ = \
+        compute_model_metrics(LogisticRegression(), 5, dataset, config_params.bootstrap_fraction,
+                              config_params.sensitive_attributes_dct, config_params.dataset_name,
+                              'LogisticRegression', save_results=False, return_analyzers=True,
+                              per_sample_stats_file_path=file_path)
+
+    per_sample_stats_df = pd.read_parquet(file_path) if file_name.endswith('.parquet') else pd.read_feather(file_path)
+    assert per_sample_stats_df.shape[0] == dataset.X_test.shape[0]
+    assert np.array_equal(per_sample_stats_df['Test_Index'].values, dataset.X_test.index.values)
+    assert per_sample_stats_df['Std'].dtype == np.float32
+    assert np.allclose(per_sample_stats_df['Std'].values, subgroup_variance_analyzer.per_sample_stats_df['Std'].values)
+
+    # Subgroup metrics can be restored from the file with sensitive attribute codes
+    metrics_df = metrics_df.set_index('Metric')
+    for attr in config_params.sensitive_attributes_dct.keys():
+        dis_mean = per_sample_stats_df.loc[per_sample_stats_df[attr] == 1, 'Label_Stability'].mean()
+        assert np.isclose(dis_mean, metrics_df.loc['Label_Stability', f'{attr}_dis'], atol=1e-6)
+
+
+# ========================== Test run_metrics_computation with n_jobs ==========================
+def test_run_metrics_computation_parallel_true1(compas_base_flow_dataset, config_params):
+    dataset = compas_base_flow_dataset
+    models_config = {
+        'DecisionTreeClassifier': DecisionTreeClassifier(max_depth=5),
+        'BrokenModel': LogisticRegression(penalty='unknown'),
+        'LogisticRegression': LogisticRegression(),
+    }
+    models_metrics_dct = run_metrics_computation(dataset, config_params.bootstrap_fraction, config_params.dataset_name,
+                                                 models_config, 5, config_params.sensitive_attributes_dct,
+                                                 save_results=False, n_jobs=2)
+
+    # A failed model is skipped, and other models are returned in the config order
+    assert list(models_metrics_dct.keys()) == ['DecisionTreeClassifier', 'LogisticRegression']
+    np.random.seed(42)
+    expected_metrics_df = compute_model_metrics(LogisticRegression(), 5, dataset, config_params.bootstrap_fraction,
+                                                config_params.sensitive_attributes_dct, config_params.dataset_name,
+                                                'LogisticRegression', save_results=False)
+    actual_metrics_df = models_metrics_dct['LogisticRegression']
+    assert actual_metrics_df['Metric'].tolist() == expected_metrics_df['Metric'].tolist()
+    assert actual_metrics_df.columns.tolist() == expected_metrics_df.columns.tolist()
+
+    # Results are streamed as models finish
+    streamed_model_names = [model_name for model_name, _ in iter_metrics_computation(
+        dataset, config_params.bootstrap_fraction, config_params.dataset_name, models_config, 5,
+        config_params.sensitive_attributes_dct, save_results=False, n_jobs=2)]
+    assert sorted(streamed_model_names) == ['DecisionTreeClassifier', 'LogisticRegression']
+
+    # Each model gets its own seed, so metrics do not depend on n_jobs, including the sequential path
+    metrics_dcts = []
+    for n_jobs in (None, 2):
+        np.random.seed(42)
+        metrics_dcts.append(run_metrics_computation(dataset, config_params.bootstrap_fraction,
+                                                    config_params.dataset_name, models_config, 5,
+                                                    config_params.sensitive_attributes_dct,
+                                                    save_results=False, n_jobs=n_jobs))
+    first_metrics_dct, second_metrics_dct = metrics_dcts
+    for model_name in ['DecisionTreeClassifier', 'LogisticRegression']:
+        assert np.allclose(get_numerical_metrics(first_metrics_dct[model_name]),
+                           get_numerical_metrics(second_metrics_dct[model_name]), equal_nan=True)
+
+    extra_test_sets_lst = [(dataset.X_test.iloc[:100], dataset.y_test.iloc[:100])]
+    metrics_dcts = []
+    for n_jobs in (None, 2):
+        np.random.seed(42)
+        metrics_dcts.append(run_metrics_computation_with_multiple_test_sets(
+            dataset, config_params.bootstrap_fraction, config_params.dataset_name, extra_test_sets_lst,
+            {'DecisionTreeClassifier': DecisionTreeClassifier(max_depth=5)}, 5,
+            config_params.sensitive_attributes_dct, n_jobs=n_jobs))
+    for first_metrics_df, second_metrics_df in zip(metrics_dcts[0]['DecisionTreeClassifier'],
+                                                   metrics_dcts[1]['DecisionTreeClassifier']):
+        assert np.allclose(get_numerical_metrics(first_metrics_df), get_numerical_metrics(second_metrics_df),
+                           equal_nan=True)
+
+
+# ========================== Test compute_metrics_multiple_runs ==========================
+def test_compute_metrics_multiple_runs_true1(compas_without_sensitive_attrs_dataset_class, config_params):
+    data_loader = compas_without_sensitive_attrs_dataset_class
+    column_transformer = create_column_transformer(data_loader)
+    config = config_params.copy()
+    config.n_estimators = 5
+    config.runs_seed_lst = [100, 200]
+    models_config = {
+        'DecisionTreeClassifier': DecisionTreeClassifier(max_depth=5),
+        'LogisticRegression': LogisticRegression(),
+    }
+    sequential_metrics_dct = compute_metrics_multiple_runs(data_loader, column_transformer, config, models_config)
+    parallel_metrics_dct = compute_metrics_multiple_runs(data_loader, column_transformer, config, models_config,
+                                                         n_jobs=2)
+
+    assert list(sequential_metrics_dct.keys()) == list(models_config.keys())
+    for model_name in models_config.keys():
+        sequential_metrics_df = sequential_metrics_dct[model_name]
+        assert sequential_metrics_df['Run_Number'].unique().tolist() == [1, 2]
+        assert sequential_metrics_df['Model_Seed'].unique().tolist() == [100, 200]
+        # Runs are reproducible with their seeds in worker processes
+        assert sequential_metrics_df.columns.tolist() == parallel_metrics_dct[model_name].columns.tolist()
+        assert np.allclose(get_numerical_metrics(sequential_metrics_df), get_numerical_metrics(parallel_metrics_dct[model_name]),
+                           equal_nan=True)
+
+    composed_metrics_df = MetricsComposer(sequential_metrics_dct, config.sensitive_attributes_dct).compose_metrics()
+    assert composed_metrics_df['Model_Name'].unique().tolist() == list(models_config.keys())
+
+
+# ========================== Test run_metrics_computation with ExperimentCache ==========================
+def test_run_metrics_computation_with_experiment_cache_true1(compas_base_flow_dataset, config_params, tmp_path):
+    dataset = compas_base_flow_dataset
+    experiment_cache = ExperimentCache(str(tmp_path / 'cache'))
+    models_config = {
+        'DecisionTreeClassifier': DecisionTreeClassifier(max_depth=5),
+        'LogisticRegression': LogisticRegression(),
+    }
+    first_metrics_dct = run_metrics_computation(dataset, config_params.bootstrap_fraction, config_params.dataset_name,
+                                                models_config, 5, config_params.sensitive_attributes_dct,
+                                                save_results=False, experiment_cache=experiment_cache, seed=42)
+    assert len(os.listdir(experiment_cache.cache_dir)) == 2
+
+    # Only the model with changed hyperparameters is recomputed
+    models_config['DecisionTreeClassifier'] = DecisionTreeClassifier(max_depth=3)
+    second_metrics_dct = run_metrics_computation(dataset, config_params.bootstrap_fraction, config_params.dataset_name,
+                                                 models_config, 5, config_params.sensitive_attributes_dct,
+                                                 save_results=False, experiment_cache=experiment_cache, seed=42)
+    assert len(os.listdir(experiment_cache.cache_dir)) == 3
+    assert np.allclose(get_numerical_metrics(second_metrics_dct['LogisticRegression']),
+                       get_numerical_metrics(first_metrics_dct['LogisticRegression']), equal_nan=True)
+    assert second_metrics_dct['LogisticRegression']['Model_Params'].equals(first_metrics_dct['LogisticRegression']['Model_Params'])
+    assert second_metrics_dct['LogisticRegression'].dtypes.equals(first_metrics_dct['LogisticRegression'].dtypes)
+
+    bootstrap_seed = _spawn_models_seeds(42, len(models_config))[1]
+    key = experiment_cache.create_key(dataset, LogisticRegression(), 5, config_params.bootstrap_fraction,
+                                      config_params.sensitive_attributes_dct, ModelSetting.BATCH.value,
+                                      bootstrap_seed=bootstrap_seed)
+    models_predictions, y_test, _ = experiment_cache.get_predictions(key)
+    assert models_predictions.shape == (5, dataset.X_test.shape[0])
+    assert np.array_equal(y_test.index.values, dataset.y_test.index.values)
+
+    # A change of sensitive attributes of test rows changes the key
+    changed_dataset = copy.copy(dataset)
+    changed_dataset.init_features_df = dataset.init_features_df.copy()
+    sensitive_attr = list(config_params.sensitive_attributes_dct.keys())[0]
+    test_row_idx = dataset.X_test.index[0]
+    other_values = [value for value in dataset.init_features_df[sensitive_attr].unique()
+                    if value != dataset.init_features_df.loc[test_row_idx, sensitive_attr]]
+    changed_dataset.init_features_df.loc[test_row_idx, sensitive_attr] = other_values[0]
+    changed_key = experiment_cache.create_key(changed_dataset, LogisticRegression(), 5, config_params.bootstrap_fraction,
+                                              config_params.sensitive_attributes_dct, ModelSetting.BATCH.value,
+                                              bootstrap_seed=bootstrap_seed)
+    assert changed_key != key
+
+    # The least recently used cells are evicted above the size limit
+    experiment_cache.max_size_bytes = 1
+    experiment_cache.evict()
+    assert len(os.listdir(experiment_cache.cache_dir)) == 0
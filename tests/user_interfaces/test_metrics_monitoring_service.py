@@ -0,0 +1,89 @@
+import json
+import asyncio
+import numpy as np
+import pandas as pd
+
+from tests import config_params, compas_dataset_class
+from virny.configs.constants import VARIANCE_METRICS, ERROR_METRICS
+from virny.analyzers.subgroup_error_analyzer import SubgroupErrorAnalyzer
+from virny.analyzers.subgroup_variance_calculator import SubgroupVarianceCalculator
+from virny.utils.protected_groups_partitioning import create_test_protected_groups
+from virny.utils.stability_utils import combine_bootstrap_predictions
+from virny.user_interfaces.metrics_monitoring_service import MetricsMonitoringService
+
+
+async def send_request(port, method, path, body=None):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    payload = json.dumps(body).encode('utf-8') if body is not None else b''
+    writer.write(f'{method} {path} HTTP/1.1\r\nContent-Length: {len(payload)}\r\nConnection: close\r\n\r\n'.encode() + payload)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    status = int(response.split(b' ', 2)[1])
+    return status, json.loads(response.split(b'\r\n\r\n', 1)[1])
+
+
+async def replay_dataset(sensitive_attributes_dct, sensitive_attrs_df, models_probabilities, y_true,
+                         window_size, batch_size):
+    service = MetricsMonitoringService(sensitive_attributes_dct, window_size=window_size, port=0)
+    await service.start()
+    try:
+        sample_ids = [int(idx) for idx in sensitive_attrs_df.index]
+        for start in range(0, len(sample_ids), batch_size):
+            end = start + batch_size
+            status, _ = await send_request(service.port, 'POST', '/predictions', {
+                'sample_ids': sample_ids[start:end],
+                'features': sensitive_attrs_df.iloc[start:end].to_dict(orient='list'),
+                'probabilities': models_probabilities[start:end].tolist(),
+            })
+            assert status == 200
+            # Labels are delayed by one batch
+            if start > 0:
+                status, _ = await send_request(service.port, 'POST', '/labels', {
+                    'sample_ids': sample_ids[start - batch_size:start],
+                    'labels': y_true[start - batch_size:start].tolist(),
+                })
+                assert status == 200
+
+        status, _ = await send_request(service.port, 'POST', '/labels', {
+            'sample_ids': sample_ids[-batch_size:], 'labels': y_true[-batch_size:].tolist(),
+        })
+        assert status == 200
+        return await send_request(service.port, 'GET', '/metrics')
+    finally:
+        await service.stop()
+
+
+# ========================== Test MetricsMonitoringService ==========================
+def test_metrics_monitoring_service_replay_true1(compas_dataset_class, config_params):
+    n_samples, n_estimators, window_size = 1000, 10, 600
+    rng = np.random.default_rng(42)
+    sensitive_attrs_df = compas_dataset_class.full_df[['sex', 'race']].iloc[:n_samples]
+    y_true = compas_dataset_class.y_data.iloc[:n_samples].values
+    models_probabilities = rng.beta(2, 2, size=(n_samples, n_estimators))
+
+    status, served_metrics = asyncio.run(replay_dataset(config_params.sensitive_attributes_dct, sensitive_attrs_df,
+                                                        models_probabilities, y_true, window_size, batch_size=150))
+    assert status == 200
+
+    # Compare with offline analyzers for the samples that are in the window
+    window_attrs_df = sensitive_attrs_df.iloc[-window_size:]
+    y_test = pd.Series(y_true[-window_size:], index=window_attrs_df.index)
+    models_predictions = {idx: models_probabilities[-window_size:, idx] for idx in range(n_estimators)}
+    test_protected_groups = create_test_protected_groups(window_attrs_df, window_attrs_df,
+                                                         config_params.sensitive_attributes_dct)
+    variance_calculator = SubgroupVarianceCalculator(window_attrs_df, y_test, config_params.sensitive_attributes_dct,
+                                                     test_protected_groups)
+    expected_variance_metrics = variance_calculator.compute_subgroup_metrics(models_predictions, save_results=False)
+    y_preds = combine_bootstrap_predictions(models_predictions, y_test.index)
+    error_analyzer = SubgroupErrorAnalyzer(window_attrs_df, y_test, config_params.sensitive_attributes_dct,
+                                           test_protected_groups)
+    expected_error_metrics = error_analyzer.compute_subgroup_metrics(y_preds.values, save_results=False)
+
+    assert served_metrics['overall']['Sample_Size'] == window_size
+    for group_name in test_protected_groups.keys():
+        assert served_metrics[group_name]['Sample_Size'] == test_protected_groups[group_name].shape[0]
+        for metric in VARIANCE_METRICS:
+            assert abs(served_metrics[group_name][metric] - expected_variance_metrics[group_name][metric]) < 1e-9
+        for metric in ERROR_METRICS:
+            assert abs(served_metrics[group_name][metric] - expected_error_metrics[group_name][metric]) < 1e-9
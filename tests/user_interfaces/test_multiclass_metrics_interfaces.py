@@ -0,0 +1,32 @@
+import numpy as np
+
+from sklearn.linear_model import LogisticRegression
+
+from tests import config_params, compas_without_sensitive_attrs_dataset_class, compas_base_flow_dataset
+from virny.user_interfaces.metrics_computation_interfaces import compute_model_metrics
+from virny.user_interfaces.multiclass_metrics_interfaces import compute_multiclass_model_metrics
+
+
+# ========================== Test compute_multiclass_model_metrics ==========================
+def test_compute_multiclass_model_metrics_true1(compas_base_flow_dataset, config_params):
+    # For a binary target, the multiclass engine gives the same label-based metrics as the default pipeline
+    dataset = compas_base_flow_dataset
+    np.random.seed(42)
+    expected_metrics_df = compute_model_metrics(LogisticRegression(), 5, dataset, config_params.bootstrap_fraction,
+                                                config_params.sensitive_attributes_dct, config_params.dataset_name,
+                                                'LogisticRegression', save_results=False)
+    np.random.seed(42)
+    actual_metrics_df = compute_multiclass_model_metrics(LogisticRegression(), 5, dataset,
+                                                         config_params.bootstrap_fraction,
+                                                         config_params.sensitive_attributes_dct,
+                                                         config_params.dataset_name, 'LogisticRegression',
+                                                         save_results=False)
+
+    expected_metrics_df = expected_metrics_df.set_index('Metric')
+    actual_metrics_df = actual_metrics_df.set_index('Metric')
+    group_columns = [col for col in expected_metrics_df.columns if col not in ('Model_Name', 'Model_Params')]
+    for metric in ('Jitter', 'Std', 'Label_Stability', 'Per_Sample_Accuracy', 'Statistical_Bias', 'Accuracy'):
+        assert np.allclose(actual_metrics_df.loc[metric, group_columns].values.astype(float),
+                           expected_metrics_df.loc[metric, group_columns].values.astype(float))
+    assert np.allclose(actual_metrics_df.loc['TPR_1', group_columns].values.astype(float),
+                       expected_metrics_df.loc['TPR', group_columns].values.astype(float))
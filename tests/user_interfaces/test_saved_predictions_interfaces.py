@@ -0,0 +1,60 @@
+import pytest
+import numpy as np
+
+from sklearn.linear_model import LogisticRegression
+
+from tests import config_params, compas_without_sensitive_attrs_dataset_class, compas_base_flow_dataset, \
+    get_numerical_metrics
+from virny.custom_classes.quantized_predictions import QuantizedPredictions
+from virny.user_interfaces.metrics_computation_interfaces import compute_model_metrics
+from virny.user_interfaces.saved_predictions_interfaces import compute_model_metrics_from_predictions, \
+    compute_quantization_accuracy_report
+
+
+# ========================== Test compute_quantization_accuracy_report ==========================
+def test_compute_quantization_accuracy_report_true1(compas_base_flow_dataset, config_params):
+    dataset = compas_base_flow_dataset
+    np.random.seed(42)
+    _, subgroup_variance_analyzer, error_analyzer = \
+        compute_model_metrics(LogisticRegression(), 5, dataset, config_params.bootstrap_fraction,
+                              config_params.sensitive_attributes_dct, config_params.dataset_name,
+                              'LogisticRegression', save_results=False, return_analyzers=True,
+                              predictions_dtype='uint16')
+    assert isinstance(subgroup_variance_analyzer.models_predictions, QuantizedPredictions)
+
+    report_df = compute_quantization_accuracy_report(subgroup_variance_analyzer.models_predictions, dataset.y_test,
+                                                     error_analyzer.test_protected_groups,
+                                                     predictions_dtypes=('float16', 'uint8'))
+    assert set(report_df['Subgroup']) == {'overall'} | set(error_analyzer.test_protected_groups.keys())
+    assert report_df.groupby('Predictions_Dtype')['Absolute_Shift'].max()['float16'] < 0.01
+    assert report_df.groupby('Predictions_Dtype')['Absolute_Shift'].max()['uint8'] < 0.05
+
+
+# ========================== Test compute_model_metrics_from_predictions ==========================
+@pytest.mark.parametrize("predictions_dtype", [None, 'uint16'])
+def test_compute_model_metrics_from_predictions_true1(compas_base_flow_dataset, config_params, tmp_path,
+                                                      predictions_dtype):
+    dataset = compas_base_flow_dataset
+    np.random.seed(42)
+    predictions_file_path = str(tmp_path / 'predictions.npz')
+    expected_metrics_df = compute_model_metrics(LogisticRegression(), 5, dataset, config_params.bootstrap_fraction,
+                                                config_params.sensitive_attributes_dct, config_params.dataset_name,
+                                                'LogisticRegression', save_results=False,
+                                                predictions_dtype=predictions_dtype,
+                                                predictions_file_path=predictions_file_path)
+
+    # Re-analysis with the same sensitive attributes reproduces metrics of the run
+    actual_metrics_df = compute_model_metrics_from_predictions(predictions_file_path, dataset.init_features_df,
+                                                               config_params.sensitive_attributes_dct, chunk_size=500)
+    assert actual_metrics_df['Metric'].tolist() == expected_metrics_df['Metric'].tolist()
+    assert actual_metrics_df.columns.tolist() == expected_metrics_df.columns.tolist()
+    assert actual_metrics_df[['Model_Name', 'Model_Params']].equals(expected_metrics_df[['Model_Name', 'Model_Params']])
+    assert np.allclose(get_numerical_metrics(actual_metrics_df), get_numerical_metrics(expected_metrics_df),
+                       atol=1e-9, equal_nan=True)
+
+    # New sensitive attributes do not require refitting models
+    new_metrics_df = compute_model_metrics_from_predictions(predictions_file_path, dataset.init_features_df,
+                                                            {'race': ['African-American', 'Hispanic']})
+    assert new_metrics_df.columns.tolist() == ['Metric', 'overall', 'race_priv', 'race_dis',
+                                               'Model_Name', 'Model_Params']
+    assert np.allclose(new_metrics_df['overall'].values, expected_metrics_df['overall'].values, equal_nan=True)
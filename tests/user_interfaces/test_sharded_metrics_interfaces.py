@@ -0,0 +1,40 @@
+import numpy as np
+
+from sklearn.linear_model import LogisticRegression
+
+from tests import config_params, compas_without_sensitive_attrs_dataset_class, compas_base_flow_dataset, \
+    get_numerical_metrics
+from virny.user_interfaces.metrics_computation_interfaces import compute_model_metrics
+from virny.user_interfaces.sharded_metrics_interfaces import compute_test_shard_metrics_accumulators, \
+    create_model_metrics_df_from_accumulators
+
+
+# ========================== Test compute_test_shard_metrics_accumulators ==========================
+def test_compute_test_shard_metrics_accumulators_true1(compas_base_flow_dataset, config_params):
+    dataset = compas_base_flow_dataset
+    np.random.seed(42)
+    expected_metrics_df, subgroup_variance_analyzer, _ = \
+        compute_model_metrics(LogisticRegression(), 5, dataset, config_params.bootstrap_fraction,
+                              config_params.sensitive_attributes_dct, config_params.dataset_name,
+                              'LogisticRegression', save_results=False, return_analyzers=True)
+
+    # Evaluate test shards independently and merge their accumulators
+    merged_accumulators = None
+    for shard_indexes in np.array_split(np.arange(dataset.X_test.shape[0]), 3):
+        X_test_shard, y_test_shard = dataset.X_test.iloc[shard_indexes], dataset.y_test.iloc[shard_indexes]
+        shard_accumulators = compute_test_shard_metrics_accumulators(
+            subgroup_variance_analyzer.predict_bootstrap_proba(X_test_shard), X_test_shard, y_test_shard,
+            dataset.init_features_df, config_params.sensitive_attributes_dct)
+        if merged_accumulators is None:
+            merged_accumulators = shard_accumulators
+        else:
+            merged_accumulators[0].merge(shard_accumulators[0])
+            merged_accumulators[1].merge(shard_accumulators[1])
+
+    actual_metrics_df = create_model_metrics_df_from_accumulators(*merged_accumulators, LogisticRegression(),
+                                                                  'LogisticRegression')
+
+    assert actual_metrics_df['Metric'].tolist() == expected_metrics_df['Metric'].tolist()
+    assert actual_metrics_df.columns.tolist() == expected_metrics_df.columns.tolist()
+    assert np.allclose(get_numerical_metrics(actual_metrics_df), get_numerical_metrics(expected_metrics_df),
+                       atol=1e-9, equal_nan=True)
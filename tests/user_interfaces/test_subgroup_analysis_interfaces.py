@@ -0,0 +1,95 @@
+import pytest
+import numpy as np
+
+from sklearn.linear_model import LogisticRegression
+
+from tests import config_params, compas_without_sensitive_attrs_dataset_class, compas_base_flow_dataset
+from virny.user_interfaces.metrics_computation_interfaces import compute_model_metrics
+from virny.user_interfaces.subgroup_analysis_interfaces import compute_model_metrics_confidence_intervals, \
+    compute_group_metrics_p_values, compute_model_metrics_threshold_sweep, compute_model_metrics_per_category
+
+
+@pytest.fixture(scope='module')
+def compas_model_analyzers(compas_base_flow_dataset, config_params):
+    # Analyses reuse predictions of one fitted ensemble
+    return compute_model_metrics(LogisticRegression(), 5, compas_base_flow_dataset, config_params.bootstrap_fraction,
+                                 config_params.sensitive_attributes_dct, config_params.dataset_name,
+                                 'LogisticRegression', save_results=False, return_analyzers=True, bootstrap_seed=42)
+
+
+# ========================== Test compute_model_metrics_confidence_intervals ==========================
+def test_compute_model_metrics_confidence_intervals_true1(compas_model_analyzers, config_params):
+    metrics_df, subgroup_variance_analyzer, error_analyzer = compas_model_analyzers
+    intervals_df = compute_model_metrics_confidence_intervals(subgroup_variance_analyzer, error_analyzer,
+                                                              config_params.sensitive_attributes_dct,
+                                                              n_resamples=200, seed=42)
+
+    # Point estimates are equal to metrics computed on the whole test set
+    metrics_df = metrics_df.set_index('Metric')
+    subgroup_intervals_df = intervals_df[intervals_df['Group'].isin(metrics_df.columns)]
+    for _, row in subgroup_intervals_df.iterrows():
+        assert abs(row['Estimate'] - metrics_df.loc[row['Metric'], row['Group']]) < 1e-9
+
+    composed_intervals_df = intervals_df[intervals_df['Group'].isin(config_params.sensitive_attributes_dct.keys())]
+    assert composed_intervals_df.shape[0] == 11 * len(config_params.sensitive_attributes_dct)
+    assert (intervals_df['CI_Lower'] <= intervals_df['CI_Upper']).all()
+
+
+# ========================== Test compute_group_metrics_p_values ==========================
+def test_compute_group_metrics_p_values_true1(compas_model_analyzers, config_params):
+    _, subgroup_variance_analyzer, error_analyzer = compas_model_analyzers
+    p_values_df = compute_group_metrics_p_values(subgroup_variance_analyzer, error_analyzer,
+                                                 config_params.sensitive_attributes_dct, n_permutations=2000, seed=42)
+    intervals_df = compute_model_metrics_confidence_intervals(subgroup_variance_analyzer, error_analyzer,
+                                                              config_params.sensitive_attributes_dct,
+                                                              n_resamples=10, seed=42)
+
+    # Observed values are equal to composed metrics computed on the whole test set
+    assert p_values_df.shape[0] == 11 * len(config_params.sensitive_attributes_dct)
+    estimates = intervals_df.set_index(['Group', 'Metric'])['Estimate']
+    for _, row in p_values_df.iterrows():
+        estimate = estimates[(row['Group'], row['Metric'])]
+        assert (np.isnan(row['Value']) and np.isnan(estimate)) or abs(row['Value'] - estimate) < 1e-9
+
+    finite_p_values = p_values_df['P_Value'].dropna()
+    assert ((finite_p_values > 0) & (finite_p_values <= 1)).all()
+
+
+# ========================== Test compute_model_metrics_threshold_sweep ==========================
+def test_compute_model_metrics_threshold_sweep_true1(compas_model_analyzers, config_params):
+    metrics_df, subgroup_variance_analyzer, error_analyzer = compas_model_analyzers
+    sweep_df, calibration_df = compute_model_metrics_threshold_sweep(subgroup_variance_analyzer, error_analyzer,
+                                                                     config_params.sensitive_attributes_dct,
+                                                                     thresholds=[0.3, 0.5, 0.7])
+
+    # Metrics for the 0.5 threshold are equal to metrics of the default pipeline
+    metrics_df = metrics_df.set_index('Metric')
+    default_sweep_df = sweep_df[(sweep_df['Threshold'] == 0.5) & sweep_df['Group'].isin(metrics_df.columns)]
+    assert default_sweep_df.shape[0] > 0
+    for _, row in default_sweep_df.iterrows():
+        expected_value = metrics_df.loc[row['Metric'], row['Group']]
+        assert (np.isnan(row['Value']) and np.isnan(expected_value)) or abs(row['Value'] - expected_value) < 1e-9
+
+    overall_calibration_df = calibration_df[calibration_df['Group'] == 'overall']
+    assert overall_calibration_df['Sample_Size'].sum() == error_analyzer.y_test.shape[0]
+
+
+# ========================== Test compute_model_metrics_per_category ==========================
+def test_compute_model_metrics_per_category_true1(compas_model_analyzers, compas_base_flow_dataset):
+    metrics_df, subgroup_variance_analyzer, error_analyzer = compas_model_analyzers
+    dataset = compas_base_flow_dataset
+    per_category_metrics_df = compute_model_metrics_per_category(subgroup_variance_analyzer, error_analyzer,
+                                                                 dataset.init_features_df, ['race', 'sex'],
+                                                                 min_support=100)
+
+    race_counts = dataset.init_features_df.loc[dataset.X_test.index, 'race'].value_counts()
+    race_metrics_df = per_category_metrics_df[per_category_metrics_df['Attribute'] == 'race'].set_index('Category')
+    assert race_metrics_df['Sample_Size'].to_dict() == race_counts.to_dict()
+    assert race_metrics_df['Low_Support'].to_dict() == (race_counts < 100).to_dict()
+
+    # Metrics of a category are equal to metrics of a dis group with this value
+    metrics_df = metrics_df.set_index('Metric')
+    sex_metrics_df = per_category_metrics_df[per_category_metrics_df['Attribute'] == 'sex'].set_index('Category')
+    for metric in ('Jitter', 'Std', 'Label_Stability', 'TPR', 'FPR', 'Accuracy', 'Selection-Rate'):
+        assert np.isclose(race_metrics_df.loc['African-American', metric], metrics_df.loc[metric, 'race_dis'])
+        assert np.isclose(sex_metrics_df.loc[1, metric], metrics_df.loc[metric, 'sex_dis'])
@@ -0,0 +1,77 @@
+import copy
+import numpy as np
+
+from sklearn.linear_model import LogisticRegression
+from sklearn.tree import DecisionTreeClassifier
+
+from tests import config_params, compas_without_sensitive_attrs_dataset_class, compas_base_flow_dataset, \
+    get_numerical_metrics, create_column_transformer
+from virny.preprocessing.basic_preprocessing import preprocess_dataset
+from virny.user_interfaces.metrics_computation_interfaces import compute_model_metrics, compute_metrics_multiple_runs
+from virny.user_interfaces.task_graph_interfaces import compute_metrics_with_task_graph
+
+
+# ========================== Test compute_metrics_with_task_graph ==========================
+def test_compute_metrics_with_task_graph_true1(compas_base_flow_dataset, config_params):
+    dataset = compas_base_flow_dataset
+    config = config_params.copy()
+    config.n_estimators = 5
+    models_config = {
+        'DecisionTreeClassifier': DecisionTreeClassifier(max_depth=5),
+        'LogisticRegression': LogisticRegression(),
+    }
+    datasets_dct = {100: dataset, 200: dataset}
+    extra_test_sets_lst = [(dataset.X_test.iloc[:200], dataset.y_test.iloc[:200])]
+    sequential_metrics_dct, sequential_composed_metrics_df = \
+        compute_metrics_with_task_graph(datasets_dct, config, models_config, extra_test_sets_lst, n_jobs=1)
+    parallel_metrics_dct, parallel_composed_metrics_df, timings_df = \
+        compute_metrics_with_task_graph(datasets_dct, config, models_config, extra_test_sets_lst, n_jobs=4,
+                                        return_timings=True)
+
+    model_metrics_df = compute_model_metrics(LogisticRegression(), 5, dataset, config.bootstrap_fraction,
+                                             config.sensitive_attributes_dct, config.dataset_name,
+                                             'LogisticRegression', save_results=False)
+    assert list(sequential_metrics_dct.keys()) == list(models_config.keys())
+    for model_name in models_config.keys():
+        sequential_metrics_df = sequential_metrics_dct[model_name]
+        assert sequential_metrics_df.columns.tolist() == \
+               model_metrics_df.columns.tolist() + ['Run_Number', 'Model_Seed', 'Test_Set_Index']
+        run_metrics_df = sequential_metrics_df[(sequential_metrics_df['Run_Number'] == 1) &
+                                               (sequential_metrics_df['Test_Set_Index'] == 0)]
+        assert run_metrics_df['Metric'].tolist() == model_metrics_df['Metric'].tolist()
+        assert run_metrics_df['Model_Seed'].unique().tolist() == [100]
+        assert sequential_metrics_df.groupby(['Run_Number', 'Test_Set_Index']).ngroups == 4
+        # Results do not depend on the number of workers
+        assert np.allclose(get_numerical_metrics(sequential_metrics_df), get_numerical_metrics(parallel_metrics_dct[model_name]),
+                           equal_nan=True)
+
+    assert sequential_composed_metrics_df['Test_Set_Index'].unique().tolist() == [0, 1]
+    assert sequential_composed_metrics_df.equals(parallel_composed_metrics_df)
+    assert (timings_df['Status'] == 'Done').all()
+    assert timings_df['Task'].apply(lambda task: task[0]).value_counts()['fit'] == 2 * 2 * 5
+
+
+def test_compute_metrics_with_task_graph_true2(compas_without_sensitive_attrs_dataset_class, config_params):
+    data_loader = compas_without_sensitive_attrs_dataset_class
+    column_transformer = create_column_transformer(data_loader)
+    config = config_params.copy()
+    config.n_estimators = 5
+    config.runs_seed_lst = [100, 200]
+    models_config = {
+        'DecisionTreeClassifier': DecisionTreeClassifier(max_depth=5),
+        'LogisticRegression': LogisticRegression(),
+    }
+    multiple_runs_metrics_dct = compute_metrics_multiple_runs(data_loader, column_transformer, config, models_config)
+    datasets_dct = {run_seed: preprocess_dataset(data_loader, copy.deepcopy(column_transformer), config.test_set_fraction,
+                                                 dataset_split_seed=run_seed)
+                    for run_seed in config.runs_seed_lst}
+    task_graph_metrics_dct, _ = compute_metrics_with_task_graph(datasets_dct, config, models_config, n_jobs=2)
+
+    # Both drivers draw bootstrap samples with the same seeds derived from run seeds
+    for model_name in models_config.keys():
+        multiple_runs_metrics_df = multiple_runs_metrics_dct[model_name]
+        task_graph_metrics_df = task_graph_metrics_dct[model_name].drop(columns=['Test_Set_Index'])
+        assert task_graph_metrics_df.columns.tolist() == multiple_runs_metrics_df.columns.tolist()
+        assert task_graph_metrics_df['Metric'].tolist() == multiple_runs_metrics_df['Metric'].tolist()
+        assert np.allclose(get_numerical_metrics(task_graph_metrics_df), get_numerical_metrics(multiple_runs_metrics_df),
+                           equal_nan=True)
@@ -0,0 +1,51 @@
+import copy
+import concurrent.futures
+import numpy as np
+
+from sklearn.linear_model import LogisticRegression
+from sklearn.tree import DecisionTreeClassifier
+
+from tests import config_params, compas_without_sensitive_attrs_dataset_class, get_numerical_metrics, \
+    create_column_transformer
+from virny.preprocessing.basic_preprocessing import preprocess_dataset
+from virny.user_interfaces.metrics_computation_interfaces import compute_metrics_multiple_runs
+from virny.user_interfaces.work_queue_interfaces import submit_metrics_computation_tasks, \
+    run_metrics_computation_worker, collect_metrics_computation_results
+
+
+# ========================== Test metrics computation with a file work queue ==========================
+def test_metrics_computation_with_file_work_queue_true1(compas_without_sensitive_attrs_dataset_class, config_params,
+                                                        tmp_path):
+    data_loader = compas_without_sensitive_attrs_dataset_class
+    column_transformer = create_column_transformer(data_loader)
+    config = config_params.copy()
+    config.n_estimators = 5
+    config.runs_seed_lst = [100, 200]
+    models_config = {
+        'DecisionTreeClassifier': DecisionTreeClassifier(max_depth=5),
+        'LogisticRegression': LogisticRegression(),
+    }
+    queue_dir = str(tmp_path / 'queue')
+    datasets_dct = {run_seed: preprocess_dataset(data_loader, copy.deepcopy(column_transformer),
+                                                 config.test_set_fraction, dataset_split_seed=run_seed)
+                    for run_seed in config.runs_seed_lst}
+    task_ids = submit_metrics_computation_tasks(queue_dir, datasets_dct, config, models_config)
+    assert len(task_ids) == 4
+    # Resubmitted tasks are not duplicated
+    assert submit_metrics_computation_tasks(queue_dir, datasets_dct, config, models_config) == []
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=2) as executor:
+        n_completed_tasks = list(executor.map(run_metrics_computation_worker, [queue_dir] * 2))
+    assert sum(n_completed_tasks) == 4
+
+    queue_metrics_dct = collect_metrics_computation_results(queue_dir)
+    sequential_metrics_dct = compute_metrics_multiple_runs(data_loader, column_transformer, config, models_config)
+    assert list(queue_metrics_dct.keys()) == list(models_config.keys())
+    for model_name in models_config.keys():
+        queue_metrics_df = queue_metrics_dct[model_name]
+        assert queue_metrics_df['Test_Set_Index'].unique().tolist() == [0]
+        queue_metrics_df = queue_metrics_df.drop(columns=['Test_Set_Index'])
+        # Results of workers are the same as of a sequential run with the same seeds
+        assert queue_metrics_df.columns.tolist() == sequential_metrics_dct[model_name].columns.tolist()
+        assert np.allclose(get_numerical_metrics(queue_metrics_df), get_numerical_metrics(sequential_metrics_dct[model_name]),
+                           equal_nan=True)
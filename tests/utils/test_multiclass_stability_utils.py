@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+from virny.metrics.stability_metrics import compute_jitter
+from virny.utils.stability_utils import compute_per_sample_stats
+from virny.utils.multiclass_stability_utils import compute_multiclass_per_sample_stats, \
+    compute_multiclass_subgroup_error_metrics
+
+
+# ========================== Test compute_multiclass_per_sample_stats ==========================
+def test_compute_multiclass_per_sample_stats_true1():
+    # Two classes give the same metrics as the binary path, except Mean of the ensemble predicted class
+    rng = np.random.default_rng(42)
+    n_estimators, n_samples = 7, 50
+    zero_class_proba = rng.uniform(0, 1, size=(n_estimators, n_samples))
+    y_test = rng.integers(0, 2, size=n_samples)
+
+    actual_df = compute_multiclass_per_sample_stats(y_test, np.stack([zero_class_proba, 1 - zero_class_proba], axis=2))
+    expected_df = compute_per_sample_stats(y_test, zero_class_proba)
+    for metric in ('Jitter', 'Std', 'IQR', 'Aleatoric_Uncertainty', 'Overall_Uncertainty', 'Statistical_Bias',
+                   'Per_Sample_Accuracy', 'Label_Stability'):
+        assert np.allclose(actual_df[metric].values, expected_df[metric].values)
+    assert np.array_equal(actual_df['Ensemble_Prediction'].values, (expected_df['Mean'].values < 0.5).astype(int))
+
+
+def test_compute_multiclass_per_sample_stats_true2():
+    rng = np.random.default_rng(42)
+    n_estimators, n_samples, n_classes = 6, 20, 4
+    uq_results = rng.dirichlet(np.ones(n_classes), size=(n_estimators, n_samples))
+    y_test = rng.integers(0, n_classes, size=n_samples)
+    predicted_labels = uq_results.argmax(axis=2)
+
+    per_sample_stats_df = compute_multiclass_per_sample_stats(y_test, {idx: uq_results[idx] for idx in range(n_estimators)})
+    expected_jitter = compute_jitter([predicted_labels[model_idx] for model_idx in range(n_estimators)])
+    assert np.allclose(per_sample_stats_df['Jitter'].mean(), expected_jitter)
+    assert np.allclose(per_sample_stats_df['Per_Sample_Accuracy'].values, (predicted_labels == y_test).mean(axis=0))
+    assert (per_sample_stats_df['Aleatoric_Uncertainty'] <= np.log2(n_classes) + 1e-12).all()
+
+
+# ========================== Test compute_multiclass_subgroup_error_metrics ==========================
+def test_compute_multiclass_subgroup_error_metrics_true1():
+    y_test = pd.Series(['a', 'b', 'c', 'a', 'b', 'c'], index=[10, 11, 12, 13, 14, 15])
+    y_preds = np.array(['a', 'b', 'a', 'a', 'c', 'c'])
+    test_protected_groups = {'group_1': y_test.loc[[10, 11, 12]], 'group_2': y_test.loc[[13, 14, 15]]}
+
+    metrics = compute_multiclass_subgroup_error_metrics(y_test, y_preds, test_protected_groups, ['a', 'b', 'c'])
+    assert np.isclose(metrics['overall']['Accuracy'], 4 / 6)
+    assert np.isclose(metrics['overall']['TPR_a'], 1.0)
+    assert np.isclose(metrics['overall']['PPV_a'], 2 / 3)
+    assert np.isclose(metrics['group_1']['Accuracy'], 2 / 3)
+    assert np.isclose(metrics['group_2']['TPR_b'], 0.0)
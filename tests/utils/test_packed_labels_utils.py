@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+
+from virny.metrics.stability_metrics import compute_churn, compute_std_mean_iqr_metrics
+from virny.utils.packed_labels_utils import pack_labels, count_positive_votes, count_correct_votes, \
+    compute_pairwise_disagreement, compute_labels_std_mean_iqr
+
+
+# ========================== Test packed labels kernels ==========================
+def test_packed_labels_kernels_true1():
+    rng = np.random.default_rng(42)
+    n_estimators, n_samples = 13, 101
+    uq_results = rng.uniform(0, 1, size=(n_estimators, n_samples))
+    y_test = rng.integers(0, 2, size=n_samples)
+    uq_labels = (uq_results < 0.5).astype(int)
+
+    packed_labels = pack_labels(uq_results, axis=0)
+    assert packed_labels.shape == (2, n_samples)
+    assert np.array_equal(count_positive_votes(packed_labels), uq_labels.sum(axis=0))
+    assert np.array_equal(count_correct_votes(packed_labels, y_test, n_estimators),
+                          (uq_labels == y_test).sum(axis=0))
+
+    disagreement = compute_pairwise_disagreement(pack_labels(uq_results, axis=1), n_samples)
+    assert np.allclose(disagreement[2, 7], compute_churn(uq_labels[2], uq_labels[7]))
+    assert np.allclose(disagreement, disagreement.T) and np.all(np.diag(disagreement) == 0)
+
+    actual_label_stats = compute_labels_std_mean_iqr(uq_labels.sum(axis=0), n_estimators)
+    expected_label_stats = compute_std_mean_iqr_metrics(pd.DataFrame(uq_labels))
+    for actual, expected in zip(actual_label_stats, expected_label_stats):
+        assert np.allclose(actual, expected)
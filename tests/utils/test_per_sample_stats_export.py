@@ -0,0 +1,47 @@
+import pytest
+import numpy as np
+import pandas as pd
+
+from virny.configs.constants import VARIANCE_METRICS
+from virny.utils.per_sample_stats_export import create_sensitive_attributes_codes, save_per_sample_stats
+
+
+def create_test_set():
+    init_features_df = pd.DataFrame({'age': [20, 30, 60, 70, 80]}, index=range(10, 15))
+    per_sample_stats_df = pd.DataFrame(np.arange(5 * len(VARIANCE_METRICS), dtype=float).reshape(5, -1) / 10,
+                                       columns=VARIANCE_METRICS, index=init_features_df.index)
+    # The last two rows are neither in the priv nor in the dis subgroup
+    test_protected_groups = {'age_priv': init_features_df.loc[[10, 11]], 'age_dis': init_features_df.loc[[12]]}
+    return per_sample_stats_df, test_protected_groups
+
+
+# ========================== Test create_sensitive_attributes_codes ==========================
+def test_create_sensitive_attributes_codes_true1():
+    per_sample_stats_df, test_protected_groups = create_test_set()
+    codes_df = create_sensitive_attributes_codes(per_sample_stats_df.index, test_protected_groups)
+
+    assert codes_df.columns.tolist() == ['age']
+    assert codes_df['age'].dtype == np.int8
+    assert codes_df['age'].tolist() == [0, 0, 1, -1, -1]
+
+
+# ========================== Test save_per_sample_stats ==========================
+@pytest.mark.parametrize("file_name", ['per_sample_stats.parquet', 'per_sample_stats.feather'])
+def test_save_per_sample_stats_true1(tmp_path, file_name):
+    per_sample_stats_df, test_protected_groups = create_test_set()
+    file_path = str(tmp_path / file_name)
+    # Several chunks are written for five rows
+    save_per_sample_stats(per_sample_stats_df, file_path, test_protected_groups, chunk_size=2)
+
+    saved_df = pd.read_parquet(file_path) if file_name.endswith('.parquet') else pd.read_feather(file_path)
+    assert saved_df.columns.tolist() == ['Test_Index'] + VARIANCE_METRICS + ['age']
+    assert saved_df['Test_Index'].tolist() == [10, 11, 12, 13, 14]
+    assert (saved_df[VARIANCE_METRICS].dtypes == np.float32).all()
+    assert np.allclose(saved_df[VARIANCE_METRICS].values, per_sample_stats_df.values)
+    assert saved_df['age'].tolist() == [0, 0, 1, -1, -1]
+
+
+def test_save_per_sample_stats_false1(tmp_path):
+    per_sample_stats_df, _ = create_test_set()
+    with pytest.raises(ValueError):
+        save_per_sample_stats(per_sample_stats_df, str(tmp_path / 'per_sample_stats.csv'), file_format='csv')
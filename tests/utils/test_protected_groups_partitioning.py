@@ -1,6 +1,11 @@
+import numpy as np
+import pandas as pd
 from sklearn.model_selection import train_test_split
 from virny.datasets import ACSEmploymentDataset
-from virny.utils.protected_groups_partitioning import check_sensitive_attrs_in_columns, create_test_protected_groups
+from virny.utils.protected_groups_partitioning import check_sensitive_attrs_in_columns, create_test_protected_groups, \
+    create_groups_membership_matrix, partition_by_group_binary, partition_by_group_intersectional, ProtectedGroups, \
+    create_test_protected_groups_lattice, ProtectedGroupsCache
+from virny.custom_classes.metrics_accumulators import encode_confusion_codes, compute_groups_confusion_counts
 
 from tests import config_params, folk_emp_config_params, compas_dataset_class, compas_without_sensitive_attrs_dataset_class
 
@@ -79,3 +84,122 @@ def test_create_test_protected_groups_true2(compas_without_sensitive_attrs_datas
     assert actual_test_protected_groups['sex_dis'].shape[0] == 845
     assert actual_test_protected_groups['race_priv'].shape[0] == 414
     assert actual_test_protected_groups['race_dis'].shape[0] == 642
+
+
+def test_create_groups_membership_matrix_true1(compas_dataset_class, config_params):
+    X_train, X_test, y_train, y_test = train_test_split(compas_dataset_class.X_data,
+                                                        compas_dataset_class.y_data,
+                                                        test_size=config_params.test_set_fraction,
+                                                        random_state=42)
+    test_protected_groups = create_test_protected_groups(X_test, compas_dataset_class.full_df,
+                                                         config_params.sensitive_attributes_dct)
+    group_names = list(test_protected_groups.keys())
+    groups_membership = create_groups_membership_matrix(y_test.index, test_protected_groups, group_names)
+
+    assert groups_membership.shape == (X_test.shape[0], len(group_names))
+    assert groups_membership.sum(axis=0).tolist()[0] == [test_protected_groups[g].shape[0] for g in group_names]
+
+    y_preds = np.random.default_rng(42).integers(0, 2, size=y_test.shape[0])
+    groups_confusion_counts = compute_groups_confusion_counts(encode_confusion_codes(y_test, y_preds), groups_membership)
+    y_preds = pd.Series(y_preds, index=y_test.index)
+    for group_idx, group_name in enumerate(group_names):
+        group_index = test_protected_groups[group_name].index
+        expected_counts = np.bincount(2 * y_test[group_index] + y_preds[group_index], minlength=4)
+        assert np.array_equal(groups_confusion_counts[group_idx], expected_counts)
+
+
+def test_create_test_protected_groups_positions_true1(compas_dataset_class, config_params):
+    X_train, X_test, y_train, y_test = train_test_split(compas_dataset_class.X_data,
+                                                        compas_dataset_class.y_data,
+                                                        test_size=config_params.test_set_fraction,
+                                                        random_state=42)
+    test_protected_groups = create_test_protected_groups(X_test, compas_dataset_class.full_df,
+                                                         config_params.sensitive_attributes_dct)
+    assert isinstance(test_protected_groups, ProtectedGroups)
+
+    # Positions are aligned with X_test and give the same rows as dataframe partitions
+    sensitive_attrs_df = compas_dataset_class.full_df[['sex', 'race']].loc[X_test.index]
+    expected_sex_priv, expected_sex_dis = partition_by_group_binary(sensitive_attrs_df, 'sex', 1)
+    _, expected_intersection_dis = partition_by_group_intersectional(sensitive_attrs_df, ['sex', 'race'],
+                                                                     [1, 'African-American'])
+    assert test_protected_groups['sex_priv'].index.equals(expected_sex_priv.index)
+    assert test_protected_groups['sex_dis'].index.equals(expected_sex_dis.index)
+    assert test_protected_groups['sex&race_dis'].index.equals(expected_intersection_dis.index)
+    assert np.array_equal(X_test.index[test_protected_groups['race_dis'].positions],
+                          test_protected_groups['race_dis'].index)
+
+    group_names = list(test_protected_groups.keys())
+    masks = np.unpackbits(test_protected_groups.get_packed_masks(), axis=1, count=X_test.shape[0])
+    assert np.array_equal(masks.T, create_groups_membership_matrix(X_test.index, test_protected_groups,
+                                                                   group_names).toarray())
+    codes_df = test_protected_groups.sensitive_attributes_codes
+    race_categories = test_protected_groups.sensitive_attributes_categories['race']
+    assert (np.asarray(race_categories)[codes_df['race'].values] == sensitive_attrs_df['race'].values).all()
+
+    # Appended groups have positions shifted by the size of the first test set part
+    first_groups = create_test_protected_groups(X_test.iloc[:500], compas_dataset_class.full_df,
+                                                config_params.sensitive_attributes_dct)
+    second_groups = create_test_protected_groups(X_test.iloc[500:], compas_dataset_class.full_df,
+                                                 config_params.sensitive_attributes_dct)
+    appended_groups = first_groups.append(second_groups)
+    for group_name in group_names:
+        assert np.array_equal(appended_groups[group_name].positions, test_protected_groups[group_name].positions)
+
+
+def test_create_test_protected_groups_lattice_true1(compas_dataset_class, config_params):
+    X_train, X_test, y_train, y_test = train_test_split(compas_dataset_class.X_data,
+                                                        compas_dataset_class.y_data,
+                                                        test_size=config_params.test_set_fraction,
+                                                        random_state=42)
+    sensitive_attributes_dct = {'sex': 1, 'race': 'African-American', 'age_cat_Less than 25': 1}
+    lattice_groups, lattice_dct = create_test_protected_groups_lattice(X_test, compas_dataset_class.full_df,
+                                                                       sensitive_attributes_dct,
+                                                                       max_intersection_order=3)
+    assert list(lattice_dct.keys()) == ['sex', 'race', 'age_cat_Less than 25', 'sex&race', 'sex&age_cat_Less than 25',
+                                        'race&age_cat_Less than 25', 'sex&race&age_cat_Less than 25']
+
+    # Bitset-based intersections are equal to dataframe-based ones
+    expected_groups = create_test_protected_groups(X_test, compas_dataset_class.full_df, lattice_dct)
+    assert list(lattice_groups.keys()) == list(expected_groups.keys())
+    for group_name in expected_groups.keys():
+        assert np.array_equal(lattice_groups[group_name].positions, expected_groups[group_name].positions)
+
+    # Intersections with small groups are pruned
+    min_group_size = len(lattice_groups['sex&race&age_cat_Less than 25_dis']) + 1
+    pruned_groups, pruned_dct = create_test_protected_groups_lattice(X_test, compas_dataset_class.full_df,
+                                                                     sensitive_attributes_dct,
+                                                                     max_intersection_order=3,
+                                                                     min_group_size=min_group_size)
+    assert 'sex&race&age_cat_Less than 25' not in pruned_dct
+    assert 'sex&race&age_cat_Less than 25_dis' not in pruned_groups
+    assert all(min(len(pruned_groups[attr + '_priv']), len(pruned_groups[attr + '_dis'])) >= min_group_size
+               for attr in pruned_dct.keys() if '&' in attr)
+
+
+def test_protected_groups_cache_true1(compas_dataset_class, config_params):
+    X_train, X_test, y_train, y_test = train_test_split(compas_dataset_class.X_data,
+                                                        compas_dataset_class.y_data,
+                                                        test_size=config_params.test_set_fraction,
+                                                        random_state=42)
+    cache = ProtectedGroupsCache(max_size=2)
+    test_protected_groups = cache.get_test_protected_groups(X_test, compas_dataset_class.full_df,
+                                                            config_params.sensitive_attributes_dct)
+    # A copy of the test set with the same index reuses the cached partition
+    assert cache.get_test_protected_groups(X_test.copy(), compas_dataset_class.full_df,
+                                           config_params.sensitive_attributes_dct) is test_protected_groups
+    assert (cache.n_hits, cache.n_misses) == (1, 1)
+
+    expected_groups = create_test_protected_groups(X_test, compas_dataset_class.full_df,
+                                                   config_params.sensitive_attributes_dct)
+    for group_name in expected_groups.keys():
+        assert np.array_equal(test_protected_groups[group_name].positions, expected_groups[group_name].positions)
+
+    # Other test indexes, sensitive attributes, and datasets get their own partitions
+    assert cache.get_test_protected_groups(X_test.iloc[::-1], compas_dataset_class.full_df,
+                                           config_params.sensitive_attributes_dct) is not test_protected_groups
+    sex_groups = cache.get_test_protected_groups(X_test, compas_dataset_class.full_df, {'sex': 1})
+    assert list(sex_groups.keys()) == ['sex_priv', 'sex_dis']
+    assert cache.get_test_protected_groups(X_test, compas_dataset_class.full_df.copy(),
+                                           config_params.sensitive_attributes_dct) is not test_protected_groups
+    assert (cache.n_hits, cache.n_misses) == (1, 4)
+    assert len(cache._cache) == 2
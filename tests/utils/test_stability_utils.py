@@ -14,7 +14,8 @@ def test_count_prediction_stats_true1():
     y_test = np.array([0, 0, 1, 1, 0, 1, 0, 1, 1, 1])
     uq_results = np.array([[0.6, 0.7, 0.3, 0.4, 0.5, 0.3, 0.7, 0.6, 0.4, 0.4],
                            [0.7, 0.6, 0.4, 0.4, 0.5, 0.3, 0.2, 0.6, 0.4, 0.4]])
-    y_preds, uq_labels, prediction_stats = count_prediction_stats(y_test, uq_results)
+    y_preds, packed_labels, prediction_stats = count_prediction_stats(y_test, uq_results)
+    uq_labels = np.unpackbits(packed_labels, axis=0, count=uq_results.shape[0])
 
     mean = np.mean(prediction_stats.means_lst)
     std = np.mean(prediction_stats.stds_lst)
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+import scipy as sp
+
+from virny.configs.constants import VARIANCE_METRICS
+from virny.utils.stratified_sampling_utils import sample_stratified_test_subset, compute_required_strata_sample_sizes, \
+    estimate_stratified_groups_metrics
+
+
+def create_constant_per_sample_stats_df(n_rows: int) -> pd.DataFrame:
+    # Variance metrics without variability do not require extra rows
+    return pd.DataFrame(np.full((n_rows, len(VARIANCE_METRICS)), 0.5), columns=VARIANCE_METRICS)
+
+
+def create_confusion_codes(n_rows: int, accuracy: float) -> np.ndarray:
+    # All true labels are 1, so rows are TP with the rate of accuracy and FN otherwise
+    n_correct = int(round(n_rows * accuracy))
+    return np.array([3] * n_correct + [2] * (n_rows - n_correct))
+
+
+# ========================== Test sample_stratified_test_subset ==========================
+def test_sample_stratified_test_subset_true1():
+    strata = np.array([0, 0, 0, 0, 1, 1, 1, 2])
+    sampled_positions = sample_stratified_test_subset(strata, np.array([2, 5, 1]), seed=42)
+
+    # Sizes are capped by sizes of strata
+    assert np.array_equal(np.bincount(strata[sampled_positions]), [2, 3, 1])
+    assert np.array_equal(sampled_positions, np.sort(sampled_positions))
+
+    # Already sampled rows are kept when the subsample is extended
+    extended_positions = sample_stratified_test_subset(strata, np.array([3, 3, 1]), sampled_positions, seed=42)
+    assert set(sampled_positions) <= set(extended_positions)
+    assert np.array_equal(np.bincount(strata[extended_positions]), [3, 3, 1])
+
+
+# ========================== Test compute_required_strata_sample_sizes ==========================
+def test_compute_required_strata_sample_sizes_true1():
+    n_pilot_rows, stratum_size, relative_error = 1000, 10_000, 0.1
+    strata = np.zeros(n_pilot_rows, dtype=int)
+    groups_membership = np.ones((n_pilot_rows, 1))
+
+    required_sample_sizes = compute_required_strata_sample_sizes(create_constant_per_sample_stats_df(n_pilot_rows),
+                                                                 create_confusion_codes(n_pilot_rows, 0.5),
+                                                                 groups_membership, strata, np.array([stratum_size]),
+                                                                 relative_error)
+    # For accuracy of 0.5, n0 = (z * S / (relative_error * 0.5)) ** 2 with a finite population correction
+    z_score = sp.stats.norm.ppf(0.975)
+    n0 = (z_score * np.sqrt(0.25 * n_pilot_rows / (n_pilot_rows - 1)) / (relative_error * 0.5)) ** 2
+    assert required_sample_sizes[0] == int(np.ceil(n0 / (1 + n0 / stratum_size)))
+
+
+def test_compute_required_strata_sample_sizes_true2():
+    n_pilot_rows, relative_error = 1000, 0.1
+    strata = np.zeros(n_pilot_rows, dtype=int)
+    groups_membership = np.ones((n_pilot_rows, 1))
+
+    required_sample_sizes_lst = [
+        compute_required_strata_sample_sizes(create_constant_per_sample_stats_df(n_pilot_rows),
+                                             create_confusion_codes(n_pilot_rows, accuracy),
+                                             groups_membership, strata, np.array([100_000]), relative_error)[0]
+        for accuracy in (0.5, 0.1)
+    ]
+    # A coefficient of variation of a rate p is sqrt((1 - p) / p), so a rate of 0.1 requires about 9 times more rows
+    assert required_sample_sizes_lst[1] > 8 * required_sample_sizes_lst[0]
+
+
+def test_compute_required_strata_sample_sizes_true3():
+    n_pilot_rows = 100
+    strata = np.array([0] * 50 + [1] * 50)
+    groups_membership = np.ones((n_pilot_rows, 1))
+
+    # Strata, which require more rows than they have, are taken completely
+    confusion_codes = np.tile([3, 2], n_pilot_rows // 2)
+    required_sample_sizes = compute_required_strata_sample_sizes(create_constant_per_sample_stats_df(n_pilot_rows),
+                                                                 confusion_codes, groups_membership, strata,
+                                                                 np.array([60, 60]), 0.01)
+    assert np.array_equal(required_sample_sizes, [60, 60])
+
+
+# ========================== Test estimate_stratified_groups_metrics ==========================
+def test_estimate_stratified_groups_metrics_true1():
+    strata = np.array([0, 0, 0, 1, 1, 1])
+    confusion_codes = np.array([3, 2, 3, 0, 1, 0])
+    groups_membership = np.array([[1, 1], [1, 0], [1, 1], [1, 0], [1, 1], [1, 0]])
+    per_sample_stats_df = create_constant_per_sample_stats_df(6)
+
+    # All rows are sampled, so metrics are exact and their standard errors are zero
+    groups_metrics, groups_std_errors = estimate_stratified_groups_metrics(per_sample_stats_df, confusion_codes,
+                                                                           groups_membership, ['overall', 'group'],
+                                                                           strata, np.array([3, 3]))
+    assert np.isclose(groups_metrics['overall']['Accuracy'], 4 / 6)
+    assert np.isclose(groups_metrics['overall']['TPR'], 2 / 3)
+    assert np.isclose(groups_metrics['group']['FPR'], 1.0)
+    assert np.isclose(groups_std_errors['overall']['Accuracy'], 0)
+
+    # Half of the rows of the second stratum represent the whole stratum with doubled weights
+    sampled_rows = [0, 1, 2, 3, 4]
+    groups_metrics, groups_std_errors = estimate_stratified_groups_metrics(per_sample_stats_df.iloc[sampled_rows],
+                                                                           confusion_codes[sampled_rows],
+                                                                           groups_membership[sampled_rows],
+                                                                           ['overall', 'group'], strata[sampled_rows],
+                                                                           np.array([3, 4]))
+    assert np.isclose(groups_metrics['overall']['Accuracy'], (2 + 2 * 1) / 7)
+    assert groups_std_errors['overall']['Accuracy'] > 0
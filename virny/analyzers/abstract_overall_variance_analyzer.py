@@ -8,8 +8,13 @@ from abc import ABCMeta, abstractmethod
 
 from virny.custom_classes.custom_logger import get_logger
 from virny.utils.data_viz_utils import plot_generic
-from virny.utils.stability_utils import generate_bootstrap
-from virny.utils.stability_utils import count_prediction_stats, compute_std_mean_iqr_metrics
+from virny.utils.stability_utils import generate_bootstrap, create_bootstrap_seeds
+from virny.custom_classes.metrics_accumulators import VarianceMetricsAccumulator
+from virny.custom_classes.streaming_per_sample_stats import StreamingPerSampleStats
+from virny.custom_classes.quantized_predictions import QuantizedPredictions
+from virny.utils.stability_utils import compute_per_sample_stats, get_predictions_matrix
+from virny.utils.packed_labels_utils import pack_labels, count_positive_votes, compute_labels_std_mean_iqr
+from virny.utils.multiclass_stability_utils import compute_multiclass_per_sample_stats
 
 
 class AbstractOverallVarianceAnalyzer(metaclass=ABCMeta):
@@ -36,6 +41,21 @@ class AbstractOverallVarianceAnalyzer(metaclass=ABCMeta):
         Name of dataset, used for correct results naming
     n_estimators
         Number of estimators in ensemble to measure base_model stability
+    streaming
+        [Optional] If True, predictions of each estimator are folded into per-sample running statistics
+         and discarded, so models_predictions is not kept in memory. IQR is approximated with an absolute
+         error of at most 1 / StreamingPerSampleStats.n_iqr_bins. Default: False.
+    predictions_dtype
+        [Optional] If defined, models_predictions are stored as QuantizedPredictions of this type:
+         'float16', 'uint8' or 'uint16'. Ignored in the streaming mode. Default: None (float64 lists).
+    multiclass
+        [Optional] If True, probabilities of all classes are kept for each estimator, and per-sample metrics
+         are computed by compute_multiclass_per_sample_stats(). Classes are sorted unique values of y_train.
+         Cannot be combined with streaming or predictions_dtype. Default: False.
+    bootstrap_seed
+        [Optional] If defined, a bootstrap sample of each estimator is drawn with its own seed derived from
+         bootstrap_seed by create_bootstrap_seeds(), so it does not depend on the global numpy random state
+         and the order of fits. Default: None (the global numpy random state).
     verbose
         [Optional] Level of logs printing. The greater level provides more logs.
          As for now, 0, 1, 2 levels are supported.
@@ -44,14 +64,26 @@ class AbstractOverallVarianceAnalyzer(metaclass=ABCMeta):
 
     def __init__(self, base_model, base_model_name: str, bootstrap_fraction: float,
                  X_train: pd.DataFrame, y_train: pd.DataFrame, X_test: pd.DataFrame, y_test: pd.DataFrame,
-                 dataset_name: str, n_estimators: int, verbose: int = 0):
+                 dataset_name: str, n_estimators: int, streaming: bool = False, predictions_dtype: str = None,
+                 multiclass: bool = False, bootstrap_seed: int = None, verbose: int = 0):
+        if multiclass and (streaming or predictions_dtype is not None):
+            raise ValueError('The multiclass mode cannot be combined with streaming or predictions_dtype')
+
         self.base_model = base_model
         self.base_model_name = base_model_name
         self.bootstrap_fraction = bootstrap_fraction
         self.dataset_name = dataset_name
         self.n_estimators = n_estimators
         self.models_lst = [deepcopy(base_model) for _ in range(n_estimators)]
+        self.bootstrap_seeds = None if bootstrap_seed is None else create_bootstrap_seeds(bootstrap_seed, n_estimators)
         self.models_predictions = None
+        self.streaming = streaming
+        self.streaming_stats = None  # per-sample running statistics in the streaming mode
+        self.predictions_dtype = predictions_dtype
+        self.multiclass = multiclass
+        self.classes = np.unique(y_train) if multiclass else None
+        self.per_sample_stats_df = None
+        self.variance_metrics_accumulator = None  # sufficient statistics for overall metrics
 
         self._verbose = verbose
         self.__logger = get_logger(verbose)
@@ -103,29 +135,40 @@ class AbstractOverallVarianceAnalyzer(metaclass=ABCMeta):
         self.models_predictions = self.UQ_by_boostrap(boostrap_size, with_replacement=True, with_fit=with_fit)
 
         # Count metrics based on prediction proba results
-        y_preds, uq_labels, prediction_stats = count_prediction_stats(self.y_test.values, self.models_predictions)
+        if self.multiclass:
+            self.per_sample_stats_df = compute_multiclass_per_sample_stats(self._encode_classes(self.y_test),
+                                                                           self.models_predictions,
+                                                                           index=self.y_test.index)
+        elif self.streaming:
+            self.per_sample_stats_df = self.streaming_stats.get_per_sample_stats(self.y_test.values,
+                                                                                 index=self.y_test.index)
+        elif isinstance(self.models_predictions, QuantizedPredictions):
+            self.per_sample_stats_df = self.models_predictions.compute_per_sample_stats(self.y_test.values,
+                                                                                        index=self.y_test.index)
+        else:
+            self.per_sample_stats_df = compute_per_sample_stats(self.y_test.values, self.models_predictions,
+                                                                index=self.y_test.index)
+        self.variance_metrics_accumulator = VarianceMetricsAccumulator(group_names=[])
+        self.variance_metrics_accumulator.update(self.y_test, None, dict(), self.per_sample_stats_df)
+        self.__update_metrics()
+        y_preds = self._get_ensemble_predictions(self.per_sample_stats_df)
         self.__logger.info(f'Successfully computed predict proba metrics')
 
-        self.__update_metrics(means_lst=prediction_stats.means_lst,
-                              stds_lst=prediction_stats.stds_lst,
-                              iqr_lst=prediction_stats.iqr_lst,
-                              mean_ensemble_entropy_lst=prediction_stats.mean_ensemble_entropy_lst,
-                              overall_entropy_lst=prediction_stats.overall_entropy_lst,
-                              statistical_bias_lst=prediction_stats.statistical_bias_lst,
-                              jitter=prediction_stats.jitter,
-                              per_sample_accuracy_lst=prediction_stats.per_sample_accuracy_lst,
-                              label_stability_lst=prediction_stats.label_stability_lst)
-
-        # Display plots if needed
-        if make_plots:
+        # Display plots if needed. Plots of label statistics are defined only for binary labels
+        if make_plots and not self.multiclass:
             self.print_metrics()
 
             # Count metrics based on label predictions to visualize plots
-            labels_means_lst, labels_stds_lst, labels_iqr_lst = compute_std_mean_iqr_metrics(uq_labels)
-            
+            if self.streaming:
+                labels_means_lst, labels_stds_lst, labels_iqr_lst = self.streaming_stats.get_label_stats()
+            else:
+                positive_votes = count_positive_votes(pack_labels(get_predictions_matrix(self.models_predictions)))
+                labels_means_lst, labels_stds_lst, labels_iqr_lst = \
+                    compute_labels_std_mean_iqr(positive_votes, self.n_estimators)
+
             self.__logger.info(f'Successfully computed predict labels metrics')
-            per_sample_accuracy_lst = prediction_stats.per_sample_accuracy_lst
-            label_stability_lst = prediction_stats.label_stability_lst
+            per_sample_accuracy_lst = self.per_sample_stats_df['Per_Sample_Accuracy'].values
+            label_stability_lst = self.per_sample_stats_df['Label_Stability'].values
 
             plot_generic(labels_means_lst, labels_stds_lst, "Mean of probability", "Standard deviation", x_lim=1.01,
                          y_lim=0.5, plot_title="Probability mean vs Standard deviation")
@@ -148,7 +191,8 @@ class AbstractOverallVarianceAnalyzer(metaclass=ABCMeta):
         Quantifying uncertainty of the base model by constructing an ensemble from bootstrapped samples.
 
         Return a dictionary where keys are models indexes, and values are lists of
-         correspondent model predictions for X_test set.
+         correspondent model predictions for X_test set. In the streaming mode, predictions are folded
+         into self.streaming_stats, and None is returned.
 
         Parameters
         ----------
@@ -160,7 +204,14 @@ class AbstractOverallVarianceAnalyzer(metaclass=ABCMeta):
             Whether to fit estimators in bootstrap
 
         """
-        models_predictions = {idx: [] for idx in range(self.n_estimators)}
+        if self.streaming:
+            models_predictions = None
+            self.streaming_stats = StreamingPerSampleStats(self.X_test.shape[0])
+        elif self.predictions_dtype is not None:
+            models_predictions = QuantizedPredictions.empty(self.n_estimators, self.X_test.shape[0],
+                                                            self.predictions_dtype)
+        else:
+            models_predictions = {idx: [] for idx in range(self.n_estimators)}
         if self._verbose >= 1:
             print('\n', flush=True)
         self.__logger.info('Start classifiers testing by bootstrap')
@@ -174,9 +225,13 @@ class AbstractOverallVarianceAnalyzer(metaclass=ABCMeta):
         for idx in cycle_range:
             classifier = self.models_lst[idx]
             if with_fit:
-                X_sample, y_sample = generate_bootstrap(self.X_train, self.y_train, boostrap_size, with_replacement)
+                X_sample, y_sample = generate_bootstrap(self.X_train, self.y_train, boostrap_size, with_replacement,
+                                                        random_state=self._get_bootstrap_seed(idx))
                 classifier = self._fit_model(classifier, X_sample, y_sample)
-            models_predictions[idx] = self._batch_predict_proba(classifier, self.X_test)
+            if self.streaming:
+                self.streaming_stats.update(self._batch_predict_proba(classifier, self.X_test))
+            else:
+                models_predictions[idx] = self._batch_predict_proba(classifier, self.X_test)
             self.models_lst[idx] = classifier
 
         if self._verbose >= 1:
@@ -185,17 +240,140 @@ class AbstractOverallVarianceAnalyzer(metaclass=ABCMeta):
 
         return models_predictions
 
-    def __update_metrics(self, means_lst, stds_lst, iqr_lst, mean_ensemble_entropy_lst, overall_entropy_lst,
-                         statistical_bias_lst, jitter, per_sample_accuracy_lst, label_stability_lst):
-        self.mean = np.mean(means_lst)
-        self.std = np.mean(stds_lst)
-        self.iqr = np.mean(iqr_lst)
-        self.aleatoric_uncertainty = np.mean(mean_ensemble_entropy_lst)
-        self.overall_uncertainty = np.mean(overall_entropy_lst)
-        self.statistical_bias = np.mean(statistical_bias_lst)
-        self.jitter = jitter
-        self.per_sample_accuracy = np.mean(per_sample_accuracy_lst)
-        self.label_stability = np.mean(label_stability_lst)
+    def fit_estimator(self, idx: int, random_state: int = None):
+        """
+        Fit the estimator with index idx on its own bootstrap sample of the train set. Estimators are independent,
+         so they can be fitted in any order, for example, by parallel tasks of a TaskGraph.
+
+        Return the fitted estimator.
+
+        Parameters
+        ----------
+        idx
+            Index of the estimator in bootstrap
+        random_state
+            [Optional] Seed of the bootstrap sample. Default: None (a seed derived from bootstrap_seed
+             or the global numpy random state).
+
+        """
+        boostrap_size = int(self.bootstrap_fraction * self.X_train.shape[0])
+        random_state = self._get_bootstrap_seed(idx) if random_state is None else random_state
+        X_sample, y_sample = generate_bootstrap(self.X_train, self.y_train, boostrap_size, with_replacement=True,
+                                                random_state=random_state)
+        self.models_lst[idx] = self._fit_model(self.models_lst[idx], X_sample, y_sample)
+        return self.models_lst[idx]
+
+    def _get_bootstrap_seed(self, idx: int):
+        return None if self.bootstrap_seeds is None else self.bootstrap_seeds[idx]
+
+    def predict_estimator_proba(self, idx: int, X_test: pd.DataFrame):
+        """
+        Predict with the fitted estimator with index idx without refitting it.
+
+        Return model predictions for X_test set in the same format as values of models_predictions.
+
+        Parameters
+        ----------
+        idx
+            Index of the estimator in bootstrap
+        X_test
+            Processed features test set or its shard
+
+        """
+        return self._batch_predict_proba(self.models_lst[idx], X_test)
+
+    def append_test_rows(self, new_X_test: pd.DataFrame, new_y_test: pd.DataFrame):
+        """
+        Append new labelled rows to the test set and update overall metrics without refitting estimators
+         or recomputing metrics for the existing rows. Only the new rows are predicted by the fitted bootstrap
+         estimators, and their per-sample statistics are added to the overall sufficient statistics.
+
+        Return a 1D numpy array of ensemble predictions and a dictionary of bootstrap predictions for the new rows.
+         In the streaming mode, bootstrap predictions are not kept, and None is returned instead of the dictionary.
+
+        Parameters
+        ----------
+        new_X_test
+            Processed features of the new test rows
+        new_y_test
+            Targets of the new test rows
+
+        """
+        if self.per_sample_stats_df is None:
+            raise ValueError('compute_metrics() must be called before appending new test rows')
+
+        if self.streaming:
+            new_models_predictions = None
+            new_streaming_stats = StreamingPerSampleStats(new_X_test.shape[0], self.streaming_stats.n_iqr_bins)
+            for idx in range(self.n_estimators):
+                new_streaming_stats.update(self._batch_predict_proba(self.models_lst[idx], new_X_test))
+            new_per_sample_stats_df = new_streaming_stats.get_per_sample_stats(new_y_test.values,
+                                                                               index=new_y_test.index)
+        elif self.multiclass:
+            new_models_predictions = self.predict_bootstrap_proba(new_X_test)
+            new_per_sample_stats_df = compute_multiclass_per_sample_stats(self._encode_classes(new_y_test),
+                                                                          new_models_predictions,
+                                                                          index=new_y_test.index)
+        else:
+            new_models_predictions = self.predict_bootstrap_proba(new_X_test)
+            new_per_sample_stats_df = compute_per_sample_stats(new_y_test.values, new_models_predictions,
+                                                               index=new_y_test.index)
+        self.variance_metrics_accumulator.update(new_y_test, None, dict(), new_per_sample_stats_df)
+        self.__update_metrics()
+
+        if isinstance(self.models_predictions, QuantizedPredictions):
+            self.models_predictions = self.models_predictions.append(new_models_predictions)
+        elif not self.streaming:
+            self.models_predictions = {
+                idx: np.concatenate([np.asarray(self.models_predictions[idx]), np.asarray(new_models_predictions[idx])])
+                for idx in range(self.n_estimators)
+            }
+        self.per_sample_stats_df = pd.concat([self.per_sample_stats_df, new_per_sample_stats_df])
+        self.X_test = pd.concat([self.X_test, new_X_test])
+        self.y_test = pd.concat([self.y_test, new_y_test])
+
+        new_y_preds = self._get_ensemble_predictions(new_per_sample_stats_df)
+        return new_y_preds, new_models_predictions
+
+    def _encode_classes(self, y_test):
+        # Indexes of true labels in self.classes, the order of columns in multiclass predictions
+        y_test = np.asarray(y_test).ravel()
+        if not np.isin(y_test, self.classes).all():
+            raise ValueError('y_test contains classes that are not present in y_train')
+        return np.searchsorted(self.classes, y_test)
+
+    def _get_ensemble_predictions(self, per_sample_stats_df: pd.DataFrame):
+        if self.multiclass:
+            return self.classes[per_sample_stats_df['Ensemble_Prediction'].values]
+        # Ensemble predictions are int(mean<0.5), the same as in combine_bootstrap_predictions()
+        return (per_sample_stats_df['Mean'].values < 0.5).astype(int)
+
+    def predict_bootstrap_proba(self, X_test: pd.DataFrame) -> dict:
+        """
+        Predict with the fitted bootstrap estimators without refitting them.
+
+        Return a dictionary where keys are models indexes, and values are lists of
+         correspondent model predictions for X_test set.
+
+        Parameters
+        ----------
+        X_test
+            Processed features test set or its shard
+
+        """
+        return {idx: self._batch_predict_proba(self.models_lst[idx], X_test) for idx in range(self.n_estimators)}
+
+    def __update_metrics(self):
+        overall_metrics = self.variance_metrics_accumulator.finalize()['overall']
+        self.mean = overall_metrics['Mean']
+        self.std = overall_metrics['Std']
+        self.iqr = overall_metrics['IQR']
+        self.aleatoric_uncertainty = overall_metrics['Aleatoric_Uncertainty']
+        self.overall_uncertainty = overall_metrics['Overall_Uncertainty']
+        self.statistical_bias = overall_metrics['Statistical_Bias']
+        self.jitter = overall_metrics['Jitter']
+        self.per_sample_accuracy = overall_metrics['Per_Sample_Accuracy']
+        self.label_stability = overall_metrics['Label_Stability']
 
     def print_metrics(self):
         precision = 4
@@ -5,6 +5,7 @@ from datetime import datetime, timezone
 from abc import ABCMeta, abstractmethod
 
 from virny.configs.constants import ComputationMode
+from virny.utils.protected_groups_partitioning import get_group_positions
 
 
 class AbstractSubgroupAnalyzer(metaclass=ABCMeta):
@@ -42,8 +43,9 @@ class AbstractSubgroupAnalyzer(metaclass=ABCMeta):
 
     def _partition_and_compute_metrics(self, y_pred_all, results: dict):
         for group_name in self.test_protected_groups.keys():
-            X_test_group = self.test_protected_groups[group_name]
-            results[group_name] = self._compute_metrics(self.y_test[X_test_group.index], y_pred_all[X_test_group.index])
+            group_positions = get_group_positions(self.y_test.index, self.test_protected_groups, group_name)
+            results[group_name] = self._compute_metrics(self.y_test.iloc[group_positions],
+                                                        y_pred_all.iloc[group_positions])
 
         return results
 
@@ -56,24 +58,22 @@ class AbstractSubgroupAnalyzer(metaclass=ABCMeta):
         :param results: a dict to add subgroup metrics for each partition
         """
         for group_name in self.test_protected_groups.keys():
-            X_test_group = self.test_protected_groups[group_name]
-            group_y_true = self.y_test[X_test_group.index]
-            group_y_preds = y_preds[X_test_group.index]
-
-            # Define indexes of each partition of the group: overall group indexes,
-            # correct preds group indexes, incorrect preds group indexes
-            correct_preds_indexes = group_y_true.index[group_y_true == group_y_preds]
-            incorrect_preds_indexes = group_y_true.index[group_y_true != group_y_preds]
-            partition_indexes_dct = {
-                group_name: X_test_group.index,
-                f'{group_name}_correct': correct_preds_indexes,
-                f'{group_name}_incorrect': incorrect_preds_indexes,
+            group_positions = get_group_positions(self.y_test.index, self.test_protected_groups, group_name)
+            is_correct = self.y_test.values[group_positions] == y_preds.values[group_positions]
+
+            # Define positions of each partition of the group: overall group positions,
+            # correct preds group positions, incorrect preds group positions
+            partition_positions_dct = {
+                group_name: group_positions,
+                f'{group_name}_correct': group_positions[is_correct],
+                f'{group_name}_incorrect': group_positions[~is_correct],
             }
 
             # Compute metrics for each group partition
-            for group_partition_name, partition_indexes in partition_indexes_dct.items():
-                metrics_dct = self._compute_metrics(self.y_test[partition_indexes], y_preds[partition_indexes])
-                metrics_dct['Sample_Size'] = len(partition_indexes)
+            for group_partition_name, partition_positions in partition_positions_dct.items():
+                metrics_dct = self._compute_metrics(self.y_test.iloc[partition_positions],
+                                                    y_preds.iloc[partition_positions])
+                metrics_dct['Sample_Size'] = len(partition_positions)
                 results[group_partition_name] = metrics_dct
 
         return results
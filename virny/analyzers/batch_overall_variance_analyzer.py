@@ -30,6 +30,17 @@ class BatchOverallVarianceAnalyzer(AbstractOverallVarianceAnalyzer):
         Name of dataset, used for correct results naming
     n_estimators
         Number of estimators in ensemble to measure base_model stability
+    streaming
+        [Optional] If True, bootstrap predictions are folded into per-sample running statistics
+         instead of being kept in memory. Default: False.
+    predictions_dtype
+        [Optional] A type of compact storage for bootstrap predictions: 'float16', 'uint8' or 'uint16'.
+         Default: None (float64 lists).
+    multiclass
+        [Optional] If True, probabilities of all classes are kept for each estimator. Default: False.
+    bootstrap_seed
+        [Optional] Seed to derive seeds of bootstrap samples of all estimators. Default: None (the global
+         numpy random state).
     verbose
         [Optional] Level of logs printing. The greater level provides more logs.
          As for now, 0, 1, 2 levels are supported.
@@ -37,7 +48,8 @@ class BatchOverallVarianceAnalyzer(AbstractOverallVarianceAnalyzer):
     """
     def __init__(self, base_model, base_model_name: str, bootstrap_fraction: float,
                  X_train: pd.DataFrame, y_train: pd.DataFrame, X_test: pd.DataFrame, y_test: pd.DataFrame,
-                 target_column: str, dataset_name: str, n_estimators: int, verbose: int = 0):
+                 target_column: str, dataset_name: str, n_estimators: int, streaming: bool = False,
+                 predictions_dtype: str = None, multiclass: bool = False, bootstrap_seed: int = None, verbose: int = 0):
         super().__init__(base_model=base_model,
                          base_model_name=base_model_name,
                          bootstrap_fraction=bootstrap_fraction,
@@ -47,6 +59,10 @@ class BatchOverallVarianceAnalyzer(AbstractOverallVarianceAnalyzer):
                          y_test=y_test,
                          dataset_name=dataset_name,
                          n_estimators=n_estimators,
+                         streaming=streaming,
+                         predictions_dtype=predictions_dtype,
+                         multiclass=multiclass,
+                         bootstrap_seed=bootstrap_seed,
                          verbose=verbose)
         self.target_column = target_column
 
@@ -66,4 +82,10 @@ class BatchOverallVarianceAnalyzer(AbstractOverallVarianceAnalyzer):
         """
         Predict with the classifier for X_test set and return probabilities for each class for each test point
         """
-        return classifier.predict_proba(X_test)[:, 0]
+        if not self.multiclass:
+            return classifier.predict_proba(X_test)[:, 0]
+
+        # A bootstrap sample can miss some classes, so columns are aligned with classes of the whole train set
+        predictions = np.zeros((X_test.shape[0], self.classes.shape[0]))
+        predictions[:, np.searchsorted(self.classes, classifier.classes_)] = classifier.predict_proba(X_test)
+        return predictions
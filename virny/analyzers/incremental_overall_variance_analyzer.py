@@ -31,6 +31,15 @@ class IncrementalOverallVarianceAnalyzer(AbstractOverallVarianceAnalyzer):
         Name of dataset, used for correct results naming
     n_estimators
         Number of estimators in ensemble to measure base_model stability
+    streaming
+        [Optional] If True, bootstrap predictions are folded into per-sample running statistics
+         instead of being kept in memory. Default: False.
+    predictions_dtype
+        [Optional] A type of compact storage for bootstrap predictions: 'float16', 'uint8' or 'uint16'.
+         Default: None (float64 lists).
+    bootstrap_seed
+        [Optional] Seed to derive seeds of bootstrap samples of all estimators. Default: None (the global
+         numpy random state).
     verbose
         [Optional] Level of logs printing. The greater level provides more logs.
          As for now, 0, 1, 2 levels are supported.
@@ -38,7 +47,8 @@ class IncrementalOverallVarianceAnalyzer(AbstractOverallVarianceAnalyzer):
     """
     def __init__(self, base_model, base_model_name: str, bootstrap_fraction: float,
                  X_train: pd.DataFrame, y_train: pd.DataFrame, X_test: pd.DataFrame, y_test: pd.DataFrame,
-                 target_column: str, dataset_name: str, n_estimators: int, verbose: int = 0):
+                 target_column: str, dataset_name: str, n_estimators: int, streaming: bool = False,
+                 predictions_dtype: str = None, bootstrap_seed: int = None, verbose: int = 0):
         super().__init__(base_model=base_model,
                          base_model_name=base_model_name,
                          bootstrap_fraction=bootstrap_fraction,
@@ -48,6 +58,9 @@ class IncrementalOverallVarianceAnalyzer(AbstractOverallVarianceAnalyzer):
                          y_test=y_test,
                          dataset_name=dataset_name,
                          n_estimators=n_estimators,
+                         streaming=streaming,
+                         predictions_dtype=predictions_dtype,
+                         bootstrap_seed=bootstrap_seed,
                          verbose=verbose)
         self.target_column = target_column
         self.dataset_reader = IncrementalPandasDataset
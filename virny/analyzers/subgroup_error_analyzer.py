@@ -1,7 +1,11 @@
+import numpy as np
 import pandas as pd
 
+from virny.configs.constants import ComputationMode
 from virny.analyzers.abstract_subgroup_analyzer import AbstractSubgroupAnalyzer
-from virny.utils.common_helpers import confusion_matrix_metrics
+from virny.custom_classes.metrics_accumulators import ErrorMetricsAccumulator, finalize_confusion_counts
+from virny.utils.common_helpers import confusion_matrix_metrics_from_counts
+from virny.utils.protected_groups_partitioning import append_test_protected_groups
 
 
 class SubgroupErrorAnalyzer(AbstractSubgroupAnalyzer):
@@ -28,9 +32,100 @@ class SubgroupErrorAnalyzer(AbstractSubgroupAnalyzer):
                  sensitive_attributes_dct: dict, test_protected_groups: dict = None,
                  computation_mode: str = None):
         super().__init__(X_test, y_test, sensitive_attributes_dct, test_protected_groups, computation_mode)
+        # Sufficient statistics for 'overall' and each subgroup
+        self.error_metrics_accumulator = None
 
     def _compute_metrics(self, y_test: pd.DataFrame, y_preds: list):
         """
         Compute metrics for subgroups using a confusion matrix
         """
-        return confusion_matrix_metrics(y_test, y_preds)
+        TN, FP, FN, TP = ErrorMetricsAccumulator.compute_confusion_counts(y_test, y_preds)
+        return confusion_matrix_metrics_from_counts(TN, FP, FN, TP)
+
+    def compute_subgroup_metrics(self, y_preds, save_results: bool,
+                                 result_filename: str = None, save_dir_path: str = None):
+        """
+        Compute error metrics for each subgroup in self.test_protected_groups.
+
+        Return a dictionary where keys are subgroup names, and values are subgroup metrics.
+
+        Parameters
+        ----------
+        y_preds
+            Models predictions
+        save_results
+            If to save results in a file
+        result_filename
+            [Optional] Filename for results to save
+        save_dir_path
+            [Optional] Location where to save the results file
+
+        """
+        # Confusion matrices of all groups are computed at once based on a sparse group membership matrix
+        self.error_metrics_accumulator = ErrorMetricsAccumulator(list(self.test_protected_groups.keys()))
+        self.error_metrics_accumulator.update(self.y_test, y_preds, self.test_protected_groups)
+        if self.computation_mode == ComputationMode.ERROR_ANALYSIS.value:
+            self.subgroup_metrics_dict = self._finalize_error_analysis_metrics()
+        else:
+            self.subgroup_metrics_dict = self.error_metrics_accumulator.finalize()
+        if save_results:
+            self.save_metrics_to_file(result_filename, save_dir_path)
+
+        return self.subgroup_metrics_dict
+
+    def _finalize_error_analysis_metrics(self):
+        """
+        Compute metrics for each group and its partitions on correct and incorrect predictions.
+         Correct predictions of a group are its TN and TP, and incorrect predictions are its FP and FN,
+         so confusion matrices of the partitions are derived from the group confusion matrix.
+        """
+        partition_names, partition_counts = [], []
+        for group_name in self.error_metrics_accumulator.group_names:
+            TN, FP, FN, TP = self.error_metrics_accumulator.confusion_counts[group_name]
+            partition_names.extend([group_name, f'{group_name}_correct', f'{group_name}_incorrect'])
+            partition_counts.extend([[TN, FP, FN, TP], [TN, 0, 0, TP], [0, FP, FN, 0]])
+
+        partition_counts = np.array(partition_counts, dtype=np.int64)
+        partitions_metrics = finalize_confusion_counts(partition_names, partition_counts)
+        for partition_name, counts in zip(partition_names, partition_counts):
+            partitions_metrics[partition_name]['Sample_Size'] = int(counts.sum())
+
+        # The overall set is not partitioned in the error analysis mode
+        results = {'overall': partitions_metrics['overall']}
+        for partition_name in partition_names[3:]:
+            results[partition_name] = partitions_metrics[partition_name]
+
+        return results
+
+    def append_test_rows(self, new_X_test: pd.DataFrame, new_y_test: pd.DataFrame, new_y_preds,
+                         new_test_protected_groups: dict):
+        """
+        Append new labelled rows to the test set and update error metrics in O(new rows)
+         by adding confusion matrix counts of the new rows to the subgroup sufficient statistics.
+         compute_subgroup_metrics() must be called beforehand.
+
+        Return a dictionary where keys are subgroup names, and values are subgroup metrics.
+
+        Parameters
+        ----------
+        new_X_test
+            Processed features of the new test rows
+        new_y_test
+            Targets of the new test rows
+        new_y_preds
+            Models predictions for the new test rows
+        new_test_protected_groups
+            Protected groups for new_X_test created by create_test_protected_groups()
+
+        """
+        self.error_metrics_accumulator.update(new_y_test, new_y_preds, new_test_protected_groups)
+        self.test_protected_groups = append_test_protected_groups(self.test_protected_groups,
+                                                                  new_test_protected_groups)
+        self.X_test = pd.concat([self.X_test, new_X_test])
+        self.y_test = pd.concat([self.y_test, new_y_test])
+        if self.computation_mode == ComputationMode.ERROR_ANALYSIS.value:
+            self.subgroup_metrics_dict = self._finalize_error_analysis_metrics()
+        else:
+            self.subgroup_metrics_dict = self.error_metrics_accumulator.finalize()
+
+        return self.subgroup_metrics_dict
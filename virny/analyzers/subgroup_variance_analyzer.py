@@ -1,6 +1,6 @@
 import pandas as pd
 
-from virny.configs.constants import ModelSetting
+from virny.configs.constants import ModelSetting, ComputationMode
 from virny.custom_classes.base_dataset import BaseFlowDataset
 from virny.analyzers.subgroup_variance_calculator import SubgroupVarianceCalculator
 from virny.analyzers.batch_overall_variance_analyzer import BatchOverallVarianceAnalyzer
@@ -35,6 +35,17 @@ class SubgroupVarianceAnalyzer:
          and values are X_test row indexes correspondent to this subgroup.
     computation_mode
         [Optional] A non-default mode for metrics computation. Should be included in the ComputationMode enum.
+         In the streaming mode, bootstrap predictions are not kept in memory, and models_predictions is None.
+    predictions_dtype
+        [Optional] If defined, bootstrap predictions are stored as QuantizedPredictions of this type:
+         'float16', 'uint8' or 'uint16'. Default: None (float64 lists).
+    multiclass
+        [Optional] If True, probabilities of all classes are kept, and variance metrics are computed
+         for a multiclass classifier. Supported only for batch models and the default computation mode.
+         Default: False.
+    bootstrap_seed
+        [Optional] Seed to derive seeds of bootstrap samples of all estimators by create_bootstrap_seeds().
+         Default: None (the global numpy random state).
     verbose
         [Optional] Level of logs printing. The greater level provides more logs.
          As for now, 0, 1, 2 levels are supported.
@@ -42,7 +53,13 @@ class SubgroupVarianceAnalyzer:
     """
     def __init__(self, model_setting: ModelSetting, n_estimators: int, base_model, base_model_name: str,
                  bootstrap_fraction: float, dataset: BaseFlowDataset, dataset_name: str,
-                 sensitive_attributes_dct: dict, test_protected_groups: dict, computation_mode: str = None, verbose: int = 0):
+                 sensitive_attributes_dct: dict, test_protected_groups: dict, computation_mode: str = None,
+                 predictions_dtype: str = None, multiclass: bool = False, bootstrap_seed: int = None,
+                 verbose: int = 0):
+        if multiclass and (model_setting != ModelSetting.BATCH or computation_mode is not None):
+            raise ValueError('The multiclass mode is supported only for batch models and the default computation mode')
+
+        streaming = computation_mode == ComputationMode.STREAMING.value
         if model_setting == ModelSetting.BATCH:
             overall_variance_analyzer = BatchOverallVarianceAnalyzer(base_model=base_model,
                                                                      base_model_name=base_model_name,
@@ -54,6 +71,10 @@ class SubgroupVarianceAnalyzer:
                                                                      dataset_name=dataset_name,
                                                                      target_column=dataset.target,
                                                                      n_estimators=n_estimators,
+                                                                     streaming=streaming,
+                                                                     predictions_dtype=predictions_dtype,
+                                                                     multiclass=multiclass,
+                                                                     bootstrap_seed=bootstrap_seed,
                                                                      verbose=verbose)
         elif model_setting == ModelSetting.INCREMENTAL:
             overall_variance_analyzer = IncrementalOverallVarianceAnalyzer(base_model=base_model,
@@ -66,6 +87,9 @@ class SubgroupVarianceAnalyzer:
                                                                            dataset_name=dataset_name,
                                                                            target_column=dataset.target,
                                                                            n_estimators=n_estimators,
+                                                                           streaming=streaming,
+                                                                           predictions_dtype=predictions_dtype,
+                                                                           bootstrap_seed=bootstrap_seed,
                                                                            verbose=verbose)
         else:
             raise ValueError('model_setting is incorrect or not supported')
@@ -83,6 +107,65 @@ class SubgroupVarianceAnalyzer:
         self.overall_variance_metrics_dct = dict()
         self.subgroup_variance_metrics_dct = dict()
 
+    @property
+    def models_predictions(self):
+        return self.__overall_variance_analyzer.models_predictions
+
+    @property
+    def per_sample_stats_df(self):
+        return self.__overall_variance_analyzer.per_sample_stats_df
+
+    @property
+    def classes(self):
+        return self.__overall_variance_analyzer.classes
+
+    def predict_bootstrap_proba(self, X_test: pd.DataFrame) -> dict:
+        """
+        Predict with the fitted bootstrap estimators without refitting them, for example, for a shard of a test set.
+
+        Return a dictionary where keys are models indexes, and values are lists of
+         correspondent model predictions for X_test set.
+
+        Parameters
+        ----------
+        X_test
+            Processed features test set or its shard
+
+        """
+        return self.__overall_variance_analyzer.predict_bootstrap_proba(X_test)
+
+    def fit_estimator(self, idx: int, random_state: int = None):
+        """
+        Fit the estimator with index idx on its own bootstrap sample of the train set.
+
+        Return the fitted estimator.
+
+        Parameters
+        ----------
+        idx
+            Index of the estimator in bootstrap
+        random_state
+            [Optional] Seed of the bootstrap sample. Default: None (the global numpy random state).
+
+        """
+        return self.__overall_variance_analyzer.fit_estimator(idx, random_state)
+
+    def predict_estimator_proba(self, idx: int, X_test: pd.DataFrame):
+        """
+        Predict with the fitted estimator with index idx without refitting it.
+
+        Return model predictions for X_test set.
+
+        Parameters
+        ----------
+        idx
+            Index of the estimator in bootstrap
+        X_test
+            Processed features test set or its shard
+
+        """
+        return self.__overall_variance_analyzer.predict_estimator_proba(idx, X_test)
+
     def set_test_sets(self, new_X_test, new_y_test):
         self.__overall_variance_analyzer.X_test = new_X_test
         self.__overall_variance_analyzer.y_test = new_y_test
@@ -120,7 +203,40 @@ class SubgroupVarianceAnalyzer:
         # Count and display fairness metrics
         self.__subgroup_variance_calculator.set_overall_variance_metrics(self.overall_variance_metrics_dct)
         self.subgroup_variance_metrics_dct = self.__subgroup_variance_calculator.compute_subgroup_metrics(
-            self.__overall_variance_analyzer.models_predictions, save_results, result_filename, save_dir_path
+            self.__overall_variance_analyzer.models_predictions, save_results, result_filename, save_dir_path,
+            per_sample_stats_df=self.__overall_variance_analyzer.per_sample_stats_df
         )
 
         return y_preds, pd.DataFrame(self.subgroup_variance_metrics_dct)
+
+    def append_test_rows(self, new_X_test: pd.DataFrame, new_y_test: pd.DataFrame, new_test_protected_groups: dict):
+        """
+        Append new labelled rows to the test set and update overall and subgroup variance metrics.
+         Only the new rows are predicted by the already fitted bootstrap estimators, and metrics are updated
+         in O(new rows) based on sufficient statistics of subgroups. compute_metrics() must be called beforehand.
+
+        Return ensemble predictions for the new rows and a pandas dataframe of variance metrics for subgroups
+         of the whole enlarged test set.
+
+        Parameters
+        ----------
+        new_X_test
+            Processed features of the new test rows
+        new_y_test
+            Targets of the new test rows
+        new_test_protected_groups
+            Protected groups for new_X_test created by create_test_protected_groups()
+
+        """
+        new_y_preds, new_models_predictions = self.__overall_variance_analyzer.append_test_rows(new_X_test, new_y_test)
+        self.overall_variance_metrics_dct = self.__overall_variance_analyzer.get_metrics_dict()
+
+        self.__subgroup_variance_calculator.set_overall_variance_metrics(self.overall_variance_metrics_dct)
+        per_sample_stats_df = self.__overall_variance_analyzer.per_sample_stats_df
+        new_per_sample_stats_df = per_sample_stats_df.iloc[per_sample_stats_df.shape[0] - new_X_test.shape[0]:]
+        self.subgroup_variance_metrics_dct = self.__subgroup_variance_calculator.append_test_rows(
+            new_X_test, new_y_test, new_models_predictions, new_test_protected_groups,
+            new_per_sample_stats_df=new_per_sample_stats_df
+        )
+
+        return new_y_preds, pd.DataFrame(self.subgroup_variance_metrics_dct)
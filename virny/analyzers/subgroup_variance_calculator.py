@@ -1,8 +1,12 @@
 import numpy as np
 import pandas as pd
 
-from virny.configs.constants import ComputationMode
-from virny.utils.stability_utils import count_prediction_stats, combine_bootstrap_predictions
+from virny.configs.constants import ComputationMode, VARIANCE_METRICS
+from virny.custom_classes.metrics_accumulators import VarianceMetricsAccumulator
+from scipy.sparse import hstack
+
+from virny.utils.stability_utils import compute_per_sample_stats
+from virny.utils.protected_groups_partitioning import create_groups_membership_matrix, append_test_protected_groups
 from virny.analyzers.abstract_subgroup_analyzer import AbstractSubgroupAnalyzer
 
 
@@ -31,77 +35,73 @@ class SubgroupVarianceCalculator(AbstractSubgroupAnalyzer):
         super().__init__(X_test, y_test, sensitive_attributes_dct, test_protected_groups, computation_mode)
         self.overall_variance_metrics = None
         self.subgroup_variance_metrics_dict = None
+        # Sufficient statistics for 'overall' and each subgroup
+        self.variance_metrics_accumulator = None
 
     def set_overall_variance_metrics(self, overall_variance_metrics):
         self.overall_variance_metrics = overall_variance_metrics
 
-    def _partition_and_compute_metrics(self, models_predictions, results: dict):
+    def _partition_and_compute_metrics(self, per_sample_stats_df, results: dict):
+        self.variance_metrics_accumulator = VarianceMetricsAccumulator(list(self.test_protected_groups.keys()))
+        self.variance_metrics_accumulator.update(self.y_test, None, self.test_protected_groups, per_sample_stats_df)
+        subgroup_metrics_dct = self.variance_metrics_accumulator.finalize()
         for group_name in self.test_protected_groups.keys():
-            X_test_group = self.test_protected_groups[group_name]
-            group_models_predictions = {
-                model_idx: models_predictions[model_idx][X_test_group.index].reset_index(drop=True)
-                for model_idx in models_predictions.keys()
-            }
-            results[group_name] = self._compute_metrics(self.y_test[X_test_group.index].reset_index(drop=True),
-                                                        group_models_predictions)
+            results[group_name] = subgroup_metrics_dct[group_name]
 
         return results
 
-    def _partition_and_compute_metrics_for_error_analysis(self, models_predictions, results: dict):
+    def _partition_and_compute_metrics_for_error_analysis(self, per_sample_stats_df, results: dict):
         """
-        Partition predictions on correct and incorrect and compute subgroup metrics for each of the partitions.
-        Used for the 'error_analysis' mode.
+        Partition each group on samples with correct and incorrect ensemble predictions and compute subgroup metrics
+         for each of the partitions. Used for the 'error_analysis' mode. Per-sample statistics are computed once
+         and aggregated over group x correctness masks.
 
-        :param models_predictions: a list of predictions
+        :param per_sample_stats_df: per-sample metrics for X_test created by compute_per_sample_stats()
         :param results: a dict to add subgroup metrics for each partition
         """
-        # Create a 1D pandas series of predictions for the test set based on bootstrap predictions
-        y_preds = combine_bootstrap_predictions(models_predictions, self.y_test.index)
-
-        # Partition and compute subgroup metrics
-        for group_name in self.test_protected_groups.keys():
-            X_test_group = self.test_protected_groups[group_name]
-            group_y_true = self.y_test[X_test_group.index]
-            group_y_preds = y_preds[X_test_group.index]
-
-            # Define indexes of each partition of the group: overall group indexes,
-            # correct preds group indexes, incorrect preds group indexes
-            correct_preds_indexes = group_y_true.index[group_y_true == group_y_preds]
-            incorrect_preds_indexes = group_y_true.index[group_y_true != group_y_preds]
-            partition_indexes_dct = {
-                group_name: X_test_group.index,
-                f'{group_name}_correct': correct_preds_indexes,
-                f'{group_name}_incorrect': incorrect_preds_indexes,
-            }
-
-            # Compute metrics for each group partition
-            for group_partition_name, partition_indexes in partition_indexes_dct.items():
-                group_models_predictions = {
-                    model_idx: models_predictions[model_idx][partition_indexes].reset_index(drop=True)
-                    for model_idx in models_predictions.keys()
-                }
-                metrics_dct = self._compute_metrics(self.y_test[partition_indexes].reset_index(drop=True),
-                                                    group_models_predictions)
-                results[group_partition_name] = metrics_dct
+        partition_names, partitions_membership = \
+            self._create_error_analysis_partitions(self.y_test, per_sample_stats_df, self.test_protected_groups)
+        self.variance_metrics_accumulator = VarianceMetricsAccumulator(partition_names)
+        self.variance_metrics_accumulator.update(self.y_test, None, None, per_sample_stats_df,
+                                                 groups_membership=partitions_membership)
+        partitions_metrics_dct = self.variance_metrics_accumulator.finalize()
+        for partition_name in partition_names:
+            results[partition_name] = partitions_metrics_dct[partition_name]
 
         return results
 
+    def _create_error_analysis_partitions(self, y_test, per_sample_stats_df, test_protected_groups):
+        """
+        Return names of group partitions (group, group_correct, group_incorrect for each group) and
+         a sparse membership matrix of test samples in these partitions.
+        """
+        group_names = list(test_protected_groups.keys())
+        groups_membership = create_groups_membership_matrix(per_sample_stats_df.index, test_protected_groups,
+                                                            group_names)
+        # Ensemble predictions are int(mean<0.5), the same as in combine_bootstrap_predictions()
+        y_preds = (per_sample_stats_df['Mean'].values < 0.5).astype(int)
+        is_correct = (np.asarray(y_test) == y_preds).astype(np.int8)[:, np.newaxis]
+
+        partition_names = []
+        for group_name in group_names:
+            partition_names.extend([group_name, f'{group_name}_correct', f'{group_name}_incorrect'])
+        partitions_membership = hstack([groups_membership,
+                                        groups_membership.multiply(is_correct),
+                                        groups_membership.multiply(1 - is_correct)]).tocsc()
+        # Reorder columns to [group, group_correct, group_incorrect] for each group
+        n_groups = len(group_names)
+        columns_order = np.arange(3 * n_groups).reshape(3, n_groups).T.ravel()
+
+        return partition_names, partitions_membership[:, columns_order]
+
     def _compute_metrics(self, y_test: pd.DataFrame, group_models_predictions):
-        _, _, prediction_stats = count_prediction_stats(y_test, group_models_predictions)
-        return {
-            'Jitter': prediction_stats.jitter,
-            'Mean': np.mean(prediction_stats.means_lst),
-            'Std': np.mean(prediction_stats.stds_lst),
-            'IQR': np.mean(prediction_stats.iqr_lst),
-            'Aleatoric_Uncertainty': np.mean(prediction_stats.mean_ensemble_entropy_lst),
-            'Overall_Uncertainty': np.mean(prediction_stats.overall_entropy_lst),
-            'Statistical_Bias': np.mean(prediction_stats.statistical_bias_lst),
-            'Per_Sample_Accuracy': np.mean(prediction_stats.per_sample_accuracy_lst),
-            'Label_Stability': np.mean(prediction_stats.label_stability_lst),
-        }
+        # A subgroup variance metric is a mean of correspondent per-sample values over the subgroup samples
+        per_sample_stats_df = compute_per_sample_stats(np.asarray(y_test), group_models_predictions)
+        return per_sample_stats_df[VARIANCE_METRICS].mean().to_dict()
 
     def compute_subgroup_metrics(self, models_predictions: dict, save_results: bool,
-                                 result_filename: str = None, save_dir_path: str = None):
+                                 result_filename: str = None, save_dir_path: str = None,
+                                 per_sample_stats_df: pd.DataFrame = None):
         """
         Compute variance metrics for subgroups.
 
@@ -117,25 +117,75 @@ class SubgroupVarianceCalculator(AbstractSubgroupAnalyzer):
             [Optional] Filename for results to save
         save_dir_path
             [Optional] Location where to save the results file
+        per_sample_stats_df
+            [Optional] Per-sample metrics for X_test created by compute_per_sample_stats().
+             If None, they are computed based on models_predictions.
 
         """
-        models_predictions = {
-            model_idx: pd.Series(models_predictions[model_idx], index=self.y_test.index)
-            for model_idx in models_predictions.keys()
-        }
-
         # Compute overall stability metrics
         results = dict()
         results['overall'] = self.overall_variance_metrics
 
         # Compute stability metrics for subgroups
+        if per_sample_stats_df is None:
+            per_sample_stats_df = compute_per_sample_stats(self.y_test.values, models_predictions,
+                                                           index=self.y_test.index)
         if self.computation_mode == ComputationMode.ERROR_ANALYSIS.value:
-            results = self._partition_and_compute_metrics_for_error_analysis(models_predictions, results)
+            results = self._partition_and_compute_metrics_for_error_analysis(per_sample_stats_df, results)
         else:
-            results = self._partition_and_compute_metrics(models_predictions, results)
+            results = self._partition_and_compute_metrics(per_sample_stats_df, results)
 
         self.subgroup_variance_metrics_dict = results
         if save_results:
             self.save_metrics_to_file(result_filename, save_dir_path)
 
         return self.subgroup_variance_metrics_dict
+
+    def append_test_rows(self, new_X_test: pd.DataFrame, new_y_test: pd.DataFrame, new_models_predictions: dict,
+                         new_test_protected_groups: dict, new_per_sample_stats_df: pd.DataFrame = None):
+        """
+        Append new labelled rows to the test set and update subgroup variance metrics in O(new rows)
+         by adding per-sample statistics of the new rows to the subgroup sufficient statistics.
+         Overall metrics must be updated with set_overall_variance_metrics() beforehand.
+
+        Return a dict of dicts where key is 'overall' or a subgroup name, and value is a dict of metrics for this subgroup.
+
+        Parameters
+        ----------
+        new_X_test
+            Processed features of the new test rows
+        new_y_test
+            Targets of the new test rows
+        new_models_predictions
+            Dict of lists where key is a model index, and value is a list of model predictions for new_X_test
+        new_test_protected_groups
+            Protected groups for new_X_test created by create_test_protected_groups()
+        new_per_sample_stats_df
+            [Optional] Per-sample metrics for new_X_test created by compute_per_sample_stats()
+
+        """
+        if new_per_sample_stats_df is None:
+            new_per_sample_stats_df = compute_per_sample_stats(new_y_test.values, new_models_predictions,
+                                                               index=new_y_test.index)
+
+        if self.computation_mode == ComputationMode.ERROR_ANALYSIS.value:
+            _, new_partitions_membership = \
+                self._create_error_analysis_partitions(new_y_test, new_per_sample_stats_df, new_test_protected_groups)
+            self.variance_metrics_accumulator.update(new_y_test, None, None, new_per_sample_stats_df,
+                                                     groups_membership=new_partitions_membership)
+        else:
+            self.variance_metrics_accumulator.update(new_y_test, None, new_test_protected_groups,
+                                                     new_per_sample_stats_df)
+
+        subgroup_metrics_dct = self.variance_metrics_accumulator.finalize()
+        results = {'overall': self.overall_variance_metrics}
+        self.test_protected_groups = append_test_protected_groups(self.test_protected_groups,
+                                                                  new_test_protected_groups)
+        for group_name in self.variance_metrics_accumulator.group_names[1:]:
+            results[group_name] = subgroup_metrics_dct[group_name]
+
+        self.X_test = pd.concat([self.X_test, new_X_test])
+        self.y_test = pd.concat([self.y_test, new_y_test])
+        self.subgroup_variance_metrics_dict = results
+
+        return self.subgroup_variance_metrics_dict
@@ -24,6 +24,7 @@ class ModelSetting(Enum):
 
 class ComputationMode(Enum):
     ERROR_ANALYSIS = "error_analysis"
+    STREAMING = "streaming"
 
 
 class ReportType(Enum):
@@ -33,5 +34,9 @@ class ReportType(Enum):
 
 
 INTERSECTION_SIGN = '&'
+VARIANCE_METRICS = ['Mean', 'Std', 'IQR', 'Aleatoric_Uncertainty', 'Overall_Uncertainty', 'Statistical_Bias',
+                    'Jitter', 'Per_Sample_Accuracy', 'Label_Stability']
+LABEL_BASED_VARIANCE_METRICS = ['Statistical_Bias', 'Per_Sample_Accuracy']
+ERROR_METRICS = ['TPR', 'TNR', 'PPV', 'FNR', 'FPR', 'Accuracy', 'F1', 'Selection-Rate', 'Positive-Rate']
 MODELS_TUNING_SEED = 42
 MODELS_TUNING_TEST_SET_FRACTION = 0.2
@@ -6,10 +6,33 @@ that are highly  customizable for future library features.
 from .base_dataset import BaseFlowDataset
 from .metrics_composer import MetricsComposer
 from .metrics_visualizer import MetricsVisualizer
+from .sliding_window_subgroup_metrics import SlidingWindowSubgroupMetrics
+from .metrics_accumulators import VarianceMetricsAccumulator, ErrorMetricsAccumulator
+from .streaming_per_sample_stats import StreamingPerSampleStats
+from .quantized_predictions import QuantizedPredictions
+from .subgroup_metrics_bootstrap import SubgroupMetricsBootstrap
+from .group_metrics_permutation_test import GroupMetricsPermutationTest
+from .subgroup_threshold_sweep import SubgroupThresholdSweep
+from .subgroup_slice_finder import SubgroupSliceFinder
+from .experiment_cache import ExperimentCache
+from .task_graph import TaskGraph
+from .file_work_queue import FileWorkQueue
 
 
 __all__ = [
     "BaseFlowDataset",
     "MetricsComposer",
     "MetricsVisualizer",
+    "SlidingWindowSubgroupMetrics",
+    "VarianceMetricsAccumulator",
+    "ErrorMetricsAccumulator",
+    "StreamingPerSampleStats",
+    "QuantizedPredictions",
+    "SubgroupMetricsBootstrap",
+    "GroupMetricsPermutationTest",
+    "SubgroupThresholdSweep",
+    "SubgroupSliceFinder",
+    "ExperimentCache",
+    "TaskGraph",
+    "FileWorkQueue",
 ]
@@ -0,0 +1,213 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import joblib
+import tempfile
+import pandas as pd
+
+from sklearn.base import clone
+
+from virny.__version__ import __version__
+from virny.configs.constants import INTERSECTION_SIGN
+from virny.custom_classes.base_dataset import BaseFlowDataset
+# The module is imported as a whole, since it imports QuantizedPredictions from this package
+from virny.utils import ensemble_predictions_utils
+
+
+METRICS_FILE_NAME = 'metrics.pkl'
+PREDICTIONS_FILE_NAME = 'predictions.npz'
+
+
+def create_dataset_fingerprint(dataset: BaseFlowDataset, sensitive_attributes_dct: dict = None) -> str:
+    """
+    Return a hex digest of the train and test splits of a dataset (values, columns, and indexes),
+     which changes if the dataset, its preprocessing, or its split seed change.
+
+    Parameters
+    ----------
+    dataset
+        BaseFlowDataset object with X_train_val, y_train_val, X_test, y_test, and init_features_df attributes
+    sensitive_attributes_dct
+        [Optional] A dictionary where keys are sensitive attribute names (including attributes intersections).
+         If defined, the sensitive attribute columns of init_features_df for the test rows are also hashed,
+         since subgroups of test samples are created based on them.
+
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    data_lst = [dataset.X_train_val, dataset.y_train_val, dataset.X_test, dataset.y_test]
+    if sensitive_attributes_dct is not None:
+        sensitive_attributes = sorted({single_attr.strip() for attr in sensitive_attributes_dct.keys()
+                                       for single_attr in attr.split(INTERSECTION_SIGN)})
+        data_lst.append(dataset.init_features_df[sensitive_attributes].loc[dataset.X_test.index])
+
+    for data in data_lst:
+        digest.update(pd.util.hash_pandas_object(data, index=True).values.tobytes())
+        if isinstance(data, pd.DataFrame):
+            digest.update(repr(data.columns.tolist()).encode())
+
+    return digest.hexdigest()
+
+
+class ExperimentCache:
+    """
+    A content-addressed on-disk cache of model metrics and bootstrap predictions for cells of an experiment grid.
+     A key of a cell is a hash of the dataset fingerprint (including sensitive attributes of test rows), the model
+     class and its parameters, n_estimators, bootstrap_fraction, sensitive_attributes_dct, the computation mode,
+     the bootstrap seed, and the virny version, so a cell is recomputed only when one of them changes.
+
+    Each cell is stored in its own directory <cache_dir>/<key> with metrics.pkl, which keeps dtypes of metrics
+     and None values of Model_Params, and predictions.npz (if predictions are kept in memory). Cells are written
+     to a temporary directory and renamed, so parallel workers can share one cache. After each write, cells older
+     than max_age_seconds are evicted, and then the least recently used cells are evicted until the cache size
+     is below max_size_bytes.
+
+    Parameters
+    ----------
+    cache_dir
+        Directory to store cached cells
+    max_size_bytes
+        [Optional] Maximum total size of cached files. Default: None (no limit).
+    max_age_seconds
+        [Optional] Maximum time since the last use of a cached cell. Default: None (no limit).
+
+    """
+    def __init__(self, cache_dir: str, max_size_bytes: int = None, max_age_seconds: float = None):
+        self.cache_dir = cache_dir
+        self.max_size_bytes = max_size_bytes
+        self.max_age_seconds = max_age_seconds
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def create_key(dataset: BaseFlowDataset, base_model, n_estimators: int, bootstrap_fraction: float,
+                   sensitive_attributes_dct: dict, model_setting: str = None, computation_mode: str = None,
+                   bootstrap_seed: int = None) -> str:
+        """
+        Return a hex key of an experiment cell. Model parameters are hashed by joblib.hash() of
+         get_params(deep=True) of a clone of the model, so a RandomState parameter is hashed by its state
+         instead of its memory address.
+
+        Parameters
+        ----------
+        dataset
+            BaseFlowDataset object that contains train and test splits
+        base_model
+            Base model for metrics computation
+        n_estimators
+            Number of estimators for bootstrap
+        bootstrap_fraction
+            Fraction of a train set to fit models in bootstrap
+        sensitive_attributes_dct
+            A dictionary where keys are sensitive attribute names (including attributes intersections),
+             and values are privilege values for these attributes
+        model_setting
+            [Optional] Model type: 'batch' or 'incremental'
+        computation_mode
+            [Optional] A non-default mode for metrics computation
+        bootstrap_seed
+            [Optional] Seed to derive seeds of bootstrap samples
+
+        """
+        model_params = clone(base_model).get_params(deep=True) if hasattr(base_model, 'get_params') \
+            else vars(base_model)
+        cell_description = {
+            'dataset': create_dataset_fingerprint(dataset, sensitive_attributes_dct),
+            'model_class': f'{type(base_model).__module__}.{type(base_model).__qualname__}',
+            'model_params': joblib.hash(model_params),
+            'n_estimators': n_estimators,
+            'bootstrap_fraction': bootstrap_fraction,
+            'sensitive_attributes_dct': repr(list(sensitive_attributes_dct.items())),
+            'model_setting': model_setting,
+            'computation_mode': computation_mode,
+            'bootstrap_seed': None if bootstrap_seed is None else int(bootstrap_seed),
+            'virny_version': __version__,
+        }
+        return hashlib.sha256(json.dumps(cell_description, sort_keys=True).encode()).hexdigest()
+
+    def _get_cell_dir(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, key: str):
+        """
+        Return cached model metrics of a cell or None if the cell is not cached.
+        """
+        metrics_path = os.path.join(self._get_cell_dir(key), METRICS_FILE_NAME)
+        try:
+            metrics_df = pd.read_pickle(metrics_path)
+            # Update the modification time of a cell to track its last use
+            os.utime(self._get_cell_dir(key))
+        except FileNotFoundError:
+            return None
+
+        return metrics_df
+
+    def get_predictions(self, key: str):
+        """
+        Return cached bootstrap predictions of a cell in the format of load_ensemble_predictions()
+         or None if they are not cached.
+        """
+        predictions_path = os.path.join(self._get_cell_dir(key), PREDICTIONS_FILE_NAME)
+        if not os.path.exists(predictions_path):
+            return None
+        return ensemble_predictions_utils.load_ensemble_predictions(predictions_path)
+
+    def put(self, key: str, metrics_df: pd.DataFrame, models_predictions=None, y_test: pd.DataFrame = None):
+        """
+        Save model metrics and bootstrap predictions (if defined) of a cell and evict old cells.
+
+        Parameters
+        ----------
+        key
+            A key of the cell created by create_key()
+        metrics_df
+            Model metrics returned by compute_model_metrics()
+        models_predictions
+            [Optional] Bootstrap predictions of the model for the test set
+        y_test
+            [Optional] Targets of the test set. Required if models_predictions is defined.
+
+        """
+        tmp_cell_dir = tempfile.mkdtemp(dir=self.cache_dir, prefix='.tmp_')
+        try:
+            metrics_df.to_pickle(os.path.join(tmp_cell_dir, METRICS_FILE_NAME))
+            if models_predictions is not None:
+                ensemble_predictions_utils.save_ensemble_predictions(os.path.join(tmp_cell_dir, PREDICTIONS_FILE_NAME),
+                                                                     models_predictions, y_test)
+            shutil.rmtree(self._get_cell_dir(key), ignore_errors=True)
+            os.replace(tmp_cell_dir, self._get_cell_dir(key))
+        except OSError:
+            # Another worker has written the same cell at the same time
+            shutil.rmtree(tmp_cell_dir, ignore_errors=True)
+
+        self.evict()
+
+    def evict(self):
+        """
+        Evict cells older than max_age_seconds and then the least recently used cells above max_size_bytes.
+        """
+        cells = []
+        for key in os.listdir(self.cache_dir):
+            cell_dir = self._get_cell_dir(key)
+            if key.startswith('.tmp_') or not os.path.isdir(cell_dir):
+                continue
+            try:
+                cell_size = sum(entry.stat().st_size for entry in os.scandir(cell_dir))
+                cells.append((os.stat(cell_dir).st_mtime, cell_size, cell_dir))
+            except FileNotFoundError:
+                continue
+
+        cells.sort()
+        now = time.time()
+        total_size = sum(cell_size for _, cell_size, _ in cells)
+        for last_use_time, cell_size, cell_dir in cells:
+            is_expired = self.max_age_seconds is not None and now - last_use_time > self.max_age_seconds
+            is_oversized = self.max_size_bytes is not None and total_size > self.max_size_bytes
+            if not is_expired and not is_oversized:
+                break
+            shutil.rmtree(cell_dir, ignore_errors=True)
+            total_size -= cell_size
+
+    def clear(self):
+        for key in os.listdir(self.cache_dir):
+            shutil.rmtree(self._get_cell_dir(key), ignore_errors=True)
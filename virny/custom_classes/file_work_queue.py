@@ -0,0 +1,324 @@
+import os
+import re
+import time
+import pickle
+import socket
+import tempfile
+import threading
+import traceback
+
+
+PENDING_DIR = 'pending'
+CLAIMED_DIR = 'claimed'
+DONE_DIR = 'done'
+FAILED_DIR = 'failed'
+RESULTS_DIR = 'results'
+OBJECTS_DIR = 'objects'
+TASK_FILE_EXTENSION = '.pkl'
+# Separates a task id and a worker id in names of claimed task files
+CLAIM_SEPARATOR = '@'
+
+
+def create_safe_file_name(name: str) -> str:
+    """
+    Return a name with only letters, digits, '_', '-', and '.' that can be used as a part of a file name.
+    """
+    return re.sub(r'[^\w.-]', '_', str(name))
+
+
+def _write_pickle_atomically(file_path: str, obj):
+    # A file is written to a temporary file in the same directory and renamed, so readers never see a partial file
+    fd, tmp_file_path = tempfile.mkstemp(dir=os.path.dirname(file_path), prefix='.tmp_')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(obj, f)
+        os.replace(tmp_file_path, file_path)
+    except BaseException:
+        os.remove(tmp_file_path)
+        raise
+
+
+def _read_pickle(file_path: str):
+    with open(file_path, 'rb') as f:
+        return pickle.load(f)
+
+
+class ClaimedTask:
+    """
+    A task claimed by a worker of FileWorkQueue.
+
+    Parameters
+    ----------
+    task_id
+        Id of the task
+    payload
+        Object saved with the task by FileWorkQueue.put()
+    claim_path
+        Path to the claimed task file
+
+    """
+    def __init__(self, task_id: str, payload, claim_path: str):
+        self.task_id = task_id
+        self.payload = payload
+        self.claim_path = claim_path
+
+
+class FileWorkQueue:
+    """
+    A work queue in a directory on a file system shared by workers, for example, an NFS mount of several machines.
+     Each task is a pickled file, and its state is a subdirectory of queue_dir: pending, claimed, done, or failed.
+     Results of tasks are saved to the results subdirectory, and large inputs shared by many tasks can be saved once
+     to the objects subdirectory by put_object().
+
+    A worker claims a task by renaming its file from pending to claimed, which is atomic, so each pending task
+     is claimed by one worker. While a task is running, the worker updates the modification time of its claimed file
+     (a heartbeat). Claims without a heartbeat for claim_timeout_seconds, for example, of crashed workers, are moved back
+     to pending by requeue_stale_claims(), which each worker calls before claiming a task. Hence, a task is executed
+     at least once, and results of the same task must be the same for all executions.
+
+    Parameters
+    ----------
+    queue_dir
+        Directory of the queue. It is created if it does not exist.
+    claim_timeout_seconds
+        [Optional] Time since the last heartbeat of a claimed task, after which the claim is stale. Default: 600.
+
+    """
+    def __init__(self, queue_dir: str, claim_timeout_seconds: float = 600):
+        self.queue_dir = queue_dir
+        self.claim_timeout_seconds = claim_timeout_seconds
+        for dir_name in (PENDING_DIR, CLAIMED_DIR, DONE_DIR, FAILED_DIR, RESULTS_DIR, OBJECTS_DIR):
+            os.makedirs(os.path.join(queue_dir, dir_name), exist_ok=True)
+
+    def _get_path(self, dir_name: str, file_name: str) -> str:
+        return os.path.join(self.queue_dir, dir_name, file_name)
+
+    def _list_task_files(self, dir_name: str) -> list:
+        return sorted(file_name for file_name in os.listdir(os.path.join(self.queue_dir, dir_name))
+                      if file_name.endswith(TASK_FILE_EXTENSION) and not file_name.startswith('.tmp_'))
+
+    def put(self, task_id: str, payload, retry_failed: bool = False) -> bool:
+        """
+        Add a task to the queue, if a task with the same id is not pending, claimed, done, or failed.
+
+        Return True if the task is added.
+
+        Parameters
+        ----------
+        task_id
+            A unique id of the task. Only letters, digits, '_', '-', and '.' are allowed.
+        payload
+            A picklable object with inputs of the task
+        retry_failed
+            [Optional] If True, a failed task with the same id is replaced by the new task. Default: False.
+
+        """
+        if task_id != create_safe_file_name(task_id):
+            raise ValueError(f'Task id {task_id} must contain only letters, digits, "_", "-", and "."')
+
+        task_file_name = task_id + TASK_FILE_EXTENSION
+        if os.path.exists(self._get_path(PENDING_DIR, task_file_name)) \
+                or os.path.exists(self._get_path(DONE_DIR, task_file_name)) \
+                or any(file_name.startswith(task_id + CLAIM_SEPARATOR) for file_name in self._list_task_files(CLAIMED_DIR)):
+            return False
+
+        failed_task_path = self._get_path(FAILED_DIR, task_file_name)
+        if os.path.exists(failed_task_path):
+            if not retry_failed:
+                return False
+            for file_path in (failed_task_path, self._get_path(FAILED_DIR, task_id + '.txt')):
+                try:
+                    os.remove(file_path)
+                except FileNotFoundError:
+                    pass
+
+        _write_pickle_atomically(self._get_path(PENDING_DIR, task_file_name), payload)
+        return True
+
+    def put_object(self, name: str, obj):
+        """
+        Save an object shared by many tasks, for example, a dataset, to load it in workers by get_object().
+        """
+        _write_pickle_atomically(self._get_path(OBJECTS_DIR, create_safe_file_name(name) + TASK_FILE_EXTENSION), obj)
+
+    def get_object(self, name: str):
+        return _read_pickle(self._get_path(OBJECTS_DIR, create_safe_file_name(name) + TASK_FILE_EXTENSION))
+
+    def claim(self, worker_id: str):
+        """
+        Claim the first pending task for a worker.
+
+        Return a ClaimedTask or None if there are no pending tasks.
+
+        Parameters
+        ----------
+        worker_id
+            Id of the worker, for example, '<hostname>-<pid>'
+
+        """
+        worker_id = create_safe_file_name(worker_id).replace(CLAIM_SEPARATOR, '_')
+        for task_file_name in self._list_task_files(PENDING_DIR):
+            task_id = task_file_name[:-len(TASK_FILE_EXTENSION)]
+            claim_path = self._get_path(CLAIMED_DIR, f'{task_id}{CLAIM_SEPARATOR}{worker_id}{TASK_FILE_EXTENSION}')
+            pending_path = self._get_path(PENDING_DIR, task_file_name)
+            try:
+                # The modification time of a claimed file is the time of its last heartbeat. It is updated
+                # before renaming, so a task that was pending for a long time is not stale right after the claim.
+                os.utime(pending_path)
+                os.rename(pending_path, claim_path)
+                payload = _read_pickle(claim_path)
+            except FileNotFoundError:
+                # The task is claimed by another worker
+                continue
+
+            return ClaimedTask(task_id, payload, claim_path)
+
+        return None
+
+    def heartbeat(self, task: ClaimedTask) -> bool:
+        """
+        Mark a claimed task as alive. Return False if the claim was requeued as stale.
+        """
+        try:
+            os.utime(task.claim_path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def complete(self, task: ClaimedTask, result) -> bool:
+        """
+        Save a result of a claimed task and move the task to done.
+
+        Return False if the claim was requeued as stale in the meantime. The result is saved anyway,
+         and the task will be executed again by another worker.
+
+        """
+        _write_pickle_atomically(self._get_path(RESULTS_DIR, task.task_id + TASK_FILE_EXTENSION), result)
+        try:
+            os.rename(task.claim_path, self._get_path(DONE_DIR, task.task_id + TASK_FILE_EXTENSION))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def fail(self, task: ClaimedTask, err: Exception):
+        """
+        Move a claimed task to failed and save the traceback of its error to failed/<task_id>.txt.
+         Failed tasks are not retried until requeue_failed() is called.
+        """
+        with open(self._get_path(FAILED_DIR, task.task_id + '.txt'), 'w') as f:
+            f.write(''.join(traceback.format_exception(type(err), err, err.__traceback__)))
+        try:
+            os.rename(task.claim_path, self._get_path(FAILED_DIR, task.task_id + TASK_FILE_EXTENSION))
+        except FileNotFoundError:
+            pass
+
+    def requeue_stale_claims(self) -> list:
+        """
+        Move claimed tasks without a heartbeat for claim_timeout_seconds back to pending.
+
+        Return ids of requeued tasks.
+        """
+        requeued_task_ids = []
+        now = time.time()
+        for claim_file_name in self._list_task_files(CLAIMED_DIR):
+            claim_path = self._get_path(CLAIMED_DIR, claim_file_name)
+            try:
+                if now - os.stat(claim_path).st_mtime <= self.claim_timeout_seconds:
+                    continue
+                task_id = claim_file_name.rsplit(CLAIM_SEPARATOR, 1)[0]
+                os.rename(claim_path, self._get_path(PENDING_DIR, task_id + TASK_FILE_EXTENSION))
+            except FileNotFoundError:
+                # The task is completed or requeued by another worker
+                continue
+            requeued_task_ids.append(task_id)
+
+        return requeued_task_ids
+
+    def requeue_failed(self) -> list:
+        """
+        Move failed tasks back to pending. Return ids of requeued tasks.
+        """
+        requeued_task_ids = []
+        for task_file_name in self._list_task_files(FAILED_DIR):
+            try:
+                os.rename(self._get_path(FAILED_DIR, task_file_name), self._get_path(PENDING_DIR, task_file_name))
+            except FileNotFoundError:
+                continue
+            requeued_task_ids.append(task_file_name[:-len(TASK_FILE_EXTENSION)])
+
+        return requeued_task_ids
+
+    def get_results(self) -> dict:
+        """
+        Return a dictionary where keys are ids of tasks with saved results, and values are these results.
+        """
+        return {task_file_name[:-len(TASK_FILE_EXTENSION)]: _read_pickle(self._get_path(RESULTS_DIR, task_file_name))
+                for task_file_name in self._list_task_files(RESULTS_DIR)}
+
+    def get_status(self) -> dict:
+        """
+        Return a dictionary with numbers of pending, claimed, done, and failed tasks.
+        """
+        return {dir_name: len(self._list_task_files(dir_name))
+                for dir_name in (PENDING_DIR, CLAIMED_DIR, DONE_DIR, FAILED_DIR)}
+
+    def run_worker(self, task_func, worker_id: str = None, max_tasks: int = None, verbose: int = 0) -> int:
+        """
+        Claim and execute pending tasks one by one until there are no pending tasks. Each task is executed
+         as task_func(payload), and its result is saved by complete(). A failed task is moved to failed
+         with its traceback, and the worker continues with other tasks.
+
+        Return the number of completed tasks.
+
+        Parameters
+        ----------
+        task_func
+            A function that takes a payload of a task and returns its picklable result
+        worker_id
+            [Optional] Id of the worker. Default: '<hostname>-<pid>'.
+        max_tasks
+            [Optional] Maximum number of tasks to execute. Default: None (no limit).
+        verbose
+            [Optional] Level of logs printing. The greater level provides more logs.
+             As for now, 0, 1, 2 levels are supported.
+
+        """
+        worker_id = f'{socket.gethostname()}-{os.getpid()}' if worker_id is None else worker_id
+        n_completed_tasks = 0
+        n_claimed_tasks = 0
+        while max_tasks is None or n_claimed_tasks < max_tasks:
+            requeued_task_ids = self.requeue_stale_claims()
+            if verbose >= 1 and len(requeued_task_ids) > 0:
+                print(f'[{worker_id}] Stale tasks are requeued: {requeued_task_ids}')
+
+            task = self.claim(worker_id)
+            if task is None:
+                break
+            n_claimed_tasks += 1
+            if verbose >= 1:
+                print(f'[{worker_id}] Run task {task.task_id}')
+
+            # Heartbeats are sent from a background thread, so long tasks are not treated as stale
+            stop_heartbeat = threading.Event()
+            heartbeat_thread = threading.Thread(target=self._send_heartbeats, args=(task, stop_heartbeat), daemon=True)
+            heartbeat_thread.start()
+            try:
+                result = task_func(task.payload)
+            except Exception as err:
+                print('#' * 20, f'ERROR with task {task.task_id}', '#' * 20)
+                traceback.print_exception(type(err), err, err.__traceback__)
+                self.fail(task, err)
+                continue
+            finally:
+                stop_heartbeat.set()
+                heartbeat_thread.join()
+
+            if self.complete(task, result):
+                n_completed_tasks += 1
+
+        return n_completed_tasks
+
+    def _send_heartbeats(self, task: ClaimedTask, stop_heartbeat: threading.Event):
+        while not stop_heartbeat.wait(self.claim_timeout_seconds / 4):
+            if not self.heartbeat(task):
+                return
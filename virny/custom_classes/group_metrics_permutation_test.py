@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+
+from virny.configs.constants import VARIANCE_METRICS
+from virny.custom_classes.metrics_composer import compose_group_metrics
+from virny.custom_classes.metrics_accumulators import encode_confusion_codes, create_groups_values_matrix, \
+    compute_groups_metrics_from_sums
+from virny.utils.protected_groups_partitioning import get_protected_group_names, get_group_positions
+
+
+# Group metrics that are ratios of dis and priv metrics; their permutation statistic is a log-ratio
+RATIO_GROUP_METRICS = ['Disparate_Impact', 'Label_Stability_Ratio', 'Std_Ratio']
+
+
+class GroupMetricsPermutationTest:
+    """
+    Two-sided permutation tests for composed group metrics (Equalized_Odds_TPR, Accuracy_Parity, Jitter_Parity etc.)
+     under the null hypothesis that the dis and priv subgroups of each sensitive attribute are exchangeable.
+
+    Dis/priv membership labels of the pooled samples are shuffled n_permutations times keeping subgroup sizes.
+     Predictions are not recomputed: each permutation is a 0/1 row of a dis membership matrix, and sums of
+     precomputed per-sample statistics for all permutations are obtained by one matrix product per chunk.
+
+    Parameters
+    ----------
+    n_permutations
+        [Optional] Number of random permutations of subgroup labels. Default: 10_000.
+    seed
+        [Optional] Seed for the random generator of permutations
+    chunk_size
+        [Optional] Number of permutations in one membership matrix to limit memory usage. Default: 1000.
+
+    """
+    def __init__(self, n_permutations: int = 10_000, seed: int = None, chunk_size: int = 1000):
+        self.n_permutations = n_permutations
+        self.seed = seed
+        self.chunk_size = chunk_size
+
+    def compute_p_values(self, y_test: pd.DataFrame, y_preds, per_sample_stats_df: pd.DataFrame,
+                         test_protected_groups: dict, sensitive_attributes_dct: dict) -> pd.DataFrame:
+        """
+        Compute observed composed group metrics and their permutation p-values.
+
+        Return a pandas dataframe with Group, Metric, Value, P_Value, and N_Permutations columns,
+         where Group is a sensitive attribute name, and N_Permutations is a number of permutations
+         with a defined metric value.
+
+        Parameters
+        ----------
+        y_test
+            Targets of the test set
+        y_preds
+            Ensemble predictions for the test set
+        per_sample_stats_df
+            Per-sample metrics for the test set created by compute_per_sample_stats()
+        test_protected_groups
+            Protected groups of the test set created by create_test_protected_groups()
+        sensitive_attributes_dct
+            A dictionary where keys are sensitive attribute names (including attributes intersections),
+             and values are privilege values for these attributes
+
+        """
+        rng = np.random.default_rng(self.seed)
+        confusion_codes = encode_confusion_codes(y_test, y_preds)
+        protected_group_names = get_protected_group_names(sensitive_attributes_dct)
+
+        rows = []
+        for priv_group, dis_group in zip(protected_group_names[::2], protected_group_names[1::2]):
+            dis_positions = get_group_positions(y_test.index, test_protected_groups, dis_group)
+            priv_positions = get_group_positions(y_test.index, test_protected_groups, priv_group)
+            pooled_positions = np.concatenate([dis_positions, priv_positions])
+            pooled_values = create_groups_values_matrix(per_sample_stats_df.iloc[pooled_positions],
+                                                        confusion_codes[pooled_positions],
+                                                        np.ones((len(pooled_positions), 1)))
+            pooled_sums = pooled_values.sum(axis=0)
+            n_dis = len(dis_positions)
+
+            observed_metrics = self._compose_metrics(pooled_values[:n_dis].sum(axis=0, keepdims=True), pooled_sums)
+
+            dis_membership = np.zeros(len(pooled_positions))
+            dis_membership[:n_dis] = 1
+            permuted_dis_sums_lst = []
+            for start in range(0, self.n_permutations, self.chunk_size):
+                n_chunk_permutations = min(self.chunk_size, self.n_permutations - start)
+                permuted_membership = rng.permuted(np.tile(dis_membership, (n_chunk_permutations, 1)), axis=1)
+                permuted_dis_sums_lst.append(permuted_membership @ pooled_values)
+            permuted_metrics = self._compose_metrics(np.vstack(permuted_dis_sums_lst), pooled_sums)
+
+            for metric, observed_value in observed_metrics.items():
+                observed_statistic = self._get_test_statistic(metric, observed_value)[0]
+                permuted_statistics = self._get_test_statistic(metric, permuted_metrics[metric])
+                permuted_statistics = permuted_statistics[np.isfinite(permuted_statistics)]
+                if np.isfinite(observed_statistic) and permuted_statistics.shape[0] > 0:
+                    # Add-one correction keeps p-values valid for a finite number of permutations
+                    n_extreme = np.sum(np.abs(permuted_statistics) >= np.abs(observed_statistic) - 1e-12)
+                    p_value = (n_extreme + 1) / (permuted_statistics.shape[0] + 1)
+                else:
+                    p_value = np.nan
+
+                rows.append({
+                    'Group': dis_group[:-len('_dis')],
+                    'Metric': metric,
+                    'Value': float(observed_value[0]),
+                    'P_Value': float(p_value),
+                    'N_Permutations': int(permuted_statistics.shape[0]),
+                })
+
+        return pd.DataFrame(rows)
+
+    @staticmethod
+    def _compose_metrics(dis_sums: np.ndarray, pooled_sums: np.ndarray) -> dict:
+        # Priv sums are pooled sums minus dis sums. Arrange columns in the layout of create_groups_values_matrix()
+        # for two groups: [dis metrics, priv metrics, dis size, priv size, dis confusion, priv confusion]
+        priv_sums = pooled_sums - dis_sums
+        n_metrics = len(VARIANCE_METRICS)
+        values_sums = np.hstack([dis_sums[:, :n_metrics], priv_sums[:, :n_metrics],
+                                 dis_sums[:, n_metrics: n_metrics + 1], priv_sums[:, n_metrics: n_metrics + 1],
+                                 dis_sums[:, n_metrics + 1:], priv_sums[:, n_metrics + 1:]])
+        groups_metrics = compute_groups_metrics_from_sums(values_sums, ['dis', 'priv'])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return compose_group_metrics(groups_metrics['dis'], groups_metrics['priv'])
+
+    @staticmethod
+    def _get_test_statistic(metric: str, values: np.ndarray) -> np.ndarray:
+        # Differences are centered at 0 under the null hypothesis, and ratios are centered at 1
+        if metric in RATIO_GROUP_METRICS:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return np.log(values)
+        return values
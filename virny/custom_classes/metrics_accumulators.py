@@ -0,0 +1,352 @@
+import numpy as np
+import pandas as pd
+
+from virny.configs.constants import VARIANCE_METRICS
+from virny.utils.common_helpers import confusion_matrix_metrics_from_counts
+from virny.utils.stability_utils import compute_per_sample_stats
+from virny.utils.protected_groups_partitioning import create_groups_membership_matrix
+
+
+class VarianceMetricsAccumulator:
+    """
+    Mergeable accumulator of sufficient statistics for overall and subgroup variance metrics.
+     Each subgroup variance metric is a mean of per-sample values, so the accumulator keeps sums of per-sample
+     metrics and numbers of samples for 'overall' and each subgroup. Accumulators updated with disjoint shards
+     of a test set and merged together give the same metrics as computing them on the whole test set
+     (up to the floating point summation order).
+
+    Parameters
+    ----------
+    group_names
+        Names of subgroups, for example, created by virny.utils.protected_groups_partitioning.get_protected_group_names().
+         The 'overall' group is always added.
+
+    """
+    def __init__(self, group_names: list):
+        self.group_names = ['overall'] + [group_name for group_name in group_names if group_name != 'overall']
+        self.statistics = {group_name: np.zeros(len(VARIANCE_METRICS)) for group_name in self.group_names}
+        self.sample_sizes = {group_name: 0 for group_name in self.group_names}
+
+    def update(self, y_test: pd.DataFrame, models_predictions, test_protected_groups: dict,
+               per_sample_stats_df: pd.DataFrame = None, groups_membership=None):
+        """
+        Add a shard of a test set to the accumulator.
+
+        Return the accumulator itself.
+
+        Parameters
+        ----------
+        y_test
+            Targets of the test shard
+        models_predictions
+            Dict of lists where key is a model index, and value is a list of model predictions for the test shard.
+             Ignored if per_sample_stats_df is defined.
+        test_protected_groups
+            Protected groups of the test shard created by create_test_protected_groups(..., allow_empty_groups=True)
+        per_sample_stats_df
+            [Optional] Per-sample metrics for the test shard created by compute_per_sample_stats()
+        groups_membership
+            [Optional] A sparse matrix with a shape (n_test_samples, n_groups) of test samples membership
+             in self.group_names except 'overall'. If defined, test_protected_groups is ignored.
+
+        """
+        if per_sample_stats_df is None:
+            per_sample_stats_df = compute_per_sample_stats(np.asarray(y_test), models_predictions, index=y_test.index)
+        if groups_membership is None:
+            groups_membership = create_groups_membership_matrix(per_sample_stats_df.index, test_protected_groups,
+                                                                self.group_names[1:])
+
+        per_sample_metrics = per_sample_stats_df[VARIANCE_METRICS].values
+        self._add_statistics('overall', per_sample_metrics.sum(axis=0), per_sample_metrics.shape[0])
+        # Only stored elements of the sparse matrix are multiplied, so NaN metrics of samples
+        # out of a group do not affect its sums
+        groups_metrics_sums = groups_membership.T.astype(float) @ per_sample_metrics
+        groups_sample_sizes = np.asarray(groups_membership.sum(axis=0)).ravel()
+        for group_idx, group_name in enumerate(self.group_names[1:]):
+            self._add_statistics(group_name, groups_metrics_sums[group_idx], int(groups_sample_sizes[group_idx]))
+
+        return self
+
+    def merge(self, other: 'VarianceMetricsAccumulator'):
+        """
+        Add statistics of another accumulator with the same groups to this accumulator.
+
+        Return the accumulator itself.
+
+        Parameters
+        ----------
+        other
+            Another VarianceMetricsAccumulator
+
+        """
+        if other.group_names != self.group_names:
+            raise ValueError('Only accumulators with the same groups can be merged')
+
+        for group_name in self.group_names:
+            self._add_statistics(group_name, other.statistics[group_name], other.sample_sizes[group_name])
+
+        return self
+
+    def finalize(self) -> dict:
+        """
+        Return a dict of dicts where key is 'overall' or a subgroup name, and value is a dict of metrics for this subgroup.
+        """
+        results = dict()
+        for group_name in self.group_names:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                group_metrics = self.statistics[group_name] / self.sample_sizes[group_name]
+            results[group_name] = dict(zip(VARIANCE_METRICS, group_metrics.tolist()))
+
+        return results
+
+    def _add_statistics(self, group_name: str, metrics_sums: np.ndarray, sample_size: int):
+        self.statistics[group_name] = self.statistics[group_name] + metrics_sums
+        self.sample_sizes[group_name] += sample_size
+
+
+class ErrorMetricsAccumulator:
+    """
+    Mergeable accumulator of sufficient statistics for overall and subgroup error metrics.
+     The accumulator keeps TN, FP, FN, TP counts for 'overall' and each subgroup. Accumulators updated with
+     disjoint shards of a test set and merged together give exactly the same metrics as computing them
+     on the whole test set.
+
+    Parameters
+    ----------
+    group_names
+        Names of subgroups, for example, created by virny.utils.protected_groups_partitioning.get_protected_group_names().
+         The 'overall' group is always added.
+
+    """
+    def __init__(self, group_names: list):
+        self.group_names = ['overall'] + [group_name for group_name in group_names if group_name != 'overall']
+        self.confusion_counts = {group_name: np.zeros(4, dtype=np.int64) for group_name in self.group_names}
+
+    @staticmethod
+    def compute_confusion_counts(y_test, y_preds):
+        """
+        Return a numpy array of TN, FP, FN, TP counts.
+
+        Parameters
+        ----------
+        y_test
+            True labels
+        y_preds
+            Predicted labels
+
+        """
+        return np.bincount(encode_confusion_codes(y_test, y_preds), minlength=4)
+
+    def update(self, y_test: pd.DataFrame, y_preds, test_protected_groups: dict):
+        """
+        Add a shard of a test set to the accumulator.
+
+        Return the accumulator itself.
+
+        Parameters
+        ----------
+        y_test
+            Targets of the test shard
+        y_preds
+            Predicted labels for the test shard
+        test_protected_groups
+            Protected groups of the test shard created by create_test_protected_groups(..., allow_empty_groups=True)
+
+        """
+        confusion_codes = encode_confusion_codes(y_test, y_preds)
+        groups_membership = create_groups_membership_matrix(y_test.index, test_protected_groups, self.group_names[1:])
+        groups_confusion_counts = compute_groups_confusion_counts(confusion_codes, groups_membership)
+
+        self.confusion_counts['overall'] += np.bincount(confusion_codes, minlength=4)
+        for group_idx, group_name in enumerate(self.group_names[1:]):
+            self.confusion_counts[group_name] += groups_confusion_counts[group_idx]
+
+        return self
+
+    def merge(self, other: 'ErrorMetricsAccumulator'):
+        """
+        Add statistics of another accumulator with the same groups to this accumulator.
+
+        Return the accumulator itself.
+
+        Parameters
+        ----------
+        other
+            Another ErrorMetricsAccumulator
+
+        """
+        if other.group_names != self.group_names:
+            raise ValueError('Only accumulators with the same groups can be merged')
+
+        for group_name in self.group_names:
+            self.confusion_counts[group_name] += other.confusion_counts[group_name]
+
+        return self
+
+    def finalize(self) -> dict:
+        """
+        Return a dict of dicts where key is 'overall' or a subgroup name, and value is a dict of metrics for this subgroup.
+        """
+        results = finalize_confusion_counts(self.group_names,
+                                            np.vstack([self.confusion_counts[group_name] for group_name in self.group_names]))
+        results['overall']['Sample_Size'] = int(self.confusion_counts['overall'].sum())
+        return results
+
+
+def encode_confusion_codes(y_test, y_preds) -> np.ndarray:
+    """
+    Encode pairs of a true and a predicted label as 2-bit codes: 0 -- TN, 1 -- FP, 2 -- FN, 3 -- TP.
+    """
+    return 2 * np.asarray(y_test, dtype=np.int64) + np.asarray(y_preds, dtype=np.int64)
+
+
+def compute_groups_confusion_counts(confusion_codes: np.ndarray, groups_membership) -> np.ndarray:
+    """
+    Compute TN, FP, FN, TP counts for all (possibly overlapping) groups with one np.bincount call
+     on (group id, confusion code) keys.
+
+    Return a 2D numpy array with a shape (n_groups, 4).
+
+    Parameters
+    ----------
+    confusion_codes
+        Confusion codes of test samples created by encode_confusion_codes()
+    groups_membership
+        A sparse matrix with a shape (n_test_samples, n_groups) created by create_groups_membership_matrix()
+
+    """
+    n_groups = groups_membership.shape[1]
+    membership = groups_membership.tocoo()
+    keys = membership.col.astype(np.int64) * 4 + confusion_codes[membership.row]
+    return np.bincount(keys, minlength=n_groups * 4).reshape(n_groups, 4)
+
+
+def finalize_confusion_counts(group_names: list, confusion_counts: np.ndarray) -> dict:
+    """
+    Derive error metrics for all groups at once from a 2D array of TN, FP, FN, TP counts with a shape (n_groups, 4).
+
+    Return a dict of dicts where key is a group name, and value is a dict of metrics for this group.
+
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        metrics = confusion_matrix_metrics_from_counts(*confusion_counts.T.astype(float))
+
+    return {
+        group_name: {metric: float(values[group_idx]) for metric, values in metrics.items()}
+        for group_idx, group_name in enumerate(group_names)
+    }
+
+
+def create_groups_values_matrix(per_sample_stats_df: pd.DataFrame, confusion_codes: np.ndarray,
+                                groups_membership: np.ndarray) -> np.ndarray:
+    """
+    Create a matrix of per-sample values, which column sums (plain or weighted) are sufficient statistics
+     of variance and error metrics for each group: sums of variance metrics, sample sizes, and confusion counts.
+
+    Return a 2D numpy array with a shape (n_test_samples, n_groups * (len(VARIANCE_METRICS) + 5)).
+     Use compute_groups_metrics_from_sums() to get metrics from its column sums.
+
+    Parameters
+    ----------
+    per_sample_stats_df
+        Per-sample metrics for the test set created by compute_per_sample_stats()
+    confusion_codes
+        Confusion codes of test samples created by encode_confusion_codes()
+    groups_membership
+        A dense 0/1 matrix with a shape (n_test_samples, n_groups) of test samples membership in groups
+
+    """
+    n_samples = per_sample_stats_df.shape[0]
+    groups_membership = np.asarray(groups_membership, dtype=float)
+    per_sample_metrics = per_sample_stats_df[VARIANCE_METRICS].values
+    confusion_one_hot = np.eye(4)[confusion_codes]
+
+    return np.hstack([
+        (groups_membership[:, :, np.newaxis] * per_sample_metrics[:, np.newaxis, :]).reshape(n_samples, -1),
+        groups_membership,
+        (groups_membership[:, :, np.newaxis] * confusion_one_hot[:, np.newaxis, :]).reshape(n_samples, -1),
+    ])
+
+
+def compute_groups_metrics_from_sums(values_sums: np.ndarray, group_names: list) -> dict:
+    """
+    Compute variance and error metrics from column sums of create_groups_values_matrix() in a vectorized way.
+
+    Return a dict of dicts where key is a group name, and value is a dict of metric names and 1D numpy arrays
+     of metrics for each row of values_sums.
+
+    Parameters
+    ----------
+    values_sums
+        2D numpy array of column sums with a shape (n_rows, n_groups * (len(VARIANCE_METRICS) + 5)),
+         for example, one row per bootstrap resample or permutation
+    group_names
+        Names of groups in the same order as in groups_membership of create_groups_values_matrix()
+
+    """
+    n_groups, n_metrics = len(group_names), len(VARIANCE_METRICS)
+    metrics_sums = values_sums[:, :n_groups * n_metrics].reshape(-1, n_groups, n_metrics)
+    sample_sizes = values_sums[:, n_groups * n_metrics: n_groups * (n_metrics + 1)]
+    confusion_counts = values_sums[:, n_groups * (n_metrics + 1):].reshape(-1, n_groups, 4)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variance_metrics = metrics_sums / sample_sizes[:, :, np.newaxis]
+        error_metrics = confusion_matrix_metrics_from_counts(*np.moveaxis(confusion_counts, 2, 0))
+
+    groups_metrics = dict()
+    for group_idx, group_name in enumerate(group_names):
+        group_metrics = {metric: variance_metrics[:, group_idx, metric_idx]
+                         for metric_idx, metric in enumerate(VARIANCE_METRICS)}
+        group_metrics.update({metric: values[:, group_idx] for metric, values in error_metrics.items()})
+        groups_metrics[group_name] = group_metrics
+
+    return groups_metrics
+
+
+def compute_per_category_metrics(per_sample_stats_df: pd.DataFrame, confusion_codes: np.ndarray,
+                                 category_values, min_support: int = 30) -> pd.DataFrame:
+    """
+    Compute variance and error metrics for every category of a (high-cardinality) attribute, like a state
+     or an occupation code. The attribute is factorized once, and sums of variance metrics, sample sizes,
+     and confusion counts of all categories are computed with np.bincount over category codes,
+     so the cost is O(n_test_samples + n_categories) instead of one partition per category.
+
+    Return a pandas dataframe with one row per category sorted by Sample_Size in a descending order.
+     Columns are Category, Sample_Size, Low_Support (True if Sample_Size is below min_support), and metrics.
+     Test samples with a missing category are skipped.
+
+    Parameters
+    ----------
+    per_sample_stats_df
+        Per-sample metrics for the test set created by compute_per_sample_stats()
+    confusion_codes
+        Confusion codes of test samples created by encode_confusion_codes()
+    category_values
+        1D array-like of attribute values for test samples in the same order as per_sample_stats_df
+    min_support
+        [Optional] Minimum number of test samples in a category to not flag its metrics as unreliable. Default: 30.
+
+    """
+    category_codes, categories = pd.factorize(pd.Series(np.asarray(category_values)), sort=True)
+    is_known = category_codes >= 0
+    category_codes = category_codes[is_known]
+    n_categories, n_metrics = len(categories), len(VARIANCE_METRICS)
+
+    per_sample_metrics = per_sample_stats_df[VARIANCE_METRICS].values[is_known]
+    metrics_sums = np.column_stack([np.bincount(category_codes, weights=per_sample_metrics[:, metric_idx],
+                                                minlength=n_categories)
+                                    for metric_idx in range(n_metrics)])
+    sample_sizes = np.bincount(category_codes, minlength=n_categories)
+    confusion_counts = np.bincount(category_codes * 4 + np.asarray(confusion_codes)[is_known],
+                                   minlength=n_categories * 4).reshape(n_categories, 4)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        per_category_metrics_df = pd.DataFrame(metrics_sums / sample_sizes[:, np.newaxis], columns=VARIANCE_METRICS)
+        error_metrics = confusion_matrix_metrics_from_counts(*confusion_counts.T.astype(float))
+    for metric, values in error_metrics.items():
+        per_category_metrics_df[metric] = values
+    per_category_metrics_df.insert(0, 'Category', categories)
+    per_category_metrics_df.insert(1, 'Sample_Size', sample_sizes)
+    per_category_metrics_df.insert(2, 'Low_Support', sample_sizes < min_support)
+
+    return per_category_metrics_df.sort_values('Sample_Size', ascending=False, kind='stable').reset_index(drop=True)
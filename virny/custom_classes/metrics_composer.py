@@ -45,21 +45,7 @@ class MetricsComposer:
                 dis_group = sensitive_attr + '_dis'
                 priv_group = sensitive_attr + '_priv'
 
-                groups_metrics_dct[sensitive_attr] = {
-                    # Group fairness metrics
-                    'Equalized_Odds_TPR': cfm[dis_group]['TPR'] - cfm[priv_group]['TPR'],
-                    'Equalized_Odds_FPR': cfm[dis_group]['FPR'] - cfm[priv_group]['FPR'],
-                    'Equalized_Odds_FNR': cfm[dis_group]['FNR'] - cfm[priv_group]['FNR'],
-                    'Disparate_Impact': cfm[dis_group]['Positive-Rate'] / cfm[priv_group]['Positive-Rate'],
-                    'Statistical_Parity_Difference': cfm[dis_group]['Positive-Rate'] - cfm[priv_group]['Positive-Rate'],
-                    'Accuracy_Parity': cfm[dis_group]['Accuracy'] - cfm[priv_group]['Accuracy'],
-                    # Group stability metrics
-                    'Label_Stability_Ratio': cfm[dis_group]['Label_Stability'] / cfm[priv_group]['Label_Stability'],
-                    'IQR_Parity': cfm[dis_group]['IQR'] - cfm[priv_group]['IQR'],
-                    'Std_Parity': cfm[dis_group]['Std'] - cfm[priv_group]['Std'],
-                    'Std_Ratio': cfm[dis_group]['Std'] / cfm[priv_group]['Std'],
-                    'Jitter_Parity': cfm[dis_group]['Jitter'] - cfm[priv_group]['Jitter'],
-                }
+                groups_metrics_dct[sensitive_attr] = compose_group_metrics(cfm[dis_group], cfm[priv_group])
 
             model_composed_metrics_df = pd.DataFrame(groups_metrics_dct).reset_index()
             model_composed_metrics_df = model_composed_metrics_df.rename(columns={"index": "Metric"})
@@ -68,3 +54,55 @@ class MetricsComposer:
 
         models_composed_metrics_df = models_composed_metrics_df.reset_index(drop=True)
         return models_composed_metrics_df
+
+
+def compose_group_metrics(dis_group_metrics, priv_group_metrics) -> dict:
+    """
+    Combine metrics of the disadvantaged and the privileged subgroups into group fairness and stability metrics.
+
+    Return a dictionary where keys are group metric names, and values are group metrics.
+
+    Parameters
+    ----------
+    dis_group_metrics
+        Metrics of the disadvantaged subgroup, a dictionary or a pandas series where keys are metric names.
+         Values can be scalars or numpy arrays, for example, metrics for bootstrap resamples of a test set.
+    priv_group_metrics
+        Metrics of the privileged subgroup in the same format
+
+    """
+    return {
+        **compose_group_fairness_metrics(dis_group_metrics, priv_group_metrics),
+        **compose_group_stability_metrics(dis_group_metrics, priv_group_metrics),
+    }
+
+
+def compose_group_fairness_metrics(dis_group_metrics, priv_group_metrics) -> dict:
+    """
+    Combine error metrics of the disadvantaged and the privileged subgroups into group fairness metrics.
+     Arguments are the same as in compose_group_metrics(), but only error metrics are required.
+    """
+    dis, priv = dis_group_metrics, priv_group_metrics
+    return {
+        'Equalized_Odds_TPR': dis['TPR'] - priv['TPR'],
+        'Equalized_Odds_FPR': dis['FPR'] - priv['FPR'],
+        'Equalized_Odds_FNR': dis['FNR'] - priv['FNR'],
+        'Disparate_Impact': dis['Positive-Rate'] / priv['Positive-Rate'],
+        'Statistical_Parity_Difference': dis['Positive-Rate'] - priv['Positive-Rate'],
+        'Accuracy_Parity': dis['Accuracy'] - priv['Accuracy'],
+    }
+
+
+def compose_group_stability_metrics(dis_group_metrics, priv_group_metrics) -> dict:
+    """
+    Combine variance metrics of the disadvantaged and the privileged subgroups into group stability metrics.
+     Arguments are the same as in compose_group_metrics(), but only variance metrics are required.
+    """
+    dis, priv = dis_group_metrics, priv_group_metrics
+    return {
+        'Label_Stability_Ratio': dis['Label_Stability'] / priv['Label_Stability'],
+        'IQR_Parity': dis['IQR'] - priv['IQR'],
+        'Std_Parity': dis['Std'] - priv['Std'],
+        'Std_Ratio': dis['Std'] / priv['Std'],
+        'Jitter_Parity': dis['Jitter'] - priv['Jitter'],
+    }
@@ -0,0 +1,204 @@
+import numpy as np
+import pandas as pd
+
+from virny.utils.stability_utils import compute_per_sample_stats, get_predictions_matrix
+
+
+# Odd scales keep the 0.5 threshold between two quantization levels, so predicted labels are preserved
+QUANTIZATION_SCALES = {
+    'float16': None,
+    'uint8': 255,
+    'uint16': 65535,
+}
+
+
+class QuantizedPredictions:
+    """
+    Compact storage of bootstrap predictions with a shape (n_estimators, n_test_samples) as float16
+     or uint8/uint16 fixed-point values. Labels predicted by each estimator (int(x<0.5)) are preserved exactly,
+     and values are dequantized to float64 only chunk by chunk, when metrics are computed.
+
+    Absolute errors of the stored probabilities are at most 1/510 for 'uint8', 1/131070 for 'uint16',
+     and 2^-12 for 'float16'.
+
+    The object can be used instead of a dictionary of models predictions: predictions[model_idx] returns
+     dequantized predictions of one estimator, and keys() returns estimator indexes.
+
+    Parameters
+    ----------
+    values
+        2D numpy array with a shape (n_estimators, n_test_samples) of quantized values
+    predictions_dtype
+        A storage type, one of QUANTIZATION_SCALES keys: 'float16', 'uint8', 'uint16'
+
+    """
+    def __init__(self, values: np.ndarray, predictions_dtype: str):
+        if predictions_dtype not in QUANTIZATION_SCALES:
+            raise ValueError(f'predictions_dtype must be one of {list(QUANTIZATION_SCALES.keys())}')
+        if values.dtype != np.dtype(predictions_dtype) or values.ndim != 2:
+            raise ValueError(f'values must be a 2D numpy array of {predictions_dtype} type')
+
+        self.values = values
+        self.predictions_dtype = predictions_dtype
+        self.scale = QUANTIZATION_SCALES[predictions_dtype]
+
+    @classmethod
+    def empty(cls, n_estimators: int, n_samples: int, predictions_dtype: str):
+        """
+        Create storage to be filled with predictions of each estimator by predictions[model_idx] = model_predictions.
+        """
+        return cls(np.zeros((n_estimators, n_samples), dtype=predictions_dtype), predictions_dtype)
+
+    @classmethod
+    def from_predictions(cls, uq_results, predictions_dtype: str):
+        """
+        Quantize bootstrap predictions.
+
+        Parameters
+        ----------
+        uq_results
+            2D array of prediction proba for the zero value label by each model or
+             a dictionary where keys are model indexes and values are model predictions
+        predictions_dtype
+            A storage type, one of QUANTIZATION_SCALES keys: 'float16', 'uint8', 'uint16'
+
+        """
+        if predictions_dtype not in QUANTIZATION_SCALES:
+            raise ValueError(f'predictions_dtype must be one of {list(QUANTIZATION_SCALES.keys())}')
+        return cls(quantize(get_predictions_matrix(uq_results), predictions_dtype), predictions_dtype)
+
+    @classmethod
+    def load(cls, file_path: str, mmap_mode: str = None):
+        """
+        Load quantized predictions saved by save().
+
+        Parameters
+        ----------
+        file_path
+            Path to a .npy or .npz file
+        mmap_mode
+            [Optional] Memory-map mode for .npy files, for example, 'r' to read chunks of a large matrix from disk
+             without loading it in memory
+
+        """
+        if str(file_path).endswith('.npz'):
+            with np.load(file_path) as data:
+                return cls(data['values'], str(data['predictions_dtype']))
+
+        values = np.load(file_path, mmap_mode=mmap_mode)
+        return cls(values, values.dtype.name)
+
+    @property
+    def n_estimators(self):
+        return self.values.shape[0]
+
+    @property
+    def n_samples(self):
+        return self.values.shape[1]
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes
+
+    def keys(self):
+        return range(self.n_estimators)
+
+    def __len__(self):
+        return self.n_estimators
+
+    def __getitem__(self, model_idx: int):
+        return dequantize(self.values[model_idx], self.predictions_dtype)
+
+    def __setitem__(self, model_idx: int, model_predictions):
+        self.values[model_idx] = quantize(np.asarray(model_predictions, dtype=float), self.predictions_dtype)
+
+    def to_numpy(self, start: int = 0, end: int = None):
+        """
+        Return dequantized float64 predictions for test samples from start to end.
+        """
+        return dequantize(self.values[:, start:end], self.predictions_dtype)
+
+    def append(self, uq_results):
+        """
+        Return new QuantizedPredictions with predictions for new test samples added after the existing ones.
+
+        Parameters
+        ----------
+        uq_results
+            Predictions for the new test samples in any format accepted by from_predictions()
+
+        """
+        new_values = quantize(get_predictions_matrix(uq_results), self.predictions_dtype)
+        return QuantizedPredictions(np.hstack([self.values, new_values]), self.predictions_dtype)
+
+    def compute_per_sample_stats(self, y_test=None, index=None, chunk_size: int = 10_000) -> pd.DataFrame:
+        """
+        Compute per-sample variance metrics like compute_per_sample_stats(), dequantizing only chunk_size
+         test samples at a time.
+
+        Parameters
+        ----------
+        y_test
+            [Optional] True labels. If None, label-based metrics are filled with NaN.
+        index
+            [Optional] Index for the result dataframe, for example, y_test.index
+        chunk_size
+            [Optional] Number of test samples to dequantize at a time. Default: 10_000.
+
+        """
+        y_test = None if y_test is None else np.asarray(y_test)
+        chunks_stats = []
+        for start in range(0, self.n_samples, chunk_size):
+            end = min(start + chunk_size, self.n_samples)
+            chunks_stats.append(compute_per_sample_stats(None if y_test is None else y_test[start:end],
+                                                         self.to_numpy(start, end)))
+
+        per_sample_stats_df = pd.concat(chunks_stats, ignore_index=True)
+        if index is not None:
+            per_sample_stats_df.index = index
+        return per_sample_stats_df
+
+    def save(self, file_path: str):
+        """
+        Save quantized predictions to a .npy file (only values, a storage type is restored from the array type)
+         or to a compressed .npz file.
+        """
+        if str(file_path).endswith('.npz'):
+            np.savez_compressed(file_path, values=self.values, predictions_dtype=self.predictions_dtype)
+        else:
+            np.save(file_path, self.values)
+
+
+def quantize(predictions: np.ndarray, predictions_dtype: str) -> np.ndarray:
+    """
+    Quantize probabilities of the zero value label keeping labels int(x<0.5) unchanged.
+
+    Parameters
+    ----------
+    predictions
+        Numpy array of probabilities in [0, 1]
+    predictions_dtype
+        A storage type, one of QUANTIZATION_SCALES keys: 'float16', 'uint8', 'uint16'
+
+    """
+    scale = QUANTIZATION_SCALES[predictions_dtype]
+    predictions = np.clip(predictions, 0.0, 1.0)
+    if scale is not None:
+        # Values below 0.5 are below scale / 2 = k + 0.5 and are rounded to at most k, that is below 0.5 again
+        return np.rint(predictions * scale).astype(predictions_dtype)
+
+    quantized = predictions.astype(np.float16)
+    # Values just below 0.5 can be rounded to 0.5 that changes their label
+    flipped = (predictions < 0.5) & (quantized >= 0.5)
+    quantized[flipped] = np.nextafter(np.float16(0.5), np.float16(0))
+    return quantized
+
+
+def dequantize(values: np.ndarray, predictions_dtype: str) -> np.ndarray:
+    """
+    Convert quantized values back to float64 probabilities.
+    """
+    scale = QUANTIZATION_SCALES[predictions_dtype]
+    if scale is None:
+        return values.astype(float)
+    return values.astype(float) / scale
@@ -0,0 +1,235 @@
+import numpy as np
+import pandas as pd
+
+from virny.configs.constants import VARIANCE_METRICS, LABEL_BASED_VARIANCE_METRICS, ERROR_METRICS
+from virny.utils.common_helpers import confusion_matrix_metrics_from_counts
+from virny.utils.protected_groups_partitioning import create_protected_groups_masks, get_protected_group_names
+from virny.utils.stability_utils import compute_per_sample_stats, compute_label_based_per_sample_stats
+
+
+LABEL_FREE_VARIANCE_METRICS = [metric for metric in VARIANCE_METRICS if metric not in LABEL_BASED_VARIANCE_METRICS]
+
+
+class SlidingWindowSubgroupMetrics:
+    """
+    State of subgroup variance and error metrics over a sliding window of the most recent prediction events.
+     Per-group sufficient statistics (sums of per-sample metrics and confusion matrix counts) are updated
+     incrementally on each insert, eviction and delayed label, so reading current metrics costs O(n_groups).
+
+    Parameters
+    ----------
+    sensitive_attributes_dct
+        A dictionary where keys are sensitive attribute names (including attributes intersections),
+         and values are disadvantaged values for these attributes
+    window_size
+        Maximum number of the most recent samples to keep in the window
+
+    """
+    def __init__(self, sensitive_attributes_dct: dict, window_size: int = 10_000):
+        if not isinstance(window_size, int) or window_size <= 0:
+            raise ValueError('window_size must be a positive integer')
+
+        self.sensitive_attributes_dct = sensitive_attributes_dct
+        self.window_size = window_size
+        self.group_names = ['overall'] + get_protected_group_names(sensitive_attributes_dct)
+
+        n_groups = len(self.group_names)
+        # Ring buffers with per-sample statistics
+        self._sample_ids = np.empty(window_size, dtype=object)
+        self._filled = np.zeros(window_size, dtype=bool)
+        self._membership = np.zeros((window_size, n_groups), dtype=bool)
+        self._label_free_stats = np.zeros((window_size, len(LABEL_FREE_VARIANCE_METRICS)))
+        self._means = np.zeros(window_size)
+        self._positive_votes_rates = np.zeros(window_size)
+        self._y_preds = np.zeros(window_size, dtype=int)
+        self._labelled = np.zeros(window_size, dtype=bool)
+        self._label_based_stats = np.zeros((window_size, len(LABEL_BASED_VARIANCE_METRICS)))
+        self._confusion_codes = np.zeros(window_size, dtype=int)
+        self._slot_by_sample_id = dict()
+        self._next_slot = 0
+        self._evictions_since_rebase = 0
+
+        # Per-group sufficient statistics
+        self._sample_counts = np.zeros(n_groups)
+        self._label_free_sums = np.zeros((n_groups, len(LABEL_FREE_VARIANCE_METRICS)))
+        self._labelled_counts = np.zeros(n_groups)
+        self._label_based_sums = np.zeros((n_groups, len(LABEL_BASED_VARIANCE_METRICS)))
+        self._confusion_counts = np.zeros((n_groups, 4))  # TN, FP, FN, TP
+
+    def __len__(self):
+        return int(self._filled.sum())
+
+    def add_predictions(self, sample_ids: list, sensitive_attrs_df: pd.DataFrame, models_probabilities,
+                        y_true=None):
+        """
+        Add a batch of prediction events to the window evicting the oldest samples if the window is full.
+
+        Parameters
+        ----------
+        sample_ids
+            Unique ids of the samples, used to attach delayed labels
+        sensitive_attrs_df
+            A dataframe with sensitive attribute columns for the samples
+        models_probabilities
+            2D array with a shape (n_samples, n_estimators) of probabilities of the zero value label
+             predicted by each ensemble member
+        y_true
+            [Optional] True labels of the samples if they are already known
+
+        """
+        models_probabilities = np.asarray(models_probabilities, dtype=float)
+        if models_probabilities.ndim != 2 or models_probabilities.shape[0] != len(sample_ids) \
+                or sensitive_attrs_df.shape[0] != len(sample_ids):
+            raise ValueError('sample_ids, sensitive_attrs_df and models_probabilities must describe the same samples')
+        if y_true is not None:
+            y_true = self._validate_labels(y_true, len(sample_ids))
+
+        # Only the last window_size samples of the batch can stay in the window
+        first_idx = max(0, len(sample_ids) - self.window_size)
+        sample_ids = list(sample_ids)[first_idx:]
+        sensitive_attrs_df = sensitive_attrs_df.iloc[first_idx:]
+        models_probabilities = models_probabilities[first_idx:]
+        if y_true is not None:
+            y_true = y_true[first_idx:]
+        if len(sample_ids) == 0:
+            return
+
+        per_sample_stats_df = compute_per_sample_stats(None, models_probabilities.T)
+        groups_masks = create_protected_groups_masks(sensitive_attrs_df, self.sensitive_attributes_dct)
+        membership = np.column_stack([np.ones(len(sample_ids), dtype=bool)] +
+                                     [groups_masks[group_name] for group_name in self.group_names[1:]])
+
+        slots = (self._next_slot + np.arange(len(sample_ids))) % self.window_size
+        self._next_slot = int((slots[-1] + 1) % self.window_size)
+        self._evict(slots)
+
+        self._sample_ids[slots] = sample_ids
+        self._filled[slots] = True
+        self._membership[slots] = membership
+        self._label_free_stats[slots] = per_sample_stats_df[LABEL_FREE_VARIANCE_METRICS].values
+        self._means[slots] = per_sample_stats_df['Mean'].values
+        self._positive_votes_rates[slots] = per_sample_stats_df['Positive_Votes_Rate'].values
+        self._y_preds[slots] = (self._means[slots] < 0.5).astype(int)
+        self._slot_by_sample_id.update(zip(sample_ids, slots.tolist()))
+
+        self._sample_counts += membership.sum(axis=0)
+        self._label_free_sums += membership.T.astype(float) @ self._label_free_stats[slots]
+        if y_true is not None:
+            self._set_labels(slots, y_true)
+
+    def add_labels(self, sample_ids: list, y_true):
+        """
+        Attach delayed true labels to samples in the window. Labels of samples that were already evicted are ignored.
+
+        Parameters
+        ----------
+        sample_ids
+            Ids of the samples used in add_predictions()
+        y_true
+            True labels of the samples
+
+        """
+        y_true = self._validate_labels(y_true, len(sample_ids))
+        slots, labels = [], []
+        for sample_id, label in zip(sample_ids, y_true):
+            slot = self._slot_by_sample_id.get(sample_id)
+            if slot is not None:
+                slots.append(slot)
+                labels.append(label)
+        if len(slots) == 0:
+            return
+
+        # Keep only the last label of a sample that appears several times in the batch
+        slots, labels = np.array(slots), np.array(labels)
+        _, last_positions = np.unique(slots[::-1], return_index=True)
+        last_positions = np.sort(len(slots) - 1 - last_positions)
+        self._set_labels(slots[last_positions], labels[last_positions])
+
+    @staticmethod
+    def _validate_labels(y_true, n_samples: int) -> np.ndarray:
+        y_true = np.asarray(y_true)
+        if y_true.ndim != 1 or y_true.shape[0] != n_samples:
+            raise ValueError('y_true must contain one label for each sample')
+        if not np.isin(y_true, (0, 1)).all():
+            raise ValueError('y_true must contain only binary labels 0 and 1')
+        return y_true.astype(int)
+
+    def get_metrics(self) -> dict:
+        """
+        Return a dictionary where keys are 'overall' and subgroup names, and values are dictionaries of
+         current variance and error metrics for the samples in the window.
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            label_free_means = self._label_free_sums / self._sample_counts[:, None]
+            label_based_means = self._label_based_sums / self._labelled_counts[:, None]
+            TN, FP, FN, TP = self._confusion_counts.T
+            error_metrics = confusion_matrix_metrics_from_counts(TN, FP, FN, TP)
+
+        results = dict()
+        for group_idx, group_name in enumerate(self.group_names):
+            group_metrics = dict()
+            for metric_idx, metric in enumerate(LABEL_FREE_VARIANCE_METRICS):
+                group_metrics[metric] = float(label_free_means[group_idx, metric_idx])
+            for metric_idx, metric in enumerate(LABEL_BASED_VARIANCE_METRICS):
+                group_metrics[metric] = float(label_based_means[group_idx, metric_idx])
+            for metric in ERROR_METRICS:
+                group_metrics[metric] = float(error_metrics[metric][group_idx])
+            group_metrics['Sample_Size'] = int(self._sample_counts[group_idx])
+            group_metrics['Labelled_Sample_Size'] = int(self._labelled_counts[group_idx])
+            results[group_name] = group_metrics
+
+        return results
+
+    def _set_labels(self, slots: np.ndarray, y_true: np.ndarray):
+        # Statistics are computed before any state is changed, so a failure leaves the window consistent
+        statistical_bias_lst, per_sample_accuracy_lst = \
+            compute_label_based_per_sample_stats(y_true, self._means[slots], self._positive_votes_rates[slots])
+        label_based_stats = np.column_stack([statistical_bias_lst, per_sample_accuracy_lst])
+        confusion_codes = 2 * y_true.astype(int) + self._y_preds[slots]
+
+        # Remove previous labels of the slots, if any, to make relabelling idempotent
+        self._remove_label_contributions(slots[self._labelled[slots]])
+        self._labelled[slots] = True
+        self._label_based_stats[slots] = label_based_stats
+        self._confusion_codes[slots] = confusion_codes
+
+        membership = self._membership[slots].T.astype(float)
+        self._labelled_counts += membership.sum(axis=1)
+        self._label_based_sums += membership @ self._label_based_stats[slots]
+        self._confusion_counts += membership @ np.eye(4)[self._confusion_codes[slots]]
+
+    def _remove_label_contributions(self, slots: np.ndarray):
+        if len(slots) == 0:
+            return
+        membership = self._membership[slots].T.astype(float)
+        self._labelled_counts -= membership.sum(axis=1)
+        self._label_based_sums -= membership @ self._label_based_stats[slots]
+        self._confusion_counts -= membership @ np.eye(4)[self._confusion_codes[slots]]
+        self._labelled[slots] = False
+
+    def _evict(self, slots: np.ndarray):
+        evicted_slots = slots[self._filled[slots]]
+        if len(evicted_slots) == 0:
+            return
+
+        self._remove_label_contributions(evicted_slots[self._labelled[evicted_slots]])
+        membership = self._membership[evicted_slots].T.astype(float)
+        self._sample_counts -= membership.sum(axis=1)
+        self._label_free_sums -= membership @ self._label_free_stats[evicted_slots]
+        for slot, sample_id in zip(evicted_slots.tolist(), self._sample_ids[evicted_slots]):
+            if self._slot_by_sample_id.get(sample_id) == slot:
+                del self._slot_by_sample_id[sample_id]
+        self._filled[evicted_slots] = False
+
+        # Recompute float sums from the buffers once per window_size evictions
+        # to avoid accumulation of rounding errors from repeated subtractions
+        self._evictions_since_rebase += len(evicted_slots)
+        if self._evictions_since_rebase >= self.window_size:
+            self._rebase_sums()
+
+    def _rebase_sums(self):
+        filled_membership = (self._membership & self._filled[:, None]).T.astype(float)
+        labelled_membership = (self._membership & self._labelled[:, None]).T.astype(float)
+        self._label_free_sums = filled_membership @ self._label_free_stats
+        self._label_based_sums = labelled_membership @ self._label_based_stats
+        self._evictions_since_rebase = 0
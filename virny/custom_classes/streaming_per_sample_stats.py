@@ -0,0 +1,157 @@
+import numpy as np
+import pandas as pd
+
+from virny.metrics.stability_metrics import compute_entropy_from_predicted_probability
+from virny.utils.stability_utils import compute_label_based_per_sample_stats
+from virny.utils.packed_labels_utils import compute_labels_std_mean_iqr
+
+
+# Number of test samples, which histograms are processed at once to approximate IQR
+IQR_CHUNK_SIZE = 4096
+
+
+class StreamingPerSampleStats:
+    """
+    Per-sample running statistics of bootstrap predictions that are updated with predictions of one estimator
+     at a time, so the (n_estimators, n_test_samples) matrix of predictions is never kept in memory.
+     Memory is O(n_test_samples * n_iqr_bins) instead of O(n_test_samples * n_estimators).
+
+    The following statistics are kept for each test sample:
+
+    * a number of estimators that predicted the label 1 -- gives exact Jitter, Label_Stability and Per_Sample_Accuracy;
+
+    * Welford running mean and sum of squared deviations -- give Mean, Std, Statistical_Bias and Overall_Uncertainty
+      (equal to the batch computation up to the floating point summation order);
+
+    * a sum of estimators entropies -- gives exact Aleatoric_Uncertainty;
+
+    * a fixed-bin histogram of predicted probabilities on [0, 1] -- gives approximate IQR. Each order statistic
+      is approximated by the midpoint of its bin, so the error of each quartile is at most 1 / (2 * n_iqr_bins),
+      and the absolute error of IQR is at most 1 / n_iqr_bins (0.01 for the default 100 bins). Bin counters
+      are uint8 and are widened to uint16 and uint32 only when the number of estimators requires it.
+
+    Parameters
+    ----------
+    n_samples
+        Number of test samples
+    n_iqr_bins
+        [Optional] Number of histogram bins used to approximate IQR. Default: 100.
+
+    """
+    def __init__(self, n_samples: int, n_iqr_bins: int = 100):
+        self.n_samples = n_samples
+        self.n_iqr_bins = n_iqr_bins
+        self.n_estimators = 0
+
+        self.positive_votes = np.zeros(n_samples, dtype=np.int64)
+        self.means = np.zeros(n_samples)
+        self.squared_deviations_sums = np.zeros(n_samples)
+        self.entropy_sums = np.zeros(n_samples)
+        self.histograms = np.zeros((n_samples, n_iqr_bins), dtype=np.uint8)
+
+    def update(self, model_predictions):
+        """
+        Fold predictions of one estimator into the running statistics.
+
+        Parameters
+        ----------
+        model_predictions
+            1D array of probabilities of the zero value label predicted by one estimator for each test sample
+
+        """
+        model_predictions = np.asarray(model_predictions, dtype=float)
+        if model_predictions.shape != (self.n_samples,):
+            raise ValueError(f'model_predictions must be a 1D array with {self.n_samples} values')
+
+        self.n_estimators += 1
+        # Welford update of the mean and the sum of squared deviations
+        deltas = model_predictions - self.means
+        self.means += deltas / self.n_estimators
+        self.squared_deviations_sums += deltas * (model_predictions - self.means)
+
+        # int(x<0.5) gives the label 1, since predictions are probabilities of the zero value label
+        self.positive_votes += model_predictions < 0.5
+        self.entropy_sums += compute_entropy_from_predicted_probability(model_predictions)
+
+        # A bin count and a cumulative count of a sample are at most n_estimators
+        if self.n_estimators > np.iinfo(self.histograms.dtype).max:
+            self.histograms = self.histograms.astype(np.uint16 if self.histograms.dtype == np.uint8 else np.uint32)
+        bins = np.clip((model_predictions * self.n_iqr_bins).astype(int), 0, self.n_iqr_bins - 1)
+        self.histograms[np.arange(self.n_samples), bins] += 1
+
+    def get_per_sample_stats(self, y_test=None, index=None) -> pd.DataFrame:
+        """
+        Return a pandas dataframe of per-sample variance metrics with the same columns as compute_per_sample_stats().
+
+        Parameters
+        ----------
+        y_test
+            [Optional] True labels. If None, label-based metrics (Statistical_Bias, Per_Sample_Accuracy) are filled with NaN.
+        index
+            [Optional] Index for the result dataframe, for example, y_test.index
+
+        """
+        n_estimators = self.n_estimators
+        if n_estimators < 2:
+            raise ValueError('At least two estimators are required to compute variance metrics')
+
+        stds_lst = np.sqrt(self.squared_deviations_sums / (n_estimators - 1))
+        iqr_lst = self._approximate_iqr()
+        positive_votes_rate_lst = self.positive_votes / n_estimators
+        label_stability_lst = np.abs(2 * self.positive_votes - n_estimators) / n_estimators
+        jitter_lst = self.positive_votes * (n_estimators - self.positive_votes) / (n_estimators * (n_estimators - 1) * 0.5)
+
+        if y_test is None:
+            statistical_bias_lst = np.full(self.n_samples, np.nan)
+            per_sample_accuracy_lst = np.full(self.n_samples, np.nan)
+        else:
+            statistical_bias_lst, per_sample_accuracy_lst = \
+                compute_label_based_per_sample_stats(y_test, self.means, positive_votes_rate_lst)
+
+        return pd.DataFrame({
+            'Jitter': jitter_lst,
+            'Mean': self.means.copy(),
+            'Std': stds_lst,
+            'IQR': iqr_lst,
+            'Aleatoric_Uncertainty': self.entropy_sums / n_estimators,
+            'Overall_Uncertainty': compute_entropy_from_predicted_probability(self.means),
+            'Statistical_Bias': statistical_bias_lst,
+            'Per_Sample_Accuracy': per_sample_accuracy_lst,
+            'Label_Stability': label_stability_lst,
+            'Positive_Votes_Rate': positive_votes_rate_lst,
+        }, index=index)
+
+    def get_label_stats(self):
+        """
+        Compute exact means, standard deviations, and interquartile ranges of predicted labels for each test sample,
+         the same as compute_std_mean_iqr_metrics() for a dataframe of labels.
+
+        Return a tuple of three 1D numpy arrays.
+
+        """
+        return compute_labels_std_mean_iqr(self.positive_votes, self.n_estimators)
+
+    def _approximate_iqr(self):
+        # Linear interpolation between order statistics, the same as numpy.percentile() used by scipy.stats.iqr().
+        # Both quartiles are computed in one pass over chunks of histograms to bound the size of temporary arrays.
+        quantile_ranks = []
+        for q in (0.25, 0.75):
+            position = (self.n_estimators - 1) * q
+            lower_rank = int(np.floor(position))
+            upper_rank = min(lower_rank + 1, self.n_estimators - 1)
+            quantile_ranks.append((position - lower_rank, lower_rank, upper_rank))
+
+        iqr_lst = np.empty(self.n_samples)
+        for start_idx in range(0, self.n_samples, IQR_CHUNK_SIZE):
+            # Cumulative counts are at most n_estimators, so they fit the dtype of histograms
+            cumulative_counts = np.cumsum(self.histograms[start_idx: start_idx + IQR_CHUNK_SIZE], axis=1,
+                                          dtype=self.histograms.dtype)
+            quantiles = []
+            for fraction, lower_rank, upper_rank in quantile_ranks:
+                lower_value = ((cumulative_counts <= lower_rank).sum(axis=1) + 0.5) / self.n_iqr_bins
+                upper_value = ((cumulative_counts <= upper_rank).sum(axis=1) + 0.5) / self.n_iqr_bins \
+                    if upper_rank != lower_rank else lower_value
+                quantiles.append(lower_value + fraction * (upper_value - lower_value))
+            iqr_lst[start_idx: start_idx + IQR_CHUNK_SIZE] = quantiles[1] - quantiles[0]
+
+        return iqr_lst
@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+
+from virny.custom_classes.metrics_composer import compose_group_metrics
+from virny.custom_classes.metrics_accumulators import encode_confusion_codes, create_groups_values_matrix, \
+    compute_groups_metrics_from_sums
+from virny.utils.protected_groups_partitioning import create_groups_membership_matrix, get_protected_group_names
+
+
+class SubgroupMetricsBootstrap:
+    """
+    Bootstrap confidence intervals for overall, subgroup and composed group metrics without model refits
+     or new predictions. The test set is resampled n_resamples times with a multinomial weight matrix
+     with a shape (n_resamples, n_test_samples). Since subgroup metrics are functions of weighted sums
+     of per-sample statistics and confusion codes, all resamples of all groups are computed by one matrix product
+     per chunk of resamples.
+
+    Parameters
+    ----------
+    n_resamples
+        [Optional] Number of bootstrap resamples of the test set. Default: 1000.
+    confidence_level
+        [Optional] Confidence level of percentile intervals. Default: 0.95.
+    seed
+        [Optional] Seed for the random generator of resamples
+    chunk_size
+        [Optional] Number of resamples in one weight matrix to limit memory usage. Default: 100.
+
+    """
+    def __init__(self, n_resamples: int = 1000, confidence_level: float = 0.95, seed: int = None,
+                 chunk_size: int = 100):
+        if not 0 < confidence_level < 1:
+            raise ValueError('confidence_level must be in (0, 1)')
+
+        self.n_resamples = n_resamples
+        self.confidence_level = confidence_level
+        self.seed = seed
+        self.chunk_size = chunk_size
+
+    def compute_confidence_intervals(self, y_test: pd.DataFrame, y_preds, per_sample_stats_df: pd.DataFrame,
+                                     test_protected_groups: dict, sensitive_attributes_dct: dict = None) -> pd.DataFrame:
+        """
+        Compute point estimates and percentile confidence intervals of metrics.
+
+        Return a pandas dataframe with Group, Metric, Estimate, Std_Error, CI_Lower, and CI_Upper columns.
+         Group is 'overall', a subgroup name, or a sensitive attribute name for composed metrics.
+
+        Parameters
+        ----------
+        y_test
+            Targets of the test set
+        y_preds
+            Ensemble predictions for the test set
+        per_sample_stats_df
+            Per-sample metrics for the test set created by compute_per_sample_stats()
+        test_protected_groups
+            Protected groups of the test set created by create_test_protected_groups()
+        sensitive_attributes_dct
+            [Optional] A dictionary where keys are sensitive attribute names (including attributes intersections),
+             and values are privilege values for these attributes. If defined, composed metrics
+             (Disparate_Impact, Std_Parity etc.) are added for each sensitive attribute.
+
+        """
+        group_names = ['overall'] + list(test_protected_groups.keys())
+        groups_membership = create_groups_membership_matrix(y_test.index, test_protected_groups, group_names[1:])
+        groups_membership = np.column_stack([np.ones(y_test.shape[0]), groups_membership.toarray()])
+        per_sample_values = create_groups_values_matrix(per_sample_stats_df, encode_confusion_codes(y_test, y_preds),
+                                                        groups_membership)
+
+        estimates = self._compute_metrics(per_sample_values.sum(axis=0, keepdims=True), group_names,
+                                          sensitive_attributes_dct)
+        rng = np.random.default_rng(self.seed)
+        n_samples = y_test.shape[0]
+        resampled_sums_lst = []
+        for start in range(0, self.n_resamples, self.chunk_size):
+            n_chunk_resamples = min(self.chunk_size, self.n_resamples - start)
+            weights = rng.multinomial(n_samples, np.full(n_samples, 1 / n_samples), size=n_chunk_resamples)
+            resampled_sums_lst.append(weights @ per_sample_values)
+        resamples = self._compute_metrics(np.vstack(resampled_sums_lst), group_names, sensitive_attributes_dct)
+
+        alpha = 1 - self.confidence_level
+        rows = []
+        for (group_name, metric), estimate in estimates.items():
+            values = resamples[(group_name, metric)]
+            finite_values = values[np.isfinite(values)]
+            has_values = finite_values.shape[0] > 0
+            rows.append({
+                'Group': group_name,
+                'Metric': metric,
+                'Estimate': float(estimate[0]),
+                'Std_Error': float(np.std(finite_values, ddof=1)) if finite_values.shape[0] > 1 else np.nan,
+                'CI_Lower': float(np.quantile(finite_values, alpha / 2)) if has_values else np.nan,
+                'CI_Upper': float(np.quantile(finite_values, 1 - alpha / 2)) if has_values else np.nan,
+            })
+
+        return pd.DataFrame(rows)
+
+    @staticmethod
+    def _compute_metrics(values_sums: np.ndarray, group_names: list, sensitive_attributes_dct: dict = None) -> dict:
+        """
+        Compute metrics from sums of per-sample values for each resample.
+
+        Return a dictionary where keys are (group name, metric name) tuples, and values are 1D arrays of metrics
+         for each resample.
+
+        """
+        groups_metrics = compute_groups_metrics_from_sums(values_sums, group_names)
+        results = {(group_name, metric): values
+                   for group_name, group_metrics in groups_metrics.items()
+                   for metric, values in group_metrics.items()}
+        if sensitive_attributes_dct is not None:
+            protected_group_names = get_protected_group_names(sensitive_attributes_dct)
+            for priv_group, dis_group in zip(protected_group_names[::2], protected_group_names[1::2]):
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    composed_metrics = compose_group_metrics(groups_metrics[dis_group], groups_metrics[priv_group])
+                for metric, values in composed_metrics.items():
+                    results[(priv_group[:-len('_priv')], metric)] = values
+
+        return results
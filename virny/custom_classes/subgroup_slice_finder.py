@@ -0,0 +1,161 @@
+import heapq
+import numpy as np
+import pandas as pd
+
+from virny.configs.constants import VARIANCE_METRICS
+
+
+# Per-sample metrics, for which lower values of a slice are worse
+LOWER_IS_WORSE_METRICS = ('Label_Stability', 'Per_Sample_Accuracy')
+
+
+class SubgroupSliceFinder:
+    """
+    Top-k discovery of test set slices, which are conjunctions of column=value conditions like
+     'race=African-American & age_cat_Less than 25=1', with the worst mean of a per-sample metric.
+
+    Slices are searched depth-first over columns in a fixed order (as in frequent itemset mining), so each
+     conjunction is visited once. A slice is evaluated only from its per-sample arrays: supports and metric sums
+     of all its extensions by one column are computed with a single np.bincount over rows of the slice,
+     and nothing is refitted or predicted. The search is pruned by two rules:
+
+    * support -- slices with less than min_support rows are not reported and not extended, since their extensions
+      are even smaller;
+
+    * optimistic bound -- a mean of any sub-slice with at least min_support rows is not worse than a mean of
+      the min_support worst per-sample values in the slice, so a slice is not extended when this bound is not
+      better than the current k-th worst slice.
+
+    Parameters
+    ----------
+    metric
+        [Optional] A per-sample metric from virny.configs.constants.VARIANCE_METRICS or 'Error_Rate',
+         a fraction of misclassified samples by the ensemble. Default: 'Jitter'.
+    k
+        [Optional] Number of the worst slices to return. Default: 10.
+    min_support
+        [Optional] Minimum slice size as a fraction of the test set (if below 1) or as a number of rows.
+         Default: 0.01.
+    max_order
+        [Optional] Maximum number of conditions in a slice. Default: 3.
+    max_column_values
+        [Optional] Numerical columns with more distinct values are split on n_bins quantile bins. Default: 10.
+    n_bins
+        [Optional] Number of quantile bins for numerical columns. Default: 4.
+
+    """
+    def __init__(self, metric: str = 'Jitter', k: int = 10, min_support: float = 0.01, max_order: int = 3,
+                 max_column_values: int = 10, n_bins: int = 4):
+        if metric not in VARIANCE_METRICS + ['Error_Rate']:
+            raise ValueError(f'metric must be one of {VARIANCE_METRICS + ["Error_Rate"]}')
+
+        self.metric = metric
+        self.k = k
+        self.min_support = min_support
+        self.max_order = max_order
+        self.max_column_values = max_column_values
+        self.n_bins = n_bins
+
+    def _encode_columns(self, features_df: pd.DataFrame):
+        """
+        Encode each column as int codes of its values (or quantile bins for numerical columns
+         with many distinct values), where -1 is a missing value.
+
+        Return a tuple of a list of 1D code arrays and a list of category lists.
+
+        """
+        columns_codes, columns_categories = [], []
+        for col in features_df.columns:
+            values = features_df[col]
+            if pd.api.types.is_numeric_dtype(values) and values.nunique() > self.max_column_values:
+                values = pd.qcut(values, q=self.n_bins, duplicates='drop')
+            values = pd.Categorical(values)
+            columns_codes.append(values.codes.astype(np.int32))
+            columns_categories.append([str(category) for category in values.categories])
+
+        return columns_codes, columns_categories
+
+    def find_slices(self, features_df: pd.DataFrame, per_sample_stats_df: pd.DataFrame,
+                    y_test: pd.DataFrame = None, y_preds=None) -> pd.DataFrame:
+        """
+        Find the k worst slices of the test set.
+
+        Return a pandas dataframe sorted from the worst slice with Slice, Order, Size, Metric, Value,
+         Overall_Value, and Disparity (Value - Overall_Value) columns.
+
+        Parameters
+        ----------
+        features_df
+            Columns to build slices from for rows of the test set in the same order as per_sample_stats_df,
+             for example, init_features_df.loc[X_test.index]
+        per_sample_stats_df
+            Per-sample metrics created by compute_per_sample_stats()
+        y_test
+            [Optional] Targets of the test set. Required for the 'Error_Rate' metric.
+        y_preds
+            [Optional] Predicted labels of the ensemble. Required for the 'Error_Rate' metric.
+
+        """
+        if self.metric == 'Error_Rate':
+            if y_test is None or y_preds is None:
+                raise ValueError('y_test and y_preds are required for the Error_Rate metric')
+            metric_values = (np.asarray(y_test).ravel() != np.asarray(y_preds).ravel()).astype(float)
+        else:
+            metric_values = per_sample_stats_df[self.metric].values.astype(float)
+
+        n_samples = metric_values.shape[0]
+        min_support = max(int(np.ceil(self.min_support * n_samples)) if self.min_support < 1
+                          else int(self.min_support), 1)
+        # Scores are oriented so that a greater score is a worse slice
+        sign = -1.0 if self.metric in LOWER_IS_WORSE_METRICS else 1.0
+        scores = sign * metric_values
+        columns_codes, columns_categories = self._encode_columns(features_df)
+        columns = list(features_df.columns)
+
+        # A min-heap of (score, slice id, conditions, size) of the k worst slices found so far
+        top_slices = []
+        slice_id = 0
+        stack = [(np.arange(n_samples), (), -1)]
+        while stack:
+            positions, conditions, last_col_idx = stack.pop()
+            if len(top_slices) == self.k and len(conditions) > 0:
+                slice_scores = scores[positions]
+                worst_mean = np.partition(slice_scores, positions.shape[0] - min_support)[-min_support:].mean()
+                if worst_mean <= top_slices[0][0]:
+                    continue
+
+            for col_idx in range(last_col_idx + 1, len(columns)):
+                slice_codes = columns_codes[col_idx][positions]
+                n_categories = len(columns_categories[col_idx])
+                # Shift codes by one to count missing values in the zero bin
+                supports = np.bincount(slice_codes + 1, minlength=n_categories + 1)[1:]
+                scores_sums = np.bincount(slice_codes + 1, weights=scores[positions],
+                                          minlength=n_categories + 1)[1:]
+                for code in np.flatnonzero(supports >= min_support):
+                    child_conditions = conditions + ((col_idx, code),)
+                    child_slice = (scores_sums[code] / supports[code], slice_id, child_conditions, int(supports[code]))
+                    if len(top_slices) < self.k:
+                        heapq.heappush(top_slices, child_slice)
+                    elif child_slice[0] > top_slices[0][0]:
+                        heapq.heapreplace(top_slices, child_slice)
+                    slice_id += 1
+                    if len(child_conditions) < self.max_order:
+                        stack.append((positions[slice_codes == code], child_conditions, col_idx))
+
+        overall_value = float(metric_values.mean())
+        slices_rows = []
+        for score, _, conditions, size in sorted(top_slices, reverse=True):
+            value = float(sign * score)
+            slices_rows.append({
+                'Slice': ' & '.join(f'{columns[col_idx]}={columns_categories[col_idx][code]}'
+                                    for col_idx, code in conditions),
+                'Order': len(conditions),
+                'Size': size,
+                'Metric': self.metric,
+                'Value': value,
+                'Overall_Value': overall_value,
+                'Disparity': value - overall_value,
+            })
+
+        return pd.DataFrame(slices_rows, columns=['Slice', 'Order', 'Size', 'Metric', 'Value',
+                                                  'Overall_Value', 'Disparity'])
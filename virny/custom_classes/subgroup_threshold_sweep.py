@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+
+from virny.custom_classes.metrics_composer import compose_group_fairness_metrics
+from virny.utils.common_helpers import confusion_matrix_metrics_from_counts
+from virny.utils.protected_groups_partitioning import create_groups_membership_matrix, get_protected_group_names
+
+
+class SubgroupThresholdSweep:
+    """
+    Overall and subgroup error metrics, composed group fairness metrics, and calibration bins of the ensemble
+     for all decision thresholds at once.
+
+    Predictions are probabilities of the zero value label averaged over bootstrap estimators, and a test sample
+     gets the label 1 if its mean prediction is below a threshold (0.5 in the default pipeline). Mean predictions
+     are sorted once, and confusion counts of all groups for every threshold are taken from cumulative sums
+     of true labels in the sorted order, so the sweep takes O(n log n + n_thresholds * n_groups) time.
+
+    Group stability metrics are not included, since Label_Stability and Jitter depend on labels of each estimator,
+     not on the threshold of the ensemble mean.
+
+    Parameters
+    ----------
+    thresholds
+        [Optional] Thresholds for the mean probability of the zero value label. If None, every distinct mean
+         prediction and 1.0 are used, which covers all operating points of the ensemble on the test set.
+    n_calibration_bins
+        [Optional] Number of equal-width bins of the predicted probability of the label 1. Default: 10.
+
+    """
+    def __init__(self, thresholds=None, n_calibration_bins: int = 10):
+        self.thresholds = None if thresholds is None else np.asarray(thresholds, dtype=float)
+        self.n_calibration_bins = n_calibration_bins
+
+    def compute_metrics(self, y_test: pd.DataFrame, mean_predictions, test_protected_groups: dict,
+                        sensitive_attributes_dct: dict = None):
+        """
+        Compute metrics for each threshold and calibration bins for each group.
+
+        Return a tuple of two pandas dataframes:
+
+        * metrics with Threshold, Group, Metric, and Value columns, where Group is 'overall', a subgroup name,
+          or a sensitive attribute name for composed metrics;
+
+        * calibration bins with Group, Bin_Lower, Bin_Upper, Sample_Size, Mean_Predicted_Proba,
+          and Observed_Positive_Rate columns for the probability of the label 1.
+
+        Parameters
+        ----------
+        y_test
+            Targets of the test set
+        mean_predictions
+            1D array of probabilities of the zero value label averaged over bootstrap estimators
+        test_protected_groups
+            Protected groups of the test set created by create_test_protected_groups()
+        sensitive_attributes_dct
+            [Optional] A dictionary where keys are sensitive attribute names (including attributes intersections),
+             and values are privilege values for these attributes. If defined, composed fairness metrics
+             (Disparate_Impact, Equalized_Odds_TPR etc.) are added for each sensitive attribute.
+
+        """
+        mean_predictions = np.asarray(mean_predictions, dtype=float)
+        y_true = np.asarray(y_test).ravel().astype(float)
+        group_names = ['overall'] + list(test_protected_groups.keys())
+        groups_membership = create_groups_membership_matrix(y_test.index, test_protected_groups, group_names[1:])
+        groups_membership = np.column_stack([np.ones(y_true.shape[0]), groups_membership.toarray()])
+
+        thresholds = self.thresholds
+        if thresholds is None:
+            thresholds = np.unique(np.append(mean_predictions, 1.0))
+
+        # Numbers of positive and negative samples of each group among the first k sorted samples,
+        # that are samples predicted as the label 1 when k = #{mean_prediction < threshold}
+        order = np.argsort(mean_predictions, kind='stable')
+        sorted_membership = groups_membership[order]
+        sorted_y_true = y_true[order][:, np.newaxis]
+        positives_cumsum = np.vstack([np.zeros((1, len(group_names))),
+                                      np.cumsum(sorted_membership * sorted_y_true, axis=0)])
+        negatives_cumsum = np.vstack([np.zeros((1, len(group_names))),
+                                      np.cumsum(sorted_membership * (1 - sorted_y_true), axis=0)])
+        n_predicted_positives = np.searchsorted(mean_predictions[order], thresholds, side='left')
+
+        TP = positives_cumsum[n_predicted_positives]
+        FP = negatives_cumsum[n_predicted_positives]
+        FN = positives_cumsum[-1] - TP
+        TN = negatives_cumsum[-1] - FP
+        with np.errstate(divide='ignore', invalid='ignore'):
+            error_metrics = confusion_matrix_metrics_from_counts(TN, FP, FN, TP)
+
+        groups_metrics = {group_name: {metric: values[:, group_idx] for metric, values in error_metrics.items()}
+                          for group_idx, group_name in enumerate(group_names)}
+        results = [(group_name, group_metrics) for group_name, group_metrics in groups_metrics.items()]
+        if sensitive_attributes_dct is not None:
+            protected_group_names = get_protected_group_names(sensitive_attributes_dct)
+            for priv_group, dis_group in zip(protected_group_names[::2], protected_group_names[1::2]):
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    composed_metrics = compose_group_fairness_metrics(groups_metrics[dis_group],
+                                                                      groups_metrics[priv_group])
+                results.append((priv_group[:-len('_priv')], composed_metrics))
+
+        metrics_df = pd.concat([
+            pd.DataFrame({'Threshold': thresholds, 'Group': group_name, 'Metric': metric, 'Value': values})
+            for group_name, group_metrics in results
+            for metric, values in group_metrics.items()
+        ], ignore_index=True)
+
+        calibration_df = self._compute_calibration_bins(1 - mean_predictions, y_true, groups_membership, group_names)
+        return metrics_df, calibration_df
+
+    def _compute_calibration_bins(self, positive_proba: np.ndarray, y_true: np.ndarray,
+                                  groups_membership: np.ndarray, group_names: list) -> pd.DataFrame:
+        n_bins = self.n_calibration_bins
+        bins = np.clip((positive_proba * n_bins).astype(int), 0, n_bins - 1)
+        bin_edges = np.linspace(0, 1, n_bins + 1)
+
+        calibration_dfs = []
+        for group_idx, group_name in enumerate(group_names):
+            is_member = groups_membership[:, group_idx] > 0
+            group_bins = bins[is_member]
+            sample_sizes = np.bincount(group_bins, minlength=n_bins)
+            proba_sums = np.bincount(group_bins, weights=positive_proba[is_member], minlength=n_bins)
+            positives = np.bincount(group_bins, weights=y_true[is_member], minlength=n_bins)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                calibration_dfs.append(pd.DataFrame({
+                    'Group': group_name,
+                    'Bin_Lower': bin_edges[:-1],
+                    'Bin_Upper': bin_edges[1:],
+                    'Sample_Size': sample_sizes,
+                    'Mean_Predicted_Proba': proba_sums / sample_sizes,
+                    'Observed_Positive_Rate': positives / sample_sizes,
+                }))
+
+        return pd.concat(calibration_dfs, ignore_index=True)
@@ -0,0 +1,211 @@
+import os
+import time
+import threading
+import collections
+import pandas as pd
+
+
+TASK_DONE = 'Done'
+TASK_FAILED = 'Failed'
+TASK_SKIPPED = 'Skipped'
+
+
+class _Task:
+    def __init__(self, name, func, dependencies: tuple, args: tuple, kwargs: dict, allow_failed_dependencies: bool):
+        self.name = name
+        self.func = func
+        self.dependencies = dependencies
+        self.args = args
+        self.kwargs = kwargs
+        self.allow_failed_dependencies = allow_failed_dependencies
+        self.dependents = []
+        self.status = None
+        self.worker = None
+        self.start_time = None
+        self.end_time = None
+
+
+class TaskGraph:
+    """
+    A graph of tasks with explicit dependencies, which is executed by a pool of worker threads.
+     A task is started as soon as all its dependencies are finished, and results of the dependencies are passed
+     to the task function as the first positional arguments in the order of dependencies.
+
+    Each worker has its own deque of ready tasks. A worker runs its newest task first, and tasks that become ready
+     after a finished task are pushed to the deque of the same worker, so a consumer usually runs right after
+     its producer. An idle worker steals the oldest task from the deque of another worker.
+
+    Workers are threads of one process, so results (for example, predictions of estimators) are shared between tasks
+     without copying. Tasks run in parallel when they release the GIL, as numpy and most scikit-learn estimators do
+     in fit and predict.
+
+    A failed task is recorded in errors, and its dependents are skipped, except for tasks added with
+     allow_failed_dependencies=True, which get None instead of results of failed or skipped dependencies.
+     Other tasks continue.
+
+    """
+    def __init__(self):
+        self.tasks = dict()
+        self.results = dict()
+        self.errors = dict()
+        self._run_start_time = None
+
+    def add_task(self, name, func, dependencies: tuple = (), args: tuple = (), kwargs: dict = None,
+                 allow_failed_dependencies: bool = False):
+        """
+        Add a task to the graph. Dependencies must be added before the task, so the graph has no cycles.
+
+        Return the task name.
+
+        Parameters
+        ----------
+        name
+            A unique hashable name of the task, for example, a tuple like ('fit', run_seed, model_name, estimator_idx)
+        func
+            A function to call as func(*dependencies_results, *args, **kwargs)
+        dependencies
+            [Optional] Names of tasks, which results are required by the task
+        args
+            [Optional] Extra positional arguments of func
+        kwargs
+            [Optional] Keyword arguments of func
+        allow_failed_dependencies
+            [Optional] If True, the task is run even if some of its dependencies failed or were skipped,
+             and None is passed instead of their results. Default: False.
+
+        """
+        if name in self.tasks:
+            raise ValueError(f'Task {name} is already added to the graph')
+        for dependency in dependencies:
+            if dependency not in self.tasks:
+                raise ValueError(f'Dependency {dependency} of task {name} must be added to the graph before the task')
+
+        task = _Task(name, func, tuple(dependencies), tuple(args), dict() if kwargs is None else kwargs,
+                     allow_failed_dependencies)
+        for dependency in task.dependencies:
+            self.tasks[dependency].dependents.append(task)
+        self.tasks[name] = task
+
+        return name
+
+    def run(self, n_jobs: int = -1) -> dict:
+        """
+        Execute all tasks of the graph.
+
+        Return a dictionary where keys are names of tasks without dependents, and values are their results.
+         Results of other tasks are released as soon as all their dependents are finished.
+
+        Parameters
+        ----------
+        n_jobs
+            [Optional] Number of worker threads, -1 means all CPUs. With n_jobs=1, tasks are executed in the calling
+             thread in a deterministic order. Default: -1.
+
+        """
+        n_workers = os.cpu_count() if n_jobs is None or n_jobs < 0 else n_jobs
+        n_workers = max(min(n_workers, len(self.tasks)), 1)
+
+        self.results, self.errors = dict(), dict()
+        self._run_start_time = time.perf_counter()
+        self._n_pending_dependencies = {task.name: len(task.dependencies) for task in self.tasks.values()}
+        self._n_pending_dependents = {task.name: len(task.dependents) for task in self.tasks.values()}
+        self._n_finished = 0
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._deques = [collections.deque() for _ in range(n_workers)]
+        for task in self.tasks.values():
+            task.status = None
+        # Spread initial tasks among workers in the order of adding to keep runs with n_jobs=1 deterministic
+        ready_tasks = [task for task in self.tasks.values() if len(task.dependencies) == 0]
+        for idx, task in enumerate(ready_tasks):
+            self._deques[idx % n_workers].appendleft(task)
+
+        if n_workers == 1:
+            self._run_worker(0)
+        else:
+            workers = [threading.Thread(target=self._run_worker, args=(worker_idx,), daemon=True)
+                       for worker_idx in range(n_workers)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+
+        return {task.name: self.results[task.name] for task in self.tasks.values()
+                if len(task.dependents) == 0 and task.name in self.results}
+
+    def _get_next_task(self, worker_idx: int):
+        own_deque = self._deques[worker_idx]
+        while True:
+            try:
+                return own_deque.pop()
+            except IndexError:
+                pass
+            n_workers = len(self._deques)
+            for offset in range(1, n_workers):
+                try:
+                    return self._deques[(worker_idx + offset) % n_workers].popleft()
+                except IndexError:
+                    continue
+
+            with self._condition:
+                if self._n_finished == len(self.tasks):
+                    return None
+                # New ready tasks are pushed under the same lock, so a wake-up is not lost
+                if not any(self._deques):
+                    self._condition.wait()
+
+    def _run_worker(self, worker_idx: int):
+        while True:
+            task = self._get_next_task(worker_idx)
+            if task is None:
+                return
+            self._execute_task(task, worker_idx)
+
+    def _execute_task(self, task: _Task, worker_idx: int):
+        task.worker = worker_idx
+        task.start_time = time.perf_counter()
+        failed_dependencies = [dependency for dependency in task.dependencies
+                               if self.tasks[dependency].status != TASK_DONE]
+        if failed_dependencies and not task.allow_failed_dependencies:
+            task.status = TASK_SKIPPED
+        else:
+            dependencies_results = [self.results.get(dependency) for dependency in task.dependencies]
+            try:
+                self.results[task.name] = task.func(*dependencies_results, *task.args, **task.kwargs)
+                task.status = TASK_DONE
+            except Exception as err:
+                self.errors[task.name] = err
+                task.status = TASK_FAILED
+        task.end_time = time.perf_counter()
+
+        with self._condition:
+            self._n_finished += 1
+            for dependency in task.dependencies:
+                self._n_pending_dependents[dependency] -= 1
+                if self._n_pending_dependents[dependency] == 0:
+                    self.results.pop(dependency, None)
+            for dependent in task.dependents:
+                self._n_pending_dependencies[dependent.name] -= 1
+                if self._n_pending_dependencies[dependent.name] == 0:
+                    self._deques[worker_idx].append(dependent)
+            self._condition.notify_all()
+
+    def get_timings_df(self) -> pd.DataFrame:
+        """
+        Return a pandas dataframe with Task, Status, Worker, Start_Time, End_Time, and Duration_Seconds columns
+         for each task of the last run. Start and end times are in seconds from the start of the run.
+        """
+        timings = []
+        for task in self.tasks.values():
+            if task.status is None:
+                continue
+            timings.append({
+                'Task': task.name,
+                'Status': task.status,
+                'Worker': task.worker,
+                'Start_Time': task.start_time - self._run_start_time,
+                'End_Time': task.end_time - self._run_start_time,
+                'Duration_Seconds': task.end_time - task.start_time,
+            })
+
+        return pd.DataFrame(timings, columns=['Task', 'Status', 'Worker', 'Start_Time', 'End_Time', 'Duration_Seconds'])
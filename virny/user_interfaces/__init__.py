@@ -7,18 +7,64 @@ This module contains user interfaces for metrics computation.
 from .metrics_computation_interfaces import (
     compute_model_metrics,
     compute_model_metrics_with_config,
+    compute_model_metrics_with_cache,
     run_metrics_computation,
+    iter_metrics_computation,
     compute_metrics_with_config,
+    compute_metrics_multiple_runs,
     compute_metrics_multiple_runs_with_multiple_test_sets,
-    compute_metrics_multiple_runs_with_db_writer
+    compute_metrics_multiple_runs_with_db_writer,
 )
+from .task_graph_interfaces import compute_metrics_with_task_graph
+from .work_queue_interfaces import (
+    submit_metrics_computation_tasks,
+    run_metrics_computation_worker,
+    collect_metrics_computation_results,
+)
+from .appended_rows_interfaces import append_test_rows_to_model_metrics
+from .sharded_metrics_interfaces import (
+    compute_test_shard_metrics_accumulators,
+    create_model_metrics_df_from_accumulators,
+)
+from .saved_predictions_interfaces import (
+    compute_quantization_accuracy_report,
+    compute_model_metrics_from_predictions,
+)
+from .subgroup_analysis_interfaces import (
+    compute_model_metrics_confidence_intervals,
+    compute_group_metrics_p_values,
+    compute_model_metrics_threshold_sweep,
+    compute_model_metrics_per_category,
+    find_worst_model_subgroups,
+)
+from .multiclass_metrics_interfaces import compute_multiclass_model_metrics
+from .metrics_monitoring_service import MetricsMonitoringService
 
 
 __all__ = [
     "compute_metrics_with_config",
+    "compute_metrics_multiple_runs",
+    "compute_metrics_with_task_graph",
+    "submit_metrics_computation_tasks",
+    "run_metrics_computation_worker",
+    "collect_metrics_computation_results",
     "compute_metrics_multiple_runs_with_multiple_test_sets",
     "compute_metrics_multiple_runs_with_db_writer",
     "compute_model_metrics",
     "compute_model_metrics_with_config",
+    "compute_model_metrics_with_cache",
     "run_metrics_computation",
+    "iter_metrics_computation",
+    "append_test_rows_to_model_metrics",
+    "compute_test_shard_metrics_accumulators",
+    "create_model_metrics_df_from_accumulators",
+    "compute_quantization_accuracy_report",
+    "compute_model_metrics_confidence_intervals",
+    "compute_group_metrics_p_values",
+    "compute_model_metrics_threshold_sweep",
+    "compute_multiclass_model_metrics",
+    "find_worst_model_subgroups",
+    "compute_model_metrics_from_predictions",
+    "compute_model_metrics_per_category",
+    "MetricsMonitoringService",
 ]
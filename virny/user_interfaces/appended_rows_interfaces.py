@@ -0,0 +1,57 @@
+import pandas as pd
+
+from virny.utils.protected_groups_partitioning import create_test_protected_groups
+from virny.analyzers.subgroup_variance_analyzer import SubgroupVarianceAnalyzer
+from virny.analyzers.subgroup_error_analyzer import SubgroupErrorAnalyzer
+from virny.user_interfaces.metrics_computation_interfaces import create_model_metrics_df
+
+
+def append_test_rows_to_model_metrics(base_model, base_model_name: str,
+                                      subgroup_variance_analyzer: SubgroupVarianceAnalyzer,
+                                      error_analyzer: SubgroupErrorAnalyzer, new_X_test: pd.DataFrame,
+                                      new_y_test: pd.DataFrame, init_features_df: pd.DataFrame,
+                                      sensitive_attributes_dct: dict, verbose: int = 0) -> pd.DataFrame:
+    """
+    Update model metrics after new labelled rows are appended to the test set. Only the new rows are predicted
+     by the fitted bootstrap estimators, and overall and subgroup metrics are updated in O(new rows)
+     based on sufficient statistics kept by the analyzers.
+
+    Return a dataframe of model metrics for the whole enlarged test set.
+
+    Parameters
+    ----------
+    base_model
+        Base model used for metrics computation
+    base_model_name
+        Model name to name a result file with metrics
+    subgroup_variance_analyzer
+        SubgroupVarianceAnalyzer returned by compute_model_metrics(..., return_analyzers=True)
+    error_analyzer
+        SubgroupErrorAnalyzer returned by compute_model_metrics(..., return_analyzers=True)
+    new_X_test
+        Processed features of the new test rows
+    new_y_test
+        Targets of the new test rows
+    init_features_df
+        Full non-preprocessed dataset of features that includes the new test rows. It is used for creating test groups.
+    sensitive_attributes_dct
+        A dictionary where keys are sensitive attribute names (including attributes intersections),
+         and values are privilege values for these attributes
+    verbose
+        [Optional] Level of logs printing. The greater level provides more logs.
+            As for now, 0, 1, 2 levels are supported.
+
+    """
+    new_test_protected_groups = create_test_protected_groups(new_X_test, init_features_df, sensitive_attributes_dct,
+                                                             allow_empty_groups=True)
+    if verbose >= 2:
+        print('\nProtected groups splits for new test rows:')
+        for g in new_test_protected_groups.keys():
+            print(g, new_test_protected_groups[g].shape)
+
+    new_y_preds, variance_metrics_df = subgroup_variance_analyzer.append_test_rows(new_X_test, new_y_test,
+                                                                                   new_test_protected_groups)
+    error_metrics_df = pd.DataFrame(error_analyzer.append_test_rows(new_X_test, new_y_test, new_y_preds,
+                                                                    new_test_protected_groups))
+
+    return create_model_metrics_df(variance_metrics_df, error_metrics_df, base_model, base_model_name)
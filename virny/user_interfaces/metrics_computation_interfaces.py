@@ -1,17 +1,31 @@
 import os
 import random
+import copy
 import traceback
+import concurrent.futures
+import numpy as np
 import pandas as pd
 from river import base
+from sklearn.compose import ColumnTransformer
 from tqdm.notebook import tqdm
 from datetime import datetime, timezone
 from IPython.display import display
 
-from virny.configs.constants import ModelSetting
-from virny.utils.protected_groups_partitioning import create_test_protected_groups
+from virny.configs.constants import ModelSetting, ComputationMode
+from virny.utils.stratified_sampling_utils import create_test_strata, sample_stratified_test_subset, \
+    compute_required_strata_sample_sizes, estimate_stratified_groups_metrics, create_groups_membership_with_overall, \
+    PILOT_STRATUM_SIZE
+from virny.utils.per_sample_stats_export import save_per_sample_stats
+from virny.utils.ensemble_predictions_utils import save_ensemble_predictions
+from virny.utils.protected_groups_partitioning import create_test_protected_groups, \
+    create_test_protected_groups_lattice, create_test_protected_groups_cached
+from virny.custom_classes.metrics_accumulators import encode_confusion_codes
+from virny.custom_classes.experiment_cache import ExperimentCache
 from virny.custom_classes.base_dataset import BaseFlowDataset
+from virny.datasets.data_loaders import BaseDataLoader
+from virny.preprocessing.basic_preprocessing import preprocess_dataset
 from virny.analyzers.subgroup_variance_analyzer import SubgroupVarianceAnalyzer
-from virny.utils.common_helpers import save_metrics_to_file
+from virny.utils.common_helpers import save_metrics_to_file, reset_model_seed
 from virny.analyzers.subgroup_error_analyzer import SubgroupErrorAnalyzer
 
 
@@ -57,12 +71,18 @@ def compute_model_metrics_with_config(base_model, model_name: str, dataset: Base
 def compute_model_metrics(base_model, n_estimators: int, dataset: BaseFlowDataset, bootstrap_fraction: float,
                           sensitive_attributes_dct: dict, dataset_name: str, base_model_name: str,
                           model_setting: str = ModelSetting.BATCH.value, computation_mode: str = None, save_results: bool = True,
-                          save_results_dir_path: str = None, verbose: int = 0):
+                          save_results_dir_path: str = None, return_analyzers: bool = False,
+                          predictions_dtype: str = None, approximation_relative_error: float = None,
+                          approximation_seed: int = None, per_sample_stats_file_path: str = None, max_intersection_order: int = None,
+                          min_intersection_size: int = 30, predictions_file_path: str = None, bootstrap_seed: int = None,
+                          verbose: int = 0):
     """
     Compute subgroup metrics for the base model.
     Save results in `save_results_dir_path` folder.
 
-    Return a dataframe of model metrics.
+    Return a dataframe of model metrics. If return_analyzers is True, return a tuple of the dataframe of model metrics,
+     the fitted SubgroupVarianceAnalyzer and the SubgroupErrorAnalyzer, which can be used to update metrics
+     with new test rows by append_test_rows_to_model_metrics().
 
     Parameters
     ----------
@@ -89,6 +109,43 @@ def compute_model_metrics(base_model, n_estimators: int, dataset: BaseFlowDatase
         [Optional] A non-default mode for metrics computation. Should be included in the ComputationMode enum.
     save_results_dir_path
         [Optional] Location where to save result files with metrics
+    return_analyzers
+        [Optional] If to return the analyzers together with the model metrics
+    predictions_dtype
+        [Optional] A type of compact storage for bootstrap predictions: 'float16', 'uint8' or 'uint16'.
+         Default: None (float64 lists).
+    approximation_relative_error
+        [Optional] If defined, metrics are approximated on a stratified (by protected groups and label) subsample
+         of the test set, for example, 0.05. A pilot subsample is extended in rounds until each nonzero metric
+         of each group has a relative error (standard error * z / |metric|) below this target with 95% confidence,
+         based on variances of metrics in strata estimated on the subsample. Refer to
+         compute_required_strata_sample_sizes() for details. Only the subsample is predicted, metrics are
+         reweighted to the whole test set, and standard errors of metrics are added in '<group>_Std_Error' columns.
+         Returned analyzers keep unweighted metrics of the subsample. Not supported in the error analysis mode.
+         Default: None (exact metrics).
+    approximation_seed
+        [Optional] Seed for sampling the test subset with approximation_relative_error. It does not use
+         the global numpy random state, so bootstrap estimators are the same as in the exact mode.
+    per_sample_stats_file_path
+        [Optional] Path to a .parquet or .feather file to save per-sample metrics of the test set as float32
+         together with the test index and sensitive attribute codes. Refer to save_per_sample_stats()
+         for the file layout. Requires the optional pyarrow package.
+    max_intersection_order
+        [Optional] If defined, metrics are also computed for all intersections of plain sensitive attributes
+         with up to max_intersection_order attributes, for example, 3 for 'sex&race' and 'sex&race&age'.
+         Refer to create_test_protected_groups_lattice() for details. Default: None (only attributes
+         from sensitive_attributes_dct).
+    min_intersection_size
+        [Optional] Minimum size of dis and priv groups of an automatically added intersection. Smaller intersections
+         are skipped. Used only with max_intersection_order. Default: 30.
+    predictions_file_path
+        [Optional] Path to a .npz file to save bootstrap predictions, test labels and the test index,
+         which can be re-analyzed for other sensitive attributes by compute_model_metrics_from_predictions()
+         without refitting models. Not supported in the streaming mode.
+    bootstrap_seed
+        [Optional] Seed to derive a seed of a bootstrap sample of each estimator by create_bootstrap_seeds(),
+         so bootstrap samples do not depend on the global numpy random state. Default: None (the global numpy
+         random state).
     verbose
         [Optional] Level of logs printing. The greater level provides more logs.
             As for now, 0, 1, 2 levels are supported.
@@ -96,7 +153,29 @@ def compute_model_metrics(base_model, n_estimators: int, dataset: BaseFlowDatase
     """
     model_setting = ModelSetting.BATCH if model_setting is None else ModelSetting[model_setting.upper()]
 
-    test_protected_groups = create_test_protected_groups(dataset.X_test, dataset.init_features_df, sensitive_attributes_dct)
+    if max_intersection_order is None:
+        test_protected_groups = create_test_protected_groups_cached(dataset.X_test, dataset.init_features_df,
+                                                                    sensitive_attributes_dct)
+    else:
+        test_protected_groups, sensitive_attributes_dct = \
+            create_test_protected_groups_lattice(dataset.X_test, dataset.init_features_df, sensitive_attributes_dct,
+                                                 max_intersection_order=max_intersection_order,
+                                                 min_group_size=min_intersection_size)
+    if approximation_relative_error is not None:
+        if computation_mode == ComputationMode.ERROR_ANALYSIS.value:
+            raise ValueError('approximation_relative_error is not supported in the error analysis mode')
+
+        approximation_rng = np.random.default_rng(approximation_seed)
+        full_test_set = (dataset.X_test, dataset.y_test)
+        strata = create_test_strata(dataset.y_test, test_protected_groups)
+        strata_sizes = np.bincount(strata)
+        sampled_positions = sample_stratified_test_subset(strata, np.minimum(strata_sizes, PILOT_STRATUM_SIZE),
+                                                          seed=approximation_rng)
+        dataset = copy.copy(dataset)
+        dataset.X_test = dataset.X_test.iloc[sampled_positions]
+        dataset.y_test = dataset.y_test.iloc[sampled_positions]
+        test_protected_groups = create_test_protected_groups(dataset.X_test, dataset.init_features_df,
+                                                             sensitive_attributes_dct)
     if verbose >= 2:
         print('\nProtected groups splits:')
         for g in test_protected_groups.keys():
@@ -113,11 +192,23 @@ def compute_model_metrics(base_model, n_estimators: int, dataset: BaseFlowDatase
                                                           sensitive_attributes_dct=sensitive_attributes_dct,
                                                           test_protected_groups=test_protected_groups,
                                                           computation_mode=computation_mode,
+                                                          predictions_dtype=predictions_dtype,
+                                                          bootstrap_seed=bootstrap_seed,
                                                           verbose=verbose)
     y_preds, variance_metrics_df = subgroup_variance_analyzer.compute_metrics(save_results=False,
                                                                               result_filename=None,
                                                                               save_dir_path=None,
                                                                               make_plots=False)
+    if approximation_relative_error is not None:
+        dataset, test_protected_groups, sampled_positions, y_preds, variance_metrics_df = \
+            _extend_stratified_test_subset(subgroup_variance_analyzer, dataset, full_test_set, test_protected_groups,
+                                           sensitive_attributes_dct, strata, strata_sizes, sampled_positions,
+                                           y_preds, variance_metrics_df, approximation_relative_error,
+                                           approximation_rng)
+        sampled_strata = strata[sampled_positions]
+        if verbose >= 1:
+            print(f'Test set is subsampled to {dataset.X_test.shape[0]} rows '
+                  f'from {strata_sizes.sum()} rows in {strata_sizes.shape[0]} strata')
 
     # Compute error metrics for subgroups
     error_analyzer = SubgroupErrorAnalyzer(X_test=dataset.X_test,
@@ -130,28 +221,214 @@ def compute_model_metrics(base_model, n_estimators: int, dataset: BaseFlowDatase
                                                       result_filename=None,
                                                       save_dir_path=None)
     error_metrics_df = pd.DataFrame(dtc_res)
+    if predictions_file_path is not None:
+        if subgroup_variance_analyzer.models_predictions is None:
+            raise ValueError('predictions_file_path is not supported in the streaming mode')
+        save_ensemble_predictions(predictions_file_path, subgroup_variance_analyzer.models_predictions,
+                                  dataset.y_test, base_model_name,
+                                  None if isinstance(base_model, base.Classifier) else str(base_model.get_params()))
+    if per_sample_stats_file_path is not None:
+        save_per_sample_stats(subgroup_variance_analyzer.per_sample_stats_df, per_sample_stats_file_path,
+                              test_protected_groups)
+    if approximation_relative_error is not None:
+        metrics_df = create_stratified_model_metrics_df(subgroup_variance_analyzer.per_sample_stats_df, y_preds,
+                                                        dataset.y_test, test_protected_groups, sampled_strata,
+                                                        strata_sizes, base_model, base_model_name)
+    else:
+        metrics_df = create_model_metrics_df(variance_metrics_df, error_metrics_df, base_model, base_model_name)
+
+    if save_results:
+        # Save metrics
+        result_filename = f'Metrics_{dataset_name}_{base_model_name}'
+        save_metrics_to_file(metrics_df, result_filename, save_results_dir_path)
+
+    if return_analyzers:
+        return metrics_df, subgroup_variance_analyzer, error_analyzer
+    return metrics_df
+
+
+# Maximum number of rounds to extend a stratified test subset for approximation_relative_error
+MAX_SAMPLING_ROUNDS = 10
+
+
+def _extend_stratified_test_subset(subgroup_variance_analyzer: SubgroupVarianceAnalyzer, dataset: BaseFlowDataset,
+                                   full_test_set: tuple, test_protected_groups: dict, sensitive_attributes_dct: dict,
+                                   strata: np.ndarray, strata_sizes: np.ndarray, sampled_positions: np.ndarray,
+                                   y_preds, variance_metrics_df: pd.DataFrame, relative_error: float, rng):
+    # Extend the subsample in rounds until sizes of strata required by variances estimated on it are reached.
+    # Bootstrap estimators are fitted once on the pilot round and only predict new subsamples.
+    full_X_test, full_y_test = full_test_set
+    for _ in range(MAX_SAMPLING_ROUNDS):
+        _, groups_membership = create_groups_membership_with_overall(dataset.y_test, test_protected_groups)
+        required_sample_sizes = compute_required_strata_sample_sizes(
+            subgroup_variance_analyzer.per_sample_stats_df, encode_confusion_codes(dataset.y_test, y_preds),
+            groups_membership, strata[sampled_positions], strata_sizes, relative_error)
+        if np.all(required_sample_sizes <= np.bincount(strata[sampled_positions], minlength=strata_sizes.shape[0])):
+            break
+
+        sampled_positions = sample_stratified_test_subset(strata, required_sample_sizes, sampled_positions, seed=rng)
+        dataset = copy.copy(dataset)
+        dataset.X_test = full_X_test.iloc[sampled_positions]
+        dataset.y_test = full_y_test.iloc[sampled_positions]
+        test_protected_groups = create_test_protected_groups(dataset.X_test, dataset.init_features_df,
+                                                             sensitive_attributes_dct)
+        subgroup_variance_analyzer.set_test_sets(dataset.X_test, dataset.y_test)
+        subgroup_variance_analyzer.set_test_protected_groups(test_protected_groups)
+        y_preds, variance_metrics_df = subgroup_variance_analyzer.compute_metrics(save_results=False,
+                                                                                  make_plots=False,
+                                                                                  with_fit=False)
+
+    return dataset, test_protected_groups, sampled_positions, y_preds, variance_metrics_df
+
+
+def create_model_metrics_df(variance_metrics_df: pd.DataFrame, error_metrics_df: pd.DataFrame,
+                            base_model, base_model_name: str) -> pd.DataFrame:
+    """
+    Combine subgroup variance and error metrics in one dataframe of model metrics.
 
+    Parameters
+    ----------
+    variance_metrics_df
+        A dataframe of subgroup variance metrics
+    error_metrics_df
+        A dataframe of subgroup error metrics
+    base_model
+        Base model for metrics computation. If None, the Model_Params column is None.
+    base_model_name
+        Model name to fill the Model_Name column
+
+    """
     metrics_df = pd.concat([variance_metrics_df, error_metrics_df])
     metrics_df = metrics_df.reset_index()
     metrics_df = metrics_df.rename(columns={"index": "Metric"})
     metrics_df['Model_Name'] = base_model_name
-    if isinstance(base_model, base.Classifier): # skip for incremental models
+    if base_model is None or isinstance(base_model, base.Classifier): # skip for incremental models
         metrics_df['Model_Params'] = None
     else:
         metrics_df['Model_Params'] = str(base_model.get_params())
 
-    if save_results:
-        # Save metrics
-        result_filename = f'Metrics_{dataset_name}_{base_model_name}'
-        save_metrics_to_file(metrics_df, result_filename, save_results_dir_path)
+    return metrics_df
+
+
+def compute_model_metrics_with_cache(experiment_cache: ExperimentCache, base_model, n_estimators: int,
+                                     dataset: BaseFlowDataset, bootstrap_fraction: float, sensitive_attributes_dct: dict,
+                                     dataset_name: str, base_model_name: str,
+                                     model_setting: str = ModelSetting.BATCH.value, computation_mode: str = None,
+                                     save_results: bool = True, save_results_dir_path: str = None,
+                                     bootstrap_seed: int = None, verbose: int = 0) -> pd.DataFrame:
+    """
+    Return model metrics of compute_model_metrics() from experiment_cache if the same dataset split, model parameters
+     and metrics configuration were already computed. Otherwise, compute metrics and save them together with
+     bootstrap predictions to experiment_cache. If experiment_cache is None, compute_model_metrics() is used as is.
+
+    Parameters
+    ----------
+    experiment_cache
+        ExperimentCache object or None
+    base_model
+        Base model for metrics computation
+    n_estimators
+        Number of estimators for bootstrap to compute subgroup variance metrics
+    dataset
+        BaseFlowDataset object that contains all needed attributes like target, features, numerical_columns etc.
+    bootstrap_fraction
+        Fraction of a train set in range [0.0 - 1.0] to fit models in bootstrap
+    sensitive_attributes_dct
+        A dictionary where keys are sensitive attribute names (including attributes intersections),
+         and values are privilege values for these attributes
+    dataset_name
+        Dataset name to name a result file with metrics
+    base_model_name
+        Model name to name a result file with metrics
+    model_setting
+        [Optional] Model type: 'batch' or 'incremental'. Default: 'batch'.
+    computation_mode
+        [Optional] A non-default mode for metrics computation. Should be included in the ComputationMode enum.
+    save_results
+        [Optional] If to save result metrics in a file
+    save_results_dir_path
+        [Optional] Location where to save result files with metrics
+    bootstrap_seed
+        [Optional] Seed to derive seeds of bootstrap samples of all estimators. It is a part of a key of a cell.
+         Default: None (the global numpy random state).
+    verbose
+        [Optional] Level of logs printing. The greater level provides more logs.
+            As for now, 0, 1, 2 levels are supported.
 
+    """
+    metrics_kwargs = dict(n_estimators=n_estimators, dataset=dataset, bootstrap_fraction=bootstrap_fraction,
+                          sensitive_attributes_dct=sensitive_attributes_dct, dataset_name=dataset_name,
+                          base_model_name=base_model_name, model_setting=model_setting,
+                          computation_mode=computation_mode, save_results_dir_path=save_results_dir_path,
+                          bootstrap_seed=bootstrap_seed, verbose=verbose)
+    if experiment_cache is None:
+        return compute_model_metrics(base_model=base_model, save_results=save_results, **metrics_kwargs)
+
+    key = experiment_cache.create_key(dataset, base_model, n_estimators, bootstrap_fraction,
+                                      sensitive_attributes_dct, model_setting, computation_mode, bootstrap_seed)
+    metrics_df = experiment_cache.get(key)
+    if metrics_df is not None:
+        if verbose >= 1:
+            print(f'Metrics of {base_model_name} are loaded from the experiment cache')
+        metrics_df['Model_Name'] = base_model_name
+        if save_results:
+            save_metrics_to_file(metrics_df, f'Metrics_{dataset_name}_{base_model_name}', save_results_dir_path)
+        return metrics_df
+
+    metrics_df, subgroup_variance_analyzer, _ = compute_model_metrics(base_model=base_model, save_results=save_results,
+                                                                      return_analyzers=True, **metrics_kwargs)
+    experiment_cache.put(key, metrics_df, subgroup_variance_analyzer.models_predictions, dataset.y_test)
     return metrics_df
 
 
+def create_stratified_model_metrics_df(per_sample_stats_df: pd.DataFrame, y_preds, y_test: pd.DataFrame,
+                                       test_protected_groups: dict, strata: np.ndarray, strata_sizes: np.ndarray,
+                                       base_model, base_model_name: str) -> pd.DataFrame:
+    """
+    Create a dataframe of model metrics estimated for the whole test set from its stratified subsample
+     sampled by sample_stratified_test_subset(). Standard errors of metrics are added in '<group>_Std_Error' columns.
+
+    Parameters
+    ----------
+    per_sample_stats_df
+        Per-sample metrics for the subsample created by compute_per_sample_stats()
+    y_preds
+        Ensemble predictions for the subsample
+    y_test
+        Targets of the subsample
+    test_protected_groups
+        Protected groups of the subsample created by create_test_protected_groups()
+    strata
+        Strata of the subsample rows
+    strata_sizes
+        Sizes of all strata in the whole test set
+    base_model
+        Base model used for metrics computation
+    base_model_name
+        Model name to fill the Model_Name column
+
+    """
+    group_names, groups_membership = create_groups_membership_with_overall(y_test, test_protected_groups)
+    groups_metrics, groups_std_errors = estimate_stratified_groups_metrics(per_sample_stats_df,
+                                                                           encode_confusion_codes(y_test, y_preds),
+                                                                           groups_membership, group_names,
+                                                                           strata, strata_sizes)
+
+    metrics_df = create_model_metrics_df(pd.DataFrame(groups_metrics), pd.DataFrame(), base_model, base_model_name)
+    std_errors_df = pd.DataFrame(groups_std_errors)
+    for group_name in group_names:
+        metrics_df[f'{group_name}_Std_Error'] = std_errors_df.loc[metrics_df['Metric'], group_name].values
+
+    # Place a standard error column next to the column of metric values for each group
+    ordered_columns = ['Metric'] + [col for group_name in group_names for col in (group_name, f'{group_name}_Std_Error')]
+    return metrics_df[ordered_columns + ['Model_Name', 'Model_Params']]
+
+
 def run_metrics_computation(dataset: BaseFlowDataset, bootstrap_fraction: float, dataset_name: str,
                             models_config: dict, n_estimators: int, sensitive_attributes_dct: dict,
                             model_setting: str = ModelSetting.BATCH.value, computation_mode: str = None,
-                            save_results: bool = True, save_results_dir_path: str = None, verbose: int = 0) -> dict:
+                            save_results: bool = True, save_results_dir_path: str = None, n_jobs: int = None,
+                            experiment_cache: ExperimentCache = None, seed: int = None, verbose: int = 0) -> dict:
     """
     Compute stability and accuracy metrics for each model in models_config.
     Save results in `save_results_dir_path` folder.
@@ -181,12 +458,98 @@ def run_metrics_computation(dataset: BaseFlowDataset, bootstrap_fraction: float,
         [Optional] If to save result metrics in a file
     save_results_dir_path
         [Optional] Location where to save result files with metrics
+    n_jobs
+        [Optional] Number of worker processes to analyze models in parallel, -1 means all CPUs.
+         Refer to iter_metrics_computation() for details. Default: None (models are analyzed one by one).
+    experiment_cache
+        [Optional] ExperimentCache to load metrics of already computed models instead of refitting them.
+         Seeds of models are a part of keys of cells, so define seed to reuse cells in later calls.
+    seed
+        [Optional] Seed to spawn seeds of models. Each model is analyzed with its own seed, so metrics
+         do not depend on n_jobs. Default: None (drawn from the global numpy state).
     verbose
         [Optional] Level of logs printing. The greater level provides more logs.
             As for now, 0, 1, 2 levels are supported.
 
     """
+    if n_jobs is not None and n_jobs != 1:
+        models_metrics_dct = dict(iter_metrics_computation(dataset=dataset,
+                                                           bootstrap_fraction=bootstrap_fraction,
+                                                           dataset_name=dataset_name,
+                                                           models_config=models_config,
+                                                           n_estimators=n_estimators,
+                                                           sensitive_attributes_dct=sensitive_attributes_dct,
+                                                           model_setting=model_setting,
+                                                           computation_mode=computation_mode,
+                                                           save_results=save_results,
+                                                           save_results_dir_path=save_results_dir_path,
+                                                           n_jobs=n_jobs,
+                                                           experiment_cache=experiment_cache,
+                                                           seed=seed,
+                                                           verbose=verbose))
+        return {model_name: models_metrics_dct[model_name] for model_name in models_config.keys()
+                if model_name in models_metrics_dct}
+
+    kwargs = _create_model_metrics_kwargs(dataset_name, n_estimators, bootstrap_fraction, sensitive_attributes_dct,
+                                          model_setting, computation_mode, None, save_results,
+                                          save_results_dir_path, experiment_cache, verbose)
+    return _run_models_metrics_computation(dataset, models_config, None, kwargs, seed, verbose)
+
+
+# Datasets of a worker process by their keys, which are sent once per worker instead of once per model
+_WORKER_DATASETS = None
+
+
+def _init_metrics_computation_worker(datasets_dct: dict):
+    global _WORKER_DATASETS
+    _WORKER_DATASETS = datasets_dct
+
+
+def _compute_model_metrics_in_worker(dataset_key, model_name: str, base_model, extra_test_sets_lst, kwargs: dict,
+                                     seed: int = None):
+    return _compute_model_metrics_task(_WORKER_DATASETS[dataset_key], model_name, base_model, extra_test_sets_lst,
+                                       kwargs, seed)
+
+
+def _compute_model_metrics_task(dataset: BaseFlowDataset, model_name: str, base_model, extra_test_sets_lst,
+                                kwargs: dict, seed: int = None):
+    if seed is not None:
+        # Bootstrap samples are drawn with seeds derived from the seed as in compute_metrics_with_task_graph(),
+        # and the global random state is seeded for models, which use it
+        np.random.seed(seed)
+        random.seed(seed)
+    if extra_test_sets_lst is None:
+        return compute_model_metrics_with_cache(base_model=base_model, dataset=dataset, base_model_name=model_name,
+                                                bootstrap_seed=seed, **kwargs)
+    return compute_model_metrics_with_multiple_test_sets(base_model=base_model, dataset=dataset,
+                                                         extra_test_sets_lst=extra_test_sets_lst,
+                                                         base_model_name=model_name, bootstrap_seed=seed, **kwargs)
+
+
+def _create_model_metrics_kwargs(dataset_name: str, n_estimators: int, bootstrap_fraction: float,
+                                 sensitive_attributes_dct: dict, model_setting: str, computation_mode: str,
+                                 extra_test_sets_lst, save_results: bool, save_results_dir_path: str,
+                                 experiment_cache: ExperimentCache, verbose: int) -> dict:
+    kwargs = dict(n_estimators=n_estimators, bootstrap_fraction=bootstrap_fraction,
+                  sensitive_attributes_dct=sensitive_attributes_dct, model_setting=model_setting,
+                  computation_mode=computation_mode, dataset_name=dataset_name, verbose=verbose)
+    if extra_test_sets_lst is None:
+        kwargs.update(save_results=save_results, save_results_dir_path=save_results_dir_path,
+                      experiment_cache=experiment_cache)
+    return kwargs
+
+
+def _spawn_models_seeds(seed: int, n_models: int) -> list:
+    # Seeds of model tasks are derived in the parent process, since forked workers share the global random state.
+    # Without a seed, it is drawn from the global numpy state to keep runs reproducible with np.random.seed().
+    seed = np.random.randint(np.iinfo(np.int32).max) if seed is None else seed
+    return [int(seed_sequence.generate_state(1)[0]) for seed_sequence in np.random.SeedSequence(seed).spawn(n_models)]
+
+
+def _run_models_metrics_computation(dataset: BaseFlowDataset, models_config: dict, extra_test_sets_lst,
+                                    kwargs: dict, seed: int, verbose: int) -> dict:
     models_metrics_dct = dict()
+    models_seeds = _spawn_models_seeds(seed, len(models_config))
     num_models = len(models_config)
     for model_idx, model_name in tqdm(enumerate(models_config.keys()),
                                       total=num_models,
@@ -195,23 +558,12 @@ def run_metrics_computation(dataset: BaseFlowDataset, bootstrap_fraction: float,
         if verbose >= 1:
             print('#' * 30, f' [Model {model_idx + 1} / {num_models}] Analyze {model_name} ', '#' * 30)
         try:
-            base_model = models_config[model_name]
-            model_metrics_df = compute_model_metrics(base_model=base_model,
-                                                     n_estimators=n_estimators,
-                                                     dataset=dataset,
-                                                     bootstrap_fraction=bootstrap_fraction,
-                                                     sensitive_attributes_dct=sensitive_attributes_dct,
-                                                     model_setting=model_setting,
-                                                     computation_mode=computation_mode,
-                                                     dataset_name=dataset_name,
-                                                     base_model_name=model_name,
-                                                     save_results=save_results,
-                                                     save_results_dir_path=save_results_dir_path,
-                                                     verbose=verbose)
-            models_metrics_dct[model_name] = model_metrics_df
-            if verbose >= 2:
+            model_metrics = _compute_model_metrics_task(dataset, model_name, models_config[model_name],
+                                                        extra_test_sets_lst, kwargs, seed=models_seeds[model_idx])
+            models_metrics_dct[model_name] = model_metrics
+            if verbose >= 2 and extra_test_sets_lst is None:
                 print(f'\n[{model_name}] Metrics matrix:')
-                display(model_metrics_df)
+                display(model_metrics)
         except Exception as err:
             print('#' * 20, f'ERROR with {model_name}', '#' * 20)
             traceback.print_exc()
@@ -222,8 +574,204 @@ def run_metrics_computation(dataset: BaseFlowDataset, bootstrap_fraction: float,
     return models_metrics_dct
 
 
+def _create_metrics_computation_executor(n_jobs: int, n_tasks: int, datasets_dct: dict):
+    n_workers = os.cpu_count() if n_jobs is None or n_jobs < 0 else n_jobs
+    n_workers = max(min(n_workers, n_tasks), 1)
+    return concurrent.futures.ProcessPoolExecutor(max_workers=n_workers,
+                                                  initializer=_init_metrics_computation_worker,
+                                                  initargs=(datasets_dct,))
+
+
+def iter_metrics_computation(dataset: BaseFlowDataset, bootstrap_fraction: float, dataset_name: str,
+                             models_config: dict, n_estimators: int, sensitive_attributes_dct: dict,
+                             model_setting: str = ModelSetting.BATCH.value, computation_mode: str = None,
+                             save_results: bool = True, save_results_dir_path: str = None,
+                             extra_test_sets_lst: list = None, n_jobs: int = -1,
+                             experiment_cache: ExperimentCache = None, seed: int = None, verbose: int = 0):
+    """
+    Compute stability and accuracy metrics for models in models_config in parallel worker processes.
+     Each model is analyzed by compute_model_metrics() (or compute_model_metrics_with_multiple_test_sets()
+     if extra_test_sets_lst is defined) in one task, and the dataset is sent to each worker only once
+     and used read-only by all its tasks.
+
+    Yield a tuple of a model name and its metrics as soon as the model is analyzed, so the order of models
+     is the order of completion. A failed model is reported with its traceback and skipped, and other models
+     continue. Each model task seeds numpy and random in its worker with its own seed spawned from seed
+     by np.random.SeedSequence, so metrics of a model do not depend on n_jobs and the order of completion.
+
+    Parameters
+    ----------
+    dataset
+        Dataset object that contains all needed attributes like target, features, numerical_columns etc.
+    bootstrap_fraction
+        Fraction of a train set in range [0.0 - 1.0] to fit models in bootstrap
+    dataset_name
+        Dataset name to name a result file with metrics
+    models_config
+        Dictionary where keys are model names, and values are initialized models
+    n_estimators
+        Number of estimators for bootstrap to compute subgroup stability metrics
+    sensitive_attributes_dct
+        A dictionary where keys are sensitive attribute names (including attributes intersections),
+         and values are privilege values for these attributes
+    model_setting
+        [Optional] Model type: 'batch' or incremental. Default: 'batch'.
+    computation_mode
+        [Optional] A non-default mode for metrics computation. Should be included in the ComputationMode enum.
+    save_results
+        [Optional] If to save result metrics in a file. Not used with extra_test_sets_lst.
+    save_results_dir_path
+        [Optional] Location where to save result files with metrics. Not used with extra_test_sets_lst.
+    extra_test_sets_lst
+        [Optional] List of extra test sets like [(X_test1, y_test1), (X_test2, y_test2), ...] to compute metrics
+    n_jobs
+        [Optional] Number of worker processes, -1 means all CPUs. Default: -1.
+    experiment_cache
+        [Optional] ExperimentCache to load metrics of already computed models instead of refitting them.
+         Not used with extra_test_sets_lst.
+    seed
+        [Optional] Seed to spawn seeds of model tasks. Default: None (drawn from the global numpy state,
+         so results are reproducible with np.random.seed()).
+    verbose
+        [Optional] Level of logs printing. The greater level provides more logs.
+            As for now, 0, 1, 2 levels are supported.
+
+    """
+    kwargs = _create_model_metrics_kwargs(dataset_name, n_estimators, bootstrap_fraction, sensitive_attributes_dct,
+                                          model_setting, computation_mode, extra_test_sets_lst, save_results,
+                                          save_results_dir_path, experiment_cache, verbose)
+    models_seeds = _spawn_models_seeds(seed, len(models_config))
+
+    with _create_metrics_computation_executor(n_jobs, len(models_config), {0: dataset}) as executor:
+        futures_dct = {
+            executor.submit(_compute_model_metrics_in_worker, 0, model_name, base_model, extra_test_sets_lst, kwargs,
+                            model_seed): model_name
+            for (model_name, base_model), model_seed in zip(models_config.items(), models_seeds)
+        }
+        for future in tqdm(concurrent.futures.as_completed(futures_dct),
+                           total=len(futures_dct),
+                           desc="Analyze models in one run",
+                           colour="red"):
+            model_name = futures_dct[future]
+            try:
+                model_metrics = future.result()
+            except Exception as err:
+                print('#' * 20, f'ERROR with {model_name}', '#' * 20)
+                traceback.print_exception(type(err), err, err.__traceback__)
+                continue
+
+            if verbose >= 1:
+                print(f'Model {model_name} is analyzed')
+            yield model_name, model_metrics
+
+
+def compute_metrics_multiple_runs(data_loader: BaseDataLoader, column_transformer: ColumnTransformer, config,
+                                  models_config: dict, save_results_dir_path: str = None, n_jobs: int = None,
+                                  experiment_cache: ExperimentCache = None, verbose: int = 0) -> dict:
+    """
+    Compute stability and accuracy metrics for each model in models_config and each seed in config.runs_seed_lst.
+     For each run, the dataset is split with the run seed and preprocessed once, and this dataset is reused by all
+     models of the run. Each model is refitted with the run seed as its random_state (or seed for incremental models),
+     and each bootstrap sample is drawn with its own seed derived from the run seed as in
+     compute_metrics_with_task_graph(), so results are reproducible both sequentially and in parallel and are equal
+     to metrics of the task graph.
+
+    Return a dictionary where keys are model names, and values are metrics of all runs concatenated with
+     Run_Number (starting from 1) and Model_Seed columns, which can be used by MetricsComposer and MetricsVisualizer.
+     Failed (run, model) pairs are reported with their tracebacks and skipped.
+
+    Parameters
+    ----------
+    data_loader
+        Instance of BaseDataLoader that contains a target, numerical, and categorical columns
+    column_transformer
+        Instance of sklearn ColumnTransformer to preprocess categorical and numerical columns. It is fitted
+         on a copy for each run.
+    config
+        Object that contains bootstrap_fraction, dataset_name, n_estimators, sensitive_attributes_dct,
+         test_set_fraction, and runs_seed_lst attributes
+    models_config
+        Dictionary where keys are model names, and values are initialized models
+    save_results_dir_path
+        [Optional] Location where to save result files with metrics of all runs for each model
+    n_jobs
+        [Optional] Number of worker processes to run (run, model) pairs in parallel, -1 means all CPUs.
+         Preprocessed datasets of all runs are sent once to each worker. Default: None (pairs are run one by one).
+    experiment_cache
+        [Optional] ExperimentCache to load metrics of already computed (run, model) pairs instead of refitting them
+    verbose
+        [Optional] Level of logs printing. The greater level provides more logs.
+            As for now, 0, 1, 2 levels are supported.
+
+    """
+    model_setting = getattr(config, 'model_setting', ModelSetting.BATCH.value)
+    computation_mode = getattr(config, 'computation_mode', None)
+    kwargs = dict(n_estimators=config.n_estimators, bootstrap_fraction=config.bootstrap_fraction,
+                  sensitive_attributes_dct=config.sensitive_attributes_dct, model_setting=model_setting,
+                  computation_mode=computation_mode, dataset_name=config.dataset_name, save_results=False,
+                  experiment_cache=experiment_cache, verbose=verbose)
+
+    # Split and preprocess a dataset of each run once for all models
+    datasets_dct = {run_idx: preprocess_dataset(data_loader, copy.deepcopy(column_transformer),
+                                                config.test_set_fraction, dataset_split_seed=run_seed)
+                    for run_idx, run_seed in enumerate(config.runs_seed_lst)}
+    tasks = [(run_idx, run_seed, model_name,
+              reset_model_seed(copy.deepcopy(base_model), run_seed, verbose=0))
+             for run_idx, run_seed in enumerate(config.runs_seed_lst)
+             for model_name, base_model in models_config.items()]
+
+    def add_run_columns(model_metrics_df, run_idx, run_seed):
+        model_metrics_df['Run_Number'] = run_idx + 1
+        model_metrics_df['Model_Seed'] = run_seed
+        return model_metrics_df
+
+    runs_metrics_dct = dict()
+    if n_jobs is None or n_jobs == 1:
+        for run_idx, run_seed, model_name, base_model in tqdm(tasks, desc="Analyze models in multiple runs",
+                                                              colour="red"):
+            if verbose >= 1:
+                print('#' * 30, f' [Run {run_idx + 1} / {len(datasets_dct)}] Analyze {model_name} ', '#' * 30)
+            try:
+                model_metrics_df = _compute_model_metrics_task(datasets_dct[run_idx], model_name, base_model, None,
+                                                               kwargs, seed=run_seed)
+                runs_metrics_dct[(run_idx, model_name)] = add_run_columns(model_metrics_df, run_idx, run_seed)
+            except Exception as err:
+                print('#' * 20, f'ERROR with {model_name} in run {run_idx + 1}', '#' * 20)
+                traceback.print_exc()
+    else:
+        with _create_metrics_computation_executor(n_jobs, len(tasks), datasets_dct) as executor:
+            futures_dct = {
+                executor.submit(_compute_model_metrics_in_worker, run_idx, model_name, base_model, None, kwargs,
+                                run_seed): (run_idx, run_seed, model_name)
+                for run_idx, run_seed, model_name, base_model in tasks
+            }
+            for future in tqdm(concurrent.futures.as_completed(futures_dct), total=len(futures_dct),
+                               desc="Analyze models in multiple runs", colour="red"):
+                run_idx, run_seed, model_name = futures_dct[future]
+                try:
+                    runs_metrics_dct[(run_idx, model_name)] = add_run_columns(future.result(), run_idx, run_seed)
+                except Exception as err:
+                    print('#' * 20, f'ERROR with {model_name} in run {run_idx + 1}', '#' * 20)
+                    traceback.print_exception(type(err), err, err.__traceback__)
+
+    models_metrics_dct = dict()
+    for model_name in models_config.keys():
+        model_runs_metrics = [runs_metrics_dct[(run_idx, model_name)] for run_idx in range(len(datasets_dct))
+                              if (run_idx, model_name) in runs_metrics_dct]
+        if len(model_runs_metrics) == 0:
+            continue
+        models_metrics_dct[model_name] = pd.concat(model_runs_metrics, ignore_index=True)
+        if save_results_dir_path is not None:
+            save_metrics_to_file(models_metrics_dct[model_name],
+                                 f'Metrics_{config.dataset_name}_{model_name}_{len(datasets_dct)}_Runs',
+                                 save_results_dir_path)
+
+    return models_metrics_dct
+
+
 def compute_metrics_with_config(dataset: BaseFlowDataset, config, models_config: dict,
-                                save_results_dir_path: str, verbose: int = 0) -> dict:
+                                save_results_dir_path: str, experiment_cache: ExperimentCache = None,
+                                verbose: int = 0) -> dict:
     """
     Compute stability and accuracy metrics for each model in models_config. Arguments are defined as an input config object.
     Save results in `save_results_dir_path` folder.
@@ -240,6 +788,8 @@ def compute_metrics_with_config(dataset: BaseFlowDataset, config, models_config:
         Dictionary where keys are model names, and values are initialized models
     save_results_dir_path
         Location where to save result files with metrics
+    experiment_cache
+        [Optional] ExperimentCache to load metrics of already computed models instead of refitting them
     verbose
         [Optional] Level of logs printing. The greater level provides more logs.
             As for now, 0, 1, 2 levels are supported.
@@ -258,6 +808,7 @@ def compute_metrics_with_config(dataset: BaseFlowDataset, config, models_config:
                                                  model_setting=config.model_setting,
                                                  computation_mode=config.computation_mode,
                                                  save_results=False,
+                                                 experiment_cache=experiment_cache,
                                                  verbose=verbose)
 
     # Concatenate with previous results and save them in an overwrite mode each time for backups
@@ -272,7 +823,8 @@ def compute_metrics_with_config(dataset: BaseFlowDataset, config, models_config:
 
 
 def compute_metrics_multiple_runs_with_db_writer(dataset: BaseFlowDataset, config, models_config: dict,
-                                                 custom_tbl_fields_dct: dict, db_writer_func, verbose: int = 0) -> dict:
+                                                 custom_tbl_fields_dct: dict, db_writer_func,
+                                                 experiment_cache: ExperimentCache = None, verbose: int = 0) -> dict:
     """
     Compute stability and accuracy metrics for each model in models_config. Arguments are defined as an input config object.
     Save results to a database after each run appending fields and value from custom_tbl_fields_dct and using db_writer_func.
@@ -291,6 +843,8 @@ def compute_metrics_multiple_runs_with_db_writer(dataset: BaseFlowDataset, confi
         Dictionary where keys are column names and values to add to inserted metrics during saving results to a database
     db_writer_func
         Python function object has one argument (run_models_metrics_df) and save this metrics df to a target database
+    experiment_cache
+        [Optional] ExperimentCache to load metrics of already computed models instead of refitting them
     verbose
         [Optional] Level of logs printing. The greater level provides more logs.
             As for now, 0, 1, 2 levels are supported.
@@ -307,6 +861,7 @@ def compute_metrics_multiple_runs_with_db_writer(dataset: BaseFlowDataset, confi
                                                  model_setting=config.model_setting,
                                                  computation_mode=config.computation_mode,
                                                  save_results=False,
+                                                 experiment_cache=experiment_cache,
                                                  verbose=verbose)
 
     # Concatenate current run metrics with previous results and
@@ -416,7 +971,8 @@ def compute_metrics_multiple_runs_with_multiple_test_sets(dataset: BaseFlowDatas
 def run_metrics_computation_with_multiple_test_sets(dataset: BaseFlowDataset, bootstrap_fraction: float, dataset_name: str,
                                                     extra_test_sets_lst: list, models_config: dict, n_estimators: int,
                                                     sensitive_attributes_dct: dict, model_setting: str = ModelSetting.BATCH.value,
-                                                    computation_mode: str = None, verbose: int = 0) -> dict:
+                                                    computation_mode: str = None, n_jobs: int = None,
+                                                    seed: int = None, verbose: int = 0) -> dict:
     """
     Compute stability and accuracy metrics for each model in models_config based on dataset.X_test and each extra test set
      in extra_test_sets_lst. Save results in `save_results_dir_path` folder.
@@ -444,41 +1000,37 @@ def run_metrics_computation_with_multiple_test_sets(dataset: BaseFlowDataset, bo
         Model type: 'batch' or incremental.
     computation_mode
         [Optional] A non-default mode for metrics computation. Should be included in the ComputationMode enum.
+    n_jobs
+        [Optional] Number of worker processes to analyze models in parallel, -1 means all CPUs.
+         Refer to iter_metrics_computation() for details. Default: None (models are analyzed one by one).
+    seed
+        [Optional] Seed to spawn seeds of models. Each model is analyzed with its own seed, so metrics
+         do not depend on n_jobs. Default: None (drawn from the global numpy state).
     verbose
         [Optional] Level of logs printing. The greater level provides more logs.
             As for now, 0, 1, 2 levels are supported.
 
     """
-    models_metrics_dct = dict()
-    num_models = len(models_config)
-    for model_idx, model_name in tqdm(enumerate(models_config.keys()),
-                                      total=num_models,
-                                      desc="Analyze models in one run",
-                                      colour="red"):
-        if verbose >= 1:
-            print('#' * 30, f' [Model {model_idx + 1} / {num_models}] Analyze {model_name} ', '#' * 30)
-        try:
-            base_model = models_config[model_name]
-            model_metrics_dfs_lst = compute_model_metrics_with_multiple_test_sets(base_model=base_model,
-                                                                                  n_estimators=n_estimators,
-                                                                                  dataset=dataset,
-                                                                                  extra_test_sets_lst=extra_test_sets_lst,
-                                                                                  bootstrap_fraction=bootstrap_fraction,
-                                                                                  sensitive_attributes_dct=sensitive_attributes_dct,
-                                                                                  model_setting=model_setting,
-                                                                                  computation_mode=computation_mode,
-                                                                                  dataset_name=dataset_name,
-                                                                                  base_model_name=model_name,
-                                                                                  verbose=verbose)
-            models_metrics_dct[model_name] = model_metrics_dfs_lst
-        except Exception as err:
-            print('#' * 20, f'ERROR with {model_name}', '#' * 20)
-            traceback.print_exc()
-
-        if verbose >= 1:
-            print('\n\n\n')
-
-    return models_metrics_dct
+    if n_jobs is not None and n_jobs != 1:
+        models_metrics_dct = dict(iter_metrics_computation(dataset=dataset,
+                                                           bootstrap_fraction=bootstrap_fraction,
+                                                           dataset_name=dataset_name,
+                                                           models_config=models_config,
+                                                           n_estimators=n_estimators,
+                                                           sensitive_attributes_dct=sensitive_attributes_dct,
+                                                           model_setting=model_setting,
+                                                           computation_mode=computation_mode,
+                                                           extra_test_sets_lst=extra_test_sets_lst,
+                                                           n_jobs=n_jobs,
+                                                           seed=seed,
+                                                           verbose=verbose))
+        return {model_name: models_metrics_dct[model_name] for model_name in models_config.keys()
+                if model_name in models_metrics_dct}
+
+    kwargs = _create_model_metrics_kwargs(dataset_name, n_estimators, bootstrap_fraction, sensitive_attributes_dct,
+                                          model_setting, computation_mode, extra_test_sets_lst, None, None, None,
+                                          verbose)
+    return _run_models_metrics_computation(dataset, models_config, extra_test_sets_lst, kwargs, seed, verbose)
 
 
 def compute_model_metrics_with_multiple_test_sets(base_model, n_estimators: int,
@@ -486,7 +1038,8 @@ def compute_model_metrics_with_multiple_test_sets(base_model, n_estimators: int,
                                                   bootstrap_fraction: float, sensitive_attributes_dct: dict,
                                                   dataset_name: str, base_model_name: str,
                                                   model_setting: str = ModelSetting.BATCH.value,
-                                                  computation_mode: str = None, verbose: int = 0):
+                                                  computation_mode: str = None, bootstrap_seed: int = None,
+                                                  verbose: int = 0):
     """
     Compute subgroup metrics for the base model based on dataset.X_test and each extra test set in extra_test_sets_lst.
     Save results in `save_results_dir_path` folder.
@@ -516,6 +1069,9 @@ def compute_model_metrics_with_multiple_test_sets(base_model, n_estimators: int,
         Model type: 'batch' or incremental.
     computation_mode
         [Optional] A non-default mode for metrics computation. Should be included in the ComputationMode enum.
+    bootstrap_seed
+        [Optional] Seed to derive seeds of bootstrap samples of all estimators. Default: None (the global numpy
+         random state).
     verbose
         [Optional] Level of logs printing. The greater level provides more logs.
             As for now, 0, 1, 2 levels are supported.
@@ -532,12 +1088,14 @@ def compute_model_metrics_with_multiple_test_sets(base_model, n_estimators: int,
                                                           sensitive_attributes_dct=sensitive_attributes_dct,
                                                           test_protected_groups=dict(),  # stub for this attribute
                                                           computation_mode=computation_mode,
+                                                          bootstrap_seed=bootstrap_seed,
                                                           verbose=verbose)
 
     test_sets_lst = [(dataset.X_test, dataset.y_test)] + extra_test_sets_lst
     all_test_sets_metrics_lst = []
     for set_idx, (new_X_test, new_y_test) in enumerate(test_sets_lst):
-        new_test_protected_groups = create_test_protected_groups(new_X_test, dataset.init_features_df, sensitive_attributes_dct)
+        new_test_protected_groups = create_test_protected_groups_cached(new_X_test, dataset.init_features_df,
+                                                                        sensitive_attributes_dct)
         if verbose >= 2:
             print(f'\nProtected groups splits for test set index #{set_idx}:')
             for g in new_test_protected_groups.keys():
@@ -565,12 +1123,7 @@ def compute_model_metrics_with_multiple_test_sets(base_model, n_estimators: int,
                                                           result_filename=None,
                                                           save_dir_path=None)
         error_metrics_df = pd.DataFrame(dtc_res)
-
-        metrics_df = pd.concat([variance_metrics_df, error_metrics_df])
-        metrics_df = metrics_df.reset_index()
-        metrics_df = metrics_df.rename(columns={"index": "Metric"})
-        metrics_df['Model_Name'] = base_model_name
-        metrics_df['Model_Params'] = str(base_model.get_params())
+        metrics_df = create_model_metrics_df(variance_metrics_df, error_metrics_df, base_model, base_model_name)
 
         all_test_sets_metrics_lst.append(metrics_df)
 
@@ -0,0 +1,187 @@
+import json
+import math
+import asyncio
+import pandas as pd
+
+from virny.configs.constants import INTERSECTION_SIGN
+from virny.custom_classes.custom_logger import get_logger
+from virny.custom_classes.sliding_window_subgroup_metrics import SlidingWindowSubgroupMetrics
+
+
+HTTP_STATUS_PHRASES = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+}
+
+
+class MetricsMonitoringService:
+    """
+    Long-running asyncio service that monitors subgroup variance and error metrics of a deployed ensemble
+     over a sliding window of live prediction events. Metrics follow the definitions of SubgroupVarianceCalculator
+     and SubgroupErrorAnalyzer, and subgroups follow the semantics of create_test_protected_groups().
+
+    The service speaks a minimal HTTP/1.1 JSON protocol over TCP or a local unix socket:
+
+    * POST /predictions -- add a batch of events. Body: {"sample_ids": [...], "features": {column: [values]},
+      "probabilities": [[member_1_proba, ..., member_n_proba], ...], "labels": [...] (optional)}.
+      Probabilities are predicted for the zero value label, one row per sample. Sensitive attributes are
+      taken from the features by their names in sensitive_attributes_dct.
+
+    * POST /labels -- attach delayed labels. Body: {"sample_ids": [...], "labels": [...]}.
+
+    * GET /metrics -- current metrics, a JSON object where keys are 'overall' and subgroup names.
+
+    Parameters
+    ----------
+    sensitive_attributes_dct
+        A dictionary where keys are sensitive attribute names (including attributes intersections),
+         and values are disadvantaged values for these attributes
+    window_size
+        Maximum number of the most recent samples to compute metrics on
+    host
+        [Optional] Host to listen on. Default: '127.0.0.1'.
+    port
+        [Optional] TCP port to listen on. Use 0 to pick a free port. Default: 8765.
+    unix_socket_path
+        [Optional] Path to a unix socket to listen on instead of a TCP port
+    verbose
+        [Optional] Level of logs printing. The greater level provides more logs.
+            As for now, 0, 1, 2 levels are supported.
+
+    """
+    def __init__(self, sensitive_attributes_dct: dict, window_size: int = 10_000, host: str = '127.0.0.1',
+                 port: int = 8765, unix_socket_path: str = None, verbose: int = 0):
+        self.sensitive_attributes_dct = sensitive_attributes_dct
+        self.sensitive_attrs = [attr for attr in sensitive_attributes_dct.keys() if INTERSECTION_SIGN not in attr]
+        self.host = host
+        self.port = port
+        self.unix_socket_path = unix_socket_path
+        self.metrics_state = SlidingWindowSubgroupMetrics(sensitive_attributes_dct, window_size)
+
+        self._server = None
+        self.__logger = get_logger(verbose)
+
+    async def start(self):
+        """
+        Start listening for connections. If port is 0, self.port is set to the port picked by the OS.
+        """
+        if self.unix_socket_path is not None:
+            self._server = await asyncio.start_unix_server(self._handle_connection, path=self.unix_socket_path)
+            self.__logger.info(f'Metrics monitoring service is listening on {self.unix_socket_path}')
+        else:
+            self._server = await asyncio.start_server(self._handle_connection, host=self.host, port=self.port)
+            self.port = self._server.sockets[0].getsockname()[1]
+            self.__logger.info(f'Metrics monitoring service is listening on {self.host}:{self.port}')
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    def run(self):
+        """
+        Run the service in the current thread until it is interrupted.
+        """
+        asyncio.run(self.serve_forever())
+
+    def handle_request(self, method: str, path: str, body: dict):
+        """
+        Route a decoded request to the metrics state.
+
+        Return a tuple of an HTTP status code and a JSON-serializable response.
+
+        Parameters
+        ----------
+        method
+            HTTP method
+        path
+            Request path
+        body
+            Decoded JSON body of the request
+
+        """
+        if path == '/metrics':
+            if method != 'GET':
+                return 405, {'error': 'Use GET for /metrics'}
+            return 200, replace_nan_with_none(self.metrics_state.get_metrics())
+
+        if path == '/predictions':
+            if method != 'POST':
+                return 405, {'error': 'Use POST for /predictions'}
+            features_df = pd.DataFrame(body['features'])
+            self.metrics_state.add_predictions(sample_ids=body['sample_ids'],
+                                               sensitive_attrs_df=features_df[self.sensitive_attrs],
+                                               models_probabilities=body['probabilities'],
+                                               y_true=body.get('labels'))
+            return 200, {'window_size': len(self.metrics_state)}
+
+        if path == '/labels':
+            if method != 'POST':
+                return 405, {'error': 'Use POST for /labels'}
+            self.metrics_state.add_labels(body['sample_ids'], body['labels'])
+            return 200, {'window_size': len(self.metrics_state)}
+
+        return 404, {'error': f'Unknown path {path}'}
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = dict()
+                while True:
+                    header_line = await reader.readline()
+                    if header_line in (b'\r\n', b'\n', b''):
+                        break
+                    name, value = header_line.decode('latin-1').split(':', 1)
+                    headers[name.strip().lower()] = value.strip()
+
+                content_length = int(headers.get('content-length', 0))
+                raw_body = await reader.readexactly(content_length) if content_length > 0 else b''
+                try:
+                    body = json.loads(raw_body) if raw_body else dict()
+                    status, response = self.handle_request(method.upper(), path.split('?', 1)[0], body)
+                except (ValueError, KeyError, TypeError) as err:
+                    status, response = 400, {'error': f'{type(err).__name__}: {err}'}
+
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                await self._write_response(writer, status, response, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _write_response(writer: asyncio.StreamWriter, status: int, response: dict, keep_alive: bool):
+        payload = json.dumps(response).encode('utf-8')
+        head = (f'HTTP/1.1 {status} {HTTP_STATUS_PHRASES.get(status, "")}\r\n'
+                f'Content-Type: application/json\r\n'
+                f'Content-Length: {len(payload)}\r\n'
+                f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n')
+        writer.write(head.encode('latin-1') + payload)
+        await writer.drain()
+
+
+def replace_nan_with_none(metrics_dct: dict):
+    """
+    Replace NaN and infinite metric values with None to create a valid JSON.
+    """
+    return {
+        group_name: {metric: None if isinstance(value, float) and not math.isfinite(value) else value
+                     for metric, value in group_metrics.items()}
+        for group_name, group_metrics in metrics_dct.items()
+    }
@@ -0,0 +1,75 @@
+import pandas as pd
+
+from virny.configs.constants import ModelSetting
+from virny.utils.common_helpers import save_metrics_to_file
+from virny.utils.multiclass_stability_utils import compute_multiclass_subgroup_error_metrics
+from virny.utils.protected_groups_partitioning import create_test_protected_groups_cached
+from virny.custom_classes.base_dataset import BaseFlowDataset
+from virny.analyzers.subgroup_variance_analyzer import SubgroupVarianceAnalyzer
+from virny.user_interfaces.metrics_computation_interfaces import create_model_metrics_df
+
+
+def compute_multiclass_model_metrics(base_model, n_estimators: int, dataset: BaseFlowDataset,
+                                     bootstrap_fraction: float, sensitive_attributes_dct: dict, dataset_name: str,
+                                     base_model_name: str, save_results: bool = True,
+                                     save_results_dir_path: str = None, verbose: int = 0):
+    """
+    Compute subgroup metrics for a multiclass batch base model. Variance metrics are generalized
+     for multiple classes by compute_multiclass_per_sample_stats(), and error metrics are Accuracy
+     and one-vs-rest metrics of each class named like 'TPR_<class>'.
+
+    Return a dataframe of model metrics in the same format as compute_model_metrics().
+
+    Parameters
+    ----------
+    base_model
+        Base model for metrics computation. Must implement predict_proba() and have a classes_ attribute after fit.
+    n_estimators
+        Number of estimators for bootstrap to compute subgroup variance metrics
+    dataset
+        BaseFlowDataset object that contains all needed attributes like target, features, numerical_columns etc.
+    bootstrap_fraction
+        Fraction of a train set in range [0.0 - 1.0] to fit models in bootstrap
+    sensitive_attributes_dct
+        A dictionary where keys are sensitive attribute names (including attributes intersections),
+         and values are privilege values for these attributes
+    dataset_name
+        Dataset name to name a result file with metrics
+    base_model_name
+        Model name to name a result file with metrics
+    save_results
+        [Optional] If to save result metrics in a file
+    save_results_dir_path
+        [Optional] Location where to save result files with metrics
+    verbose
+        [Optional] Level of logs printing. The greater level provides more logs.
+            As for now, 0, 1, 2 levels are supported.
+
+    """
+    test_protected_groups = create_test_protected_groups_cached(dataset.X_test, dataset.init_features_df,
+                                                                sensitive_attributes_dct)
+    subgroup_variance_analyzer = SubgroupVarianceAnalyzer(model_setting=ModelSetting.BATCH,
+                                                          n_estimators=n_estimators,
+                                                          base_model=base_model,
+                                                          base_model_name=base_model_name,
+                                                          bootstrap_fraction=bootstrap_fraction,
+                                                          dataset=dataset,
+                                                          dataset_name=dataset_name,
+                                                          sensitive_attributes_dct=sensitive_attributes_dct,
+                                                          test_protected_groups=test_protected_groups,
+                                                          multiclass=True,
+                                                          verbose=verbose)
+    y_preds, variance_metrics_df = subgroup_variance_analyzer.compute_metrics(save_results=False,
+                                                                              result_filename=None,
+                                                                              save_dir_path=None,
+                                                                              make_plots=False)
+    error_metrics_df = pd.DataFrame(compute_multiclass_subgroup_error_metrics(dataset.y_test, y_preds,
+                                                                              test_protected_groups,
+                                                                              subgroup_variance_analyzer.classes))
+    metrics_df = create_model_metrics_df(variance_metrics_df, error_metrics_df, base_model, base_model_name)
+
+    if save_results:
+        result_filename = f'Metrics_{dataset_name}_{base_model_name}'
+        save_metrics_to_file(metrics_df, result_filename, save_results_dir_path)
+
+    return metrics_df
@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+
+from virny.configs.constants import VARIANCE_METRICS, ERROR_METRICS
+from virny.utils.stability_utils import compute_per_sample_stats
+from virny.utils.ensemble_predictions_utils import load_ensemble_predictions
+from virny.utils.protected_groups_partitioning import create_test_protected_groups, get_protected_group_names
+from virny.custom_classes.metrics_accumulators import VarianceMetricsAccumulator, ErrorMetricsAccumulator
+from virny.custom_classes.quantized_predictions import QuantizedPredictions
+from virny.user_interfaces.sharded_metrics_interfaces import create_model_metrics_df_from_accumulators
+
+
+def compute_model_metrics_from_predictions(predictions_file_path: str, init_features_df: pd.DataFrame,
+                                           sensitive_attributes_dct: dict, base_model_name: str = None,
+                                           chunk_size: int = 100_000) -> pd.DataFrame:
+    """
+    Re-analyze bootstrap predictions saved by compute_model_metrics(..., predictions_file_path=...) for a new
+     sensitive_attributes_dct, for example, with other disadvantaged values or new intersections. Models are not
+     refitted, and subgroup variance and error metrics are computed from the saved predictions in chunks of test rows.
+     Composed metrics can be computed from the result by MetricsComposer as for compute_model_metrics().
+
+    Return a dataframe of model metrics in the same format as compute_model_metrics().
+
+    Parameters
+    ----------
+    predictions_file_path
+        Path to a .npz file with bootstrap predictions
+    init_features_df
+        Initial full dataset without preprocessing that contains the test index and sensitive attributes
+    sensitive_attributes_dct
+        A dictionary where keys are sensitive attribute names (including attributes intersections),
+         and values are privilege values for these attributes
+    base_model_name
+        [Optional] Model name to fill the Model_Name column. Default: a model name saved with predictions.
+    chunk_size
+        [Optional] Number of test rows to compute per-sample metrics at a time. Default: 100_000.
+
+    """
+    models_predictions, y_test, model_info = load_ensemble_predictions(predictions_file_path)
+    base_model_name = model_info['base_model_name'] if base_model_name is None else base_model_name
+
+    group_names = get_protected_group_names(sensitive_attributes_dct)
+    variance_metrics_accumulator = VarianceMetricsAccumulator(group_names)
+    error_metrics_accumulator = ErrorMetricsAccumulator(group_names)
+    for start in range(0, y_test.shape[0], chunk_size):
+        y_test_chunk = y_test.iloc[start: start + chunk_size]
+        test_protected_groups = create_test_protected_groups(pd.DataFrame(index=y_test_chunk.index), init_features_df,
+                                                             sensitive_attributes_dct, allow_empty_groups=True)
+        predictions_chunk = models_predictions.to_numpy(start, start + chunk_size) \
+            if isinstance(models_predictions, QuantizedPredictions) else models_predictions[:, start: start + chunk_size]
+        per_sample_stats_df = compute_per_sample_stats(y_test_chunk.values, predictions_chunk, index=y_test_chunk.index)
+        y_preds = (per_sample_stats_df['Mean'].values < 0.5).astype(int)
+        variance_metrics_accumulator.update(y_test_chunk, None, test_protected_groups, per_sample_stats_df)
+        error_metrics_accumulator.update(y_test_chunk, y_preds, test_protected_groups)
+
+    metrics_df = create_model_metrics_df_from_accumulators(variance_metrics_accumulator, error_metrics_accumulator,
+                                                           None, base_model_name)
+    metrics_df['Model_Params'] = model_info['model_params']
+    return metrics_df
+
+
+def compute_quantization_accuracy_report(models_predictions, y_test: pd.DataFrame, test_protected_groups: dict = None,
+                                         predictions_dtypes: tuple = ('float16', 'uint16', 'uint8')) -> pd.DataFrame:
+    """
+    Measure how much each overall and subgroup metric shifts when bootstrap predictions are stored
+     as QuantizedPredictions of each type instead of float64.
+
+    Return a pandas dataframe with Predictions_Dtype, Bytes_Per_Prediction, Subgroup, Metric, Reference_Value,
+     Quantized_Value, and Absolute_Shift columns.
+
+    Parameters
+    ----------
+    models_predictions
+        Dict of lists where key is a model index, and value is a list of model predictions for the test set,
+         for example, SubgroupVarianceAnalyzer.models_predictions
+    y_test
+        Targets of the test set
+    test_protected_groups
+        [Optional] Protected groups of the test set created by create_test_protected_groups().
+         If None, only overall metrics are reported.
+    predictions_dtypes
+        [Optional] Types of quantized storage to compare. Default: ('float16', 'uint16', 'uint8').
+
+    """
+    test_protected_groups = dict() if test_protected_groups is None else test_protected_groups
+    group_names = list(test_protected_groups.keys())
+
+    def compute_metrics(predictions):
+        if isinstance(predictions, QuantizedPredictions):
+            per_sample_stats_df = predictions.compute_per_sample_stats(y_test.values, index=y_test.index)
+        else:
+            per_sample_stats_df = compute_per_sample_stats(y_test.values, predictions, index=y_test.index)
+        y_preds = (per_sample_stats_df['Mean'].values < 0.5).astype(int)
+        variance_metrics = VarianceMetricsAccumulator(group_names).update(y_test, None, test_protected_groups,
+                                                                          per_sample_stats_df).finalize()
+        error_metrics = ErrorMetricsAccumulator(group_names).update(y_test, y_preds, test_protected_groups).finalize()
+        return {group_name: {**variance_metrics[group_name], **error_metrics[group_name]}
+                for group_name in variance_metrics.keys()}
+
+    reference_metrics = compute_metrics(models_predictions)
+    report_rows = []
+    for predictions_dtype in predictions_dtypes:
+        quantized_metrics = compute_metrics(QuantizedPredictions.from_predictions(models_predictions, predictions_dtype))
+        for group_name in reference_metrics.keys():
+            for metric in VARIANCE_METRICS + ERROR_METRICS:
+                reference_value = reference_metrics[group_name][metric]
+                quantized_value = quantized_metrics[group_name][metric]
+                report_rows.append({
+                    'Predictions_Dtype': predictions_dtype,
+                    'Bytes_Per_Prediction': np.dtype(predictions_dtype).itemsize,
+                    'Subgroup': group_name,
+                    'Metric': metric,
+                    'Reference_Value': reference_value,
+                    'Quantized_Value': quantized_value,
+                    'Absolute_Shift': abs(quantized_value - reference_value),
+                })
+
+    return pd.DataFrame(report_rows)
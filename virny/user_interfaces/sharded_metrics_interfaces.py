@@ -0,0 +1,69 @@
+import pandas as pd
+
+from virny.utils.stability_utils import compute_per_sample_stats
+from virny.utils.protected_groups_partitioning import create_test_protected_groups, get_protected_group_names
+from virny.custom_classes.metrics_accumulators import VarianceMetricsAccumulator, ErrorMetricsAccumulator
+from virny.user_interfaces.metrics_computation_interfaces import create_model_metrics_df
+
+
+def compute_test_shard_metrics_accumulators(models_predictions: dict, X_test_shard: pd.DataFrame,
+                                            y_test_shard: pd.DataFrame, init_features_df: pd.DataFrame,
+                                            sensitive_attributes_dct: dict):
+    """
+    Compute mergeable sufficient statistics of variance and error metrics for a shard of a test set.
+     Shards can be evaluated independently, for example, in different processes or on different machines,
+     and then combined with VarianceMetricsAccumulator.merge() and ErrorMetricsAccumulator.merge().
+
+    Return a tuple of VarianceMetricsAccumulator and ErrorMetricsAccumulator for the shard.
+
+    Parameters
+    ----------
+    models_predictions
+        Dict of lists where key is a model index, and value is a list of model predictions for X_test_shard,
+         for example, created by SubgroupVarianceAnalyzer.predict_bootstrap_proba()
+    X_test_shard
+        Processed features of the test shard
+    y_test_shard
+        Targets of the test shard
+    init_features_df
+        Full non-preprocessed dataset of features. It is used for creating test groups.
+    sensitive_attributes_dct
+        A dictionary where keys are sensitive attribute names (including attributes intersections),
+         and values are privilege values for these attributes
+
+    """
+    test_protected_groups = create_test_protected_groups(X_test_shard, init_features_df, sensitive_attributes_dct,
+                                                         allow_empty_groups=True)
+    group_names = get_protected_group_names(sensitive_attributes_dct)
+    per_sample_stats_df = compute_per_sample_stats(y_test_shard.values, models_predictions, index=y_test_shard.index)
+    y_preds = (per_sample_stats_df['Mean'].values < 0.5).astype(int)
+
+    variance_metrics_accumulator = VarianceMetricsAccumulator(group_names)
+    variance_metrics_accumulator.update(y_test_shard, None, test_protected_groups, per_sample_stats_df)
+    error_metrics_accumulator = ErrorMetricsAccumulator(group_names)
+    error_metrics_accumulator.update(y_test_shard, y_preds, test_protected_groups)
+
+    return variance_metrics_accumulator, error_metrics_accumulator
+
+
+def create_model_metrics_df_from_accumulators(variance_metrics_accumulator: VarianceMetricsAccumulator,
+                                              error_metrics_accumulator: ErrorMetricsAccumulator,
+                                              base_model, base_model_name: str) -> pd.DataFrame:
+    """
+    Create a dataframe of model metrics, the same as compute_model_metrics() returns, from merged accumulators.
+
+    Parameters
+    ----------
+    variance_metrics_accumulator
+        VarianceMetricsAccumulator with statistics of all test shards
+    error_metrics_accumulator
+        ErrorMetricsAccumulator with statistics of all test shards
+    base_model
+        Base model used for metrics computation
+    base_model_name
+        Model name to fill the Model_Name column
+
+    """
+    variance_metrics_df = pd.DataFrame(variance_metrics_accumulator.finalize())
+    error_metrics_df = pd.DataFrame(error_metrics_accumulator.finalize())
+    return create_model_metrics_df(variance_metrics_df, error_metrics_df, base_model, base_model_name)
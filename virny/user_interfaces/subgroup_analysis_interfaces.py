@@ -0,0 +1,193 @@
+import numpy as np
+import pandas as pd
+
+from virny.custom_classes.metrics_accumulators import encode_confusion_codes, compute_per_category_metrics
+from virny.custom_classes.subgroup_metrics_bootstrap import SubgroupMetricsBootstrap
+from virny.custom_classes.group_metrics_permutation_test import GroupMetricsPermutationTest
+from virny.custom_classes.subgroup_threshold_sweep import SubgroupThresholdSweep
+from virny.custom_classes.subgroup_slice_finder import SubgroupSliceFinder
+from virny.analyzers.subgroup_variance_analyzer import SubgroupVarianceAnalyzer
+from virny.analyzers.subgroup_error_analyzer import SubgroupErrorAnalyzer
+
+
+def compute_model_metrics_confidence_intervals(subgroup_variance_analyzer: SubgroupVarianceAnalyzer,
+                                               error_analyzer: SubgroupErrorAnalyzer, sensitive_attributes_dct: dict,
+                                               n_resamples: int = 1000, confidence_level: float = 0.95,
+                                               seed: int = None) -> pd.DataFrame:
+    """
+    Compute bootstrap confidence intervals for overall, subgroup and composed group metrics by resampling
+     the test set. Models are not refitted, and predictions are reused from the analyzers.
+
+    Return a pandas dataframe with Group, Metric, Estimate, Std_Error, CI_Lower, and CI_Upper columns.
+
+    Parameters
+    ----------
+    subgroup_variance_analyzer
+        SubgroupVarianceAnalyzer returned by compute_model_metrics(..., return_analyzers=True)
+    error_analyzer
+        SubgroupErrorAnalyzer returned by compute_model_metrics(..., return_analyzers=True)
+    sensitive_attributes_dct
+        A dictionary where keys are sensitive attribute names (including attributes intersections),
+         and values are privilege values for these attributes
+    n_resamples
+        [Optional] Number of bootstrap resamples of the test set. Default: 1000.
+    confidence_level
+        [Optional] Confidence level of percentile intervals. Default: 0.95.
+    seed
+        [Optional] Seed for the random generator of resamples
+
+    """
+    per_sample_stats_df = subgroup_variance_analyzer.per_sample_stats_df
+    y_preds = (per_sample_stats_df['Mean'].values < 0.5).astype(int)
+    bootstrap = SubgroupMetricsBootstrap(n_resamples=n_resamples, confidence_level=confidence_level, seed=seed)
+    return bootstrap.compute_confidence_intervals(error_analyzer.y_test, y_preds, per_sample_stats_df,
+                                                  error_analyzer.test_protected_groups, sensitive_attributes_dct)
+
+
+def compute_group_metrics_p_values(subgroup_variance_analyzer: SubgroupVarianceAnalyzer,
+                                   error_analyzer: SubgroupErrorAnalyzer, sensitive_attributes_dct: dict,
+                                   n_permutations: int = 10_000, seed: int = None) -> pd.DataFrame:
+    """
+    Compute permutation p-values of composed group metrics (Equalized_Odds_TPR, Disparate_Impact etc.)
+     for each sensitive attribute by shuffling dis/priv subgroup labels. Models are not refitted,
+     and predictions are reused from the analyzers.
+
+    Return a pandas dataframe with Group, Metric, Value, P_Value, and N_Permutations columns.
+
+    Parameters
+    ----------
+    subgroup_variance_analyzer
+        SubgroupVarianceAnalyzer returned by compute_model_metrics(..., return_analyzers=True)
+    error_analyzer
+        SubgroupErrorAnalyzer returned by compute_model_metrics(..., return_analyzers=True)
+    sensitive_attributes_dct
+        A dictionary where keys are sensitive attribute names (including attributes intersections),
+         and values are privilege values for these attributes
+    n_permutations
+        [Optional] Number of random permutations of subgroup labels. Default: 10_000.
+    seed
+        [Optional] Seed for the random generator of permutations
+
+    """
+    per_sample_stats_df = subgroup_variance_analyzer.per_sample_stats_df
+    y_preds = (per_sample_stats_df['Mean'].values < 0.5).astype(int)
+    permutation_test = GroupMetricsPermutationTest(n_permutations=n_permutations, seed=seed)
+    return permutation_test.compute_p_values(error_analyzer.y_test, y_preds, per_sample_stats_df,
+                                             error_analyzer.test_protected_groups, sensitive_attributes_dct)
+
+
+def compute_model_metrics_threshold_sweep(subgroup_variance_analyzer: SubgroupVarianceAnalyzer,
+                                          error_analyzer: SubgroupErrorAnalyzer, sensitive_attributes_dct: dict,
+                                          thresholds=None, n_calibration_bins: int = 10):
+    """
+    Compute overall and subgroup error metrics and composed group fairness metrics for all decision thresholds
+     of the ensemble mean prediction instead of the default 0.5, and calibration bins for each group.
+     Models are not refitted, and predictions are reused from the analyzers.
+
+    Return a tuple of two pandas dataframes: metrics with Threshold, Group, Metric, and Value columns,
+     and calibration bins with Group, Bin_Lower, Bin_Upper, Sample_Size, Mean_Predicted_Proba,
+     and Observed_Positive_Rate columns.
+
+    Parameters
+    ----------
+    subgroup_variance_analyzer
+        SubgroupVarianceAnalyzer returned by compute_model_metrics(..., return_analyzers=True)
+    error_analyzer
+        SubgroupErrorAnalyzer returned by compute_model_metrics(..., return_analyzers=True)
+    sensitive_attributes_dct
+        A dictionary where keys are sensitive attribute names (including attributes intersections),
+         and values are privilege values for these attributes
+    thresholds
+        [Optional] Thresholds for the mean probability of the zero value label. If None, all operating points
+         of the ensemble on the test set are used.
+    n_calibration_bins
+        [Optional] Number of equal-width calibration bins. Default: 10.
+
+    """
+    threshold_sweep = SubgroupThresholdSweep(thresholds=thresholds, n_calibration_bins=n_calibration_bins)
+    return threshold_sweep.compute_metrics(error_analyzer.y_test,
+                                           subgroup_variance_analyzer.per_sample_stats_df['Mean'].values,
+                                           error_analyzer.test_protected_groups, sensitive_attributes_dct)
+
+
+def compute_model_metrics_per_category(subgroup_variance_analyzer: SubgroupVarianceAnalyzer,
+                                       error_analyzer: SubgroupErrorAnalyzer, init_features_df: pd.DataFrame,
+                                       attributes: list, min_support: int = 30) -> pd.DataFrame:
+    """
+    Compute variance and error metrics for every category of high-cardinality attributes (for example, ACS POBP,
+     OCCP or ST), where a binary dis/priv split is not informative. Models are not refitted, and per-sample metrics
+     are reused from the analyzers. Refer to compute_per_category_metrics() for details.
+
+    Return a pandas dataframe with one row per attribute category and Attribute, Category, Sample_Size,
+     Low_Support, and metrics columns.
+
+    Parameters
+    ----------
+    subgroup_variance_analyzer
+        SubgroupVarianceAnalyzer returned by compute_model_metrics(..., return_analyzers=True)
+    error_analyzer
+        SubgroupErrorAnalyzer returned by compute_model_metrics(..., return_analyzers=True)
+    init_features_df
+        Initial full dataset without preprocessing, for example, dataset.init_features_df
+    attributes
+        Columns of init_features_df to compute per-category metrics for
+    min_support
+        [Optional] Categories with less test samples are flagged in the Low_Support column. Default: 30.
+
+    """
+    per_sample_stats_df = subgroup_variance_analyzer.per_sample_stats_df
+    y_preds = (per_sample_stats_df['Mean'].values < 0.5).astype(int)
+    confusion_codes = encode_confusion_codes(np.asarray(error_analyzer.y_test).ravel(), y_preds)
+    test_features_df = init_features_df.loc[error_analyzer.y_test.index, attributes]
+
+    attributes_metrics_dfs = []
+    for attr in attributes:
+        per_category_metrics_df = compute_per_category_metrics(per_sample_stats_df, confusion_codes,
+                                                               test_features_df[attr].values, min_support=min_support)
+        per_category_metrics_df.insert(0, 'Attribute', attr)
+        attributes_metrics_dfs.append(per_category_metrics_df)
+
+    return pd.concat(attributes_metrics_dfs, ignore_index=True)
+
+
+def find_worst_model_subgroups(subgroup_variance_analyzer: SubgroupVarianceAnalyzer,
+                               error_analyzer: SubgroupErrorAnalyzer, init_features_df: pd.DataFrame,
+                               metric: str = 'Jitter', k: int = 10, min_support: float = 0.01, max_order: int = 3,
+                               columns: list = None) -> pd.DataFrame:
+    """
+    Find the k slices of the test set (conjunctions of column=value conditions over sensitive and non-sensitive
+     columns) with the worst mean of a per-sample metric. Models are not refitted, and per-sample metrics
+     are reused from the analyzers. Refer to SubgroupSliceFinder for details of the search.
+
+    Return a pandas dataframe sorted from the worst slice with Slice, Order, Size, Metric, Value,
+     Overall_Value, and Disparity columns.
+
+    Parameters
+    ----------
+    subgroup_variance_analyzer
+        SubgroupVarianceAnalyzer returned by compute_model_metrics(..., return_analyzers=True)
+    error_analyzer
+        SubgroupErrorAnalyzer returned by compute_model_metrics(..., return_analyzers=True)
+    init_features_df
+        Initial full dataset without preprocessing, for example, dataset.init_features_df
+    metric
+        [Optional] A per-sample metric from virny.configs.constants.VARIANCE_METRICS or 'Error_Rate'. Default: 'Jitter'.
+    k
+        [Optional] Number of the worst slices to return. Default: 10.
+    min_support
+        [Optional] Minimum slice size as a fraction of the test set (if below 1) or as a number of rows.
+         Default: 0.01.
+    max_order
+        [Optional] Maximum number of conditions in a slice. Default: 3.
+    columns
+        [Optional] Columns of init_features_df to build slices from. Default: all columns.
+
+    """
+    per_sample_stats_df = subgroup_variance_analyzer.per_sample_stats_df
+    y_preds = (per_sample_stats_df['Mean'].values < 0.5).astype(int)
+    features_df = init_features_df.loc[error_analyzer.y_test.index]
+    if columns is not None:
+        features_df = features_df[columns]
+
+    slice_finder = SubgroupSliceFinder(metric=metric, k=k, min_support=min_support, max_order=max_order)
+    return slice_finder.find_slices(features_df, per_sample_stats_df, error_analyzer.y_test, y_preds)
@@ -0,0 +1,209 @@
+import copy
+import traceback
+import pandas as pd
+
+from virny.configs.constants import ModelSetting
+from virny.utils.stability_utils import compute_per_sample_stats
+from virny.utils.common_helpers import reset_model_seed
+from virny.utils.protected_groups_partitioning import create_test_protected_groups
+from virny.custom_classes.metrics_accumulators import VarianceMetricsAccumulator
+from virny.custom_classes.metrics_composer import MetricsComposer
+from virny.custom_classes.task_graph import TaskGraph
+from virny.analyzers.subgroup_variance_analyzer import SubgroupVarianceAnalyzer
+from virny.analyzers.subgroup_variance_calculator import SubgroupVarianceCalculator
+from virny.analyzers.subgroup_error_analyzer import SubgroupErrorAnalyzer
+from virny.user_interfaces.metrics_computation_interfaces import create_model_metrics_df
+
+
+def _predict_estimator_proba_task(fitted_estimator, subgroup_variance_analyzer: SubgroupVarianceAnalyzer, idx: int,
+                                  X_test: pd.DataFrame):
+    # The fitted estimator is kept by the analyzer, which also knows how to predict with batch and incremental models
+    return subgroup_variance_analyzer.predict_estimator_proba(idx, X_test)
+
+
+def _compute_per_sample_stats_task(*models_predictions, y_test: pd.DataFrame):
+    return compute_per_sample_stats(y_test.values, dict(enumerate(models_predictions)), index=y_test.index)
+
+
+def _compute_variance_metrics_task(per_sample_stats_df: pd.DataFrame, test_protected_groups: dict,
+                                   X_test: pd.DataFrame, y_test: pd.DataFrame, sensitive_attributes_dct: dict,
+                                   computation_mode: str):
+    overall_variance_metrics_accumulator = VarianceMetricsAccumulator(group_names=[])
+    overall_variance_metrics_accumulator.update(y_test, None, dict(), per_sample_stats_df)
+    subgroup_variance_calculator = SubgroupVarianceCalculator(X_test=X_test,
+                                                              y_test=y_test,
+                                                              sensitive_attributes_dct=sensitive_attributes_dct,
+                                                              test_protected_groups=test_protected_groups,
+                                                              computation_mode=computation_mode)
+    subgroup_variance_calculator.set_overall_variance_metrics(overall_variance_metrics_accumulator.finalize()['overall'])
+    variance_metrics_dct = subgroup_variance_calculator.compute_subgroup_metrics(None, save_results=False,
+                                                                                 per_sample_stats_df=per_sample_stats_df)
+    return pd.DataFrame(variance_metrics_dct)
+
+
+def _compute_error_metrics_task(per_sample_stats_df: pd.DataFrame, test_protected_groups: dict,
+                                X_test: pd.DataFrame, y_test: pd.DataFrame, sensitive_attributes_dct: dict,
+                                computation_mode: str):
+    # Ensemble predictions are int(mean<0.5), the same as in combine_bootstrap_predictions()
+    y_preds = (per_sample_stats_df['Mean'].values < 0.5).astype(int)
+    error_analyzer = SubgroupErrorAnalyzer(X_test=X_test,
+                                           y_test=y_test,
+                                           sensitive_attributes_dct=sensitive_attributes_dct,
+                                           test_protected_groups=test_protected_groups,
+                                           computation_mode=computation_mode)
+    return pd.DataFrame(error_analyzer.compute_subgroup_metrics(y_preds, save_results=False))
+
+
+def _create_model_metrics_task(variance_metrics_df: pd.DataFrame, error_metrics_df: pd.DataFrame, base_model,
+                               base_model_name: str, run_idx: int, run_seed: int, test_set_idx: int):
+    model_metrics_df = create_model_metrics_df(variance_metrics_df, error_metrics_df, base_model, base_model_name)
+    model_metrics_df['Run_Number'] = run_idx + 1
+    model_metrics_df['Model_Seed'] = run_seed
+    model_metrics_df['Test_Set_Index'] = test_set_idx
+    return model_metrics_df
+
+
+def _compose_metrics_task(*models_metrics_lst, model_names: list, sensitive_attributes_dct: dict,
+                          test_set_idx: int):
+    # Metrics of failed (run, model) pairs are None
+    models_metrics_dct = dict()
+    for model_name, model_metrics_df in zip(model_names, models_metrics_lst):
+        if model_metrics_df is not None:
+            models_metrics_dct.setdefault(model_name, []).append(model_metrics_df)
+    models_metrics_dct = {model_name: pd.concat(model_metrics_dfs, ignore_index=True)
+                          for model_name, model_metrics_dfs in models_metrics_dct.items()}
+
+    models_composed_metrics_df = MetricsComposer(models_metrics_dct, sensitive_attributes_dct).compose_metrics()
+    models_composed_metrics_df['Test_Set_Index'] = test_set_idx
+    return models_metrics_dct, models_composed_metrics_df
+
+
+def compute_metrics_with_task_graph(datasets_dct: dict, config, models_config: dict, extra_test_sets_lst: list = None,
+                                    n_jobs: int = -1, return_timings: bool = False, verbose: int = 0):
+    """
+    Compute stability and accuracy metrics for each run in datasets_dct, each model in models_config, and each test set
+     in one TaskGraph instead of nested loops over runs, models, and test sets. Each step is a separate task:
+     a fit of a bootstrap estimator, its prediction for a test set, per-sample metrics of the ensemble, subgroup variance
+     metrics, subgroup error metrics, a dataframe of model metrics, and composition of group metrics for a test set.
+     Protected groups are created once for each run and test set and shared by all models. A task is started as soon
+     as its inputs are ready, so, for example, fits of one model overlap with metrics computation of another one.
+
+    Each model is refitted with the run seed as its random_state (or seed for incremental models), and each bootstrap
+     sample is drawn with its own seed derived from the run seed, so results do not depend on n_jobs and the order
+     of tasks. Failed tasks are reported with their tracebacks, and their (run, model) pairs are skipped.
+
+    Return a tuple of a dictionary where keys are model names, and values are metrics of all runs and test sets
+     with Run_Number (starting from 1), Model_Seed, and Test_Set_Index columns, and a dataframe of composed metrics
+     of all models with a Test_Set_Index column. If return_timings is True, a dataframe of timings of all tasks
+     created by TaskGraph.get_timings_df() is also returned.
+
+    Parameters
+    ----------
+    datasets_dct
+        Dictionary where keys are run seeds, and values are BaseFlowDataset objects of these runs, for example,
+         created by preprocess_dataset() with each seed in config.runs_seed_lst
+    config
+        Object that contains bootstrap_fraction, dataset_name, n_estimators, and sensitive_attributes_dct attributes
+    models_config
+        Dictionary where keys are model names, and values are initialized models
+    extra_test_sets_lst
+        [Optional] List of extra test sets like [(X_test1, y_test1), (X_test2, y_test2), ...] to compute metrics
+         in each run. Test_Set_Index is 0 for X_test of a dataset and 1 and greater for extra test sets.
+    n_jobs
+        [Optional] Number of worker threads of the TaskGraph, -1 means all CPUs. Default: -1.
+    return_timings
+        [Optional] If to return timings of all tasks together with metrics. Default: False.
+    verbose
+        [Optional] Level of logs printing. The greater level provides more logs.
+            As for now, 0, 1, 2 levels are supported.
+
+    """
+    model_setting = getattr(config, 'model_setting', None) or ModelSetting.BATCH.value
+    model_setting = ModelSetting[model_setting.upper()]
+    computation_mode = getattr(config, 'computation_mode', None)
+    sensitive_attributes_dct = config.sensitive_attributes_dct
+    extra_test_sets_lst = [] if extra_test_sets_lst is None else extra_test_sets_lst
+    n_test_sets = len(extra_test_sets_lst) + 1
+    metrics_kwargs = dict(sensitive_attributes_dct=sensitive_attributes_dct, computation_mode=computation_mode)
+
+    task_graph = TaskGraph()
+    test_sets_model_metrics_tasks = [[] for _ in range(n_test_sets)]
+    test_sets_model_names = [[] for _ in range(n_test_sets)]
+    for run_idx, (run_seed, dataset) in enumerate(datasets_dct.items()):
+        test_sets_lst = [(dataset.X_test, dataset.y_test)] + extra_test_sets_lst
+        protected_groups_tasks = [
+            task_graph.add_task(('protected_groups', run_idx, test_set_idx), create_test_protected_groups,
+                                args=(X_test, dataset.init_features_df, sensitive_attributes_dct))
+            for test_set_idx, (X_test, _) in enumerate(test_sets_lst)
+        ]
+        for model_name, base_model in models_config.items():
+            base_model = reset_model_seed(copy.deepcopy(base_model), run_seed, verbose=0)
+            subgroup_variance_analyzer = SubgroupVarianceAnalyzer(model_setting=model_setting,
+                                                                  n_estimators=config.n_estimators,
+                                                                  base_model=base_model,
+                                                                  base_model_name=model_name,
+                                                                  bootstrap_fraction=config.bootstrap_fraction,
+                                                                  dataset=dataset,
+                                                                  dataset_name=config.dataset_name,
+                                                                  sensitive_attributes_dct=sensitive_attributes_dct,
+                                                                  test_protected_groups=dict(),
+                                                                  computation_mode=computation_mode,
+                                                                  bootstrap_seed=run_seed,
+                                                                  verbose=verbose)
+            fit_tasks = [task_graph.add_task(('fit', run_idx, model_name, idx), subgroup_variance_analyzer.fit_estimator,
+                                             args=(idx,))
+                         for idx in range(config.n_estimators)]
+            for test_set_idx, (X_test, y_test) in enumerate(test_sets_lst):
+                task_key = (run_idx, model_name, test_set_idx)
+                predict_tasks = [
+                    task_graph.add_task(('predict', run_idx, model_name, idx, test_set_idx), _predict_estimator_proba_task,
+                                        dependencies=(fit_tasks[idx],), args=(subgroup_variance_analyzer, idx, X_test))
+                    for idx in range(config.n_estimators)
+                ]
+                per_sample_stats_task = task_graph.add_task(('per_sample_stats',) + task_key,
+                                                            _compute_per_sample_stats_task,
+                                                            dependencies=predict_tasks, kwargs=dict(y_test=y_test))
+                subgroup_metrics_dependencies = (per_sample_stats_task, protected_groups_tasks[test_set_idx])
+                variance_metrics_task = task_graph.add_task(('variance_metrics',) + task_key,
+                                                            _compute_variance_metrics_task,
+                                                            dependencies=subgroup_metrics_dependencies,
+                                                            args=(X_test, y_test), kwargs=metrics_kwargs)
+                error_metrics_task = task_graph.add_task(('error_metrics',) + task_key, _compute_error_metrics_task,
+                                                         dependencies=subgroup_metrics_dependencies,
+                                                         args=(X_test, y_test), kwargs=metrics_kwargs)
+                model_metrics_task = task_graph.add_task(('model_metrics',) + task_key, _create_model_metrics_task,
+                                                         dependencies=(variance_metrics_task, error_metrics_task),
+                                                         args=(base_model, model_name, run_idx, run_seed, test_set_idx))
+                test_sets_model_metrics_tasks[test_set_idx].append(model_metrics_task)
+                test_sets_model_names[test_set_idx].append(model_name)
+
+    for test_set_idx in range(n_test_sets):
+        task_graph.add_task(('compose', test_set_idx), _compose_metrics_task,
+                            dependencies=test_sets_model_metrics_tasks[test_set_idx],
+                            kwargs=dict(model_names=test_sets_model_names[test_set_idx],
+                                        sensitive_attributes_dct=sensitive_attributes_dct,
+                                        test_set_idx=test_set_idx),
+                            allow_failed_dependencies=True)
+
+    if verbose >= 1:
+        print(f'Run a task graph with {len(task_graph.tasks)} tasks')
+    results = task_graph.run(n_jobs=n_jobs)
+    for task_name, err in task_graph.errors.items():
+        print('#' * 20, f'ERROR with task {task_name}', '#' * 20)
+        traceback.print_exception(type(err), err, err.__traceback__)
+
+    # Concatenate metrics of each model for all test sets
+    models_metrics_dct = dict()
+    models_composed_metrics_dfs = []
+    for test_set_idx in range(n_test_sets):
+        test_set_models_metrics_dct, test_set_composed_metrics_df = results[('compose', test_set_idx)]
+        models_composed_metrics_dfs.append(test_set_composed_metrics_df)
+        for model_name, model_metrics_df in test_set_models_metrics_dct.items():
+            models_metrics_dct.setdefault(model_name, []).append(model_metrics_df)
+    models_metrics_dct = {model_name: pd.concat(models_metrics_dct[model_name], ignore_index=True)
+                          for model_name in models_config.keys() if model_name in models_metrics_dct}
+    models_composed_metrics_df = pd.concat(models_composed_metrics_dfs, ignore_index=True)
+
+    if return_timings:
+        return models_metrics_dct, models_composed_metrics_df, task_graph.get_timings_df()
+    return models_metrics_dct, models_composed_metrics_df
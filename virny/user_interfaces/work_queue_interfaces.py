@@ -0,0 +1,168 @@
+import copy
+import pandas as pd
+
+from virny.configs.constants import ModelSetting
+from virny.utils.common_helpers import save_metrics_to_file, reset_model_seed
+from virny.custom_classes.file_work_queue import FileWorkQueue, create_safe_file_name
+from virny.user_interfaces.metrics_computation_interfaces import _compute_model_metrics_task
+
+
+# Name of an object in a FileWorkQueue with a dataset name and model names of submitted tasks
+METRICS_COMPUTATION_INFO_OBJECT = 'metrics_computation_info'
+
+
+def submit_metrics_computation_tasks(queue_dir: str, datasets_dct: dict, config, models_config: dict,
+                                     extra_test_sets_lst: list = None, claim_timeout_seconds: float = 600) -> list:
+    """
+    Write a task for each run in datasets_dct and each model in models_config to a FileWorkQueue in queue_dir,
+     for example, on a file system shared by several machines. Tasks are executed by any number of worker processes
+     started with run_metrics_computation_worker(), and their results are combined by
+     collect_metrics_computation_results(). A task computes metrics of its model for the test set of its run and
+     for each extra test set, since bootstrap estimators are fitted once for all test sets. Datasets are saved to
+     the queue once and shared by all tasks of a run. Tasks that are already pending, claimed, or done are not added
+     again, so the grid can be resubmitted after adding runs or models.
+
+    Return ids of added tasks.
+
+    Parameters
+    ----------
+    queue_dir
+        Directory of the queue
+    datasets_dct
+        Dictionary where keys are run seeds, and values are BaseFlowDataset objects of these runs, for example,
+         created by preprocess_dataset() with each seed in config.runs_seed_lst
+    config
+        Object that contains bootstrap_fraction, dataset_name, n_estimators, and sensitive_attributes_dct attributes
+    models_config
+        Dictionary where keys are model names, and values are initialized models
+    extra_test_sets_lst
+        [Optional] List of extra test sets like [(X_test1, y_test1), (X_test2, y_test2), ...] to compute metrics
+         in each run
+    claim_timeout_seconds
+        [Optional] Time since the last heartbeat of a claimed task, after which the task is requeued. Default: 600.
+
+    """
+    work_queue = FileWorkQueue(queue_dir, claim_timeout_seconds)
+    kwargs = dict(n_estimators=config.n_estimators, bootstrap_fraction=config.bootstrap_fraction,
+                  sensitive_attributes_dct=config.sensitive_attributes_dct,
+                  model_setting=getattr(config, 'model_setting', None) or ModelSetting.BATCH.value,
+                  computation_mode=getattr(config, 'computation_mode', None), dataset_name=config.dataset_name,
+                  verbose=0)
+    if extra_test_sets_lst is None:
+        kwargs.update(save_results=False, save_results_dir_path=None, experiment_cache=None)
+
+    work_queue.put_object(METRICS_COMPUTATION_INFO_OBJECT, {'dataset_name': config.dataset_name,
+                                                            'model_names': list(models_config.keys())})
+    work_queue.put_object('extra_test_sets_lst', extra_test_sets_lst)
+    added_task_ids = []
+    for run_idx, (run_seed, dataset) in enumerate(datasets_dct.items()):
+        work_queue.put_object(f'dataset_{run_idx}', dataset)
+        for model_name, base_model in models_config.items():
+            task_id = f'run_{run_idx + 1:03d}__{create_safe_file_name(model_name)}'
+            payload = {
+                'run_idx': run_idx,
+                'run_seed': run_seed,
+                'model_name': model_name,
+                'base_model': reset_model_seed(copy.deepcopy(base_model), run_seed, verbose=0),
+                'kwargs': kwargs,
+            }
+            if work_queue.put(task_id, payload):
+                added_task_ids.append(task_id)
+
+    return added_task_ids
+
+
+def run_metrics_computation_worker(queue_dir: str, claim_timeout_seconds: float = 600, worker_id: str = None,
+                                   max_tasks: int = None, verbose: int = 0) -> int:
+    """
+    Claim and execute tasks submitted by submit_metrics_computation_tasks() until the queue has no pending tasks.
+     Any number of workers can be started on machines that share queue_dir. Each (run, model) pair is computed
+     as in compute_metrics_multiple_runs(), so results are reproducible with run seeds. Claims of crashed workers are
+     requeued after claim_timeout_seconds by other workers, and failed tasks are moved to the failed directory
+     of the queue together with their tracebacks.
+
+    Return the number of completed tasks.
+
+    Parameters
+    ----------
+    queue_dir
+        Directory of the queue
+    claim_timeout_seconds
+        [Optional] Time since the last heartbeat of a claimed task, after which the task is requeued. Default: 600.
+    worker_id
+        [Optional] Id of the worker. Default: '<hostname>-<pid>'.
+    max_tasks
+        [Optional] Maximum number of tasks to execute. Default: None (no limit).
+    verbose
+        [Optional] Level of logs printing. The greater level provides more logs.
+            As for now, 0, 1, 2 levels are supported.
+
+    """
+    work_queue = FileWorkQueue(queue_dir, claim_timeout_seconds)
+    extra_test_sets_lst = work_queue.get_object('extra_test_sets_lst')
+    # Tasks are claimed in the order of runs, so only a dataset of the current run is kept in memory
+    loaded_datasets_dct = dict()
+
+    def compute_task_metrics(payload: dict):
+        dataset_key = f'dataset_{payload["run_idx"]}'
+        if dataset_key not in loaded_datasets_dct:
+            loaded_datasets_dct.clear()
+            loaded_datasets_dct[dataset_key] = work_queue.get_object(dataset_key)
+
+        model_metrics = _compute_model_metrics_task(loaded_datasets_dct[dataset_key], payload['model_name'],
+                                                    payload['base_model'], extra_test_sets_lst, payload['kwargs'],
+                                                    seed=payload['run_seed'])
+        model_metrics_dfs = [model_metrics] if extra_test_sets_lst is None else model_metrics
+        for test_set_idx, model_metrics_df in enumerate(model_metrics_dfs):
+            model_metrics_df['Run_Number'] = payload['run_idx'] + 1
+            model_metrics_df['Model_Seed'] = payload['run_seed']
+            model_metrics_df['Test_Set_Index'] = test_set_idx
+
+        return pd.concat(model_metrics_dfs, ignore_index=True)
+
+    return work_queue.run_worker(compute_task_metrics, worker_id=worker_id, max_tasks=max_tasks, verbose=verbose)
+
+
+def collect_metrics_computation_results(queue_dir: str, save_results_dir_path: str = None,
+                                        verbose: int = 0) -> dict:
+    """
+    Combine results of tasks completed by run_metrics_computation_worker().
+
+    Return a dictionary where keys are model names, and values are metrics of all completed runs and test sets
+     with Run_Number (starting from 1), Model_Seed, and Test_Set_Index columns, which can be used by MetricsComposer
+     and MetricsVisualizer. Models without completed tasks are skipped.
+
+    Parameters
+    ----------
+    queue_dir
+        Directory of the queue
+    save_results_dir_path
+        [Optional] Location where to save result files with metrics of all runs for each model
+    verbose
+        [Optional] Level of logs printing. The greater level provides more logs.
+            As for now, 0, 1, 2 levels are supported.
+
+    """
+    work_queue = FileWorkQueue(queue_dir)
+    metrics_computation_info = work_queue.get_object(METRICS_COMPUTATION_INFO_OBJECT)
+    if verbose >= 1:
+        print('Tasks status:', work_queue.get_status())
+
+    models_runs_metrics_dct = dict()
+    for model_metrics_df in work_queue.get_results().values():
+        model_name = model_metrics_df['Model_Name'].iloc[0]
+        models_runs_metrics_dct.setdefault(model_name, []).append(model_metrics_df)
+
+    models_metrics_dct = dict()
+    for model_name in metrics_computation_info['model_names']:
+        if model_name not in models_runs_metrics_dct:
+            continue
+        model_runs_metrics = sorted(models_runs_metrics_dct[model_name], key=lambda df: df['Run_Number'].iloc[0])
+        models_metrics_dct[model_name] = pd.concat(model_runs_metrics, ignore_index=True)
+        if save_results_dir_path is not None:
+            n_runs = models_metrics_dct[model_name]['Run_Number'].nunique()
+            save_metrics_to_file(models_metrics_dct[model_name],
+                                 f'Metrics_{metrics_computation_info["dataset_name"]}_{model_name}_{n_runs}_Runs',
+                                 save_results_dir_path)
+
+    return models_metrics_dct
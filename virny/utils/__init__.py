@@ -2,12 +2,19 @@
 Common helpers and utils.
 """
 from .common_helpers import validate_config
-from .stability_utils import count_prediction_stats
-from .protected_groups_partitioning import create_test_protected_groups
+from .stability_utils import count_prediction_stats, compute_per_sample_stats
+from .protected_groups_partitioning import create_test_protected_groups, create_test_protected_groups_lattice, \
+    create_test_protected_groups_cached, ProtectedGroups, ProtectedGroup, ProtectedGroupsCache
 
 
 __all__ = [
     "validate_config",
     "create_test_protected_groups",
+    "create_test_protected_groups_lattice",
+    "create_test_protected_groups_cached",
+    "ProtectedGroups",
+    "ProtectedGroup",
+    "ProtectedGroupsCache",
     "count_prediction_stats",
+    "compute_per_sample_stats",
 ]
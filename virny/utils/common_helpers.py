@@ -16,7 +16,7 @@ def validate_config(config_obj):
       to compute fairness and stability metrics. Should be 'batch' or 'incremental'. Default: 'batch'.
 
     * config_obj.computation_mode is an optional argument that defines a non-default mode for metrics computation.
-      Currently, only 'error_analysis' mode is supported.
+      Currently, 'error_analysis' and 'streaming' modes are supported.
 
     Parameters
     ----------
@@ -94,9 +94,27 @@ def save_metrics_to_file(metrics_df, result_filename, save_dir_path):
 
 
 def confusion_matrix_metrics(y_true, y_preds):
-    metrics = {}
     TN, FP, FN, TP = confusion_matrix(y_true, y_preds).ravel()
+    return confusion_matrix_metrics_from_counts(TN, FP, FN, TP)
+
 
+def confusion_matrix_metrics_from_counts(TN, FP, FN, TP):
+    """
+    Compute error metrics based on confusion matrix counts.
+
+    Parameters
+    ----------
+    TN
+        Number of true negatives
+    FP
+        Number of false positives
+    FN
+        Number of false negatives
+    TP
+        Number of true positives
+
+    """
+    metrics = {}
     metrics['TPR'] = TP/(TP+FN)
     metrics['TNR'] = TN/(TN+FP)
     metrics['PPV'] = TP/(TP+FP)
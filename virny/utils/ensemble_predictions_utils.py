@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+
+from virny.utils.stability_utils import get_predictions_matrix
+from virny.custom_classes.quantized_predictions import QuantizedPredictions
+
+
+def save_ensemble_predictions(file_path: str, models_predictions, y_test: pd.DataFrame, base_model_name: str = None,
+                              model_params: str = None):
+    """
+    Save bootstrap predictions of an ensemble together with test labels and the test index to a compressed .npz file,
+     so that metrics can be recomputed later for other sensitive attributes without refitting models.
+     QuantizedPredictions are saved in their compact type, other predictions are saved as float64.
+
+    Parameters
+    ----------
+    file_path
+        Path to a .npz file
+    models_predictions
+        2D array of prediction proba for the zero value label by each model, a dictionary where keys are model indexes
+         and values are model predictions, or QuantizedPredictions
+    y_test
+        Targets of the test set with the test index
+    base_model_name
+        [Optional] Model name to restore the Model_Name column of metrics
+    model_params
+        [Optional] A string of model parameters to restore the Model_Params column of metrics
+
+    """
+    if isinstance(models_predictions, QuantizedPredictions):
+        predictions, predictions_dtype = models_predictions.values, models_predictions.predictions_dtype
+    else:
+        predictions, predictions_dtype = get_predictions_matrix(models_predictions), ''
+
+    test_index = y_test.index.to_numpy()
+    # Object indexes are saved as strings to load the file without pickle
+    if test_index.dtype == object:
+        test_index = test_index.astype(str)
+
+    np.savez_compressed(file_path,
+                        predictions=predictions,
+                        predictions_dtype=predictions_dtype,
+                        y_test=np.asarray(y_test).ravel(),
+                        test_index=test_index,
+                        base_model_name='' if base_model_name is None else base_model_name,
+                        model_params='' if model_params is None else model_params)
+
+
+def load_ensemble_predictions(file_path: str):
+    """
+    Load bootstrap predictions saved by save_ensemble_predictions().
+
+    Return a tuple of predictions (a 2D float64 array or QuantizedPredictions), a pandas series of test labels
+     with the test index, and a dict with 'base_model_name' and 'model_params' (None if they were not saved).
+
+    Parameters
+    ----------
+    file_path
+        Path to a .npz file
+
+    """
+    with np.load(file_path) as data:
+        predictions_dtype = str(data['predictions_dtype'])
+        models_predictions = QuantizedPredictions(data['predictions'], predictions_dtype) if predictions_dtype \
+            else data['predictions']
+        y_test = pd.Series(data['y_test'], index=pd.Index(data['test_index']))
+        model_info = {
+            'base_model_name': str(data['base_model_name']) or None,
+            'model_params': str(data['model_params']) or None,
+        }
+
+    return models_predictions, y_test, model_info
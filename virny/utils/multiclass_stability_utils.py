@@ -0,0 +1,188 @@
+import numpy as np
+import pandas as pd
+import scipy as sp
+
+from virny.utils.common_helpers import confusion_matrix_metrics_from_counts
+from virny.utils.stability_utils import compute_per_sample_stats
+from virny.utils.protected_groups_partitioning import create_groups_membership_matrix
+
+
+def get_multiclass_predictions_matrix(uq_results) -> np.ndarray:
+    """
+    Convert bootstrap predictions of a multiclass classifier to a 3D numpy array
+     with a shape (n_estimators, n_test_samples, n_classes).
+
+    Parameters
+    ----------
+    uq_results
+        A dictionary where keys are indexes of bootstrap estimators and values are their 2D arrays
+         of class probabilities with a shape (n_test_samples, n_classes), or a 3D array of class probabilities
+
+    """
+    if isinstance(uq_results, np.ndarray):
+        return uq_results.astype(float, copy=False)
+
+    return np.stack([np.asarray(uq_results[model_idx], dtype=float) for model_idx in uq_results.keys()])
+
+
+def count_class_votes(predicted_labels: np.ndarray, n_classes: int) -> np.ndarray:
+    """
+    Count estimators that predicted each class for each test sample.
+
+    Return a 2D numpy array with a shape (n_test_samples, n_classes).
+
+    Parameters
+    ----------
+    predicted_labels
+        2D numpy array of class indexes with a shape (n_estimators, n_test_samples)
+    n_classes
+        Number of classes
+
+    """
+    n_samples = predicted_labels.shape[1]
+    flat_codes = (np.arange(n_samples) * n_classes + predicted_labels).ravel()
+    return np.bincount(flat_codes, minlength=n_samples * n_classes).reshape(n_samples, n_classes)
+
+
+def compute_multiclass_entropy(probabilities: np.ndarray) -> np.ndarray:
+    """
+    Compute base 2 entropy of class probabilities along the last axis.
+
+    Parameters
+    ----------
+    probabilities
+        Numpy array of class probabilities, where the last axis is classes
+
+    """
+    return sp.special.entr(probabilities).sum(axis=-1) / np.log(2)
+
+
+def compute_multiclass_per_sample_stats(y_test, uq_results, index=None) -> pd.DataFrame:
+    """
+    Compute variance metrics for each test sample of a multiclass classifier with numpy reductions
+     over the (n_estimators, n_test_samples, n_classes) matrix of class probabilities.
+     For binary predictions in the format of compute_per_sample_stats() (probabilities of the zero value label),
+     compute_per_sample_stats() is used as is.
+
+    Metrics are generalized so that they are equal to the binary ones for two classes, except Mean:
+
+    * Mean, Std, IQR -- statistics of the probability of the ensemble predicted class over estimators;
+
+    * Aleatoric_Uncertainty, Overall_Uncertainty -- base 2 entropy of class probabilities;
+
+    * Statistical_Bias -- one minus the mean probability of the true class;
+
+    * Per_Sample_Accuracy -- a fraction of estimators that predicted the true class;
+
+    * Label_Stability -- a difference between vote fractions of the two most voted classes;
+
+    * Jitter -- a fraction of pairs of estimators that predicted different classes.
+
+    Return a pandas dataframe where rows are test samples and columns are virny.configs.constants.VARIANCE_METRICS
+     plus an 'Ensemble_Prediction' column with an index of the class with the highest mean probability.
+
+    Parameters
+    ----------
+    y_test
+        Class indexes of true labels in the order of predicted probabilities. If None, label-based metrics
+         (Statistical_Bias, Per_Sample_Accuracy) are filled with NaN.
+    uq_results
+        3D array of class probabilities or a dictionary where keys are model indexes and values are
+         2D arrays of class probabilities
+    index
+        [Optional] Index for the result dataframe, for example, y_test.index
+
+    """
+    if not isinstance(uq_results, dict) and np.ndim(uq_results) == 2:
+        return compute_per_sample_stats(y_test, uq_results, index=index)
+
+    results = get_multiclass_predictions_matrix(uq_results)
+    n_estimators, n_samples, n_classes = results.shape
+    sample_positions = np.arange(n_samples)
+
+    mean_probabilities = results.mean(axis=0)
+    ensemble_predictions = mean_probabilities.argmax(axis=1)
+    ensemble_class_probabilities = results[:, sample_positions, ensemble_predictions]
+    q75, q25 = np.percentile(ensemble_class_probabilities, [75, 25], axis=0)
+
+    class_votes = count_class_votes(results.argmax(axis=2), n_classes)
+    sorted_votes = np.sort(class_votes, axis=1)
+    label_stability_lst = (sorted_votes[:, -1] - sorted_votes[:, -2]) / n_estimators
+    # A sum of churns for all pairs of models is equal to a number of pairs with different votes for all samples
+    jitter_lst = (n_estimators ** 2 - (class_votes ** 2).sum(axis=1)) / (n_estimators * (n_estimators - 1))
+
+    if y_test is None:
+        statistical_bias_lst = np.full(n_samples, np.nan)
+        per_sample_accuracy_lst = np.full(n_samples, np.nan)
+    else:
+        y_test = np.asarray(y_test).astype(int)
+        statistical_bias_lst = 1 - mean_probabilities[sample_positions, y_test]
+        per_sample_accuracy_lst = class_votes[sample_positions, y_test] / n_estimators
+
+    return pd.DataFrame({
+        'Jitter': jitter_lst,
+        'Mean': ensemble_class_probabilities.mean(axis=0),
+        'Std': ensemble_class_probabilities.std(axis=0, ddof=1),
+        'IQR': q75 - q25,
+        'Aleatoric_Uncertainty': compute_multiclass_entropy(results).mean(axis=0),
+        'Overall_Uncertainty': compute_multiclass_entropy(mean_probabilities),
+        'Statistical_Bias': statistical_bias_lst,
+        'Per_Sample_Accuracy': per_sample_accuracy_lst,
+        'Label_Stability': label_stability_lst,
+        'Ensemble_Prediction': ensemble_predictions,
+    }, index=index)
+
+
+def compute_multiclass_subgroup_error_metrics(y_test: pd.DataFrame, y_preds, test_protected_groups: dict,
+                                              classes) -> dict:
+    """
+    Compute one-vs-rest error metrics of each class and accuracy for the overall test set and each subgroup.
+     Confusion matrices of all groups are computed by one sparse matrix product.
+
+    Return a dict of dicts where key is a group name, and value is a dict of metrics like 'Accuracy'
+     and 'TPR_<class>' for this group.
+
+    Parameters
+    ----------
+    y_test
+        True labels
+    y_preds
+        Predicted labels
+    test_protected_groups
+        A dictionary where keys are subgroup names, and values are X_test rows correspondent to this subgroup
+    classes
+        Sorted class labels
+
+    """
+    classes = np.asarray(classes)
+    n_classes = classes.shape[0]
+    y_true_codes = np.searchsorted(classes, np.asarray(y_test).ravel())
+    y_pred_codes = np.searchsorted(classes, np.asarray(y_preds).ravel())
+
+    group_names = ['overall'] + list(test_protected_groups.keys())
+    groups_membership = create_groups_membership_matrix(y_test.index, test_protected_groups, group_names[1:])
+    confusion_one_hot = np.eye(n_classes * n_classes)[y_true_codes * n_classes + y_pred_codes]
+    # Confusion matrices with a shape (n_groups, n_classes, n_classes), where rows are true classes
+    confusion_matrices = np.vstack([confusion_one_hot.sum(axis=0, keepdims=True),
+                                    groups_membership.T.astype(float) @ confusion_one_hot])
+    confusion_matrices = confusion_matrices.reshape(len(group_names), n_classes, n_classes)
+
+    TP = np.diagonal(confusion_matrices, axis1=1, axis2=2)
+    FP = confusion_matrices.sum(axis=1) - TP
+    FN = confusion_matrices.sum(axis=2) - TP
+    TN = confusion_matrices.sum(axis=(1, 2))[:, np.newaxis] - TP - FP - FN
+    with np.errstate(divide='ignore', invalid='ignore'):
+        classes_metrics = confusion_matrix_metrics_from_counts(TN, FP, FN, TP)
+        accuracy = TP.sum(axis=1) / confusion_matrices.sum(axis=(1, 2))
+
+    groups_metrics = dict()
+    for group_idx, group_name in enumerate(group_names):
+        group_metrics = {'Accuracy': float(accuracy[group_idx])}
+        for metric, values in classes_metrics.items():
+            if metric == 'Accuracy':
+                continue
+            for class_idx, class_label in enumerate(classes):
+                group_metrics[f'{metric}_{class_label}'] = float(values[group_idx, class_idx])
+        groups_metrics[group_name] = group_metrics
+
+    return groups_metrics
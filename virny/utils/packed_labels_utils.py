@@ -0,0 +1,112 @@
+import numpy as np
+
+
+# Number of set bits for each byte value
+POPCOUNT_TABLE = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.uint8)
+
+
+def pack_labels(uq_results, axis: int = 0) -> np.ndarray:
+    """
+    Convert prediction proba for the zero value label to labels int(x<0.5) and pack them into bits.
+
+    Return a 2D numpy array of uint8. With axis=0, a shape is (ceil(n_estimators / 8), n_test_samples),
+     and each column keeps labels of one test sample predicted by all estimators. With axis=1, a shape is
+     (n_estimators, ceil(n_test_samples / 8)), and each row keeps labels predicted by one estimator.
+
+    Parameters
+    ----------
+    uq_results
+        2D numpy array with a shape (n_estimators, n_test_samples) of prediction proba for the zero value label
+    axis
+        [Optional] Axis to pack: 0 for estimators, 1 for test samples. Default: 0.
+
+    """
+    return np.packbits(np.asarray(uq_results) < 0.5, axis=axis)
+
+
+def count_positive_votes(packed_labels: np.ndarray) -> np.ndarray:
+    """
+    Count estimators that predicted the label 1 for each test sample.
+
+    Parameters
+    ----------
+    packed_labels
+        Labels packed along the estimators axis by pack_labels(uq_results, axis=0)
+
+    """
+    return POPCOUNT_TABLE[packed_labels].sum(axis=0, dtype=np.int64)
+
+
+def count_correct_votes(packed_labels: np.ndarray, y_test, n_estimators: int) -> np.ndarray:
+    """
+    Count estimators that predicted the true label for each test sample.
+
+    Parameters
+    ----------
+    packed_labels
+        Labels packed along the estimators axis by pack_labels(uq_results, axis=0)
+    y_test
+        True labels
+    n_estimators
+        Number of estimators
+
+    """
+    positive_votes = count_positive_votes(packed_labels)
+    return np.where(np.asarray(y_test) == 1, positive_votes, n_estimators - positive_votes)
+
+
+def compute_pairwise_disagreement(packed_labels: np.ndarray, n_samples: int) -> np.ndarray:
+    """
+    Compute churn, a fraction of test samples with different labels, for each pair of estimators.
+
+    Return a symmetric 2D numpy array with a shape (n_estimators, n_estimators).
+
+    Parameters
+    ----------
+    packed_labels
+        Labels packed along the test samples axis by pack_labels(uq_results, axis=1)
+    n_samples
+        Number of test samples
+
+    """
+    n_estimators = packed_labels.shape[0]
+    disagreement = np.zeros((n_estimators, n_estimators))
+    for model_idx in range(n_estimators):
+        # Padding bits are zero for all estimators, so they never differ
+        different_bits = np.bitwise_xor(packed_labels[model_idx], packed_labels[model_idx:])
+        disagreement[model_idx, model_idx:] = POPCOUNT_TABLE[different_bits].sum(axis=1) / n_samples
+        disagreement[model_idx:, model_idx] = disagreement[model_idx, model_idx:]
+
+    return disagreement
+
+
+def compute_labels_std_mean_iqr(positive_votes: np.ndarray, n_estimators: int):
+    """
+    Compute means, standard deviations, and interquartile ranges of predicted labels for each test sample
+     based only on counts of positive votes, the same as compute_std_mean_iqr_metrics() for a dataframe of labels.
+
+    Return a tuple of three 1D numpy arrays.
+
+    Parameters
+    ----------
+    positive_votes
+        Numbers of estimators that predicted the label 1 for each test sample
+    n_estimators
+        Number of estimators
+
+    """
+    means_lst = positive_votes / n_estimators
+    stds_lst = np.sqrt(positive_votes * (n_estimators - positive_votes) / (n_estimators * (n_estimators - 1)))
+
+    # Sorted labels of a sample are (n_estimators - positive_votes) zeros followed by positive_votes ones
+    first_positive_rank = n_estimators - positive_votes
+    quantiles = []
+    for q in (0.25, 0.75):
+        position = (n_estimators - 1) * q
+        lower_rank = int(np.floor(position))
+        upper_rank = min(lower_rank + 1, n_estimators - 1)
+        lower_value = (lower_rank >= first_positive_rank).astype(float)
+        upper_value = (upper_rank >= first_positive_rank).astype(float)
+        quantiles.append(lower_value + (position - lower_rank) * (upper_value - lower_value))
+
+    return means_lst, stds_lst, quantiles[1] - quantiles[0]
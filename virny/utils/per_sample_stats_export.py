@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+
+from virny.utils.protected_groups_partitioning import create_groups_membership_matrix
+
+
+PER_SAMPLE_STATS_FILE_FORMATS = ('parquet', 'feather')
+
+
+def create_sensitive_attributes_codes(test_index: pd.Index, test_protected_groups: dict) -> pd.DataFrame:
+    """
+    Encode membership of test samples in protected groups. Each sensitive attribute (including intersections)
+     gets an int8 column, where 1 is the disadvantaged group, 0 is the privileged group, and -1 is neither of them.
+
+    Return a pandas dataframe with one column per sensitive attribute and the same index as test_index.
+
+    Parameters
+    ----------
+    test_index
+        Index of the test set, for example, y_test.index
+    test_protected_groups
+        A dictionary where keys are subgroup names like 'sex_priv' and 'sex_dis', and values are X_test rows
+         correspondent to this subgroup
+
+    """
+    sensitive_attributes = [group_name[:-len('_dis')] for group_name in test_protected_groups.keys()
+                            if group_name.endswith('_dis')]
+    codes = dict()
+    for attr in sensitive_attributes:
+        membership = create_groups_membership_matrix(test_index, test_protected_groups,
+                                                     [f'{attr}_priv', f'{attr}_dis']).toarray()
+        attr_codes = np.full(len(test_index), -1, dtype=np.int8)
+        attr_codes[membership[:, 0] > 0] = 0
+        attr_codes[membership[:, 1] > 0] = 1
+        codes[attr] = attr_codes
+
+    return pd.DataFrame(codes, index=test_index)
+
+
+def save_per_sample_stats(per_sample_stats_df: pd.DataFrame, file_path: str, test_protected_groups: dict = None,
+                          file_format: str = None, chunk_size: int = 100_000):
+    """
+    Save per-sample metrics in a columnar Parquet or Feather (Arrow IPC) file that can be read and sliced
+     without virny, for example, by pandas.read_parquet(file_path, columns=[...], filters=[...]).
+
+    Metrics are stored as float32, the test index in a 'Test_Index' column, and sensitive attribute codes
+     from create_sensitive_attributes_codes() as int8 columns. Rows are converted and written chunk by chunk
+     (a Parquet row group or an Arrow record batch per chunk), so memory usage grows only by one chunk.
+
+    Requires the optional pyarrow package.
+
+    Parameters
+    ----------
+    per_sample_stats_df
+        Per-sample metrics created by compute_per_sample_stats(), where index is the test index
+    file_path
+        Path to a result file
+    test_protected_groups
+        [Optional] Protected groups of the test set created by create_test_protected_groups().
+         If defined, sensitive attribute codes are added.
+    file_format
+        [Optional] 'parquet' or 'feather'. If None, the format is defined by the file extension,
+         and Parquet is used by default.
+    chunk_size
+        [Optional] Number of rows in one written chunk. Default: 100_000.
+
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc as ipc
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError('pyarrow is required to save per-sample metrics. Install it with `pip install pyarrow`.')
+
+    if file_format is None:
+        file_format = 'feather' if str(file_path).endswith(('.feather', '.arrow')) else 'parquet'
+    if file_format not in PER_SAMPLE_STATS_FILE_FORMATS:
+        raise ValueError(f'file_format must be one of {PER_SAMPLE_STATS_FILE_FORMATS}')
+
+    attributes_codes_df = None if test_protected_groups is None else \
+        create_sensitive_attributes_codes(per_sample_stats_df.index, test_protected_groups)
+
+    def create_record_batch(start: int, end: int):
+        columns = {'Test_Index': np.asarray(per_sample_stats_df.index[start:end])}
+        for col in per_sample_stats_df.columns:
+            columns[col] = per_sample_stats_df[col].values[start:end].astype(np.float32)
+        if attributes_codes_df is not None:
+            for col in attributes_codes_df.columns:
+                columns[col] = attributes_codes_df[col].values[start:end]
+        return pa.RecordBatch.from_pydict(columns)
+
+    n_rows = per_sample_stats_df.shape[0]
+    first_batch = create_record_batch(0, min(chunk_size, n_rows))
+    writer = pq.ParquetWriter(file_path, first_batch.schema) if file_format == 'parquet' \
+        else ipc.new_file(file_path, first_batch.schema)
+    with writer:
+        for start in range(0, max(n_rows, 1), chunk_size):
+            batch = first_batch if start == 0 else create_record_batch(start, min(start + chunk_size, n_rows))
+            if file_format == 'parquet':
+                writer.write_table(pa.Table.from_batches([batch]))
+            else:
+                writer.write_batch(batch)
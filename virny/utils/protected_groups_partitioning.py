@@ -1,6 +1,109 @@
+import hashlib
+import weakref
+import itertools
+import numpy as np
 import pandas as pd
 
+from scipy.sparse import csr_matrix
+
 from virny.configs.constants import INTERSECTION_SIGN
+from virny.utils.packed_labels_utils import POPCOUNT_TABLE
+
+
+class ProtectedGroup:
+    """
+    A protected group of test samples stored as int32 positions of its rows in the test set.
+     It keeps the part of a pandas dataframe interface used for groups: index and shape.
+
+    Parameters
+    ----------
+    positions
+        Sorted positions of the group rows in the test set
+    test_index
+        Index of the whole test set
+
+    """
+    __slots__ = ('positions', 'test_index')
+
+    def __init__(self, positions: np.ndarray, test_index: pd.Index):
+        self.positions = np.asarray(positions, dtype=np.int32)
+        self.test_index = test_index
+
+    @property
+    def index(self) -> pd.Index:
+        return self.test_index[self.positions]
+
+    @property
+    def shape(self):
+        return (self.positions.shape[0],)
+
+    def __len__(self):
+        return self.positions.shape[0]
+
+
+class ProtectedGroups(dict):
+    """
+    A dictionary of ProtectedGroup objects, where keys are subgroup names, created by create_test_protected_groups().
+     Positions of all groups are aligned with the order of X_test rows, so consumers use positional indexing
+     instead of pandas label alignment.
+
+    Parameters
+    ----------
+    groups
+        A dictionary where keys are subgroup names, and values are ProtectedGroup objects
+    test_index
+        Index of the test set
+    sensitive_attributes_codes
+        [Optional] A dataframe of categorical codes of plain sensitive attributes for test rows
+         (-1 for missing values), where categories are kept in sensitive_attributes_categories
+    sensitive_attributes_categories
+        [Optional] A dictionary where keys are sensitive attribute names, and values are their categories
+
+    """
+    def __init__(self, groups: dict, test_index: pd.Index, sensitive_attributes_codes: pd.DataFrame = None,
+                 sensitive_attributes_categories: dict = None):
+        super().__init__(groups)
+        self.test_index = test_index
+        self.sensitive_attributes_codes = sensitive_attributes_codes
+        self.sensitive_attributes_categories = sensitive_attributes_categories
+
+    def is_aligned_with(self, test_index: pd.Index) -> bool:
+        return test_index is self.test_index or test_index.equals(self.test_index)
+
+    def get_packed_masks(self) -> np.ndarray:
+        """
+        Return groups membership as a bit-packed boolean mask with a shape (n_groups, ceil(n_test_samples / 8))
+         in the order of groups keys. Use numpy.unpackbits(masks, axis=1, count=n_test_samples) to unpack it.
+        """
+        masks = np.zeros((len(self), len(self.test_index)), dtype=bool)
+        for group_idx, group in enumerate(self.values()):
+            masks[group_idx, group.positions] = True
+        return np.packbits(masks, axis=1)
+
+    def append(self, new_groups: 'ProtectedGroups') -> 'ProtectedGroups':
+        """
+        Return new ProtectedGroups for the test set with new rows added after the existing ones.
+
+        Parameters
+        ----------
+        new_groups
+            ProtectedGroups created for the new test rows
+        """
+        n_samples = len(self.test_index)
+        test_index = self.test_index.append(new_groups.test_index)
+        groups = {
+            group_name: ProtectedGroup(np.concatenate([group.positions, new_groups[group_name].positions + n_samples]),
+                                       test_index)
+            for group_name, group in self.items()
+        }
+        sensitive_attributes_codes = None
+        if self.sensitive_attributes_codes is not None and new_groups.sensitive_attributes_codes is not None \
+                and self.sensitive_attributes_categories == new_groups.sensitive_attributes_categories:
+            sensitive_attributes_codes = pd.concat([self.sensitive_attributes_codes,
+                                                    new_groups.sensitive_attributes_codes])
+
+        return ProtectedGroups(groups, test_index, sensitive_attributes_codes,
+                               self.sensitive_attributes_categories if sensitive_attributes_codes is not None else None)
 
 
 def get_df_condition(df: pd.DataFrame, col: str, dis, include_dis: bool):
@@ -10,10 +113,10 @@ def get_df_condition(df: pd.DataFrame, col: str, dis, include_dis: bool):
         return df[col] == dis if include_dis else df[col] != dis
 
 
-def partition_by_group_intersectional(df, attrs, dis_values):
+def get_intersectional_conditions(df, attrs, dis_values):
     """
-    After a partitioning on intersectional groups, a dis group is formed based on the values in sensitive_attributes_dct,
-    and a priv group includes all other records, which are not included to a dis group.
+    Create conditions for a priv and a dis intersectional groups. A dis group is formed based on the values
+    in sensitive_attributes_dct, and a priv group includes all other records, which are not included to a dis group.
 
     :param df: n initial df
     :param attrs: sensitive attributes
@@ -29,6 +132,20 @@ def partition_by_group_intersectional(df, attrs, dis_values):
     for idx in range(1, len(attrs)):
         priv_condition |= get_df_condition(df, attrs[idx], dis_values[idx], include_dis=False)
 
+    return priv_condition, dis_condition
+
+
+def partition_by_group_intersectional(df, attrs, dis_values):
+    """
+    After a partitioning on intersectional groups, a dis group is formed based on the values in sensitive_attributes_dct,
+    and a priv group includes all other records, which are not included to a dis group.
+
+    :param df: n initial df
+    :param attrs: sensitive attributes
+    :param dis_values: disadvantage values for input sensitive attributes
+
+    """
+    priv_condition, dis_condition = get_intersectional_conditions(df, attrs, dis_values)
     priv = df[priv_condition]
     dis = df[dis_condition]
     if len(priv) + len(dis) != len(df):
@@ -52,11 +169,13 @@ def check_sensitive_attrs_in_columns(df_columns, sensitive_attributes_dct):
     return True
 
 
-def create_test_protected_groups(X_test: pd.DataFrame, init_features_df: pd.DataFrame, sensitive_attributes_dct: dict):
+def create_test_protected_groups(X_test: pd.DataFrame, init_features_df: pd.DataFrame, sensitive_attributes_dct: dict,
+                                 allow_empty_groups: bool = False):
     """
     Create protected groups based on a test feature set. Use a disadvantaged group as a reference group.
 
-    Return a dictionary where keys are subgroup names, and values are X_test row indexes correspondent to this subgroup.
+    Return ProtectedGroups, a dictionary where keys are subgroup names, and values are ProtectedGroup objects
+     with positions of X_test rows correspondent to this subgroup.
 
     Parameters
     ----------
@@ -67,33 +186,329 @@ def create_test_protected_groups(X_test: pd.DataFrame, init_features_df: pd.Data
     sensitive_attributes_dct
         A dictionary where keys are sensitive attribute names (including attributes intersections),
          and values are disadvantaged values for these attributes
+    allow_empty_groups
+        [Optional] If to allow empty protected groups, for example, for small batches of new test rows.
+         Default: False.
 
     """
     plain_sensitive_attributes = [attr for attr in sensitive_attributes_dct.keys() if INTERSECTION_SIGN not in attr]
     X_test_with_sensitive_attrs = init_features_df[plain_sensitive_attributes].loc[X_test.index]
 
     groups = dict()
+    groups_masks = create_protected_groups_masks(X_test_with_sensitive_attrs, sensitive_attributes_dct)
+    for group_name, group_mask in groups_masks.items():
+        groups[group_name] = ProtectedGroup(np.flatnonzero(group_mask), X_test.index)
+        if not allow_empty_groups and groups[group_name].shape[0] == 0:
+            raise ValueError(f"Protected group ({group_name}) from X_test is empty. "
+                             f"Please check types of sensitive attributes in config or replace the sensitive attribute")
+
+    sensitive_attributes_codes, sensitive_attributes_categories = dict(), dict()
+    for attr in plain_sensitive_attributes:
+        attr_values = pd.Categorical(X_test_with_sensitive_attrs[attr])
+        sensitive_attributes_codes[attr] = attr_values.codes
+        sensitive_attributes_categories[attr] = list(attr_values.categories)
+
+    return ProtectedGroups(groups, X_test.index,
+                           pd.DataFrame(sensitive_attributes_codes, index=X_test.index),
+                           sensitive_attributes_categories)
+
+
+def create_test_index_fingerprint(test_index: pd.Index) -> str:
+    """
+    Return a hex digest of values and order of a test index, which is equal for equal indexes of different test sets.
+
+    Parameters
+    ----------
+    test_index
+        Index of the test set, for example, X_test.index
+
+    """
+    index_hashes = pd.util.hash_pandas_object(test_index, index=False).values
+    return hashlib.blake2b(index_hashes.tobytes(), digest_size=16).hexdigest()
+
+
+class ProtectedGroupsCache:
+    """
+    A least recently used cache of protected groups created by create_test_protected_groups(). A key is
+     a fingerprint of the test index, sensitive_attributes_dct, and the init_features_df object, so that models
+     of one run, runs of one session, and test sets with the same index share one partition of the test set.
+
+    init_features_df is tracked by a weak reference, and it should not be changed in place after groups are cached.
+     Cached groups are shared between callers and should not be changed in place as well.
+
+    Parameters
+    ----------
+    max_size
+        [Optional] Maximum number of cached partitions. Default: 16.
+
+    """
+    def __init__(self, max_size: int = 16):
+        self.max_size = max_size
+        self._cache = dict()
+        self.n_hits = 0
+        self.n_misses = 0
+
+    def get_test_protected_groups(self, X_test: pd.DataFrame, init_features_df: pd.DataFrame,
+                                  sensitive_attributes_dct: dict, allow_empty_groups: bool = False):
+        """
+        Return cached protected groups for X_test or create them with create_test_protected_groups().
+
+        Parameters
+        ----------
+        X_test
+            Test feature set
+        init_features_df
+            Initial full dataset without preprocessing
+        sensitive_attributes_dct
+            A dictionary where keys are sensitive attribute names (including attributes intersections),
+             and values are disadvantaged values for these attributes
+        allow_empty_groups
+            [Optional] If to allow empty protected groups. Default: False.
+
+        """
+        key = (id(init_features_df), create_test_index_fingerprint(X_test.index),
+               repr(list(sensitive_attributes_dct.items())), allow_empty_groups)
+        cached_entry = self._cache.pop(key, None)
+        # An id of a garbage-collected dataframe can be reused by a new one
+        if cached_entry is not None and cached_entry[0]() is init_features_df:
+            self.n_hits += 1
+            test_protected_groups = cached_entry[1]
+        else:
+            self.n_misses += 1
+            test_protected_groups = create_test_protected_groups(X_test, init_features_df, sensitive_attributes_dct,
+                                                                 allow_empty_groups=allow_empty_groups)
+
+        # Dicts keep the insertion order, so the first key is the least recently used one
+        self._cache[key] = (weakref.ref(init_features_df), test_protected_groups)
+        if len(self._cache) > self.max_size:
+            self._cache.pop(next(iter(self._cache)))
+
+        return test_protected_groups
+
+    def clear(self):
+        self._cache.clear()
+        self.n_hits = 0
+        self.n_misses = 0
+
+
+# A cache of protected groups shared by all metrics computation interfaces in a session
+PROTECTED_GROUPS_CACHE = ProtectedGroupsCache()
+
+
+def create_test_protected_groups_cached(X_test: pd.DataFrame, init_features_df: pd.DataFrame,
+                                        sensitive_attributes_dct: dict, allow_empty_groups: bool = False):
+    """
+    Create protected groups with create_test_protected_groups() or reuse them from PROTECTED_GROUPS_CACHE
+     for a test set with the same index, init_features_df, and sensitive_attributes_dct.
+
+    Parameters
+    ----------
+    X_test
+        Test feature set
+    init_features_df
+        Initial full dataset without preprocessing
+    sensitive_attributes_dct
+        A dictionary where keys are sensitive attribute names (including attributes intersections),
+         and values are disadvantaged values for these attributes
+    allow_empty_groups
+        [Optional] If to allow empty protected groups. Default: False.
+
+    """
+    return PROTECTED_GROUPS_CACHE.get_test_protected_groups(X_test, init_features_df, sensitive_attributes_dct,
+                                                            allow_empty_groups=allow_empty_groups)
+
+
+def create_test_protected_groups_lattice(X_test: pd.DataFrame, init_features_df: pd.DataFrame,
+                                         sensitive_attributes_dct: dict, max_intersection_order: int = 3,
+                                         min_group_size: int = 1):
+    """
+    Create protected groups for plain sensitive attributes and all their intersections up to max_intersection_order
+     attributes, for example, 'sex&race' and 'sex&race&age' for max_intersection_order=3. Groups follow
+     the semantics of create_test_protected_groups(): a dis group of an intersection includes rows
+     where all attributes have disadvantaged values, and a priv group includes all other rows.
+
+    Membership of each plain attribute is computed once and kept as a bitset (a packed boolean mask),
+     and a dis group of an intersection is a bitwise AND of bitsets of a smaller intersection and one attribute,
+     so each lattice node costs one AND over n_test_samples / 8 bytes. Intersections, where a dis or priv group
+     has less than min_group_size rows, are pruned.
+
+    Return a tuple of ProtectedGroups and a sensitive_attributes_dct extended with intersections kept in the lattice,
+     which can be used for get_protected_group_names() and MetricsComposer.
+
+    Parameters
+    ----------
+    X_test
+        Test feature set
+    init_features_df
+        Initial full dataset without preprocessing
+    sensitive_attributes_dct
+        A dictionary where keys are sensitive attribute names, and values are disadvantaged values for these attributes.
+         Intersections defined explicitly in the dictionary are kept without pruning.
+    max_intersection_order
+        [Optional] Maximum number of attributes in an intersection. Default: 3.
+    min_group_size
+        [Optional] Minimum size of dis and priv groups of an intersection to keep it in the lattice. Default: 1.
+
+    """
+    test_protected_groups = create_test_protected_groups(X_test, init_features_df, sensitive_attributes_dct)
+    plain_sensitive_attributes = [attr for attr in sensitive_attributes_dct.keys() if INTERSECTION_SIGN not in attr]
+    n_samples = X_test.shape[0]
+
+    dis_bitsets = dict()
+    for attr in plain_sensitive_attributes:
+        dis_mask = np.zeros(n_samples, dtype=bool)
+        dis_mask[test_protected_groups[attr + '_dis'].positions] = True
+        dis_bitsets[(attr,)] = np.packbits(dis_mask)
+
+    lattice_dct = dict(sensitive_attributes_dct)
+    groups = dict(test_protected_groups)
+    for intersection_order in range(2, max_intersection_order + 1):
+        for attrs in itertools.combinations(plain_sensitive_attributes, intersection_order):
+            # Intersections of pruned smaller intersections are also pruned, since they can only be smaller
+            if attrs[:-1] not in dis_bitsets:
+                continue
+            dis_bitset = np.bitwise_and(dis_bitsets[attrs[:-1]], dis_bitsets[(attrs[-1],)])
+            dis_size = int(POPCOUNT_TABLE[dis_bitset].sum())
+            if dis_size < min_group_size:
+                continue
+            dis_bitsets[attrs] = dis_bitset
+
+            group_name = INTERSECTION_SIGN.join(attrs)
+            if n_samples - dis_size < min_group_size or group_name in lattice_dct:
+                continue
+            dis_mask = np.unpackbits(dis_bitset, count=n_samples).astype(bool)
+            groups[group_name + '_priv'] = ProtectedGroup(np.flatnonzero(~dis_mask), X_test.index)
+            groups[group_name + '_dis'] = ProtectedGroup(np.flatnonzero(dis_mask), X_test.index)
+            # Values of intersections are not used, since groups are defined by values of plain attributes
+            lattice_dct[group_name] = None
+
+    return ProtectedGroups(groups, X_test.index, test_protected_groups.sensitive_attributes_codes,
+                           test_protected_groups.sensitive_attributes_categories), lattice_dct
+
+
+def get_protected_group_names(sensitive_attributes_dct: dict):
+    """
+    Return a list of subgroup names in the same order as in create_test_protected_groups().
+
+    Parameters
+    ----------
+    sensitive_attributes_dct
+        A dictionary where keys are sensitive attribute names (including attributes intersections),
+         and values are disadvantaged values for these attributes
+
+    """
+    group_names = []
+    for attr in sensitive_attributes_dct.keys():
+        grp_name = INTERSECTION_SIGN.join(single_attr.strip() for single_attr in attr.strip().split(INTERSECTION_SIGN))
+        group_names.extend([grp_name + '_priv', grp_name + '_dis'])
+
+    return group_names
+
+
+def create_protected_groups_masks(sensitive_attrs_df: pd.DataFrame, sensitive_attributes_dct: dict):
+    """
+    Create boolean masks of protected groups for rows of sensitive_attrs_df. Groups are defined with the same semantics
+    as in create_test_protected_groups(), but empty groups are allowed, which is useful for small batches of samples.
+
+    Return a dictionary where keys are subgroup names, and values are 1D boolean numpy arrays aligned with sensitive_attrs_df rows.
+
+    Parameters
+    ----------
+    sensitive_attrs_df
+        A dataframe with sensitive attribute columns
+    sensitive_attributes_dct
+        A dictionary where keys are sensitive attribute names (including attributes intersections),
+         and values are disadvantaged values for these attributes
+
+    """
+    groups_masks = dict()
     for attr in sensitive_attributes_dct.keys():
         attr = attr.strip()
         if INTERSECTION_SIGN in attr:
-            single_attrs = attr.split(INTERSECTION_SIGN)
-            single_attrs = [single_attr.strip() for single_attr in single_attrs]
-            priv_grp_name = INTERSECTION_SIGN.join(single_attrs) + '_priv'
-            dis_grp_name = INTERSECTION_SIGN.join(single_attrs) + '_dis'
-            groups[priv_grp_name], groups[dis_grp_name] = \
-                partition_by_group_intersectional(X_test_with_sensitive_attrs, single_attrs,
-                                                  dis_values=[sensitive_attributes_dct[attr] for attr in single_attrs])
+            single_attrs = [single_attr.strip() for single_attr in attr.split(INTERSECTION_SIGN)]
+            grp_name = INTERSECTION_SIGN.join(single_attrs)
+            priv_condition, dis_condition = \
+                get_intersectional_conditions(sensitive_attrs_df, single_attrs,
+                                              dis_values=[sensitive_attributes_dct[attr] for attr in single_attrs])
         else:
-            priv_grp_name = attr + '_priv'
-            dis_grp_name = attr + '_dis'
-            groups[priv_grp_name], groups[dis_grp_name] = \
-                partition_by_group_binary(X_test_with_sensitive_attrs, attr, sensitive_attributes_dct[attr])
+            grp_name = attr
+            dis_condition = get_df_condition(sensitive_attrs_df, attr, sensitive_attributes_dct[attr], include_dis=True)
+            priv_condition = get_df_condition(sensitive_attrs_df, attr, sensitive_attributes_dct[attr], include_dis=False)
 
-        if groups[priv_grp_name].shape[0] == 0:
-            raise ValueError(f"Protected group ({priv_grp_name}) from X_test is empty. "
-                             f"Please check types of sensitive attributes in config or replace the sensitive attribute")
-        if groups[dis_grp_name].shape[0] == 0:
-            raise ValueError(f"Protected group ({dis_grp_name}) from X_test is empty. "
-                             f"Please check types of sensitive attributes in config or replace the sensitive attribute")
+        groups_masks[grp_name + '_priv'] = priv_condition.values
+        groups_masks[grp_name + '_dis'] = dis_condition.values
+
+    return groups_masks
+
+
+def create_groups_membership_matrix(test_index: pd.Index, test_protected_groups: dict, group_names: list):
+    """
+    Create a sparse membership matrix of (possibly overlapping) groups for test samples.
+
+    Return a scipy.sparse.csr_matrix with a shape (n_test_samples, n_groups), where an element is 1
+     if a test sample at this position belongs to a group.
+
+    Parameters
+    ----------
+    test_index
+        Index of the test set, for example, y_test.index
+    test_protected_groups
+        A dictionary where keys are subgroup names, and values are X_test rows correspondent to this subgroup
+    group_names
+        Names of groups from test_protected_groups to define the matrix columns
+
+    """
+    rows_lst, cols_lst = [], []
+    for group_idx, group_name in enumerate(group_names):
+        group_positions = get_group_positions(test_index, test_protected_groups, group_name)
+        rows_lst.append(group_positions)
+        cols_lst.append(np.full(len(group_positions), group_idx))
+
+    rows = np.concatenate(rows_lst) if rows_lst else np.array([], dtype=int)
+    cols = np.concatenate(cols_lst) if cols_lst else np.array([], dtype=int)
+    return csr_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)),
+                      shape=(len(test_index), len(group_names)))
+
+
+def get_group_positions(test_index: pd.Index, test_protected_groups: dict, group_name: str) -> np.ndarray:
+    """
+    Return positions of rows of a protected group in the test set. Positions of ProtectedGroups aligned with
+     test_index are used as is, and other groups (for example, dataframes of group rows) are looked up by labels.
+
+    Parameters
+    ----------
+    test_index
+        Index of the test set, for example, y_test.index
+    test_protected_groups
+        A dictionary where keys are subgroup names, and values are ProtectedGroup objects or X_test rows
+         correspondent to this subgroup
+    group_name
+        Name of a group in test_protected_groups
+
+    """
+    if isinstance(test_protected_groups, ProtectedGroups) and test_protected_groups.is_aligned_with(test_index):
+        return test_protected_groups[group_name].positions
+
+    group_positions = test_index.get_indexer(test_protected_groups[group_name].index)
+    if (group_positions < 0).any():
+        raise ValueError(f'Rows of the {group_name} group are not found in the test set')
+    return group_positions
+
+
+def append_test_protected_groups(test_protected_groups: dict, new_test_protected_groups: dict) -> dict:
+    """
+    Return protected groups for the test set with new rows added after the existing ones.
+
+    Parameters
+    ----------
+    test_protected_groups
+        Protected groups of the test set created by create_test_protected_groups()
+    new_test_protected_groups
+        Protected groups of the new test rows created by create_test_protected_groups()
+
+    """
+    if isinstance(test_protected_groups, ProtectedGroups) and isinstance(new_test_protected_groups, ProtectedGroups):
+        return test_protected_groups.append(new_test_protected_groups)
 
-    return groups
+    return {group_name: pd.concat([group, new_test_protected_groups[group_name]])
+            for group_name, group in test_protected_groups.items()}
@@ -1,5 +1,6 @@
 import numpy as np
 import pandas as pd
+import scipy as sp
 import seaborn as sns
 
 from os import listdir
@@ -9,7 +10,8 @@ from matplotlib import pyplot as plt
 from virny.configs.constants import CountPredictionStatsResponse
 from virny.utils.data_viz_utils import set_size
 from virny.metrics.stability_metrics import compute_std_mean_iqr_metrics, compute_entropy_from_predicted_probability,\
-    compute_jitter, compute_per_sample_accuracy, compute_statistical_bias_from_predict_proba
+    compute_statistical_bias_from_predict_proba
+from virny.utils.packed_labels_utils import pack_labels, count_positive_votes, count_correct_votes
 
 
 def combine_bootstrap_predictions(bootstrap_predictions: dict, y_test_indexes: np.ndarray):
@@ -39,9 +41,11 @@ def combine_bootstrap_predictions(bootstrap_predictions: dict, y_test_indexes: n
 
 def count_prediction_stats(y_test, uq_results):
     """
-    Compute means, stds, iqr, entropy, jitter, label stability, and transform predictions to pd.Dataframe.
+    Compute means, stds, iqr, entropy, jitter, label stability, and pack predicted labels into bits.
 
-    Return a 1D numpy array of predictions, 2D array of each model prediction for y_test, a data structure of metrics.
+    Return a 1D numpy array of predictions, a 2D uint8 array of each model prediction for y_test packed into bits
+     along the estimators axis by pack_labels(uq_results, axis=0), and a data structure of metrics.
+     Use np.unpackbits(packed_labels, axis=0, count=n_estimators) to get labels with a shape (n_estimators, n_samples).
 
     Parameters
     ----------
@@ -59,11 +63,15 @@ def count_prediction_stats(y_test, uq_results):
     means_lst, stds_lst, iqr_lst = compute_std_mean_iqr_metrics(results)
     mean_ensemble_entropy_lst = results.apply(compute_entropy_from_predicted_probability).mean().values
 
-    # Convert predict proba results of each model to correspondent labels.
+    # Convert predict proba results of each model to correspondent labels packed with one bit per (estimator, sample).
     # Here we use int(x<0.5) since we use predict_prob()[:, 0] to make predictions.
     # Hence, if a value is, for example, 0.3 --> label == 1, 0.6 -- > label == 0
-    uq_labels = results.applymap(lambda x: int(x<0.5))
-    jitter = compute_jitter(uq_labels.values)
+    n_estimators = results.shape[0]
+    packed_labels = pack_labels(results.values, axis=0)
+    positive_votes = count_positive_votes(packed_labels)
+    # A sum of churns for all pairs of models is equal to a sum of positive_votes * negative_votes for all samples
+    # Python float division keeps raising ZeroDivisionError for a single estimator, as compute_jitter() does
+    jitter = float(np.mean(positive_votes * (n_estimators - positive_votes))) / (n_estimators * (n_estimators - 1) * 0.5)
 
     main_prediction = results.mean().values
     statistical_bias_lst = np.array(
@@ -73,7 +81,8 @@ def count_prediction_stats(y_test, uq_results):
 
     y_preds = np.array([int(x<0.5) for x in main_prediction])
 
-    per_sample_accuracy_lst, label_stability_lst = compute_per_sample_accuracy(y_test, results)
+    per_sample_accuracy_lst = count_correct_votes(packed_labels, y_test, n_estimators) / n_estimators
+    label_stability_lst = np.abs(2 * positive_votes - n_estimators) / n_estimators
     prediction_stats = CountPredictionStatsResponse(jitter=jitter,
                                                     means_lst=means_lst,
                                                     stds_lst=stds_lst,
@@ -84,11 +93,127 @@ def count_prediction_stats(y_test, uq_results):
                                                     per_sample_accuracy_lst=per_sample_accuracy_lst,
                                                     label_stability_lst=label_stability_lst)
 
-    return y_preds, uq_labels, prediction_stats
+    return y_preds, packed_labels, prediction_stats
 
 
-def generate_bootstrap(features, labels, boostrap_size, with_replacement=True):
-    bootstrap_index = np.random.choice(features.shape[0], size=boostrap_size, replace=with_replacement)
+def get_predictions_matrix(uq_results) -> np.ndarray:
+    """
+    Convert bootstrap predictions to a 2D numpy array with a shape (n_estimators, n_test_samples).
+
+    Parameters
+    ----------
+    uq_results
+        A dictionary where keys are indexes of bootstrap estimators and values are their predictions for the test set,
+         or a 2D array of prediction proba for the zero value label by each model
+
+    """
+    if isinstance(uq_results, np.ndarray):
+        return uq_results.astype(float, copy=False)
+    if isinstance(uq_results, pd.DataFrame):
+        return uq_results.values.astype(float, copy=False)
+
+    return np.vstack([np.asarray(uq_results[model_idx], dtype=float) for model_idx in uq_results.keys()])
+
+
+def compute_label_based_per_sample_stats(y_test, means_lst, positive_votes_rate_lst):
+    """
+    Compute per-sample statistical bias and per-sample accuracy that require true labels.
+
+    Return a tuple of two 1D numpy arrays: statistical bias and per-sample accuracy.
+
+    Parameters
+    ----------
+    y_test
+        True labels
+    means_lst
+        Per-sample means of predicted probabilities for the zero value label
+    positive_votes_rate_lst
+        Per-sample fractions of estimators that predicted the label 1
+
+    """
+    y_test = np.asarray(y_test)
+    statistical_bias_lst = compute_statistical_bias_from_predict_proba(np.asarray(means_lst), y_test)
+    per_sample_accuracy_lst = np.where(y_test == 1, positive_votes_rate_lst, 1 - np.asarray(positive_votes_rate_lst))
+
+    return statistical_bias_lst, per_sample_accuracy_lst
+
+
+def compute_per_sample_stats(y_test, uq_results, index=None) -> pd.DataFrame:
+    """
+    Compute variance metrics for each test sample in a vectorized way. A subgroup variance metric is a mean
+     of correspondent per-sample values over the subgroup samples, the same as in count_prediction_stats().
+
+    Return a pandas dataframe where rows are test samples and columns are virny.configs.constants.VARIANCE_METRICS
+     plus a 'Positive_Votes_Rate' column with a fraction of estimators that predicted the label 1.
+
+    Parameters
+    ----------
+    y_test
+        True labels. If None, label-based metrics (Statistical_Bias, Per_Sample_Accuracy) are filled with NaN.
+    uq_results
+        2D array of prediction proba for the zero value label by each model or
+         a dictionary where keys are model indexes and values are model predictions
+    index
+        [Optional] Index for the result dataframe, for example, y_test.index
+
+    """
+    results = get_predictions_matrix(uq_results)
+    n_estimators = results.shape[0]
+
+    means_lst = results.mean(axis=0)
+    stds_lst = results.std(axis=0, ddof=1)
+    iqr_lst = sp.stats.iqr(results, axis=0)
+    mean_ensemble_entropy_lst = compute_entropy_from_predicted_probability(results).mean(axis=0)
+    overall_entropy_lst = compute_entropy_from_predicted_probability(means_lst)
+
+    # int(x<0.5) gives the label 1, since predictions are probabilities of the zero value label
+    packed_labels = pack_labels(results, axis=0)
+    positive_votes = count_positive_votes(packed_labels)
+    positive_votes_rate_lst = positive_votes / n_estimators
+    label_stability_lst = np.abs(2 * positive_votes - n_estimators) / n_estimators
+    # A sum of churns for all pairs of models is equal to a sum of positive_votes * negative_votes for all samples
+    jitter_lst = positive_votes * (n_estimators - positive_votes) / (n_estimators * (n_estimators - 1) * 0.5)
+
+    if y_test is None:
+        statistical_bias_lst = np.full(results.shape[1], np.nan)
+        per_sample_accuracy_lst = np.full(results.shape[1], np.nan)
+    else:
+        statistical_bias_lst = compute_statistical_bias_from_predict_proba(means_lst, np.asarray(y_test))
+        per_sample_accuracy_lst = count_correct_votes(packed_labels, y_test, n_estimators) / n_estimators
+
+    return pd.DataFrame({
+        'Jitter': jitter_lst,
+        'Mean': means_lst,
+        'Std': stds_lst,
+        'IQR': iqr_lst,
+        'Aleatoric_Uncertainty': mean_ensemble_entropy_lst,
+        'Overall_Uncertainty': overall_entropy_lst,
+        'Statistical_Bias': statistical_bias_lst,
+        'Per_Sample_Accuracy': per_sample_accuracy_lst,
+        'Label_Stability': label_stability_lst,
+        'Positive_Votes_Rate': positive_votes_rate_lst,
+    }, index=index)
+
+
+def create_bootstrap_seeds(seed: int, n_estimators: int) -> np.ndarray:
+    """
+    Derive seeds of bootstrap samples of all estimators from one seed, for example, a run seed.
+
+    Parameters
+    ----------
+    seed
+        Seed, from which seeds of bootstrap samples are derived
+    n_estimators
+        Number of estimators in bootstrap
+
+    """
+    return np.random.RandomState(seed).randint(np.iinfo(np.int32).max, size=n_estimators)
+
+
+def generate_bootstrap(features, labels, boostrap_size, with_replacement=True, random_state=None):
+    # Samples are drawn from the global numpy state if random_state is not defined
+    rng = np.random if random_state is None else np.random.RandomState(random_state)
+    bootstrap_index = rng.choice(features.shape[0], size=boostrap_size, replace=with_replacement)
     bootstrap_features = pd.DataFrame(features).iloc[bootstrap_index].values
     bootstrap_labels = pd.DataFrame(labels).iloc[bootstrap_index].values
     if len(bootstrap_features) == boostrap_size:
@@ -0,0 +1,256 @@
+import numpy as np
+import pandas as pd
+import scipy as sp
+
+from virny.configs.constants import VARIANCE_METRICS, ERROR_METRICS
+from virny.utils.protected_groups_partitioning import create_groups_membership_matrix
+
+
+# Error metrics as ratios of linear combinations of TN, FP, FN, TP counts: (numerator, denominator) coefficients
+ERROR_METRICS_RATIOS = {
+    'TPR': ([0, 0, 0, 1], [0, 0, 1, 1]),
+    'TNR': ([1, 0, 0, 0], [1, 1, 0, 0]),
+    'PPV': ([0, 0, 0, 1], [0, 1, 0, 1]),
+    'FNR': ([0, 0, 1, 0], [0, 0, 1, 1]),
+    'FPR': ([0, 1, 0, 0], [1, 1, 0, 0]),
+    'Accuracy': ([1, 0, 0, 1], [1, 1, 1, 1]),
+    'F1': ([0, 0, 0, 2], [0, 1, 1, 2]),
+    'Selection-Rate': ([0, 1, 0, 1], [1, 1, 1, 1]),
+    'Positive-Rate': ([0, 1, 0, 1], [0, 0, 1, 1]),
+}
+# Number of rows sampled from each stratum to estimate variances of metrics in strata
+PILOT_STRATUM_SIZE = 30
+
+
+def create_test_strata(y_test: pd.DataFrame, test_protected_groups: dict) -> np.ndarray:
+    """
+    Split test samples on strata by a combination of protected groups membership and a true label.
+
+    Return a 1D numpy array of stratum indexes for each test sample.
+
+    Parameters
+    ----------
+    y_test
+        Targets of the test set
+    test_protected_groups
+        A dictionary where keys are subgroup names, and values are X_test rows correspondent to this subgroup
+
+    """
+    groups_membership = create_groups_membership_matrix(y_test.index, test_protected_groups,
+                                                        list(test_protected_groups.keys())).toarray()
+    strata_keys = np.column_stack([groups_membership, np.asarray(y_test).ravel()])
+    _, strata = np.unique(strata_keys, axis=0, return_inverse=True)
+    return strata.ravel()
+
+
+def create_groups_membership_with_overall(y_test: pd.DataFrame, test_protected_groups: dict):
+    """
+    Return a list of group names starting with 'overall' and a dense 0/1 matrix with a shape (n_test_samples, n_groups)
+     of the test samples membership in these groups.
+
+    Parameters
+    ----------
+    y_test
+        Targets of the test set
+    test_protected_groups
+        A dictionary where keys are subgroup names, and values are X_test rows correspondent to this subgroup
+
+    """
+    group_names = ['overall'] + list(test_protected_groups.keys())
+    groups_membership = create_groups_membership_matrix(y_test.index, test_protected_groups, group_names[1:])
+    return group_names, np.column_stack([np.ones(y_test.shape[0]), groups_membership.toarray()])
+
+
+def sample_stratified_test_subset(strata: np.ndarray, strata_sample_sizes: np.ndarray,
+                                  sampled_positions: np.ndarray = None, seed=None) -> np.ndarray:
+    """
+    Sample rows of each stratum without replacement until the stratum has strata_sample_sizes sampled rows.
+     Already sampled rows are kept, so a subsample can be extended in several rounds.
+
+    Return sorted positions of sampled test rows.
+
+    Parameters
+    ----------
+    strata
+        Strata of all test rows created by create_test_strata()
+    strata_sample_sizes
+        Numbers of rows to sample from each stratum. Sizes are capped by sizes of strata.
+    sampled_positions
+        [Optional] Positions of already sampled test rows
+    seed
+        [Optional] Seed or numpy Generator for sampling
+
+    """
+    rng = np.random.default_rng(seed)
+    sampled_positions = np.array([], dtype=int) if sampled_positions is None else np.asarray(sampled_positions)
+    is_sampled = np.zeros(strata.shape[0], dtype=bool)
+    is_sampled[sampled_positions] = True
+
+    new_positions_lst = [sampled_positions]
+    for stratum, sample_size in enumerate(strata_sample_sizes):
+        candidates = np.flatnonzero((strata == stratum) & ~is_sampled)
+        n_new_rows = min(int(sample_size) - (strata[sampled_positions] == stratum).sum(), candidates.shape[0])
+        if n_new_rows > 0:
+            new_positions_lst.append(rng.choice(candidates, size=n_new_rows, replace=False))
+
+    return np.sort(np.concatenate(new_positions_lst))
+
+
+def _create_metrics_numerators_and_denominators(per_sample_stats_df: pd.DataFrame, confusion_codes: np.ndarray):
+    # Each metric is a ratio of sums of per-row numerators and denominators with a shape (n_rows, n_metrics)
+    confusion_one_hot = np.eye(4)[confusion_codes]
+    numerators = np.column_stack([per_sample_stats_df[VARIANCE_METRICS].values] +
+                                 [confusion_one_hot @ np.array(ERROR_METRICS_RATIOS[metric][0]) for metric in ERROR_METRICS])
+    denominators = np.column_stack([np.ones((confusion_codes.shape[0], len(VARIANCE_METRICS)))] +
+                                   [confusion_one_hot @ np.array(ERROR_METRICS_RATIOS[metric][1]) for metric in ERROR_METRICS])
+    return numerators, denominators, VARIANCE_METRICS + ERROR_METRICS
+
+
+def _iterate_groups_ratio_estimates(numerators: np.ndarray, denominators: np.ndarray, groups_membership: np.ndarray,
+                                    weights: np.ndarray):
+    # Yield ratio estimates of metrics of each group, weighted totals of their denominators,
+    # and residuals of the linearized ratio estimator for each sampled row
+    for group_idx in range(groups_membership.shape[1]):
+        group_numerators = numerators * groups_membership[:, group_idx:group_idx + 1]
+        group_denominators = denominators * groups_membership[:, group_idx:group_idx + 1]
+        denominators_totals = weights @ group_denominators
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratios = (weights @ group_numerators) / denominators_totals
+        residuals = group_numerators - np.nan_to_num(ratios) * group_denominators
+        yield group_idx, ratios, denominators_totals, residuals
+
+
+def _compute_strata_stds(residuals: np.ndarray, strata: np.ndarray, strata_sample_sizes: np.ndarray) -> np.ndarray:
+    # Standard deviations of residuals in each stratum with a shape (n_strata, n_metrics).
+    # Strata with less than two sampled rows get zero.
+    strata_stds = np.zeros((strata_sample_sizes.shape[0], residuals.shape[1]))
+    for stratum in np.flatnonzero(strata_sample_sizes > 1):
+        strata_stds[stratum] = residuals[strata == stratum].std(axis=0, ddof=1)
+    return strata_stds
+
+
+def _allocate_neyman_sample_sizes(strata_sizes: np.ndarray, strata_stds: np.ndarray,
+                                  target_variance: float) -> np.ndarray:
+    # Minimal sizes n_h, proportional to N_h * S_h (the Neyman allocation), for which a variance
+    # sum_h N_h^2 * (1 - n_h / N_h) * S_h^2 / n_h of the estimated total is at most target_variance.
+    # Strata, which require more rows than they have, are taken completely, and other strata are reallocated.
+    is_census = np.zeros(strata_sizes.shape[0], dtype=bool)
+    sample_sizes = np.zeros(strata_sizes.shape[0])
+    while True:
+        is_active = ~is_census & (strata_stds > 0)
+        weighted_stds = strata_sizes * strata_stds * is_active
+        if weighted_stds.sum() == 0:
+            break
+        n_total = weighted_stds.sum() ** 2 / (target_variance + (weighted_stds * strata_stds).sum())
+        sample_sizes = n_total * weighted_stds / weighted_stds.sum()
+        new_census = is_active & (sample_sizes >= strata_sizes)
+        if not new_census.any():
+            break
+        is_census |= new_census
+
+    sample_sizes[is_census] = strata_sizes[is_census]
+    return np.ceil(sample_sizes).astype(int)
+
+
+def compute_required_strata_sample_sizes(per_sample_stats_df: pd.DataFrame, confusion_codes: np.ndarray,
+                                         groups_membership: np.ndarray, strata: np.ndarray, strata_sizes: np.ndarray,
+                                         relative_error: float, confidence_level: float = 0.95) -> np.ndarray:
+    """
+    Estimate numbers of rows to sample from each stratum to estimate each metric of each group with a relative error
+     below relative_error with the given confidence. Variances of metrics in strata are estimated on the current
+     subsample (a pilot), so the subsample can be extended by sample_stratified_test_subset() and checked again.
+
+    For each group and metric, a standard error of the ratio estimator is computed by the linearization
+     as in estimate_stratified_groups_metrics(), and strata sizes are allocated by the Neyman allocation
+     to keep it below relative_error * |metric| / z. Ratio metrics like TPR, PPV, and FPR are linearized
+     on their own denominators, so rare positives or predicted positives in a group require more rows.
+     Metrics with a zero or undefined estimate are skipped, since their relative error is undefined.
+     Each stratum takes the largest size required by metrics of its groups.
+
+    Return a 1D numpy array of required sample sizes of strata.
+
+    Parameters
+    ----------
+    per_sample_stats_df
+        Per-sample metrics for the sampled rows created by compute_per_sample_stats()
+    confusion_codes
+        Confusion codes of the sampled rows created by encode_confusion_codes()
+    groups_membership
+        A dense 0/1 matrix with a shape (n_sampled_rows, n_groups) of the sampled rows membership in groups
+    strata
+        Strata of the sampled rows
+    strata_sizes
+        Sizes of all strata in the test set
+    relative_error
+        Target relative error of metrics, for example, 0.05
+    confidence_level
+        [Optional] Confidence level of the relative error. Default: 0.95.
+
+    """
+    if not 0 < relative_error < 1:
+        raise ValueError('relative_error must be in (0, 1)')
+
+    z_score = sp.stats.norm.ppf(0.5 + confidence_level / 2)
+    strata_sample_sizes = np.bincount(strata, minlength=strata_sizes.shape[0])
+    weights = strata_sizes[strata] / strata_sample_sizes[strata]
+    numerators, denominators, _ = _create_metrics_numerators_and_denominators(per_sample_stats_df, confusion_codes)
+
+    required_sample_sizes = np.minimum(strata_sizes, 2)
+    for _, ratios, denominators_totals, residuals in \
+            _iterate_groups_ratio_estimates(numerators, denominators, np.asarray(groups_membership, dtype=float), weights):
+        strata_stds = _compute_strata_stds(residuals, strata, strata_sample_sizes)
+        for metric_idx in np.flatnonzero(np.isfinite(ratios) & (ratios != 0)):
+            target_variance = (relative_error * abs(ratios[metric_idx]) * denominators_totals[metric_idx] / z_score) ** 2
+            required_sample_sizes = np.maximum(required_sample_sizes,
+                                               _allocate_neyman_sample_sizes(strata_sizes, strata_stds[:, metric_idx],
+                                                                             target_variance))
+
+    return required_sample_sizes
+
+
+def estimate_stratified_groups_metrics(per_sample_stats_df: pd.DataFrame, confusion_codes: np.ndarray,
+                                       groups_membership: np.ndarray, group_names: list, strata: np.ndarray,
+                                       strata_sizes: np.ndarray):
+    """
+    Estimate variance and error metrics of each group on the whole test set from a stratified subsample.
+     Each metric is a ratio of weighted sums, and its standard error is estimated by the linearization
+     of the ratio estimator with a finite population correction in each stratum.
+
+    Return a tuple of two dicts of dicts where key is a group name, and value is a dict of metrics (or standard errors
+     of metrics) for this group.
+
+    Parameters
+    ----------
+    per_sample_stats_df
+        Per-sample metrics for the sampled rows created by compute_per_sample_stats()
+    confusion_codes
+        Confusion codes of the sampled rows created by encode_confusion_codes()
+    groups_membership
+        A dense 0/1 matrix with a shape (n_sampled_rows, n_groups) of the sampled rows membership in groups
+    group_names
+        Names of groups in the same order as in groups_membership
+    strata
+        Strata of the sampled rows
+    strata_sizes
+        Sizes of all strata in the test set
+
+    """
+    strata_sample_sizes = np.bincount(strata, minlength=strata_sizes.shape[0])
+    weights = strata_sizes[strata] / strata_sample_sizes[strata]
+    numerators, denominators, metric_names = _create_metrics_numerators_and_denominators(per_sample_stats_df,
+                                                                                         confusion_codes)
+    # A finite population correction of each stratum
+    strata_corrections = strata_sizes ** 2 * (1 - strata_sample_sizes / strata_sizes) / np.maximum(strata_sample_sizes, 1)
+
+    groups_metrics, groups_std_errors = dict(), dict()
+    for group_idx, ratios, denominators_totals, residuals in \
+            _iterate_groups_ratio_estimates(numerators, denominators, np.asarray(groups_membership, dtype=float), weights):
+        strata_stds = _compute_strata_stds(residuals, strata, strata_sample_sizes)
+        variances = strata_corrections @ strata_stds ** 2
+        with np.errstate(divide='ignore', invalid='ignore'):
+            std_errors = np.sqrt(variances) / denominators_totals
+
+        groups_metrics[group_names[group_idx]] = dict(zip(metric_names, ratios.astype(float)))
+        groups_std_errors[group_names[group_idx]] = dict(zip(metric_names, std_errors.astype(float)))
+
+    return groups_metrics, groups_std_errors